@@ -0,0 +1,129 @@
+"""Measure checkpointing and restoring wordle sessions with `session_store`.
+
+Checkpoints a wordle session per room a few times, as the bot does after
+every guess, then opens the store again as after a restart and lets a
+`WordleBot` restore every room, including its round and leave timers.
+
+    python benchmarks/session_restore.py --rooms 1000 --checkpoints 10
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.insert(0, os.path.join(ROOT, "wordle"))
+
+from common.scheduler import get_scheduler
+from common.session_store import FileSessionStore, SqliteSessionStore
+from lib.image_data import ImageData
+from lib.wordle_bot import Session, SessionManager, WordleBot
+
+
+TIMEOUT = 3600  # seconds, the timers never fire during the benchmark
+
+
+def noop(*args):
+    pass
+
+
+def create_session(room_id):
+    items = [
+        [f"word{i}", f"https://example.org/{room_id}/{i}.jpg", None]
+        for i in range(10)
+    ]
+    session = Session(ImageData.from_items(items, 10, "one_blind"))
+    session.players = [
+        {"id": 2 * room_id, "name": "Ann", "msg_n": 0, "status": "ready"},
+        {"id": 2 * room_id + 1, "name": "Bob", "msg_n": 0, "status": "ready"},
+    ]
+    session.timer.round_timer = get_scheduler().schedule(TIMEOUT, noop, group=room_id)
+    session.timer.left_room[2 * room_id + 1] = get_scheduler().schedule(
+        TIMEOUT, noop, group=room_id
+    )
+    return session
+
+
+def play(session, step):
+    """Change the session as a guess does."""
+    for player in session.players:
+        player["msg_n"] = step
+    session.guesses = {session.players[0]["id"]: "crane"}
+    session.guesses_history = ["slate", "crane"][: step % 3]
+    session.points = 25 * step
+    if step % 3 == 0 and len(session.images) > 1:
+        session.images.pop(0)
+
+
+def measure(name, open_store, bot, rooms, checkpoints):
+    sessions = {room_id: create_session(room_id) for room_id in range(rooms)}
+    store = open_store()
+    start = time.perf_counter()
+    for step in range(checkpoints):
+        for room_id, session in sessions.items():
+            play(session, step)
+            store.save(room_id, session.to_state())
+    saved = time.perf_counter() - start
+    store.close()
+    for session in sessions.values():
+        session.close()
+
+    # as after a restart: open the store and resume every room
+    start = time.perf_counter()
+    bot.sessions = SessionManager(open_store())
+    bot.restore_sessions()
+    restored = time.perf_counter() - start
+    bot.sessions.store.close()
+
+    timers = get_scheduler().pending()
+    for room_id in list(bot.sessions):
+        bot.sessions[room_id].close()
+    bot.sessions.clear()
+
+    print(
+        f"{name:<8}"
+        f"{rooms:>8}"
+        f"{timers:>8}"
+        f"{saved / (rooms * checkpoints) * 1e6:>18.1f}"
+        f"{restored * 1e3:>16.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rooms", type=int, default=1000, help="number of rooms")
+    parser.add_argument(
+        "--checkpoints", type=int, default=10, help="checkpoints per room"
+    )
+    args = parser.parse_args()
+
+    bot = WordleBot("token", 1, "http://localhost", None)
+
+    print(f"{args.rooms} rooms, {args.checkpoints} checkpoints per room")
+    print(
+        f"{'':<8}{'rooms':>8}{'timers':>8}{'checkpoint (us)':>18}{'restore (ms)':>16}"
+    )
+
+    with tempfile.TemporaryDirectory() as directory:
+        measure(
+            "sqlite",
+            lambda: SqliteSessionStore(os.path.join(directory, "sessions.db")),
+            bot,
+            args.rooms,
+            args.checkpoints,
+        )
+        measure(
+            "file",
+            lambda: FileSessionStore(os.path.join(directory, "sessions.jsonl")),
+            bot,
+            args.rooms,
+            args.checkpoints,
+        )
+    bot.api.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Compare `threading.Timer` room timers with the shared `Scheduler`.
+
+Starts one timeout timer per room, as the bots do when a task room is
+created, resets each of them a few times, as on every text message,
+and reports the number of live threads and the cost of a reset.
+
+    python benchmarks/timers.py --rooms 500 --resets 20
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.scheduler import Scheduler
+
+
+TIMEOUT = 3600  # seconds, the timers never fire during the benchmark
+
+
+def noop(room_id):
+    pass
+
+
+class ThreadingRoomTimer:
+    """The `RoomTimer` pattern used by the bots before `scheduler`."""
+
+    def __init__(self, function, room_id):
+        self.function = function
+        self.room_id = room_id
+        self.start_timer()
+
+    def start_timer(self):
+        self.timer = threading.Timer(TIMEOUT, self.function, args=[self.room_id])
+        self.timer.start()
+
+    def reset(self):
+        self.timer.cancel()
+        self.start_timer()
+
+    def cancel(self):
+        self.timer.cancel()
+
+
+class ScheduledRoomTimer:
+    def __init__(self, scheduler, function, room_id):
+        self.timer = scheduler.schedule(TIMEOUT, function, room_id, group=room_id)
+
+    def reset(self):
+        self.timer.reset()
+
+    def cancel(self):
+        self.timer.cancel()
+
+
+def measure(name, create, rooms, resets, baseline):
+
+    start = time.perf_counter()
+    timers = [create(room_id) for room_id in range(rooms)]
+    started = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(resets):
+        for timer in timers:
+            timer.reset()
+    reset = time.perf_counter() - start
+    threads = threading.active_count() - baseline
+
+    start = time.perf_counter()
+    for timer in timers:
+        timer.cancel()
+    cancelled = time.perf_counter() - start
+
+    print(
+        f"{name:<10}"
+        f"{threads:>10}"
+        f"{started / rooms * 1e6:>14.1f}"
+        f"{reset / (rooms * resets) * 1e6:>14.1f}"
+        f"{cancelled / rooms * 1e6:>14.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rooms", type=int, default=500, help="number of rooms")
+    parser.add_argument(
+        "--resets", type=int, default=20, help="resets per room (text messages)"
+    )
+    args = parser.parse_args()
+
+    print(f"{args.rooms} rooms, {args.resets} resets per room")
+    print(
+        f"{'':<10}{'threads':>10}"
+        f"{'start (us)':>14}{'reset (us)':>14}{'cancel (us)':>14}"
+    )
+
+    measure(
+        "threading",
+        lambda room_id: ThreadingRoomTimer(noop, room_id),
+        args.rooms,
+        args.resets,
+        threading.active_count(),
+    )
+    # give the cancelled timer threads time to exit
+    time.sleep(0.5)
+
+    baseline = threading.active_count()
+    scheduler = Scheduler()
+    measure(
+        "scheduler",
+        lambda room_id: ScheduledRoomTimer(scheduler, noop, room_id),
+        args.rooms,
+        args.resets,
+        baseline,
+    )
+    scheduler.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -9,10 +9,9 @@ import logging
 import os
 import random
 import string
-from time import sleep
 
-import requests
 
+from common.scheduler import schedule
 from lib.config import *
 from templates import TaskBot
 
@@ -48,28 +47,16 @@ class Chatbot(TaskBot):
 
             # read out task greeting
             # ask players to send /ready
-            sleep(1)  # avoiding namespace errors
-            for line in TASK_GREETING:
-                self.sio.emit(
-                    "text",
-                    {
-                        "message": line,
-                        "room": room_id,
-                        "html": True
-                    }
-                )
-                sleep(0.5)
+            # delayed to avoid namespace errors
+            self.send_paced(room_id, TASK_GREETING, delay=1)
 
         @self.sio.event
         def status(data):
             """Triggered if a user enters or leaves a room."""
+            self.metadata.on_status(data)
             # check whether the user is eligible to join this task
-            task = requests.get(
-                f"{self.uri}/users/{data['user']['id']}/task",
-                headers={"Authorization": f"Bearer {self.token}"},
-            )
-            self.request_feedback(task, "set task instruction title")
-            if not task.json() or task.json()["id"] != int(self.task_id):
+            task = self.metadata.task_of(data["user"]["id"])
+            if not task or task["id"] not in self.tasks:
                 return
 
         @self.sio.event
@@ -147,8 +134,9 @@ class Chatbot(TaskBot):
         """Let the bot join an assigned task room."""
 
         def join(data):
-            if self.task_id is None or data["task"] != self.task_id:
+            if data["task"] not in self.tasks:
                 return
+            self.tasks.open_room(data["room"], data["task"])
 
             room_id = data["room"]
 
@@ -163,10 +151,7 @@ class Chatbot(TaskBot):
                     {**usr, "msg_n": 0, "status": "joined"}
                 )
 
-            response = requests.post(
-                f"{self.uri}/users/{self.user}/rooms/{room_id}",
-                headers={"Authorization": f"Bearer {self.token}"},
-            )
+            response = self.api.post(f"/users/{self.user}/rooms/{room_id}")
             self.request_feedback(response, f"let {self.__class__.__name__} join room")
 
         return join
@@ -191,28 +176,25 @@ class Chatbot(TaskBot):
 
         # only one user has sent /ready repetitively
         if curr_usr["status"] in {"ready", "done"}:
-            sleep(0.5)
-            self.sio.emit(
-                "text",
-                {
-                    "message": "You have already typed /ready.",
-                    "receiver_id": curr_usr["id"],
-                    "room": room_id,
-                },
+            self.send_paced(
+                room_id,
+                [
+                    {
+                        "message": "You have already typed /ready.",
+                        "receiver_id": curr_usr["id"],
+                    }
+                ],
+                delay=0.5,
             )
             return
         curr_usr["status"] = "ready"
 
         # a first ready command was sent
-        sleep(0.5)
         # give the user feedback that his command arrived
-        self.sio.emit(
-            "text",
-            {
-                "message": "Okay, let's begin!",
-                "receiver_id": curr_usr["id"],
-                "room": room_id,
-            },
+        self.send_paced(
+            room_id,
+            [{"message": "Okay, let's begin!", "receiver_id": curr_usr["id"]}],
+            delay=0.5,
         )
 
     def _interaction_loop(self, message):
@@ -234,15 +216,14 @@ class Chatbot(TaskBot):
 
         code = "".join(random.choices(string.ascii_uppercase + string.digits, k=6))
         # post code to logs
-        response = requests.post(
-            f"{self.uri}/logs",
+        response = self.api.post(
+            "/logs",
             json={
                 "event": "confirmation_log",
                 "room_id": room_id,
                 "data": {"status_txt": status, "code": code},
                 **kwargs,
             },
-            headers={"Authorization": f"Bearer {self.token}"},
         )
         self.request_feedback(response, f"post code to logs")
 
@@ -266,7 +247,12 @@ class Chatbot(TaskBot):
         return code
 
     def close_game(self, room_id):
-        """Erase any data structures no longer necessary."""
+        """Erase any data structures no longer necessary.
+
+        The room is closed in steps on the scheduler instead of sleeping
+        in between, so that the handler does not hold up its room.
+        """
+        self.pacer.cancel(room_id)
         self.sio.emit(
             "text",
             {
@@ -275,47 +261,23 @@ class Chatbot(TaskBot):
                 "room": room_id,
             },
         )
-        sleep(2)
-        self.sio.emit(
+        schedule(
+            2,
+            self.sio.emit,
             "text",
             {
                 "message": "Make sure to save your token before that.",
                 "room": room_id
             },
+            group=room_id,
         )
-        sleep(TIME_CLOSE*2*60)
-        self.room_to_read_only(room_id)
-
-        # remove users from room
-        for usr in self.players_per_room[room_id]:
-            response = requests.get(
-                f"{self.uri}/users/{usr['id']}",
-                headers={"Authorization": f"Bearer {self.token}"},
-            )
-            self.request_feedback(response, "get user")
-            etag = response.headers["ETag"]
+        schedule(2 + TIME_CLOSE*2*60, self._close_room, room_id, group=room_id)
 
-            response = requests.delete(
-                f"{self.uri}/users/{usr['id']}/rooms/{room_id}",
-                headers={"If-Match": etag, "Authorization": f"Bearer {self.token}"},
-            )
-            self.request_feedback(response, "remove user from task room")
+    def _close_room(self, room_id):
+        self.room_to_read_only(
+            room_id, users=[usr["id"] for usr in self.players_per_room[room_id]]
+        )
 
         # remove any task room specific objects
         self.players_per_room.pop(room_id)
-
-    def room_to_read_only(self, room_id):
-        """Set room to read only."""
-        response = requests.patch(
-            f"{self.uri}/rooms/{room_id}/attribute/id/text",
-            json={"attribute": "readonly", "value": "True"},
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
-        self.request_feedback(response, "set room to read_only")
-
-        response = requests.patch(
-            f"{self.uri}/rooms/{room_id}/attribute/id/text",
-            json={"attribute": "placeholder", "value": "This room is read-only"},
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
-        self.request_feedback(response, "inform user that room is read_only")
+        self.tasks.close_room(room_id)
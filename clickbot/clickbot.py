@@ -3,10 +3,9 @@ import json
 import logging
 import os
 import random
-from threading import Timer
 
-import requests
-import socketio
+from common.scheduler import schedule
+from templates import ApiClient, InstrumentedClient, close_room
 
 
 ROOT = os.path.dirname(os.path.abspath(__file__))
@@ -22,16 +21,16 @@ class RoomTimer:
         self.start_timer()
 
     def start_timer(self):
-        self.timer = Timer(
-            TIMEOUT_TIMER*60,
+        self.timer = schedule(
+            TIMEOUT_TIMER * 60,
             self.function,
-            args=[self.room_id, self.game]
+            self.room_id,
+            self.game,
+            group=self.room_id,
         )
-        self.timer.start()
 
     def reset(self):
-        self.timer.cancel()
-        self.start_timer()
+        self.timer.reset()
         LOG.info("reset timer")
 
     def cancel(self):
@@ -49,7 +48,7 @@ class Game:
 
 
 class ClickBot:
-    sio = socketio.Client(logger=True)
+    sio = InstrumentedClient(logger=True)
     task_id = None
 
     def __init__(self, token, user, host, port, data_path):
@@ -60,6 +59,7 @@ class ClickBot:
         if port is not None:
             self.uri += f":{port}"
         self.uri += "/slurk/api"
+        self.api = ApiClient(self.uri, self.token)
 
         self.game_per_room = dict()
         with open(data_path, "r", encoding="utf-8") as f:
@@ -80,13 +80,6 @@ class ClickBot:
         # wait until the connection with the server ends
         self.sio.wait()
 
-    @staticmethod
-    def message_callback(success, error_msg="Unknown Error"):
-        if not success:
-            LOG.error(f"Could not send message: {error_msg}")
-            exit(1)
-        LOG.debug("Sent message successfully.")
-
     @staticmethod
     def request_feedback(response, action):
         if not response.ok:
@@ -99,10 +92,7 @@ class ClickBot:
             room_id = data["room"]
 
             if self.task_id is None or data["task"] == self.task_id:
-                response = requests.post(
-                    f"{self.uri}/users/{self.user}/rooms/{room_id}",
-                    headers={"Authorization": f"Bearer {self.token}"},
-                )
+                response = self.api.post(f"/users/{self.user}/rooms/{room_id}")
                 self.request_feedback(response, "let click bot join room")
 
                 # create new game instance
@@ -116,23 +106,21 @@ class ClickBot:
 
                 # greet user
                 for usr in data["users"]:
-                    self.sio.emit(
+                    self.sio.emit_acked(
                         "text",
                         {
                             "message": f"Hello {usr['name']}. Please click "
                             "on <Start> once you are ready!",
                             "room": room_id,
                         },
-                        callback=self.message_callback,
                     )
-                    self.sio.emit(
+                    self.sio.emit_acked(
                         "text",
                         {
                             "message": "Your task will be to click on the object "
                             "that matches the audio description.",
                             "room": room_id,
                         },
-                        callback=self.message_callback,
                     )
 
         @self.sio.event
@@ -147,35 +135,31 @@ class ClickBot:
             if game is None:
                 return
             if data["command"] not in {"start", "next"}:
-                self.sio.emit(
+                self.sio.emit_acked(
                     "text",
                     {"message": "I do not understand this command.", "room": room_id},
-                    callback=self.message_callback,
                 )
                 return
             if data["command"] == "next" and not game.running:
-                self.sio.emit(
+                self.sio.emit_acked(
                     "text",
                     {"message": "You should start the game first", "room": room_id},
-                    callback=self.message_callback,
                 )
                 return
 
             if data["command"] == "start":
                 game.running = True
                 # hide start button
-                response = requests.post(
-                    f"{self.uri}/rooms/{room_id}/class/start-button",
+                response = self.api.post(
+                    f"/rooms/{room_id}/class/start-button",
                     json={"class": "dis-button"},
-                    headers={"Authorization": f"Bearer {self.token}"},
                 )
                 self.request_feedback(response, "hide start button")
 
                 # enable next button
-                response = requests.delete(
-                    f"{self.uri}/rooms/{room_id}/class/next-button",
+                response = self.api.delete(
+                    f"/rooms/{room_id}/class/next-button",
                     json={"class": "dis-button"},
-                    headers={"Authorization": f"Bearer {self.token}"},
                 )
                 self.request_feedback(response, "enable next button")
 
@@ -184,10 +168,9 @@ class ClickBot:
             if game.current_item is not None:
                 self.display_item(room_id, game.current_item)
                 # set text to 'skip' while item unanswered
-                response = requests.patch(
-                    f"{self.uri}/rooms/{room_id}/text/next-button",
+                response = self.api.patch(
+                    f"/rooms/{room_id}/text/next-button",
                     json={"text": "Skip>"},
-                    headers={"Authorization": f"Bearer {self.token}"},
                 )
                 self.request_feedback(response, "set text of button")
             else:
@@ -206,22 +189,19 @@ class ClickBot:
                 if self.is_click_on_target(game.current_item, data["coordinates"]):
                     game.correct_answers += 1
                     game.current_item = None
-                    self.sio.emit(
+                    self.sio.emit_acked(
                         "text",
                         {"message": "That was correct!", "room": room_id},
-                        callback=self.message_callback,
                     )
-                    response = requests.patch(
-                        f"{self.uri}/rooms/{room_id}/text/next-button",
+                    response = self.api.patch(
+                        f"/rooms/{room_id}/text/next-button",
                         json={"text": "Next>"},
-                        headers={"Authorization": f"Bearer {self.token}"},
                     )
                     self.request_feedback(response, "set text of button")
                 else:
-                    self.sio.emit(
+                    self.sio.emit_acked(
                         "text",
                         {"message": "Try again!", "room": room_id},
-                        callback=self.message_callback,
                     )
 
     def get_new_item(self, room_id, game):
@@ -235,98 +215,48 @@ class ClickBot:
 
     def display_item(self, room_id, item):
         # set image
-        response = requests.patch(
-            f"{self.uri}/rooms/{room_id}/attribute/id/tracking-area",
+        response = self.api.patch(
+            f"/rooms/{room_id}/attribute/id/tracking-area",
             json={"attribute": "src", "value": item.get("image_filename", "")},
-            headers={"Authorization": f"Bearer {self.token}"},
         )
         self.request_feedback(response, "set image")
         # set audio
-        response = requests.patch(
-            f"{self.uri}/rooms/{room_id}/attribute/id/audio-file",
+        response = self.api.patch(
+            f"/rooms/{room_id}/attribute/id/audio-file",
             json={"attribute": "src", "value": item.get("audio_filename", "")},
-            headers={"Authorization": f"Bearer {self.token}"},
         )
         self.request_feedback(response, "set audio")
 
     def close_game(self, room_id, game):
         game.running = False
         # clear display area
-        self.sio.emit(
+        self.sio.emit_acked(
             "text",
             {"message": "You have answered all items.", "room": room_id},
-            callback=self.message_callback,
         )
-        self.sio.emit(
+        self.sio.emit_acked(
             "text",
             {
                 "message": f"You got {game.correct_answers} "
                 f"out of {game.total_answers} correct.",
                 "room": room_id,
             },
-            callback=self.message_callback,
         )
         self.display_item(room_id, {})
         # hide button
-        response = requests.post(
-            f"{self.uri}/rooms/{room_id}/class/next-button",
+        response = self.api.post(
+            f"/rooms/{room_id}/class/next-button",
             json={"class": "dis-button"},
-            headers={"Authorization": f"Bearer {self.token}"},
         )
         self.request_feedback(response, "hide button")
         self.room_to_read_only(room_id)
         self.timers_per_room.pop(room_id)
         self.game_per_room.pop(room_id)
+        self.sio.forget_room(room_id)
 
     def room_to_read_only(self, room_id):
-        """Set room to read only."""
-        # set room to read-only
-        response = requests.patch(
-            f"{self.uri}/rooms/{room_id}/attribute/id/text",
-            json={"attribute": "readonly", "value": "True"},
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
-        if not response.ok:
-            logging.error(f"Could not set room to read_only: {response.status_code}")
-            response.raise_for_status()
-        response = requests.patch(
-            f"{self.uri}/rooms/{room_id}/attribute/id/text",
-            json={"attribute": "placeholder", "value": "This room is read-only"},
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
-        if not response.ok:
-            logging.error(f"Could not set room to read_only: {response.status_code}")
-            response.raise_for_status()
-
-        response = requests.get(
-            f"{self.uri}/rooms/{room_id}/users",
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
-        if not response.ok:
-            logging.error(f"Could not get user: {response.status_code}")
-
-        users = response.json()
-        for user in users:
-            if user["id"] != self.user:
-                response = requests.get(
-                    f"{self.uri}/users/{user['id']}",
-                    headers={"Authorization": f"Bearer {self.token}"},
-                )
-                if not response.ok:
-                    logging.error(f"Could not get user: {response.status_code}")
-                    response.raise_for_status()
-                etag = response.headers["ETag"]
-
-                response = requests.delete(
-                    f"{self.uri}/users/{user['id']}/rooms/{room_id}",
-                    headers={"If-Match": etag, "Authorization": f"Bearer {self.token}"},
-                )
-                if not response.ok:
-                    logging.error(
-                        f"Could not remove user from task room: {response.status_code}"
-                    )
-                    response.raise_for_status()
-                logging.debug("Removing user from task room was successful.")
+        """Set room to read only and remove the users from it."""
+        close_room(self.api, room_id, exclude={self.user})
 
     def is_click_on_target(self, item, pos):
         left, top, right, bottom = item["bb"]
@@ -0,0 +1 @@
+"""Modules shared by the bots, copied into every image as one directory."""
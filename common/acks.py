@@ -0,0 +1,314 @@
+"""Acknowledged emits with an in-flight window, deadlines and retries."""
+
+from collections import deque
+import itertools
+import logging
+import os
+import threading
+import time
+
+from common.metrics import get_metrics
+from common.outbound import shares_ack
+from common.scheduler import get_scheduler
+
+
+LOG = logging.getLogger(__name__)
+
+
+class _Message:
+    __slots__ = (
+        "id",
+        "event",
+        "data",
+        "namespace",
+        "room",
+        "on_ack",
+        "on_failure",
+        "timeout",
+        "attempts",
+        "first_sent",
+        "timer",
+        "done",
+    )
+
+    def __init__(self, id, event, data, namespace, room, on_ack, on_failure, timeout):
+        self.id = id
+        self.event = event
+        self.data = data
+        self.namespace = namespace
+        self.room = room
+        self.on_ack = on_ack
+        self.on_failure = on_failure
+        self.timeout = timeout
+        self.attempts = 0
+        self.first_sent = None
+        self.timer = None
+        self.done = False
+
+
+class _Lane:
+    __slots__ = ("waiting", "in_flight")
+
+    def __init__(self):
+        self.waiting = deque()
+        self.in_flight = 0
+
+
+def ack_result(args):
+    """Success and error message of the values a server event handler
+    returned: `True`, `(False, "reason")` or nothing."""
+    if not args:
+        return True, None
+    success = args[0]
+    if isinstance(success, (list, tuple)):
+        return ack_result(success)
+    return bool(success), args[1] if len(args) > 1 else None
+
+
+class AckWindow:
+    def __init__(
+        self, emit, window=4, timeout=5.0, retries=2, dead_letters=100, scheduler=None
+    ):
+        """Emits events with an acknowledgement callback and keeps track
+        of the answers, without waiting for them in the calling thread.
+
+        At most `window` messages per room wait for their ack; further
+        ones are queued and sent in order as acks come in. A message
+        not acknowledged within its deadline is sent again, up to
+        `retries` times, so a slow server may receive it twice. Messages
+        the server refused or that ran out of retries end up in a
+        bounded dead-letter list instead of stopping the bot. Ack
+        latencies are recorded as `ack` metric, failures as its errors.
+        :param emit: Function sending an emit, called as
+            `emit(event, data, namespace, callback)`
+        :type emit: function
+        :param window: Messages per room waiting for their ack at once
+        :type window: int
+        :param timeout: Seconds to wait for an ack before sending again
+        :type timeout: float
+        :param retries: Number of times an unacknowledged message is
+            sent again
+        :type retries: int
+        :param dead_letters: Number of failed messages kept
+        :type dead_letters: int
+        :param scheduler: Scheduler watching the deadlines, defaults to
+            the shared one
+        :type scheduler: scheduler.Scheduler, optional
+        """
+        self._emit = emit
+        self.window = window
+        self.timeout = timeout
+        self.retries = retries
+        self.scheduler = scheduler if scheduler is not None else get_scheduler()
+
+        self._lanes = dict()
+        self._ids = itertools.count()
+        # re-entrant, as a client may call back before `emit` returns
+        self._lock = threading.RLock()
+        self._dead_letters = deque(maxlen=dead_letters)
+        self._counts = {
+            "sent": 0,
+            "acked": 0,
+            "refused": 0,
+            "timeouts": 0,
+            "retries": 0,
+            "dead": 0,
+        }
+
+        metrics = get_metrics()
+        metrics.gauge(
+            "ack_in_flight", self.in_flight, "Emits waiting for their ack."
+        )
+        metrics.gauge("ack_waiting", self.waiting, "Emits waiting for a free slot.")
+        metrics.gauge(
+            "ack_retries", lambda: self._counts["retries"], "Emits sent again."
+        )
+        metrics.gauge(
+            "ack_dead_letters",
+            lambda: self._counts["dead"],
+            "Emits given up after a refusal or too many timeouts.",
+        )
+
+    @classmethod
+    def from_env(cls, emit):
+        """Create the window with the settings from `SLURK_ACK_WINDOW`,
+        `SLURK_ACK_TIMEOUT` and `SLURK_ACK_RETRIES`."""
+        return cls(
+            emit,
+            window=int(os.environ.get("SLURK_ACK_WINDOW", 4)),
+            timeout=float(os.environ.get("SLURK_ACK_TIMEOUT", 5.0)),
+            retries=int(os.environ.get("SLURK_ACK_RETRIES", 2)),
+        )
+
+    def emit(
+        self,
+        event,
+        data=None,
+        namespace=None,
+        on_ack=None,
+        on_failure=None,
+        timeout=None,
+    ):
+        """Send an event and track its ack.
+        :param on_ack: Called with the values returned by the server
+            once the event is acknowledged
+        :type on_ack: function, optional
+        :param on_failure: Called with the reason and the payload if
+            the server refused the event or never acknowledged it
+        :type on_failure: function, optional
+        :param timeout: Deadline of this message, defaults to the
+            timeout of the window
+        :type timeout: float, optional
+        :return: ID of the message, as found in the dead-letter list
+        :rtype: int
+        """
+        room_id = data.get("room") if isinstance(data, dict) else None
+        message = _Message(
+            next(self._ids),
+            event,
+            data,
+            namespace,
+            room_id,
+            on_ack,
+            on_failure,
+            timeout if timeout is not None else self.timeout,
+        )
+        with self._lock:
+            lane = self._lanes.get(room_id)
+            if lane is None:
+                lane = self._lanes[room_id] = _Lane()
+            if lane.in_flight < self.window:
+                lane.in_flight += 1
+                self._send(message)
+            else:
+                lane.waiting.append(message)
+        return message.id
+
+    def in_flight(self, room_id=None):
+        """Number of messages waiting for their ack."""
+        with self._lock:
+            lanes = self._lanes_of(room_id)
+            return sum(lane.in_flight for lane in lanes)
+
+    def waiting(self, room_id=None):
+        """Number of messages queued behind a full window."""
+        with self._lock:
+            lanes = self._lanes_of(room_id)
+            return sum(len(lane.waiting) for lane in lanes)
+
+    def dead_letters(self):
+        """Failed messages, oldest first, as dicts with the keys `id`,
+        `event`, `data`, `reason`, `attempts` and `time`."""
+        with self._lock:
+            return list(self._dead_letters)
+
+    def stats(self):
+        with self._lock:
+            return {**self._counts, "rooms": len(self._lanes)}
+
+    def _lanes_of(self, room_id):
+        if room_id is None:
+            return self._lanes.values()
+        lane = self._lanes.get(room_id)
+        return [lane] if lane is not None else []
+
+    def _send(self, message):
+        """Send one attempt of a message. Called with the lock held."""
+        message.attempts += 1
+        attempt = message.attempts
+        if message.first_sent is None:
+            message.first_sent = time.monotonic()
+        message.timer = self.scheduler.schedule(
+            message.timeout,
+            self._expire,
+            message,
+            attempt,
+            group=("acks", message.room),
+        )
+        self._counts["sent"] += 1
+
+        @shares_ack
+        def callback(*args):
+            self._acknowledge(message, args)
+
+        try:
+            self._emit(message.event, message.data, message.namespace, callback)
+        except Exception:
+            # the deadline sends it again
+            LOG.exception(f"Could not emit {message.event}")
+
+    def _acknowledge(self, message, args):
+        success, error = ack_result(args)
+        with self._lock:
+            if message.done:
+                return
+            message.timer.cancel()
+            if success:
+                self._counts["acked"] += 1
+                self._finish(message)
+            else:
+                self._counts["refused"] += 1
+                self._fail(message, error or "refused")
+        latency = time.monotonic() - message.first_sent
+        get_metrics().observe("ack", latency, error=not success, event=message.event)
+
+        if not success:
+            LOG.error(f"Server refused {message.event}: {error}")
+            self._notify(message.on_failure, error or "refused", message.data)
+        else:
+            self._notify(message.on_ack, *args)
+
+    def _expire(self, message, attempt):
+        with self._lock:
+            if message.done or message.attempts != attempt:
+                return
+            self._counts["timeouts"] += 1
+            if message.attempts <= self.retries:
+                self._counts["retries"] += 1
+                LOG.warning(
+                    f"No ack for {message.event} after {message.timeout}s, "
+                    f"sending it again"
+                )
+                self._send(message)
+                return
+            self._fail(message, "timeout")
+        elapsed = time.monotonic() - message.first_sent
+        get_metrics().observe("ack", elapsed, error=True, event=message.event)
+        LOG.error(f"Gave up on {message.event} after {message.attempts} attempts")
+        self._notify(message.on_failure, "timeout", message.data)
+
+    def _fail(self, message, reason):
+        """Move a message to the dead letters. Called with the lock held."""
+        self._counts["dead"] += 1
+        self._dead_letters.append(
+            {
+                "id": message.id,
+                "event": message.event,
+                "data": message.data,
+                "reason": reason,
+                "attempts": message.attempts,
+                "time": time.time(),
+            }
+        )
+        self._finish(message)
+
+    def _finish(self, message):
+        """Free the slot of a message and send the next one waiting.
+        Called with the lock held."""
+        message.done = True
+        lane = self._lanes[message.room]
+        if lane.waiting:
+            self._send(lane.waiting.popleft())
+            return
+        lane.in_flight -= 1
+        if not lane.in_flight:
+            del self._lanes[message.room]
+
+    @staticmethod
+    def _notify(function, *args):
+        if function is None:
+            return
+        try:
+            function(*args)
+        except Exception:
+            LOG.exception("Ack handler failed")
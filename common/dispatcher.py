@@ -0,0 +1,157 @@
+"""Per-room ordering of Socket.IO events on a bounded thread pool."""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import threading
+import time
+
+from common.metrics import get_metrics
+
+
+LOG = logging.getLogger(__name__)
+
+
+class RoomLocks:
+    def __init__(self):
+        """One reentrant lock per room, to guard the session state of a
+        room against concurrent handlers and timers."""
+        self._locks = dict()
+        self._lock = threading.Lock()
+
+    def __call__(self, room_id):
+        with self._lock:
+            lock = self._locks.get(room_id)
+            if lock is None:
+                lock = self._locks[room_id] = threading.RLock()
+            return lock
+
+    def discard(self, room_id):
+        """Forget the lock of a closed room."""
+        with self._lock:
+            self._locks.pop(room_id, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._locks)
+
+
+class RoomDispatcher:
+    def __init__(self, workers=16, batch=16, locks=None):
+        """Runs event handlers on a bounded pool of threads.
+
+        Events of one room are handled one after another in the order
+        they arrived while different rooms are handled in parallel, so
+        a handler that waits only delays its own room. Each handler
+        holds the room's lock while running.
+        :param workers: Maximum number of rooms handled at once
+        :type workers: int
+        :param batch: Events handled for one room before the worker is
+            handed to the next waiting room
+        :type batch: int
+        :param locks: Locks shared with other code touching room state
+        :type locks: RoomLocks, optional
+        """
+        self.batch = batch
+        self.locks = locks if locks is not None else RoomLocks()
+
+        self._backlogs = dict()
+        # closed rooms whose lock is dropped once their backlog is empty
+        self._closed = set()
+        self._lock = threading.Lock()
+        self._dispatched = 0
+        self._max_backlog = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="room"
+        )
+
+        metrics = get_metrics()
+        metrics.gauge(
+            "room_backlog", self.backlog, "Events waiting to be handled."
+        )
+        metrics.gauge(
+            "room_backlog_max",
+            lambda: self.stats()["max_backlog"],
+            "Longest backlog of a single room so far.",
+        )
+        metrics.gauge(
+            "rooms_busy",
+            lambda: self.stats()["rooms"],
+            "Rooms with events being handled or waiting.",
+        )
+
+    @classmethod
+    def from_env(cls, locks=None):
+        """Create a dispatcher if `SLURK_DISPATCH_WORKERS` is set, else
+        None."""
+        workers = int(os.environ.get("SLURK_DISPATCH_WORKERS", 0))
+        if workers <= 0:
+            return None
+        return cls(workers, locks=locks)
+
+    def submit(self, room_id, function, *args):
+        """Queue `function(*args)` behind the pending events of a room."""
+        with self._lock:
+            backlog = self._backlogs.get(room_id)
+            idle = backlog is None
+            if idle:
+                backlog = self._backlogs[room_id] = deque()
+            backlog.append((function, args, time.monotonic()))
+            self._max_backlog = max(self._max_backlog, len(backlog))
+
+        if idle:
+            self._executor.submit(self._drain, room_id)
+
+    def discard(self, room_id):
+        """Forget a closed room. Its lock is dropped at once if no event
+        of the room is pending, else after the last one was handled, so
+        that its handlers keep running one at a time."""
+        with self._lock:
+            if room_id in self._backlogs:
+                self._closed.add(room_id)
+                return
+            self._closed.discard(room_id)
+        self.locks.discard(room_id)
+
+    def backlog(self, room_id=None):
+        """Number of queued events, optionally only of one room."""
+        with self._lock:
+            if room_id is not None:
+                return len(self._backlogs.get(room_id, ()))
+            return sum(len(backlog) for backlog in self._backlogs.values())
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rooms": len(self._backlogs),
+                "backlog": sum(len(backlog) for backlog in self._backlogs.values()),
+                "max_backlog": self._max_backlog,
+                "dispatched": self._dispatched,
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def _drain(self, room_id):
+        for _ in range(self.batch):
+            with self._lock:
+                backlog = self._backlogs[room_id]
+                if not backlog:
+                    del self._backlogs[room_id]
+                    if room_id in self._closed:
+                        self._closed.discard(room_id)
+                        self.locks.discard(room_id)
+                    return
+                function, args, queued = backlog.popleft()
+                self._dispatched += 1
+
+            get_metrics().observe("room_wait", time.monotonic() - queued)
+            with self.locks(room_id):
+                try:
+                    function(*args)
+                except Exception:
+                    LOG.exception(f"Handling an event for room {room_id} failed")
+
+        # let other rooms have their turn
+        self._executor.submit(self._drain, room_id)
@@ -0,0 +1,240 @@
+"""Buffered submission of log events to the slurk API."""
+
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import os
+import threading
+import time
+
+
+LOG = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("block", "drop-oldest", "spill")
+
+
+class LogPipeline:
+    def __init__(
+        self,
+        api,
+        max_size=10000,
+        batch_size=100,
+        workers=4,
+        overflow="block",
+        spill_file=None,
+    ):
+        """Bounded in-memory queue of log records drained by a
+        background worker, so that handlers do not wait for `/logs`.
+
+        slurk only accepts one record per request, so each batch is
+        submitted concurrently: records of different rooms are sent in
+        parallel, records of the same room one after another to keep
+        their order.
+        :param api: Client used to post the records
+        :type api: templates.ApiClient
+        :param max_size: Maximum number of records waiting in memory
+        :type max_size: int
+        :param batch_size: Maximum number of records taken per flush
+        :type batch_size: int
+        :param workers: Number of concurrent submissions per batch
+        :type workers: int
+        :param overflow: What to do with a new record if the queue is
+            full: `block` the caller, `drop-oldest` queued record or
+            `spill` records to `spill_file` until the queue has drained
+        :type overflow: str
+        :param spill_file: Path of the file used by the `spill` policy
+        :type spill_file: str, optional
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"overflow must be one of: {', '.join(OVERFLOW_POLICIES)}"
+            )
+        if overflow == "spill" and spill_file is None:
+            raise ValueError("the spill policy needs a spill_file")
+
+        self.api = api
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.overflow = overflow
+        self.spill_file = spill_file
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._spilled = 0
+        self._closed = False
+        self._counts = {"submitted": 0, "failed": 0, "dropped": 0, "spilled": 0}
+        self._flushes = 0
+        self._flush_time = 0.0
+        self._flush_max = 0.0
+        self._flush_last = 0.0
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="log-pipeline"
+        )
+        self._worker = threading.Thread(
+            target=self._run, name="log-pipeline", daemon=True
+        )
+        self._worker.start()
+
+    @classmethod
+    def from_env(cls, api):
+        """Create a pipeline if `SLURK_LOG_PIPELINE` is set, else None.
+        Settings are read from `SLURK_LOG_QUEUE_SIZE`,
+        `SLURK_LOG_BATCH_SIZE`, `SLURK_LOG_WORKERS`, `SLURK_LOG_OVERFLOW`
+        and `SLURK_LOG_SPILL_FILE`.
+        """
+        enabled = os.environ.get("SLURK_LOG_PIPELINE", "").lower()
+        if enabled not in {"1", "true", "yes"}:
+            return None
+        return cls(
+            api,
+            max_size=int(os.environ.get("SLURK_LOG_QUEUE_SIZE", 10000)),
+            batch_size=int(os.environ.get("SLURK_LOG_BATCH_SIZE", 100)),
+            workers=int(os.environ.get("SLURK_LOG_WORKERS", 4)),
+            overflow=os.environ.get("SLURK_LOG_OVERFLOW", "block"),
+            spill_file=os.environ.get("SLURK_LOG_SPILL_FILE"),
+        )
+
+    def put(self, record):
+        """Queue a record for submission.
+        :param record: Request body for `/logs`, holding at least the
+            keys `event`, `room_id` and `data`
+        :type record: dict
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("log pipeline is closed")
+
+            # once records went to disk, newer ones follow to keep the order
+            if self._spilled:
+                self._spill([record])
+                return
+
+            while len(self._queue) >= self.max_size:
+                if self.overflow == "block":
+                    self._cond.wait()
+                elif self.overflow == "drop-oldest":
+                    dropped = self._queue.popleft()
+                    self._counts["dropped"] += 1
+                    LOG.warning(f"Dropped log event: {dropped['event']}")
+                else:
+                    self._spill([record])
+                    return
+
+            self._queue.append(record)
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Wait until every queued record has been submitted.
+        :param timeout: Maximum number of seconds to wait
+        :type timeout: float, optional
+        :return: `True` if the queue was drained in time
+        :rtype: bool
+        """
+        with self._cond:
+            self._cond.notify_all()
+            return self._cond.wait_for(
+                lambda: not (self._queue or self._in_flight or self._spilled),
+                timeout,
+            )
+
+    def close(self, timeout=None):
+        """Submit the remaining records and stop the worker."""
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._worker.join(timeout)
+        self._executor.shutdown(wait=True)
+
+    def stats(self):
+        """Report queue depth, outcome counters and flush latencies.
+        :return: Counters and latencies (in seconds)
+        :rtype: dict
+        """
+        with self._cond:
+            return {
+                "queue_depth": len(self._queue) + self._in_flight,
+                "spill_depth": self._spilled,
+                **self._counts,
+                "flushes": self._flushes,
+                "flush_latency_last": self._flush_last,
+                "flush_latency_max": self._flush_max,
+                "flush_latency_avg": self._flush_time / self._flushes
+                if self._flushes
+                else 0.0,
+            }
+
+    def _spill(self, records):
+        with open(self.spill_file, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        self._spilled += len(records)
+        self._counts["spilled"] += len(records)
+
+    def _unspill(self):
+        """Move spilled records back into the (empty) queue."""
+        with open(self.spill_file, "r+", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+            f.seek(0)
+            f.truncate()
+            f.writelines(f"{line}\n" for line in lines[self.max_size:])
+        self._queue.extend(json.loads(line) for line in lines[: self.max_size])
+        self._spilled = max(0, len(lines) - self.max_size)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    if self._spilled:
+                        self._unspill()
+                    elif self._closed:
+                        return
+                    else:
+                        self._cond.wait()
+                batch = [
+                    self._queue.popleft()
+                    for _ in range(min(self.batch_size, len(self._queue)))
+                ]
+                self._in_flight = len(batch)
+                # make room for blocked producers
+                self._cond.notify_all()
+
+            start = time.monotonic()
+            self._submit(batch)
+            duration = time.monotonic() - start
+
+            with self._cond:
+                self._in_flight = 0
+                self._flushes += 1
+                self._flush_time += duration
+                self._flush_last = duration
+                self._flush_max = max(self._flush_max, duration)
+                self._cond.notify_all()
+
+    def _submit(self, batch):
+        per_room = defaultdict(list)
+        for record in batch:
+            per_room[record.get("room_id")].append(record)
+
+        for submitted, failed in self._executor.map(
+            self._submit_room, per_room.values()
+        ):
+            with self._cond:
+                self._counts["submitted"] += submitted
+                self._counts["failed"] += failed
+
+    def _submit_room(self, records):
+        submitted = failed = 0
+        for record in records:
+            try:
+                response = self.api.post("/logs", json=record)
+                response.raise_for_status()
+            except Exception as error:
+                failed += 1
+                LOG.error(f"Could not submit log event `{record['event']}`: {error}")
+            else:
+                submitted += 1
+        return submitted, failed
@@ -0,0 +1,352 @@
+"""First come, first served grouping of waiting users per task."""
+
+from collections import OrderedDict
+import os
+import sqlite3
+import threading
+import time
+
+from common.metrics import get_metrics
+
+
+class Ticket:
+    __slots__ = ("task_id", "user_id", "room_id", "enqueued")
+
+    def __init__(self, task_id, user_id, room_id, enqueued):
+        self.task_id = task_id
+        self.user_id = user_id
+        self.room_id = room_id
+        # wall clock time, comparable between processes
+        self.enqueued = enqueued
+
+    def __repr__(self):
+        return (
+            f"Ticket(task_id={self.task_id!r}, user_id={self.user_id!r}, "
+            f"room_id={self.room_id!r})"
+        )
+
+
+class Matchmaker:
+    def __init__(self):
+        """Keeps one queue of waiting users per task and takes groups
+        from its head as soon as enough users wait.
+
+        Queues are ordered dicts keyed by user, so enqueueing, taking
+        the oldest user and cancelling a user who left are O(1). All
+        operations hold one lock; a group taken from a queue belongs to
+        the caller only, so concurrent join and leave events can
+        neither assign a user twice nor lose one. The time from joining
+        to being grouped is recorded as `match_wait` metric per task,
+        waits ended by leaving as its errors.
+
+        The queues live in the memory of the process; several processes
+        share queues through `SqliteMatchmaker`.
+        """
+        self._queues = dict()
+        self._lock = threading.Lock()
+        self._counts = {"queued": 0, "matched": 0, "cancelled": 0}
+
+        metrics = get_metrics()
+        metrics.gauge(
+            "match_queue_depth",
+            lambda: {
+                (("task", task_id),): depth for task_id, depth in self.depths().items()
+            },
+            "Users waiting for a group per task.",
+        )
+
+    @classmethod
+    def from_env(cls):
+        """Open the queues named by `SLURK_MATCH_QUEUE`: `memory`
+        (default) or `sqlite:<path>` to share them between processes."""
+        return open_matchmaker(os.environ.get("SLURK_MATCH_QUEUE", "memory"))
+
+    def enqueue(self, task_id, user_id, room_id):
+        """Queue a user. A user already waiting keeps their place; only
+        the room is updated.
+        :return: Whether the user was not waiting before
+        :rtype: bool
+        """
+        queued = self._enqueue(Ticket(task_id, user_id, room_id, time.time()))
+        if queued:
+            with self._lock:
+                self._counts["queued"] += 1
+        return queued
+
+    def match(self, task_id, group_size):
+        """Take every group that can be formed from the waiting users.
+        :param group_size: Number of users a group of the task needs
+        :type group_size: int
+        :return: Groups formed, each a list of `Ticket` in joining order
+        :rtype: list
+        """
+        groups = self._take(task_id, group_size) if group_size > 0 else []
+        now = time.time()
+        metrics = get_metrics()
+        for group in groups:
+            for ticket in group:
+                wait = now - ticket.enqueued
+                metrics.observe("match_wait", wait, task=ticket.task_id)
+        with self._lock:
+            self._counts["matched"] += group_size * len(groups)
+        return groups
+
+    def join(self, task_id, user_id, room_id, group_size):
+        """Queue a user and take every group that can be formed, see
+        `enqueue` and `match`."""
+        self.enqueue(task_id, user_id, room_id)
+        return self.match(task_id, group_size)
+
+    def leave(self, task_id, user_id):
+        """Remove a waiting user.
+        :return: The user's ticket, None if they were not waiting
+        :rtype: Ticket
+        """
+        ticket = self._cancel(task_id, user_id)
+        if ticket is None:
+            return None
+        with self._lock:
+            self._counts["cancelled"] += 1
+        get_metrics().observe(
+            "match_wait", time.time() - ticket.enqueued, error=True, task=task_id
+        )
+        return ticket
+
+    def requeue(self, tickets):
+        """Put the tickets of a group that could not be started back at
+        the head of their queue, keeping their original wait time."""
+        self._restore(tickets)
+        with self._lock:
+            self._counts["matched"] -= len(tickets)
+
+    def waiting(self, task_id):
+        """Tickets of a task in joining order."""
+        with self._lock:
+            return list(self._queues.get(task_id, {}).values())
+
+    def depths(self):
+        """Number of waiting users per task."""
+        with self._lock:
+            return {task_id: len(queue) for task_id, queue in self._queues.items()}
+
+    def stats(self):
+        """Counts of this process and the number of waiting users."""
+        waiting = sum(self.depths().values())
+        with self._lock:
+            return {**self._counts, "waiting": waiting}
+
+    def close(self):
+        pass
+
+    def _enqueue(self, ticket):
+        with self._lock:
+            queue = self._queues.get(ticket.task_id)
+            if queue is None:
+                queue = self._queues[ticket.task_id] = OrderedDict()
+            waiting = queue.get(ticket.user_id)
+            if waiting is not None:
+                waiting.room_id = ticket.room_id
+                return False
+            queue[ticket.user_id] = ticket
+            return True
+
+    def _take(self, task_id, group_size):
+        with self._lock:
+            queue = self._queues.get(task_id)
+            if queue is None:
+                return []
+            groups = []
+            while len(queue) >= group_size:
+                groups.append(
+                    [queue.popitem(last=False)[1] for _ in range(group_size)]
+                )
+            if not queue:
+                del self._queues[task_id]
+            return groups
+
+    def _cancel(self, task_id, user_id):
+        with self._lock:
+            queue = self._queues.get(task_id)
+            if queue is None:
+                return None
+            ticket = queue.pop(user_id, None)
+            if not queue:
+                del self._queues[task_id]
+            return ticket
+
+    def _restore(self, tickets):
+        with self._lock:
+            for ticket in reversed(tickets):
+                queue = self._queues.get(ticket.task_id)
+                if queue is None:
+                    queue = self._queues[ticket.task_id] = OrderedDict()
+                queue[ticket.user_id] = ticket
+                queue.move_to_end(ticket.user_id, last=False)
+
+
+class SqliteMatchmaker(Matchmaker):
+    def __init__(self, path, claim_ttl=30.0, timeout=30.0):
+        """Queues in a SQLite database that several concierge processes
+        on one host share, e.g. replicas serving the same waiting room.
+
+        Every change runs in an immediate transaction, which holds the
+        database's write lock, so a group is claimed by exactly one
+        process. Every replica sees the same join events, so `enqueue`
+        tells which one queued the user first, and a user claimed within
+        the last `claim_ttl` seconds is not queued again by a replica
+        that handles the join event late.
+        :param path: Database file, created if missing
+        :type path: str
+        :param claim_ttl: Seconds a claimed user is not queued again
+        :type claim_ttl: float
+        :param timeout: Seconds to wait for the write lock
+        :type timeout: float
+        """
+        super().__init__()
+        self.path = path
+        self.claim_ttl = claim_ttl
+        self._db_lock = threading.Lock()
+        self._db = sqlite3.connect(
+            path, timeout=timeout, isolation_level=None, check_same_thread=False
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        # `claimed` is the time the user was grouped, NULL while waiting
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS tickets (task_id NOT NULL, "
+            "user_id NOT NULL, room_id, enqueued REAL NOT NULL, claimed REAL, "
+            "PRIMARY KEY (task_id, user_id))"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS tickets_order "
+            "ON tickets (task_id, claimed, enqueued)"
+        )
+
+    def waiting(self, task_id):
+        rows = self._query(
+            "SELECT task_id, user_id, room_id, enqueued FROM tickets "
+            "WHERE task_id = ? AND claimed IS NULL ORDER BY enqueued, rowid",
+            (task_id,),
+        )
+        return [Ticket(*row) for row in rows]
+
+    def depths(self):
+        rows = self._query(
+            "SELECT task_id, COUNT(*) FROM tickets WHERE claimed IS NULL "
+            "GROUP BY task_id"
+        )
+        return dict(rows)
+
+    def close(self):
+        with self._db_lock:
+            self._db.close()
+
+    def _query(self, sql, parameters=()):
+        with self._db_lock:
+            return self._db.execute(sql, parameters).fetchall()
+
+    def _transaction(self, work):
+        """Run `work(db)` holding the write lock of the database."""
+        with self._db_lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(self._db)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            return result
+
+    def _enqueue(self, ticket):
+        def work(db):
+            row = db.execute(
+                "SELECT claimed FROM tickets WHERE task_id = ? AND user_id = ?",
+                (ticket.task_id, ticket.user_id),
+            ).fetchone()
+            if row is not None and row[0] is None:
+                db.execute(
+                    "UPDATE tickets SET room_id = ? WHERE task_id = ? AND user_id = ?",
+                    (ticket.room_id, ticket.task_id, ticket.user_id),
+                )
+                return False
+            if row is not None and ticket.enqueued - row[0] < self.claim_ttl:
+                # grouped just now; this join event is outdated
+                return False
+            db.execute(
+                "INSERT OR REPLACE INTO tickets VALUES (?, ?, ?, ?, NULL)",
+                (ticket.task_id, ticket.user_id, ticket.room_id, ticket.enqueued),
+            )
+            return True
+
+        return self._transaction(work)
+
+    def _take(self, task_id, group_size):
+        now = time.time()
+
+        def work(db):
+            db.execute(
+                "DELETE FROM tickets WHERE claimed < ?", (now - self.claim_ttl,)
+            )
+            (count,) = db.execute(
+                "SELECT COUNT(*) FROM tickets WHERE task_id = ? AND claimed IS NULL",
+                (task_id,),
+            ).fetchone()
+            taken = count - count % group_size
+            if not taken:
+                return []
+            rows = db.execute(
+                "SELECT task_id, user_id, room_id, enqueued FROM tickets "
+                "WHERE task_id = ? AND claimed IS NULL "
+                "ORDER BY enqueued, rowid LIMIT ?",
+                (task_id, taken),
+            ).fetchall()
+            db.executemany(
+                "UPDATE tickets SET claimed = ? WHERE task_id = ? AND user_id = ?",
+                [(now, task_id, row[1]) for row in rows],
+            )
+            return rows
+
+        tickets = [Ticket(*row) for row in self._transaction(work)]
+        return [
+            tickets[start : start + group_size]
+            for start in range(0, len(tickets), group_size)
+        ]
+
+    def _cancel(self, task_id, user_id):
+        def work(db):
+            row = db.execute(
+                "SELECT task_id, user_id, room_id, enqueued FROM tickets "
+                "WHERE task_id = ? AND user_id = ? AND claimed IS NULL",
+                (task_id, user_id),
+            ).fetchone()
+            if row is not None:
+                db.execute(
+                    "DELETE FROM tickets WHERE task_id = ? AND user_id = ?",
+                    (task_id, user_id),
+                )
+            return row
+
+        row = self._transaction(work)
+        return Ticket(*row) if row is not None else None
+
+    def _restore(self, tickets):
+        def work(db):
+            db.executemany(
+                "INSERT OR REPLACE INTO tickets VALUES (?, ?, ?, ?, NULL)",
+                [
+                    (ticket.task_id, ticket.user_id, ticket.room_id, ticket.enqueued)
+                    for ticket in tickets
+                ],
+            )
+
+        self._transaction(work)
+
+
+def open_matchmaker(url):
+    """Open queues from `memory` or `sqlite:<path>`."""
+    kind, _, path = url.partition(":")
+    if kind == "memory":
+        return Matchmaker()
+    if kind == "sqlite":
+        return SqliteMatchmaker(path)
+    raise ValueError(f"unknown match queue: {url}")
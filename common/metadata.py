@@ -0,0 +1,153 @@
+"""Cache for slurk objects that rarely change during a session."""
+
+import logging
+import os
+import threading
+import time
+
+
+LOG = logging.getLogger(__name__)
+
+# a user may be changed by several bots at once, e.g. the concierge
+# moving them on while a task bot still removes them from its room
+WRITE_ATTEMPTS = 3
+
+
+class MetadataCache:
+    def __init__(self, api, ttl=None):
+        """Remembers the task of a user, the ETag of a user and the id
+        and ETag of a user's permissions, so that handlers do not have
+        to ask the server on every event.
+
+        Entries expire after `ttl` seconds. ETags are replaced by the
+        ones returned from writes; a user's ETag is dropped when they
+        join or leave a room (see `on_status`) and any entry is dropped
+        when the server answers 412 Precondition Failed.
+        :param api: Client used for lookups
+        :type api: templates.ApiClient
+        :param ttl: Seconds an entry stays valid, defaults to
+            `SLURK_CACHE_TTL` or 600
+        :type ttl: float, optional
+        """
+        if ttl is None:
+            ttl = float(os.environ.get("SLURK_CACHE_TTL", 600))
+        self.api = api
+        self.ttl = ttl
+
+        self._entries = dict()
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def task_of(self, user_id):
+        """Task the user was created for.
+        :return: The task as returned by `/users/{id}/task`, None if the
+            user has no task
+        :rtype: dict
+        """
+        return self._fetch(("task", user_id), f"/users/{user_id}/task")[0]
+
+    def user_etag(self, user_id):
+        return self._fetch(("user", user_id), f"/users/{user_id}")[1]
+
+    def permissions_of(self, user_id):
+        """Id and ETag of the user's permissions.
+        :rtype: tuple
+        """
+        permissions, etag = self._fetch(
+            ("permissions", user_id), f"/users/{user_id}/permissions"
+        )
+        return permissions["id"], etag
+
+    def write_user(self, user_id, send):
+        """Change a user with the cached ETag, retrying with a fresh
+        one if it was outdated, `WRITE_ATTEMPTS` times in total.
+        :param send: Sends the request, called with the ETag
+        :type send: function
+        :rtype: requests.models.Response
+        """
+        return self._write(("user", user_id), lambda: send(self.user_etag(user_id)))
+
+    def remove_user_from_room(self, user_id, room_id):
+        """Remove a user from a room, see `write_user`."""
+        return self.write_user(
+            user_id,
+            lambda etag: self.api.delete(
+                f"/users/{user_id}/rooms/{room_id}", headers={"If-Match": etag}
+            ),
+        )
+
+    def update_permissions(self, user_id, permissions):
+        """Change some of the user's permissions, e.g.
+        `{"send_message": False}`, see `write_user`.
+        :rtype: requests.models.Response
+        """
+
+        def patch():
+            permission_id, etag = self.permissions_of(user_id)
+            return self.api.patch(
+                f"/permissions/{permission_id}",
+                json=permissions,
+                headers={"If-Match": etag},
+            )
+
+        return self._write(("permissions", user_id), patch)
+
+    def on_status(self, data):
+        """Drop what a `status` event made outdated."""
+        if data.get("type") in {"join", "leave"}:
+            self.invalidate(("user", data["user"]["id"]))
+
+    def invalidate(self, key=None):
+        """Drop one entry, e.g. `("user", 3)`, or all of them."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            elif self._entries.pop(key, None) is None:
+                return
+            self._counts["invalidations"] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counts["hits"] + self._counts["misses"]
+            return {
+                **self._counts,
+                "entries": len(self._entries),
+                "hit_rate": self._counts["hits"] / lookups if lookups else 0.0,
+            }
+
+    def _fetch(self, key, path):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._counts["hits"] += 1
+                return entry[1:]
+            self._counts["misses"] += 1
+
+        response = self.api.get(path)
+        if not response.ok:
+            LOG.error(f"Could not get {path}: {response.status_code}")
+            response.raise_for_status()
+
+        value = response.json() if response.content else None
+        with self._lock:
+            self._entries[key] = (now + self.ttl, value, response.headers.get("ETag"))
+        return value, response.headers.get("ETag")
+
+    def _write(self, key, send):
+        response = send()
+        for _ in range(WRITE_ATTEMPTS - 1):
+            if response.status_code != 412:
+                break
+            LOG.debug(f"Outdated ETag for {key}, retrying")
+            self.invalidate(key)
+            response = send()
+
+        etag = response.headers.get("ETag") if response.ok else None
+        with self._lock:
+            entry = self._entries.get(key)
+            if etag is None or entry is None:
+                self._entries.pop(key, None)
+            else:
+                self._entries[key] = (entry[0], entry[1], etag)
+        return response
@@ -0,0 +1,243 @@
+"""Latency, error and in-flight metrics in the Prometheus text format."""
+
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import bisect
+import functools
+import logging
+import os
+import threading
+import time
+
+
+LOG = logging.getLogger(__name__)
+
+# upper bounds in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Observation:
+    def __init__(self):
+        """Yielded by `Metrics.track`; set `error` to count the call as
+        failed without raising."""
+        self.error = False
+
+
+class Series:
+    def __init__(self, buckets):
+        self.buckets = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+        self.in_flight = 0
+
+
+class Metrics:
+    def __init__(self, buckets=BUCKETS):
+        """Collects a latency histogram, an error counter and the number
+        of calls in flight per kind of call (e.g. `event`, `api`) and
+        label set (e.g. the event name).
+        :param buckets: Upper bounds of the histogram buckets in seconds
+        :type buckets: tuple
+        """
+        self.bucket_bounds = tuple(buckets)
+        self._series = dict()
+        self._gauges = dict()
+        self._lock = threading.Lock()
+        self._server = None
+
+    @contextmanager
+    def track(self, kind, **labels):
+        """Measure the enclosed block.
+        :param kind: Metric family, becomes part of the metric name
+        :type kind: str
+        """
+        with self._lock:
+            series = self._get_series(kind, labels)
+            series.in_flight += 1
+
+        observation = Observation()
+        start = time.perf_counter()
+        try:
+            yield observation
+        except BaseException:
+            observation.error = True
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            with self._lock:
+                series.in_flight -= 1
+                self._record(series, duration, observation.error)
+
+    def observe(self, kind, duration, error=False, **labels):
+        """Record a duration measured elsewhere, e.g. a queueing delay."""
+        with self._lock:
+            self._record(self._get_series(kind, labels), duration, error)
+
+    def gauge(self, name, function, description):
+        """Report the value returned by `function` on every scrape.
+        The function may also return a dict mapping label tuples like
+        `(("task", 1),)` to values, one per series.
+        :param name: Metric name without the `slurk_bot_` prefix
+        :type name: str
+        """
+        with self._lock:
+            self._gauges[name] = (function, description)
+
+    def _get_series(self, kind, labels):
+        key = (kind, tuple(sorted(labels.items())))
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = Series(self.bucket_bounds)
+        return series
+
+    def _record(self, series, duration, error):
+        series.count += 1
+        series.sum += duration
+        series.buckets[bisect.bisect_left(self.bucket_bounds, duration)] += 1
+        if error:
+            series.errors += 1
+
+    def timed(self, kind, **labels):
+        """Decorator version of `track`."""
+
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.track(kind, **labels):
+                    return function(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def snapshot(self):
+        """Current values as `{kind: {labels: {...}}}`."""
+        with self._lock:
+            result = dict()
+            for (kind, labels), series in self._series.items():
+                result.setdefault(kind, dict())[labels] = {
+                    "count": series.count,
+                    "sum": series.sum,
+                    "errors": series.errors,
+                    "in_flight": series.in_flight,
+                }
+            return result
+
+    def render(self):
+        """All series in the Prometheus text exposition format."""
+        with self._lock:
+            per_kind = dict()
+            items = sorted(self._series.items(), key=lambda item: _sort_key(*item[0]))
+            for (kind, labels), series in items:
+                per_kind.setdefault(kind, []).append((labels, series))
+
+            lines = []
+            for kind, entries in per_kind.items():
+                name = f"slurk_bot_{kind}"
+                lines.append(f"# HELP {name}_seconds Duration of {kind} calls.")
+                lines.append(f"# TYPE {name}_seconds histogram")
+                for labels, series in entries:
+                    cumulative = 0
+                    bounds = [*map(repr, self.bucket_bounds), "+Inf"]
+                    for bound, count in zip(bounds, series.buckets):
+                        cumulative += count
+                        le = _labels(labels, le=bound)
+                        lines.append(f"{name}_seconds_bucket{le} {cumulative}")
+                    lines.append(f"{name}_seconds_sum{_labels(labels)} {series.sum}")
+                    lines.append(
+                        f"{name}_seconds_count{_labels(labels)} {series.count}"
+                    )
+
+                lines.append(f"# HELP {name}_errors_total Failed {kind} calls.")
+                lines.append(f"# TYPE {name}_errors_total counter")
+                for labels, series in entries:
+                    errors = series.errors
+                    lines.append(f"{name}_errors_total{_labels(labels)} {errors}")
+
+                lines.append(f"# HELP {name}_in_flight Running {kind} calls.")
+                lines.append(f"# TYPE {name}_in_flight gauge")
+                for labels, series in entries:
+                    running = series.in_flight
+                    lines.append(f"{name}_in_flight{_labels(labels)} {running}")
+            gauges = sorted(self._gauges.items())
+
+        # evaluated without the lock, the functions may take their own
+        for name, (function, description) in gauges:
+            lines.append(f"# HELP slurk_bot_{name} {description}")
+            lines.append(f"# TYPE slurk_bot_{name} gauge")
+            value = function()
+            if isinstance(value, dict):
+                for labels, series_value in sorted(
+                    value.items(), key=lambda item: _sort_key("", item[0])
+                ):
+                    lines.append(f"slurk_bot_{name}{_labels(labels)} {series_value}")
+            else:
+                lines.append(f"slurk_bot_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="0.0.0.0"):
+        """Expose `render` at `http://host:port/metrics` from a
+        background thread. Does nothing if already serving."""
+        if self._server is not None:
+            return
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(
+            target=self._server.serve_forever, name="metrics", daemon=True
+        ).start()
+        LOG.info(f"Serving metrics on http://{host}:{port}/metrics")
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def _sort_key(kind, labels):
+    # label values may mix types, e.g. numeric and named task IDs
+    return kind, [(key, str(value)) for key, value in labels]
+
+
+def _labels(labels, **extra):
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for key, value in pairs
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    """Metrics shared by all clients of the process."""
+    return _metrics
+
+
+def serve_from_env():
+    """Start the endpoint if `SLURK_METRICS_PORT` is set."""
+    port = os.environ.get("SLURK_METRICS_PORT")
+    if port:
+        _metrics.serve(int(port), os.environ.get("SLURK_METRICS_HOST", "0.0.0.0"))
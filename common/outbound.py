@@ -0,0 +1,289 @@
+"""Merging and per-room rate limiting of outgoing Socket.IO emits."""
+
+from collections import deque
+import logging
+import os
+import threading
+import time
+
+from common.metrics import get_metrics
+from common.scheduler import get_scheduler
+
+
+LOG = logging.getLogger(__name__)
+
+# payload keys of a text message that can be merged with the next one
+MERGEABLE_KEYS = {"message", "room", "receiver_id", "html"}
+
+
+class _Packet:
+    __slots__ = (
+        "event",
+        "data",
+        "namespace",
+        "callbacks",
+        "key",
+        "parts",
+        "queued",
+        "throttled",
+    )
+
+    def __init__(self, event, data, namespace, callback, key, queued):
+        self.event = event
+        self.data = data
+        self.namespace = namespace
+        self.callbacks = [callback] if callback is not None else []
+        self.key = key
+        self.parts = [data["message"]] if key is not None else None
+        self.queued = queued
+        self.throttled = False
+
+    def payload(self):
+        if self.parts is None or len(self.parts) == 1:
+            return self.data
+        separator = "<br>" if self.data.get("html") else "\n"
+        return {**self.data, "message": separator.join(self.parts)}
+
+    def callback(self):
+        if len(self.callbacks) > 1:
+            return _SharedAck(self.callbacks)
+        return self.callbacks[0] if self.callbacks else None
+
+
+class _SharedAck:
+    __slots__ = ("callbacks",)
+
+    def __init__(self, callbacks):
+        """Hands the acknowledgement of a merged emit to the callback of
+        each message merged into it."""
+        self.callbacks = callbacks
+
+    def __call__(self, *args):
+        for callback in self.callbacks:
+            try:
+                callback(*args)
+            except Exception:
+                LOG.exception("Ack callback of a merged message failed")
+
+
+class _Room:
+    __slots__ = ("queue", "tokens", "updated", "armed", "sending")
+
+    def __init__(self, tokens, now):
+        self.queue = deque()
+        self.tokens = tokens
+        self.updated = now
+        self.armed = False
+        # a thread is emitting packets of this room
+        self.sending = False
+
+
+def shares_ack(callback):
+    """Mark an emit callback that only looks at the acknowledgement, so
+    that its message may be merged with others. The acknowledgement of
+    the merged emit is then passed to the callback of each message."""
+    callback.shares_ack = True
+    return callback
+
+
+class Outbound:
+    def __init__(
+        self, emit, window=0.0, rate=None, burst=10, max_merge=20, scheduler=None
+    ):
+        """Sits between the bot and `socketio.Client.emit`.
+
+        Text messages to the same room and receiver that follow each
+        other within `window` seconds are sent as one message, one line
+        per message; HTML messages are only merged with HTML messages
+        and plain ones with plain ones. Only plain `text` emits are
+        merged, and only
+        if they have no callback or one marked with `shares_ack`; any
+        other emit to the room is sent after the messages
+        queued before it. With a `rate`, each room may send `burst`
+        emits at once and `rate` per second after that; further emits
+        wait in order (and may be merged meanwhile) instead of being
+        dropped.
+        :param emit: Function sending an emit, called as
+            `emit(event, data, namespace, callback)`
+        :type emit: function
+        :param window: Seconds a text message waits for more to merge,
+            0 to merge only messages that are held back by the rate limit
+        :type window: float
+        :param rate: Emits per second and room, None for no limit
+        :type rate: float, optional
+        :param burst: Emits a room may send at once
+        :type burst: int
+        :param max_merge: Maximum number of messages merged into one
+        :type max_merge: int
+        :param scheduler: Scheduler sending held back emits, defaults to
+            the shared one
+        :type scheduler: scheduler.Scheduler, optional
+        """
+        self._emit = emit
+        self.window = window
+        self.rate = rate
+        self.burst = burst
+        self.max_merge = max_merge
+        self.scheduler = scheduler if scheduler is not None else get_scheduler()
+
+        self._rooms = dict()
+        self._lock = threading.Lock()
+        self._counts = {"emitted": 0, "sent": 0, "merged": 0, "throttled": 0}
+
+        metrics = get_metrics()
+        metrics.gauge(
+            "outbound_merged",
+            lambda: self._counts["merged"],
+            "Messages merged into another.",
+        )
+        metrics.gauge(
+            "outbound_throttled",
+            lambda: self._counts["throttled"],
+            "Emits held back by the rate limit of their room.",
+        )
+        metrics.gauge("outbound_backlog", self.pending, "Emits waiting to be sent.")
+
+    @classmethod
+    def from_env(cls, emit):
+        """Create the layer if `SLURK_EMIT_MERGE_WINDOW` or
+        `SLURK_ROOM_RATE` is set, else None. The burst is read from
+        `SLURK_ROOM_BURST`.
+        """
+        window = float(os.environ.get("SLURK_EMIT_MERGE_WINDOW", 0))
+        rate = os.environ.get("SLURK_ROOM_RATE")
+        if not window and not rate:
+            return None
+        return cls(
+            emit,
+            window=window,
+            rate=float(rate) if rate else None,
+            burst=int(os.environ.get("SLURK_ROOM_BURST", 10)),
+        )
+
+    def emit(self, event, data=None, namespace=None, callback=None):
+        """Send an emit now or queue it behind earlier ones of its room."""
+        room_id = data.get("room") if isinstance(data, dict) else None
+        if room_id is None:
+            self._emit(event, data, namespace, callback)
+            return
+
+        now = time.monotonic()
+        key = self._merge_key(event, data, namespace, callback)
+        with self._lock:
+            self._counts["emitted"] += 1
+            room = self._rooms.get(room_id)
+            if room is None:
+                room = self._rooms[room_id] = _Room(self.burst, now)
+
+            last = room.queue[-1] if room.queue else None
+            if (
+                key is not None
+                and last is not None
+                and last.key == key
+                and len(last.parts) < self.max_merge
+            ):
+                last.parts.append(data["message"])
+                if callback is not None:
+                    last.callbacks.append(callback)
+                self._counts["merged"] += 1
+            else:
+                room.queue.append(_Packet(event, data, namespace, callback, key, now))
+            packets = self._drain(room_id, room, now)
+        self._flush(room_id, room, packets)
+
+    def pending(self, room_id=None):
+        """Number of queued emits, optionally only of one room."""
+        with self._lock:
+            if room_id is not None:
+                room = self._rooms.get(room_id)
+                return len(room.queue) if room is not None else 0
+            return sum(len(room.queue) for room in self._rooms.values())
+
+    def stats(self):
+        with self._lock:
+            return {**self._counts, "rooms": len(self._rooms)}
+
+    def _merge_key(self, event, data, namespace, callback):
+        if event != "text" or namespace is not None:
+            return None
+        if callback is not None and not getattr(callback, "shares_ack", False):
+            return None
+        if not set(data) <= MERGEABLE_KEYS:
+            return None
+        if not isinstance(data.get("message"), str):
+            return None
+        return ("text", data.get("receiver_id"), bool(data.get("html")))
+
+    def _deliver(self, room_id):
+        with self._lock:
+            room = self._rooms.get(room_id)
+            if room is None:
+                return
+            room.armed = False
+            packets = self._drain(room_id, room, time.monotonic())
+        self._flush(room_id, room, packets)
+
+    def _drain(self, room_id, room, now):
+        """Take what is due and allowed, then wait for the rest.
+        Called with the lock held. While one thread emits the packets of
+        a room, others only queue theirs, so that emits of a room keep
+        their order.
+        :return: Packets to emit with `_flush` once the lock is released
+        :rtype: list
+        """
+        if room.sending:
+            return []
+        if self.rate is not None:
+            refill = (now - room.updated) * self.rate
+            room.tokens = min(self.burst, room.tokens + refill)
+            room.updated = now
+
+        due = []
+        wait = None
+        while room.queue:
+            packet = room.queue[0]
+            if packet.key is not None and packet.queued + self.window > now:
+                wait = packet.queued + self.window - now
+                break
+            if self.rate is not None and room.tokens < 1:
+                wait = (1 - room.tokens) / self.rate
+                if not packet.throttled:
+                    packet.throttled = True
+                    self._counts["throttled"] += 1
+                break
+            room.queue.popleft()
+            if self.rate is not None:
+                room.tokens -= 1
+            self._counts["sent"] += 1
+            due.append(packet)
+
+        if due:
+            room.sending = True
+        elif wait is None:
+            if self.rate is None or room.tokens >= self.burst:
+                del self._rooms[room_id]
+        if wait is not None and not room.armed:
+            room.armed = True
+            self.scheduler.schedule(
+                wait, self._deliver, room_id, group=("outbound", room_id)
+            )
+        return due
+
+    def _flush(self, room_id, room, packets):
+        """Emit packets taken by `_drain` without holding the lock,
+        then those of the room that became due meanwhile."""
+        while packets:
+            for packet in packets:
+                self._send(packet)
+            with self._lock:
+                room.sending = False
+                packets = self._drain(room_id, room, time.monotonic())
+
+    def _send(self, packet):
+        get_metrics().observe("outbound_delay", time.monotonic() - packet.queued)
+        try:
+            self._emit(
+                packet.event, packet.payload(), packet.namespace, packet.callback()
+            )
+        except Exception:
+            LOG.exception(f"Could not emit {packet.event}")
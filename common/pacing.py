@@ -0,0 +1,149 @@
+"""Paced delivery of several messages to a room without blocking handlers."""
+
+from collections import deque
+import logging
+import threading
+import time
+
+from common.metrics import get_metrics
+from common.scheduler import get_scheduler
+
+
+LOG = logging.getLogger(__name__)
+
+
+class PacedSender:
+    def __init__(self, sio, scheduler=None):
+        """Emits queued messages one by one with a pause in between, on
+        the shared scheduler instead of sleeping in the event handler.
+
+        Messages of a room are emitted in the order they were queued,
+        also across several calls to `send`; rooms are paced
+        independently. The delay between the planned and the actual
+        emit of a message is recorded as `paced_lag` metric.
+        :param sio: Client used to emit the messages
+        :type sio: socketio.Client
+        :param scheduler: Scheduler running the deliveries, defaults to
+            the shared one
+        :type scheduler: scheduler.Scheduler, optional
+        """
+        self.sio = sio
+        self.scheduler = scheduler if scheduler is not None else get_scheduler()
+
+        self._queues = dict()
+        # due time of the next message queued for a room
+        self._next_due = dict()
+        self._lock = threading.Lock()
+        self._counts = {"sent": 0, "cancelled": 0, "failed": 0}
+        self._max_lag = 0.0
+
+        metrics = get_metrics()
+        metrics.gauge(
+            "paced_backlog", self.pending, "Paced messages waiting to be sent."
+        )
+
+    def send(self, room_id, messages, interval=0.5, delay=0, event="text"):
+        """Queue messages for a room.
+        :param messages: Message texts or complete payloads; texts are
+            sent as HTML, payloads get the room filled in
+        :type messages: list
+        :param interval: Seconds between two messages
+        :type interval: float
+        :param delay: Seconds before the first message, counted from
+            the last queued message if the room is still busy
+        :type delay: float
+        :param event: Socket.IO event to emit
+        :type event: str
+        """
+        now = time.monotonic()
+        with self._lock:
+            queue = self._queues.get(room_id)
+            idle = queue is None
+            if idle:
+                queue = self._queues[room_id] = deque()
+                due = now + delay
+            else:
+                due = max(now, self._next_due[room_id]) + delay
+
+            for message in messages:
+                if isinstance(message, str):
+                    message = {"message": message, "html": True}
+                queue.append((event, {**message, "room": room_id}, due))
+                due += interval
+            self._next_due[room_id] = due
+
+            if not queue:
+                self._forget(room_id)
+            elif idle:
+                self._arm(room_id, queue[0][2] - now)
+
+    def cancel(self, room_id):
+        """Drop all messages of a room that were not sent yet, e.g. when
+        the room closes.
+        :return: Number of dropped messages
+        :rtype: int
+        """
+        with self._lock:
+            queue = self._queues.get(room_id, ())
+            self._counts["cancelled"] += len(queue)
+            self._forget(room_id)
+            self.scheduler.cancel_all(self._group(room_id))
+        return len(queue)
+
+    def pending(self, room_id=None):
+        """Number of queued messages, optionally only of one room."""
+        with self._lock:
+            if room_id is not None:
+                return len(self._queues.get(room_id, ()))
+            return sum(len(queue) for queue in self._queues.values())
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._counts,
+                "rooms": len(self._queues),
+                "pending": sum(len(queue) for queue in self._queues.values()),
+                "max_lag": self._max_lag,
+            }
+
+    @staticmethod
+    def _group(room_id):
+        # room timers use the bare room id as group
+        return ("paced", room_id)
+
+    def _forget(self, room_id):
+        self._queues.pop(room_id, None)
+        self._next_due.pop(room_id, None)
+
+    def _arm(self, room_id, delay):
+        self.scheduler.schedule(
+            max(0.0, delay), self._deliver, room_id, group=self._group(room_id)
+        )
+
+    def _deliver(self, room_id):
+        with self._lock:
+            queue = self._queues.get(room_id)
+            if not queue:
+                return
+            event, payload, due = queue.popleft()
+
+        lag = max(0.0, time.monotonic() - due)
+        try:
+            self.sio.emit(event, payload)
+        except Exception:
+            LOG.exception(f"Could not send paced message to room {room_id}")
+            failed = True
+        else:
+            failed = False
+        get_metrics().observe("paced_lag", lag, error=failed)
+
+        with self._lock:
+            self._counts["failed" if failed else "sent"] += 1
+            self._max_lag = max(self._max_lag, lag)
+            # the room may have been cancelled and refilled meanwhile
+            if self._queues.get(room_id) is not queue:
+                return
+            if not queue:
+                self._forget(room_id)
+                return
+            self._arm(room_id, queue[0][2] - time.monotonic())
@@ -0,0 +1,210 @@
+"""Rooms created ahead of time, so that grouped users need not wait."""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import math
+import os
+import threading
+import time
+
+from common.metrics import get_metrics
+
+
+LOG = logging.getLogger(__name__)
+
+
+class RoomPool:
+    def __init__(
+        self,
+        create,
+        discard=None,
+        min_size=1,
+        max_size=10,
+        horizon=30.0,
+        window=300.0,
+        workers=2,
+    ):
+        """Keeps rooms ready per key, e.g. per task layout, and creates
+        new ones in the background as rooms are taken.
+
+        The number of rooms kept ready follows the demand: enough for
+        the rooms taken during the last `window` seconds, extrapolated
+        to `horizon` seconds, but at least `min_size` and at most
+        `max_size`. Rooms still in the pool are discarded on `close`.
+        Creating a room is recorded as `room_pool_fill` metric.
+        :param create: Function creating a room, called with the key;
+            its return value is handed out by `acquire`
+        :type create: function
+        :param discard: Function removing an unused room, called with
+            the key and the room
+        :type discard: function, optional
+        :param min_size: Rooms kept ready per key at least
+        :type min_size: int
+        :param max_size: Rooms kept ready per key at most
+        :type max_size: int
+        :param horizon: Seconds of demand to keep rooms ready for
+        :type horizon: float
+        :param window: Seconds of past demand taken into account
+        :type window: float
+        :param workers: Rooms created at once
+        :type workers: int
+        """
+        self.create = create
+        self.discard = discard
+        self.min_size = min_size
+        self.max_size = max(min_size, max_size)
+        self.horizon = horizon
+        self.window = window
+
+        self._rooms = dict()
+        # rooms being created per key
+        self._filling = dict()
+        # times rooms were taken per key
+        self._taken = dict()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "misses": 0, "created": 0, "failed": 0}
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="room-pool"
+        )
+
+        metrics = get_metrics()
+        metrics.gauge(
+            "room_pool_size",
+            lambda: {(("key", key),): size for key, size in self.sizes().items()},
+            "Rooms ready to be handed out.",
+        )
+        metrics.gauge(
+            "room_pool_misses",
+            lambda: self._counts["misses"],
+            "Rooms requested from an empty pool.",
+        )
+
+    @classmethod
+    def from_env(cls, create, discard=None):
+        """Create a pool if `SLURK_ROOM_POOL` is set to the minimum
+        number of rooms per key, else None. `SLURK_ROOM_POOL_MAX` and
+        `SLURK_ROOM_POOL_HORIZON` set the maximum and the horizon."""
+        min_size = int(os.environ.get("SLURK_ROOM_POOL", 0))
+        if min_size <= 0:
+            return None
+        return cls(
+            create,
+            discard,
+            min_size=min_size,
+            max_size=int(os.environ.get("SLURK_ROOM_POOL_MAX", max(10, min_size))),
+            horizon=float(os.environ.get("SLURK_ROOM_POOL_HORIZON", 30.0)),
+        )
+
+    def register(self, key):
+        """Start keeping rooms ready for a key; cheap if already known."""
+        with self._lock:
+            if key in self._rooms or self._closed:
+                return
+            self._rooms[key] = deque()
+            self._taken[key] = deque()
+            self._top_up(key)
+
+    def acquire(self, key):
+        """Take a ready room without waiting.
+        :return: A room as returned by `create`, None if none is ready
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._closed:
+                return None
+            if key not in self._rooms:
+                self._rooms[key] = deque()
+                self._taken[key] = deque()
+            self._taken[key].append(now)
+            rooms = self._rooms[key]
+            room = rooms.popleft() if rooms else None
+            self._counts["hits" if room is not None else "misses"] += 1
+            self._top_up(key)
+        return room
+
+    def release(self, key, room):
+        """Put back a room that was taken but not used, or discard it if
+        the pool is closed or full."""
+        with self._lock:
+            rooms = self._rooms.setdefault(key, deque())
+            if not self._closed and len(rooms) < self.max_size:
+                rooms.append(room)
+                return
+        if self.discard is not None:
+            self.discard(key, room)
+
+    def target(self, key):
+        """Number of rooms to keep ready for a key."""
+        with self._lock:
+            return self._target(key, time.monotonic())
+
+    def sizes(self):
+        with self._lock:
+            return {key: len(rooms) for key, rooms in self._rooms.items()}
+
+    def stats(self):
+        with self._lock:
+            ready = sum(len(rooms) for rooms in self._rooms.values())
+            return {**self._counts, "ready": ready}
+
+    def close(self):
+        """Stop creating rooms and discard the unused ones.
+        :return: Number of rooms discarded
+        :rtype: int
+        """
+        with self._lock:
+            self._closed = True
+        # rooms being created are put into the pool first
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            left = [(key, room) for key, rooms in self._rooms.items() for room in rooms]
+            self._rooms.clear()
+
+        discarded = 0
+        for key, room in left:
+            if self.discard is None:
+                break
+            try:
+                self.discard(key, room)
+                discarded += 1
+            except Exception:
+                LOG.exception(f"Could not discard pooled room {room}")
+        LOG.info(f"Discarded {discarded} of {len(left)} pooled rooms")
+        return discarded
+
+    def _target(self, key, now):
+        taken = self._taken.get(key, ())
+        while taken and taken[0] < now - self.window:
+            taken.popleft()
+        wanted = math.ceil(len(taken) * self.horizon / self.window)
+        return min(self.max_size, max(self.min_size, wanted))
+
+    def _top_up(self, key):
+        """Create as many rooms as are missing. Called with the lock
+        held."""
+        if self._closed:
+            return
+        filling = self._filling.get(key, 0)
+        missing = self._target(key, time.monotonic()) - len(self._rooms[key]) - filling
+        for _ in range(max(0, missing)):
+            self._filling[key] = self._filling.get(key, 0) + 1
+            self._executor.submit(self._fill, key)
+
+    def _fill(self, key):
+        room = None
+        with get_metrics().track("room_pool_fill") as call:
+            try:
+                room = self.create(key)
+            except Exception:
+                call.error = True
+                LOG.exception(f"Could not create a room for {key}")
+
+        with self._lock:
+            self._filling[key] -= 1
+            if room is None:
+                self._counts["failed"] += 1
+                return
+            self._counts["created"] += 1
+            self._rooms.setdefault(key, deque()).append(room)
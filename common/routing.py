@@ -0,0 +1,86 @@
+"""Routing of rooms and users to the tasks a bot serves."""
+
+import json
+import logging
+import threading
+
+
+LOG = logging.getLogger(__name__)
+
+
+class TaskRoutes:
+    def __init__(self, tasks=None):
+        """Tasks served by one bot process together with their own
+        configuration (e.g. data file, version, timeouts) and a table
+        of the task each joined room belongs to.
+        :param tasks: Configuration per task ID
+        :type tasks: dict, optional
+        """
+        self._configs = dict()
+        self._rooms = dict()
+        self._lock = threading.Lock()
+        for task_id, config in (tasks or {}).items():
+            self.add(task_id, config)
+
+    @staticmethod
+    def load(source):
+        """Read the configuration per task from a JSON object mapping
+        task IDs to settings, given inline or as the path of a file.
+        :param source: JSON text or file name
+        :type source: str
+        :rtype: dict
+        """
+        if source.lstrip().startswith("{"):
+            tasks = json.loads(source)
+        else:
+            with open(source, encoding="utf-8") as f:
+                tasks = json.load(f)
+        return {int(task_id): config or {} for task_id, config in tasks.items()}
+
+    def add(self, task_id, config=None):
+        with self._lock:
+            self._configs[int(task_id)] = dict(config or {})
+
+    def __contains__(self, task_id):
+        if task_id is None:
+            return False
+        return int(task_id) in self._configs
+
+    def __iter__(self):
+        return iter(list(self._configs))
+
+    def __len__(self):
+        return len(self._configs)
+
+    def config(self, task_id):
+        """Settings of a task, empty if it has none."""
+        return self._configs.get(int(task_id), {})
+
+    def open_room(self, room_id, task_id):
+        """Remember that a room was created for a task."""
+        with self._lock:
+            self._rooms[room_id] = int(task_id)
+
+    def close_room(self, room_id):
+        with self._lock:
+            self._rooms.pop(room_id, None)
+
+    def task_of_room(self, room_id):
+        """Task ID a joined room belongs to, None for other rooms."""
+        return self._rooms.get(room_id)
+
+    def room_config(self, room_id):
+        """Settings of the task a room belongs to."""
+        task_id = self._rooms.get(room_id)
+        return self.config(task_id) if task_id is not None else {}
+
+    def setting(self, room_id, key, default=None):
+        """One setting of the task a room belongs to."""
+        return self.room_config(room_id).get(key, default)
+
+    def stats(self):
+        with self._lock:
+            rooms = dict.fromkeys(self._configs, 0)
+            for task_id in self._rooms.values():
+                rooms[task_id] = rooms.get(task_id, 0) + 1
+            return {"tasks": len(self._configs), "rooms": rooms}
@@ -0,0 +1,218 @@
+"""Room timers sharing a single scheduling thread."""
+
+from concurrent.futures import ThreadPoolExecutor
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+
+LOG = logging.getLogger(__name__)
+
+
+class ScheduledTimer:
+    def __init__(self, scheduler, delay, function, args, kwargs, group):
+        """Handle of a scheduled call, returned by `Scheduler.schedule`.
+        Can be used in place of a started `threading.Timer`.
+        """
+        self.scheduler = scheduler
+        self.delay = delay
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.group = group
+
+        self.deadline = None
+        self.finished = False
+        # deadline of the live heap entry, older entries are skipped
+        self._queued = None
+
+    def cancel(self):
+        self.scheduler.cancel(self)
+
+    def reset(self, delay=None):
+        self.scheduler.reset(self, delay)
+
+    def is_alive(self):
+        return not self.finished
+
+    def remaining(self):
+        """Seconds until the timer fires, None if it is not running."""
+        if self.finished:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+
+class Scheduler:
+    def __init__(self, workers=32):
+        """Runs all timers of a bot on one thread instead of one
+        `threading.Timer` thread per timer.
+
+        Timers live in a heap ordered by deadline. Postponing a timer
+        only updates its deadline; the heap entry is moved when it comes
+        up, so `reset` does not touch the heap in the common case.
+        Callbacks are run on a bounded pool, so one slow callback does
+        not delay the other timers.
+        :param workers: Maximum number of callbacks running at once
+        :type workers: int
+        """
+        self._heap = []
+        self._stale = 0
+        self._counter = itertools.count()
+        self._groups = dict()
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="scheduler"
+        )
+        self._thread = threading.Thread(
+            target=self._run, name="scheduler", daemon=True
+        )
+        self._thread.start()
+
+    def schedule(self, delay, function, *args, group=None, **kwargs):
+        """Call `function(*args, **kwargs)` in `delay` seconds.
+        :param group: Key to cancel several timers at once, usually the
+            room id
+        :return: Handle to reset or cancel the timer
+        :rtype: ScheduledTimer
+        """
+        timer = ScheduledTimer(self, delay, function, args, kwargs, group)
+        with self._cond:
+            self._arm(timer, delay)
+        return timer
+
+    def reset(self, timer, delay=None):
+        """Restart the countdown of a timer, even if it already fired.
+        :param delay: New delay in seconds, defaults to the last one
+        :type delay: float, optional
+        """
+        with self._cond:
+            if delay is not None:
+                timer.delay = delay
+            if timer.finished:
+                self._arm(timer, timer.delay)
+                return
+
+            timer.deadline = time.monotonic() + timer.delay
+            # a later deadline is picked up when the old entry comes up
+            if timer.deadline < timer._queued:
+                self._stale += 1
+                self._push(timer)
+
+    def cancel(self, timer):
+        with self._cond:
+            self._finish(timer)
+
+    def cancel_all(self, group):
+        """Cancel every running timer of a group."""
+        with self._cond:
+            for timer in list(self._groups.get(group, ())):
+                self._finish(timer)
+
+    def pending(self, group=None):
+        """Number of running timers, optionally only of one group."""
+        with self._cond:
+            if group is not None:
+                return len(self._groups.get(group, ()))
+            return sum(len(timers) for timers in self._groups.values())
+
+    def shutdown(self):
+        with self._cond:
+            self._thread = None
+            self._cond.notify()
+        self._executor.shutdown(wait=False)
+
+    def _arm(self, timer, delay):
+        timer.finished = False
+        timer.deadline = time.monotonic() + delay
+        self._groups.setdefault(timer.group, set()).add(timer)
+        self._push(timer)
+
+    def _push(self, timer):
+        timer._queued = timer.deadline
+        heapq.heappush(self._heap, (timer.deadline, next(self._counter), timer))
+        if self._heap[0][2] is timer:
+            self._cond.notify()
+
+    def _finish(self, timer):
+        if timer.finished:
+            return
+        timer.finished = True
+        timer._queued = None
+        self._stale += 1
+        group = self._groups.get(timer.group)
+        if group is not None:
+            group.discard(timer)
+            if not group:
+                del self._groups[timer.group]
+
+    def _compact(self):
+        self._heap = [
+            entry
+            for entry in self._heap
+            if not entry[2].finished and entry[0] == entry[2]._queued
+        ]
+        heapq.heapify(self._heap)
+        self._stale = 0
+
+    def _run(self):
+        with self._cond:
+            while self._thread is not None:
+                if self._stale > 64 and self._stale > len(self._heap) // 2:
+                    self._compact()
+
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+
+                deadline, _, timer = self._heap[0]
+                if timer.finished or deadline != timer._queued:
+                    heapq.heappop(self._heap)
+                    self._stale = max(0, self._stale - 1)
+                    continue
+                if timer.deadline > deadline:
+                    # postponed by `reset`
+                    heapq.heappop(self._heap)
+                    self._push(timer)
+                    continue
+
+                now = time.monotonic()
+                if deadline > now:
+                    self._cond.wait(deadline - now)
+                    continue
+
+                heapq.heappop(self._heap)
+                self._finish(timer)
+                self._stale = max(0, self._stale - 1)
+                self._executor.submit(self._call, timer)
+
+    def _call(self, timer):
+        try:
+            timer.function(*timer.args, **timer.kwargs)
+        except Exception:
+            name = getattr(timer.function, "__name__", repr(timer.function))
+            LOG.exception(f"Timer callback {name} failed")
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Scheduler shared by all timers of the process."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+        return _scheduler
+
+
+def schedule(delay, function, *args, group=None, **kwargs):
+    """Schedule a call on the shared scheduler, see `Scheduler.schedule`."""
+    return get_scheduler().schedule(delay, function, *args, group=group, **kwargs)
+
+
+def cancel_all(group):
+    """Cancel all timers of a group on the shared scheduler."""
+    get_scheduler().cancel_all(group)
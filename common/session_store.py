@@ -0,0 +1,218 @@
+"""Checkpoints of room sessions that survive a restart of the bot."""
+
+from abc import ABC, abstractmethod
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from common.scheduler import schedule
+
+
+LOG = logging.getLogger(__name__)
+
+
+class SessionStore(ABC):
+    """Keeps the latest state of every live room, written after each
+    change of a session and read back once at startup.
+
+    States are JSON objects. Subclasses store them in a SQLite database
+    (`SqliteSessionStore`) or an append-only file (`FileSessionStore`).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {"saved": 0, "deleted": 0, "restored": 0}
+
+    @classmethod
+    def from_env(cls):
+        """Open the store named by `SLURK_SESSION_STORE`, e.g.
+        `sqlite:/data/wordle.db` or `file:/data/wordle.jsonl`, else None.
+        """
+        url = os.environ.get("SLURK_SESSION_STORE")
+        if not url:
+            return None
+        return open_store(url)
+
+    def save(self, room_id, state):
+        """Replace the checkpoint of a room."""
+        data = json.dumps(state, separators=(",", ":"))
+        with self._lock:
+            self._write(room_id, data)
+            self._counts["saved"] += 1
+
+    def delete(self, room_id):
+        """Forget a closed room."""
+        with self._lock:
+            self._write(room_id, None)
+            self._counts["deleted"] += 1
+
+    def load(self):
+        """Latest state of every room that was not deleted.
+        :rtype: dict
+        """
+        with self._lock:
+            states = {
+                room_id: json.loads(data) for room_id, data in self._read()
+            }
+            self._counts["restored"] += len(states)
+        return states
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts)
+
+    def close(self):
+        pass
+
+    @abstractmethod
+    def _write(self, room_id, data):
+        """Store the JSON state of a room, or forget the room if `data`
+        is None. Called with the lock held."""
+        pass
+
+    @abstractmethod
+    def _read(self):
+        """Pairs of room id and JSON state of the live rooms. Called
+        with the lock held."""
+        pass
+
+
+class SqliteSessionStore(SessionStore):
+    def __init__(self, path):
+        """One row per live room in a SQLite database.
+        :param path: Database file, created if missing
+        :type path: str
+        """
+        super().__init__()
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions "
+            "(room_id INTEGER PRIMARY KEY, state TEXT NOT NULL, updated REAL)"
+        )
+        self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _write(self, room_id, data):
+        if data is None:
+            self._db.execute("DELETE FROM sessions WHERE room_id = ?", (room_id,))
+        else:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+                (room_id, data, time.time()),
+            )
+        self._db.commit()
+
+    def _read(self):
+        return self._db.execute("SELECT room_id, state FROM sessions").fetchall()
+
+
+class FileSessionStore(SessionStore):
+    def __init__(self, path, compact_after=1000):
+        """Appends every checkpoint as a line to a file; the last line
+        of a room wins. The file is rewritten with only the live rooms
+        once it holds `compact_after` outdated lines more than those.
+        :param path: File of JSON lines, created if missing
+        :type path: str
+        :param compact_after: Outdated lines tolerated before the file
+            is compacted
+        :type compact_after: int
+        """
+        super().__init__()
+        self.path = path
+        self.compact_after = compact_after
+
+        self._lines = 0
+        self._live = self._scan()
+        self._file = open(path, "a", encoding="utf-8")
+        if self._file.tell() > 0:
+            with open(path, "rb") as infile:
+                infile.seek(-1, os.SEEK_END)
+                # do not continue a line cut short by a crash
+                if infile.read(1) != b"\n":
+                    self._file.write("\n")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def _write(self, room_id, data):
+        if data is None:
+            self._live.pop(room_id, None)
+        else:
+            self._live[room_id] = data
+        self._file.write(json.dumps({"room": room_id, "state": data}) + "\n")
+        self._file.flush()
+
+        self._lines += 1
+        if self._lines > len(self._live) + self.compact_after:
+            self._compact()
+
+    def _read(self):
+        return list(self._live.items())
+
+    def _scan(self):
+        live = dict()
+        if not os.path.exists(self.path):
+            return live
+        with open(self.path, encoding="utf-8") as infile:
+            for line in infile:
+                self._lines += 1
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # a line cut short by a crash
+                    LOG.warning(f"Skipping a broken line in {self.path}")
+                    continue
+                if record["state"] is None:
+                    live.pop(record["room"], None)
+                else:
+                    live[record["room"]] = record["state"]
+        return live
+
+    def _compact(self):
+        self._file.close()
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as outfile:
+            for room_id, data in self._live.items():
+                outfile.write(json.dumps({"room": room_id, "state": data}) + "\n")
+        os.replace(temporary, self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._lines = len(self._live)
+
+
+def open_store(url):
+    """Open a store from `sqlite:<path>` or `file:<path>`."""
+    kind, _, path = url.partition(":")
+    if kind == "sqlite":
+        return SqliteSessionStore(path)
+    if kind == "file":
+        return FileSessionStore(path)
+    raise ValueError(f"unknown session store: {url}")
+
+
+def deadline_of(timer):
+    """Wall clock time at which a timer fires, to be checkpointed.
+    :param timer: Timer returned by `scheduler.schedule`
+    :return: Seconds since the epoch, None if the timer is not running
+    """
+    if timer is None:
+        return None
+    remaining = timer.remaining()
+    if remaining is None:
+        return None
+    return time.time() + remaining
+
+
+def resume_timer(deadline, function, *args, group=None):
+    """Schedule a checkpointed timer for its remaining time; a timer
+    that ran out while the bot was down fires right away."""
+    return schedule(max(0.0, deadline - time.time()), function, *args, group=group)
@@ -1,17 +1,21 @@
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import os
+import signal
+import sys
 
-import requests
-import socketio
+from common.matchmaking import Matchmaker
+from common.metrics import get_metrics
+from common.room_pool import RoomPool
+from templates import ApiClient, InstrumentedClient
 
 
 LOG = logging.getLogger(__name__)
 
 
 class ConciergeBot:
-    sio = socketio.Client(logger=True)
-    tasks = dict()
+    sio = InstrumentedClient(logger=True)
 
     def __init__(self, token, user, host, port, openvidu=False):
         """This bot lists users joining a designated
@@ -40,6 +44,12 @@ class ConciergeBot:
         if port is not None:
             self.uri += f":{port}"
         self.uri += "/slurk/api"
+        self.api = ApiClient(self.uri, self.token)
+        # users waiting for a group, per task; shared with other
+        # replicas if `SLURK_MATCH_QUEUE` names a shared backend
+        self.matchmaker = Matchmaker.from_env()
+        # task rooms created ahead of time per layout, if configured
+        self.room_pool = RoomPool.from_env(self.prepare_room, self.discard_room)
 
         LOG.info(f"Running concierge bot on {self.uri} with token {self.token}")
         # register all event handlers
@@ -53,7 +63,12 @@ class ConciergeBot:
             namespaces="/",
         )
         # wait until the connection with the server ends
-        self.sio.wait()
+        try:
+            self.sio.wait()
+        finally:
+            if self.room_pool is not None:
+                self.room_pool.close()
+            self.matchmaker.close()
 
     def register_callbacks(self):
         @self.sio.event
@@ -62,61 +77,28 @@ class ConciergeBot:
                 user = data["user"]
                 task = self.get_user_task(user)
                 if task:
-                    self.user_task_join(user, task, data["room"], self.openvidu)
+                    self.user_task_join(user, task, data["room"])
             elif data["type"] == "leave":
                 user = data["user"]
                 task = self.get_user_task(user)
                 if task:
                     self.user_task_leave(user, task)
 
-    @staticmethod
-    def message_callback(success, error_msg=None):
-        """Is passed as an optional argument to a server emit.
-
-        Will be invoked after the server has processed the event,
-        any values returned by the event handler will be passed
-        as arguments.
-
-        :param success: `True` if the message was successfully sent,
-            else `False`.
-        :type success: bool
-        :param error_msg: Reason for an insuccessful message
-            transmission. Defaults to None.
-        :type status: str, optional
-        """
-        if not success:
-            LOG.error(f"Could not send message: {error_msg}")
-            exit(1)
-        LOG.debug("Sent message successfully.")
-
     def get_user_task(self, user):
         """Retrieve task assigned to user.
 
         :param user: Holds keys `id` and `name`.
         :type user: dict
+        :return: The task, None if it could not be retrieved.
+        :rtype: dict
         """
-        task = requests.get(
-            f'{self.uri}/users/{user["id"]}/task',
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
+        task = self.api.get(f'/users/{user["id"]}/task')
         if not task.ok:
             LOG.error(f"Could not get task: {task.status_code}")
-            exit(2)
+            return None
         LOG.debug("Got user task successfully.")
         return task.json()
 
-    def get_user(self, user):
-        response = requests.get(
-            f"{self.uri}/users/{user}",
-            headers={"Authorization": f"Bearer {self.token}"}
-        )
-        if not response.ok:
-            LOG.error(
-                f"Could not get user: {response.status_code}"
-            )
-            response.raise_for_status()
-        return response.headers["ETag"]
-
     def create_room(self, layout_id, openvidu_session_id=None):
         """Create room for the task.
 
@@ -128,26 +110,22 @@ class ConciergeBot:
         if openvidu_session_id:
             json["openvidu_session_id"] = openvidu_session_id
 
-        room = requests.post(
-            f"{self.uri}/rooms",
-            headers={"Authorization": f"Bearer {self.token}"},
+        room = self.api.post(
+            "/rooms",
             json=json,
         )
         if not room.ok:
             LOG.error(f"Could not create task room: {room.status_code}")
-            exit(3)
+            room.raise_for_status()
         LOG.debug("Created room successfully.")
         return room.json()
 
     def create_openvidu_session(self):
         """Create OpenVidu session for a room."""
-        session = requests.post(
-            f"{self.uri}/openvidu/sessions",
-            headers={"Authorization": f"Bearer {self.token}"}
-        )
+        session = self.api.post("/openvidu/sessions")
         if not session.ok:
             LOG.error(f"Could not create openvidu session: {session.status_code}")
-            exit(3)
+            session.raise_for_status()
         LOG.debug("Created OpenVidu session successfully.")
         return session.json()
 
@@ -159,13 +137,10 @@ class ConciergeBot:
         :param room_id: Identifier of room.
         :type room_id: int
         """
-        response = requests.post(
-            f"{self.uri}/users/{user_id}/rooms/{room_id}",
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
+        response = self.api.post(f"/users/{user_id}/rooms/{room_id}")
         if not response.ok:
             LOG.error(f"Could not let user join room: {response.status_code}")
-            exit(4)
+            response.raise_for_status()
         LOG.debug("Sending user to new room was successful.")
         return response.headers["ETag"]
 
@@ -179,21 +154,20 @@ class ConciergeBot:
         :param etag: Used for request validation.
         :type etag: str
         """
-        response = requests.delete(
-            f"{self.uri}/users/{user_id}/rooms/{room_id}",
-            headers={"Authorization": f"Bearer {self.token}", "If-Match": etag},
+        response = self.api.delete(
+            f"/users/{user_id}/rooms/{room_id}",
+            headers={"If-Match": etag},
         )
         if not response.ok:
             LOG.error(f"Could not remove user from room: {response.status_code}")
-            exit(5)
+            response.raise_for_status()
         LOG.debug("Removing user from room was successful.")
 
-    def user_task_join(self, user, task, room, openvidu=False):
-        """A connected user and their task are registered.
+    def user_task_join(self, user, task, room):
+        """A connected user is queued for their task.
 
-        Once the final user necessary to start a task
-        has entered, all users for the task are moved to
-        a dynamically created task room.
+        Whenever enough users wait for a task, the longest waiting
+        ones are moved to a dynamically created task room.
 
         :param user: Holds keys `id` and `name`.
         :type user: dict
@@ -203,47 +177,183 @@ class ConciergeBot:
         :param room: Identifier of a room that the user joined.
         :type room: str
         """
-        task_id = task["id"]
         user_id = user["id"]
-        user_name = user["name"]
-        # register task together with the user_id
-        self.tasks.setdefault(task_id, {})[user_id] = room
-
-        if len(self.tasks[task_id]) == task["num_users"]:
-            session_id = None
-
-            if openvidu:
-                # create session
-                session = self.create_openvidu_session()
-                session_id = session["id"]
-            new_room = self.create_room(task["layout_id"], session_id)
-            # list cast necessary because the dictionary is actively altered
-            # due to parallely received "leave" events
-            for user_id, old_room_id in list(self.tasks[task_id].items()):
-                etag = self.get_user(user_id)
-                self.delete_room(user_id, old_room_id, etag)
-                self.join_room(user_id, new_room["id"])
-            del self.tasks[task_id]
-            self.sio.emit("room_created", {"room": new_room["id"], "task": task_id})
-
-            LOG.info(f"Created session {session_id}")
-
-        else:
-            self.sio.emit(
+        if self.room_pool is not None:
+            self.room_pool.register(task["layout_id"])
+        queued = self.matchmaker.enqueue(task["id"], user_id, room)
+        groups = self.start_groups(task)
+
+        grouped = any(ticket.user_id == user_id for group in groups for ticket in group)
+        # with several replicas, only the one that queued the user greets
+        if queued and not grouped:
+            self.sio.emit_acked(
                 "text",
                 {
-                    "message": f"### Hello, {user_name}!\n\n"
+                    "message": f"### Hello, {user['name']}!\n\n"
                     "I am looking for a partner for you, it might take "
                     "some time, so be patient, please...",
                     "receiver_id": user_id,
                     "room": room,
                     "html": True,
                 },
-                callback=self.message_callback,
             )
 
+    def start_groups(self, task):
+        """Start every group that can be formed from the waiting users.
+
+        :return: Groups matched, see `Matchmaker.match`.
+        :rtype: list
+        """
+        groups = self.matchmaker.match(task["id"], task["num_users"])
+        for group in groups:
+            self.start_group(task, group)
+        return groups
+
+    def start_group(self, task, group):
+        """Move a group of waiting users to a new task room.
+
+        The users join the new room in parallel and `room_created` is
+        emitted as soon as all of them are in. If a user cannot join,
+        the others are taken out of the new room again and queued at
+        the head of the queue, the room is given back and the queue is
+        matched again; the users who could not join are asked to reload
+        the page, which queues them again. The waiting room is left only
+        after `room_created`.
+
+        :param task: Holds keys `id` and `layout_id`.
+        :type task: dict
+        :param group: Tickets of the users, see `Matchmaker.join`.
+        :type group: list
+        :return: Identifier of the new room, None if the group could
+            not be started.
+        :rtype: int
+        """
+        requeued = False
+        with get_metrics().track("group_start", task=task["id"]) as call:
+            try:
+                room_id, session_id = self.take_room(task["layout_id"])
+            except Exception:
+                LOG.exception(f"Could not start a room for task {task['id']}")
+                call.error = True
+                self.matchmaker.requeue(group)
+                return None
+
+            with ThreadPoolExecutor(
+                max_workers=len(group), thread_name_prefix="transfer"
+            ) as executor:
+                futures = [
+                    executor.submit(self.join_room, ticket.user_id, room_id)
+                    for ticket in group
+                ]
+                etags = dict()
+                failed = []
+                for ticket, future in zip(group, futures):
+                    if future.exception() is None:
+                        etags[ticket.user_id] = future.result()
+                    else:
+                        failed.append(ticket)
+
+                if failed:
+                    call.error = True
+                    LOG.error(
+                        f"Users {[t.user_id for t in failed]} could not join "
+                        f"room {room_id}, queueing the others again"
+                    )
+                    for ticket in failed:
+                        self.sio.emit_acked(
+                            "text",
+                            {
+                                "message": "Sorry, I could not move you to a "
+                                "task room. Please reload the page to wait "
+                                "for a partner again.",
+                                "receiver_id": ticket.user_id,
+                                "room": ticket.room_id,
+                            },
+                        )
+                    joined = [t for t in group if t.user_id in etags]
+                    self.leave_rooms(executor, joined, etags, room_id)
+                    self.release_room(task["layout_id"], (room_id, session_id))
+                    self.matchmaker.requeue(joined)
+                    requeued = True
+                else:
+                    self.sio.emit(
+                        "room_created", {"room": room_id, "task": task["id"]}
+                    )
+                    LOG.info(f"Created session {session_id}")
+                    self.leave_rooms(executor, group, etags)
+
+        if requeued:
+            # with users who joined meanwhile they may form a group
+            self.start_groups(task)
+            return None
+        return room_id
+
+    def take_room(self, layout_id):
+        """A task room from the pool, or a new one if none is ready.
+
+        :return: Identifiers of the room and of its OpenVidu session
+        :rtype: tuple
+        """
+        if self.room_pool is not None:
+            room = self.room_pool.acquire(layout_id)
+            if room is not None:
+                return room
+        return self.prepare_room(layout_id)
+
+    def release_room(self, layout_id, room):
+        """Give back a task room nobody was moved to, to the pool if
+        there is one, else it is deleted."""
+        try:
+            if self.room_pool is not None:
+                self.room_pool.release(layout_id, room)
+            else:
+                self.discard_room(layout_id, room)
+        except Exception:
+            LOG.exception(f"Could not give back room {room[0]}")
+
+    def prepare_room(self, layout_id):
+        """Create a task room, with an OpenVidu session if enabled."""
+        session_id = None
+        if self.openvidu:
+            # create session
+            session = self.create_openvidu_session()
+            session_id = session["id"]
+        return self.create_room(layout_id, session_id)["id"], session_id
+
+    def discard_room(self, layout_id, room):
+        """Delete an unused task room and its OpenVidu session."""
+        room_id, session_id = room
+        response = self.api.get(f"/rooms/{room_id}")
+        response.raise_for_status()
+        response = self.api.delete(
+            f"/rooms/{room_id}", headers={"If-Match": response.headers["ETag"]}
+        )
+        response.raise_for_status()
+        if session_id is not None:
+            self.api.delete(f"/openvidu/sessions/{session_id}").raise_for_status()
+
+    def leave_rooms(self, executor, tickets, etags, room_id=None):
+        """Remove users from a room in parallel, by default from the
+        waiting room recorded in their ticket.
+
+        :param etags: Current ETag per user.
+        :type etags: dict
+        """
+        futures = [
+            executor.submit(
+                self.delete_room,
+                ticket.user_id,
+                room_id if room_id is not None else ticket.room_id,
+                etags[ticket.user_id],
+            )
+            for ticket in tickets
+        ]
+        for ticket, future in zip(tickets, futures):
+            if future.exception() is not None:
+                LOG.error(f"Could not remove user {ticket.user_id} from a room")
+
     def user_task_leave(self, user, task):
-        """The task entry of a disconnected user is removed.
+        """A disconnected user stops waiting for their task.
 
         :param user: Holds keys `id` and `name`.
         :type user: dict
@@ -251,10 +361,7 @@ class ConciergeBot:
             `layout_id`, `name` and `num_users`.
         :type task: dict
         """
-        task_id = task["id"]
-        user_id = user["id"]
-        if task_id in self.tasks and user_id in self.tasks[task_id]:
-            del self.tasks[task["id"]][user["id"]]
+        self.matchmaker.leave(task["id"], user["id"])
 
 
 if __name__ == "__main__":
@@ -291,6 +398,9 @@ if __name__ == "__main__":
         )
     args = parser.parse_args()
 
+    # leave through `run`, so that pooled rooms are cleaned up
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
     # create bot instance
     concierge_bot = ConciergeBot(args.token, args.user, args.host, args.port, args.openvidu)
     # connect to chat server
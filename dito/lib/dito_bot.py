@@ -7,12 +7,11 @@ import logging
 import os
 import random
 import string
-from threading import Timer
-from time import sleep
-
-import requests
-import socketio
 
+from common.metadata import MetadataCache
+from common.pacing import PacedSender
+from common.scheduler import cancel_all, schedule
+from templates import ApiClient, InstrumentedClient, close_room
 from lib.image_data import ImageData
 from lib.config import *
 
@@ -28,16 +27,16 @@ class RoomTimers:
         /ready to begin the game if none of them did so, yet.
         If one player already sent /ready then the other player
         is reminded 30s later that they should do so, too.
-    :type ready_timer: Timer
+    :type ready_timer: ScheduledTimer
     :param game_timer: Reminds both players that they should come
         to an end and close their discussion by sending /difference.
-    :type game_timer: Timer
+    :type game_timer: ScheduledTimer
     :param done_timer: Resets a sent /difference command for one
         player if their partner did not also sent /difference.
-    :type done_timer: Timer
+    :type done_timer: ScheduledTimer
     :param last_answer_timer: Used to end the game if one player
         did not answer for a prolonged time.
-    :type last_answer_timer: Timer
+    :type last_answer_timer: ScheduledTimer
     """
 
     def __init__(self):
@@ -48,7 +47,7 @@ class RoomTimers:
 
 
 class DiToBot:
-    sio = socketio.Client(logger=True)
+    sio = InstrumentedClient(logger=True)
     """The ID of the task the bot is involved in."""
     task_id = None
     """The ID of the room where users for this task are waiting."""
@@ -87,7 +86,7 @@ class DiToBot:
             room at a time because the concierge bot would move
             them once there are two. If this single user waits for
             a prolonged time their receive an AMT token for waiting.
-        :type waiting_timer: Timer
+        :type waiting_timer: ScheduledTimer
         """
         self.token = token
         self.user = user
@@ -96,6 +95,9 @@ class DiToBot:
         if port is not None:
             self.uri += f":{port}"
         self.uri += "/slurk/api"
+        self.api = ApiClient(self.uri, self.token)
+        self.metadata = MetadataCache(self.api)
+        self.pacer = PacedSender(self.sio)
 
         self.images_per_room = ImageData(DATA_PATH, N, SHUFFLE, SEED)
         self.timers_per_room = dict()
@@ -151,25 +153,20 @@ class DiToBot:
 
                 # register ready timer for this room
                 self.timers_per_room[room_id] = RoomTimers()
-                self.timers_per_room[room_id].ready_timer = Timer(
+                self.timers_per_room[room_id].ready_timer = schedule(
                     TIME_READY * 60,
                     self.sio.emit,
-                    args=[
-                        "text",
-                        {
-                            "message": "Are you ready? "
-                            "Please type **/ready** to begin the game.",
-                            "room": room_id,
-                            "html": True,
-                        },
-                    ],
+                    "text",
+                    {
+                        "message": "Are you ready? "
+                        "Please type **/ready** to begin the game.",
+                        "room": room_id,
+                        "html": True,
+                    },
+                    group=room_id,
                 )
-                self.timers_per_room[room_id].ready_timer.start()
 
-                response = requests.post(
-                    f"{self.uri}/users/{self.user}/rooms/{room_id}",
-                    headers={"Authorization": f"Bearer {self.token}"},
-                )
+                response = self.api.post(f"/users/{self.user}/rooms/{room_id}")
                 if not response.ok:
                     LOG.error(
                         f"Could not let dito bot join room: {response.status_code}"
@@ -184,16 +181,11 @@ class DiToBot:
 
             if room_id in self.images_per_room:
                 # read out task greeting
-                for line in TASK_GREETING:
-                    self.sio.emit(
-                        "text", {"message": line, "room": room_id, "html": True}
-                    )
-                    sleep(0.5)
+                self.pacer.send(room_id, TASK_GREETING)
                 # ask players to send \ready
-                response = requests.patch(
-                    f"{self.uri}/rooms/{room_id}/text/instr_title",
-                    json={"text": line},
-                    headers={"Authorization": f"Bearer {self.token}"},
+                response = self.api.patch(
+                    f"/rooms/{room_id}/text/instr_title",
+                    json={"text": TASK_GREETING[-1]},
                 )
                 if not response.ok:
                     LOG.error(
@@ -204,15 +196,10 @@ class DiToBot:
         @self.sio.event
         def status(data):
             """Triggered if a user enters or leaves a room."""
+            self.metadata.on_status(data)
             # check whether the user is eligible to join this task
-            task = requests.get(
-                f"{self.uri}/users/{data['user']['id']}/task",
-                headers={"Authorization": f"Bearer {self.token}"},
-            )
-            if not task.ok:
-                LOG.error(f"Could not set task instruction title: {task.status_code}")
-                task.raise_for_status()
-            if not task.json() or task.json()["id"] != int(self.task_id):
+            task = self.metadata.task_of(data["user"]["id"])
+            if not task or task["id"] != int(self.task_id):
                 return
 
             room_id = data["room"]
@@ -223,12 +210,13 @@ class DiToBot:
                     self.waiting_timer.cancel()
                 if data["type"] == "join":
                     LOG.debug("Waiting Timer restarted.")
-                    self.waiting_timer = Timer(
+                    self.waiting_timer = schedule(
                         TIME_WAITING * 60,
                         self._no_partner,
-                        args=[room_id, data["user"]["id"]],
+                        room_id,
+                        data["user"]["id"],
+                        group=room_id,
                     )
-                    self.waiting_timer.start()
             # some joined a task room
             elif room_id in self.images_per_room:
                 curr_usr, other_usr = self.players_per_room[room_id]
@@ -282,12 +270,13 @@ class DiToBot:
             # reset the answer timer if the message was an answer
             if user_id != self.last_message_from[room_id]:
                 LOG.debug(f"{data['user']['name']} awaits an answer.")
-                if self.last_message_from[room_id] is not None:
-                    self.timers_per_room[room_id].last_answer_timer.cancel()
-                self.timers_per_room[room_id].last_answer_timer = Timer(
-                    TIME_ANSWER * 60, self._noreply, args=[room_id, user_id]
-                )
-                self.timers_per_room[room_id].last_answer_timer.start()
+                timer = self.timers_per_room[room_id].last_answer_timer
+                if timer is None:
+                    self.timers_per_room[room_id].last_answer_timer = schedule(
+                        TIME_ANSWER * 60, self._noreply, room_id, group=room_id
+                    )
+                else:
+                    timer.reset()
                 # save the person that last left a message
                 self.last_message_from[room_id] = user_id
 
@@ -343,14 +332,15 @@ class DiToBot:
 
         # only one user has sent /ready repetitively
         if curr_usr["status"] in {"ready", "done"}:
-            sleep(0.5)
-            self.sio.emit(
-                "text",
-                {
-                    "message": "You have already typed /ready.",
-                    "receiver_id": curr_usr["id"],
-                    "room": room_id,
-                },
+            self.pacer.send(
+                room_id,
+                [
+                    {
+                        "message": "You have already typed /ready.",
+                        "receiver_id": curr_usr["id"],
+                    }
+                ],
+                delay=0.5,
             )
             return
         curr_usr["status"] = "ready"
@@ -358,30 +348,29 @@ class DiToBot:
         self.timers_per_room[room_id].ready_timer.cancel()
         # a first ready command was sent
         if other_usr["status"] == "joined":
-            sleep(0.5)
             # give the user feedback that his command arrived
-            self.sio.emit(
-                "text",
-                {
-                    "message": "Now, waiting for your partner to type /ready.",
-                    "receiver_id": curr_usr["id"],
-                    "room": room_id,
-                },
+            self.pacer.send(
+                room_id,
+                [
+                    {
+                        "message": "Now, waiting for your partner to type /ready.",
+                        "receiver_id": curr_usr["id"],
+                    }
+                ],
+                delay=0.5,
             )
             # give the other user time before reminding him
-            self.timers_per_room[room_id].ready_timer = Timer(
+            self.timers_per_room[room_id].ready_timer = schedule(
                 (TIME_READY / 2) * 60,
                 self.sio.emit,
-                args=[
-                    "text",
-                    {
-                        "message": "Your partner is ready. Please, type /ready!",
-                        "room": room_id,
-                        "receiver_id": other_usr["id"],
-                    },
-                ],
+                "text",
+                {
+                    "message": "Your partner is ready. Please, type /ready!",
+                    "room": room_id,
+                    "receiver_id": other_usr["id"],
+                },
+                group=room_id,
             )
-            self.timers_per_room[room_id].ready_timer.start()
         # the other player was already ready
         else:
             # both users are ready and the game begins
@@ -391,20 +380,18 @@ class DiToBot:
             )
             self.show_item(room_id)
             # kindly ask the users to come to an end after a certain time
-            self.timers_per_room[room_id].game_timer = Timer(
+            self.timers_per_room[room_id].game_timer = schedule(
                 TIME_GAME * 60,
                 self.sio.emit,
-                args=[
-                    "text",
-                    {
-                        "message": "You both seem to be having a discussion "
-                        "for a long time. Could you reach an "
-                        "agreement and provide an answer?",
-                        "room": room_id,
-                    },
-                ],
+                "text",
+                {
+                    "message": "You both seem to be having a discussion "
+                    "for a long time. Could you reach an "
+                    "agreement and provide an answer?",
+                    "room": room_id,
+                },
+                group=room_id,
             )
-            self.timers_per_room[room_id].game_timer.start()
 
     def _command_difference(self, room_id, user_id):
         """Must be sent to end a game round."""
@@ -435,15 +422,16 @@ class DiToBot:
             )
         # this user has already recently typed /difference
         elif curr_usr["status"] == "done":
-            sleep(0.5)
-            self.sio.emit(
-                "text",
-                {
-                    "message": "You have already typed **/difference**.",
-                    "receiver_id": curr_usr["id"],
-                    "room": room_id,
-                    "html": True,
-                },
+            self.pacer.send(
+                room_id,
+                [
+                    {
+                        "message": "You have already typed **/difference**.",
+                        "receiver_id": curr_usr["id"],
+                        "html": True,
+                    }
+                ],
+                delay=0.5,
             )
         else:
             curr_usr["status"] = "done"
@@ -451,10 +439,9 @@ class DiToBot:
             # only one user thinks they are done
             if other_usr["status"] != "done":
                 # await for the other user to agree
-                self.timers_per_room[room_id].done_timer = Timer(
-                    TIME_DONE * 60, self._not_done, args=[room_id, user_id]
+                self.timers_per_room[room_id].done_timer = schedule(
+                    TIME_DONE * 60, self._not_done, room_id, user_id, group=room_id
                 )
-                self.timers_per_room[room_id].done_timer.start()
                 self.sio.emit(
                     "text",
                     {
@@ -489,10 +476,9 @@ class DiToBot:
                             "room": room_id,
                         },
                     )
-                    sleep(1)
-                    self.confirmation_code(room_id, "success")
-                    sleep(1)
-                    self.close_game(room_id)
+                    # handlers of a room hold its lock, which its timer
+                    # callbacks wait for, so the end is scheduled
+                    schedule(1, self._finish_game, room_id, group=room_id)
                 else:
                     self.sio.emit(
                         "text",
@@ -507,27 +493,32 @@ class DiToBot:
                         usr["status"] = "ready"
                         usr["msg_n"] = 0
                     self.timers_per_room[room_id].game_timer.cancel()
-                    self.timers_per_room[room_id].game_timer = Timer(
+                    self.timers_per_room[room_id].game_timer = schedule(
                         TIME_GAME * 60,
                         self.sio.emit,
-                        args=[
-                            "text",
-                            {
-                                "message": "You both seem to be having a discussion "
-                                "for a long time. Could you reach an "
-                                "agreement and provide an answer?",
-                                "room": room_id,
-                            },
-                        ],
+                        "text",
+                        {
+                            "message": "You both seem to be having a discussion "
+                            "for a long time. Could you reach an "
+                            "agreement and provide an answer?",
+                            "room": room_id,
+                        },
+                        group=room_id,
                     )
-                    self.timers_per_room[room_id].game_timer.start()
                     self.show_item(room_id)
 
+    def _finish_game(self, room_id):
+        """Both players found the last difference."""
+        self.confirmation_code(room_id, "success")
+        self.close_game(room_id)
+
     def _not_done(self, room_id, user_id):
         """One of the two players was not done."""
-        for usr in self.players_per_room[room_id]:
-            if usr["id"] == user_id:
-                usr["status"] = "ready"
+        # the other player's /difference may be handled at the same time
+        with self.sio.room_locks(room_id):
+            for usr in self.players_per_room[room_id]:
+                if usr["id"] == user_id:
+                    usr["status"] = "ready"
         self.sio.emit(
             "text",
             {
@@ -548,20 +539,18 @@ class DiToBot:
             images = self.images_per_room[room_id][0]
             # show a different image to each user
             for usr, img in zip(users, images):
-                response = requests.patch(
-                    f"{self.uri}/rooms/{room_id}/attribute/id/current-image",
+                response = self.api.patch(
+                    f"/rooms/{room_id}/attribute/id/current-image",
                     json={"attribute": "src", "value": img, "receiver_id": usr["id"]},
-                    headers={"Authorization": f"Bearer {self.token}"},
                 )
                 if not response.ok:
                     LOG.error(f"Could not set image: {response.status_code}")
                     response.raise_for_status()
 
             # the task for both users is the same - no special receiver
-            response = requests.patch(
-                f"{self.uri}/rooms/{room_id}/text/instr_title",
+            response = self.api.patch(
+                f"/rooms/{room_id}/text/instr_title",
                 json={"text": TASK_TITLE},
-                headers={"Authorization": f"Bearer {self.token}"},
             )
             if not response.ok:
                 LOG.error(
@@ -569,10 +558,9 @@ class DiToBot:
                 )
                 response.raise_for_status()
 
-            response = requests.patch(
-                f"{self.uri}/rooms/{room_id}/text/instr",
+            response = self.api.patch(
+                f"/rooms/{room_id}/text/instr",
                 json={"text": TASK_DESCR},
-                headers={"Authorization": f"Bearer {self.token}"},
             )
             if not response.ok:
                 LOG.error(f"Could not set task instruction: {response.status_code}")
@@ -591,8 +579,10 @@ class DiToBot:
             )
             # create token and send it to user
             self.confirmation_code(room_id, "no_partner", receiver_id=user_id)
-            sleep(5)
-            self.sio.emit(
+            # timer callbacks share a pool, they must not sleep
+            schedule(
+                5,
+                self.sio.emit,
                 "text",
                 {
                     "message": "You may also wait some more :)",
@@ -602,10 +592,9 @@ class DiToBot:
             )
             # no need to cancel
             # the running out of this timer triggered this event
-            self.waiting_timer = Timer(
-                TIME_WAITING * 60, self._no_partner, args=[room_id, user_id]
+            self.waiting_timer = schedule(
+                TIME_WAITING * 60, self._no_partner, room_id, user_id, group=room_id
             )
-            self.waiting_timer.start()
             self.received_waiting_token.add(user_id)
         else:
             self.sio.emit(
@@ -616,8 +605,9 @@ class DiToBot:
                     "receiver_id": user_id,
                 },
             )
-            sleep(2)
-            self.sio.emit(
+            schedule(
+                2,
+                self.sio.emit,
                 "text",
                 {
                     "message": "Please check back at another time of the day.",
@@ -626,8 +616,9 @@ class DiToBot:
                 },
             )
 
-    def _noreply(self, room_id, user_id):
+    def _noreply(self, room_id):
         """One participant did not receive an answer for a while."""
+        user_id = self.last_message_from[room_id]
         curr_usr, other_usr = self.players_per_room[room_id]
         if curr_usr["id"] != user_id:
             curr_usr, other_usr = other_usr, curr_usr
@@ -661,15 +652,14 @@ class DiToBot:
 
         amt_token = "".join(random.choices(string.ascii_uppercase + string.digits, k=6))
         # post AMT token to logs
-        response = requests.post(
-            f"{self.uri}/logs",
+        response = self.api.post(
+            "/logs",
             json={
                 "event": "confirmation_log",
                 "room_id": room_id,
                 "data": {"status_txt": status, "amt_token": amt_token},
                 **kwargs,
             },
-            headers={"Authorization": f"Bearer {self.token}"},
         )
         if not response.ok:
             LOG.error(f"Could not post AMT token to logs: {response.status_code}")
@@ -691,7 +681,12 @@ class DiToBot:
         return amt_token
 
     def close_game(self, room_id):
-        """Erase any data structures no longer necessary."""
+        """Erase any data structures no longer necessary.
+
+        The room is closed in steps on the scheduler instead of sleeping
+        in between, so that closing many rooms at once does not hold up
+        the timers of the other rooms.
+        """
         self.sio.emit(
             "text",
             {
@@ -700,80 +695,58 @@ class DiToBot:
                 "room": room_id,
             },
         )
-        sleep(2)
+        # disable all timers, the steps below are not part of the room
+        cancel_all(room_id)
+        self.pacer.cancel(room_id)
+        schedule(2, self._room_to_read_only, room_id)
+
+    def _room_to_read_only(self, room_id):
         self.sio.emit(
             "text",
             {"message": "Make sure to save your token before that.", "room": room_id},
         )
         self.room_to_read_only(room_id)
 
-        # disable all timers
-        for timer_id in {
-            "ready_timer",
-            "game_timer",
-            "done_timer",
-            "last_answer_timer",
-        }:
-            timer = getattr(self.timers_per_room[room_id], timer_id)
-            if timer is not None:
-                timer.cancel()
-
-        # send users back to the waiting room
-        sleep(TIME_CLOSE * 60)
-        for usr in self.players_per_room[room_id]:
-            sleep(TIME_CLOSE * 60)
-
-            self.rename_users(usr["id"])
-
-            response = requests.post(
-                f"{self.uri}/users/{usr['id']}/rooms/{self.waiting_room}",
-                headers={"Authorization": f"Bearer {self.token}"},
-            )
-            if not response.ok:
-                LOG.error(
-                    f"Could not let user join waiting room: {response.status_code}"
-                )
-                response.raise_for_status()
-            LOG.debug("Sending user to waiting room was successful.")
+        # send users back to the waiting room, one every TIME_CLOSE minutes
+        schedule(
+            2 * TIME_CLOSE * 60,
+            self._return_players,
+            room_id,
+            list(self.players_per_room[room_id]),
+        )
 
-            response = requests.delete(
-                f"{self.uri}/users/{usr['id']}/rooms/{room_id}",
-                headers={
-                    "If-Match": response.headers["ETag"],
-                    "Authorization": f"Bearer {self.token}",
-                },
-            )
-            if not response.ok:
-                LOG.error(
-                    f"Could not remove user from task room: {response.status_code}"
-                )
-                response.raise_for_status()
-            LOG.debug("Removing user from task room was successful.")
+    def _return_players(self, room_id, players):
+        usr, *others = players
+        self.rename_users(usr["id"])
+
+        response = self.api.post(f"/users/{usr['id']}/rooms/{self.waiting_room}")
+        if not response.ok:
+            LOG.error(f"Could not let user join waiting room: {response.status_code}")
+            response.raise_for_status()
+        LOG.debug("Sending user to waiting room was successful.")
+
+        # the concierge may already have moved the user on, so the
+        # ETag of the join can be outdated
+        response = self.metadata.remove_user_from_room(usr["id"], room_id)
+        if not response.ok:
+            LOG.error(f"Could not remove user from task room: {response.status_code}")
+            response.raise_for_status()
+        LOG.debug("Removing user from task room was successful.")
+
+        if others:
+            schedule(TIME_CLOSE * 60, self._return_players, room_id, others)
+            return
 
         # remove any task room specific objects
         self.images_per_room.pop(room_id)
         self.timers_per_room.pop(room_id)
         self.players_per_room.pop(room_id)
         self.last_message_from.pop(room_id)
+        self.sio.forget_room(room_id)
 
     def room_to_read_only(self, room_id):
-        """Set room to read only."""
-        response = requests.patch(
-            f"{self.uri}/rooms/{room_id}/attribute/id/text",
-            json={"attribute": "readonly", "value": "True"},
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
-        if not response.ok:
-            LOG.error(f"Could not set room to read_only: {response.status_code}")
-            response.raise_for_status()
-        response = requests.patch(
-            f"{self.uri}/rooms/{room_id}/attribute/id/text",
-            json={"attribute": "placeholder", "value": "This room is read-only"},
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
-        if not response.ok:
-            LOG.error(f"Could not set room to read_only: {response.status_code}")
-            response.raise_for_status()
+        """Set room to read only, the players are moved out later."""
+        close_room(self.api, room_id, users=[])
 
     def rename_users(self, user_id):
         """Give all users in a room a new random name."""
@@ -783,21 +756,13 @@ class DiToBot:
 
             new_name = random.choice(names)
 
-            response = requests.get(
-                f"{self.uri}/users/{user_id}",
-                headers={"Authorization": f"Bearer {self.token}"},
-            )
-            if not response.ok:
-                LOG.error(f"Could not get user: {response.status_code}")
-                response.raise_for_status()
-
-            response = requests.patch(
-                f"{self.uri}/users/{user_id}",
-                json={"name": new_name},
-                headers={
-                    "If-Match": response.headers["ETag"],
-                    "Authorization": f"Bearer {self.token}",
-                },
+            response = self.metadata.write_user(
+                user_id,
+                lambda etag: self.api.patch(
+                    f"/users/{user_id}",
+                    json={"name": new_name},
+                    headers={"If-Match": etag},
+                ),
             )
             if not response.ok:
                 LOG.error(f"Could not rename user: {response.status_code}")
@@ -1,8 +1,6 @@
 import logging
-from threading import Timer
-
-import requests
 
+from common.scheduler import schedule
 from templates import TaskBot
 
 
@@ -10,22 +8,19 @@ TIMEOUT_TIMER = 60  # minutes
 
 
 class RoomTimer:
-    def __init__(self, function, room_id):
+    def __init__(self, function, room_id, timeout=TIMEOUT_TIMER):
         self.function = function
         self.room_id = room_id
+        self.timeout = timeout
         self.start_timer()
 
     def start_timer(self):
-        self.timer = Timer(
-            TIMEOUT_TIMER*60,
-            self.function,
-            args=[self.room_id]
+        self.timer = schedule(
+            self.timeout * 60, self.function, self.room_id, group=self.room_id
         )
-        self.timer.start()
 
     def reset(self):
-        self.timer.cancel()
-        self.start_timer()
+        self.timer.reset()
         logging.debug("reset timer")
 
     def cancel(self):
@@ -38,64 +33,14 @@ class EchoBot(TaskBot):
     def on_task_room_creation(self, data):
         room_id = data["room"]
 
-        self.timers_per_room[room_id] = RoomTimer(
-            self.close_room, room_id
-        )
+        # the timeout can be set per task, see `--task-config`
+        timeout = self.tasks.setting(room_id, "timeout_timer", TIMEOUT_TIMER)
+        self.timers_per_room[room_id] = RoomTimer(self.close_room, room_id, timeout)
 
     def close_room(self, room_id):
         self.room_to_read_only(room_id)
         self.timers_per_room.pop(room_id)
-
-    def room_to_read_only(self, room_id):
-        """Set room to read only."""
-        # set room to read-only
-        response = requests.patch(
-            f"{self.uri}/rooms/{room_id}/attribute/id/text",
-            json={"attribute": "readonly", "value": "True"},
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
-        if not response.ok:
-            logging.error(f"Could not set room to read_only: {response.status_code}")
-            response.raise_for_status()
-
-        response = requests.patch(
-            f"{self.uri}/rooms/{room_id}/attribute/id/text",
-            json={"attribute": "placeholder", "value": "This room is read-only"},
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
-        if not response.ok:
-            logging.error(f"Could not set room to read_only: {response.status_code}")
-            response.raise_for_status()
-
-        response = requests.get(
-            f"{self.uri}/rooms/{room_id}/users",
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
-        if not response.ok:
-            logging.error(f"Could not get user: {response.status_code}")
-
-        users = response.json()
-        for user in users:
-            if user["id"] != self.user:
-                response = requests.get(
-                    f"{self.uri}/users/{user['id']}",
-                    headers={"Authorization": f"Bearer {self.token}"},
-                )
-                if not response.ok:
-                    logging.error(f"Could not get user: {response.status_code}")
-                    response.raise_for_status()
-                etag = response.headers["ETag"]
-
-                response = requests.delete(
-                    f"{self.uri}/users/{user['id']}/rooms/{room_id}",
-                    headers={"If-Match": etag, "Authorization": f"Bearer {self.token}"},
-                )
-                if not response.ok:
-                    logging.error(
-                        f"Could not remove user from task room: {response.status_code}"
-                    )
-                    response.raise_for_status()
-                logging.debug("Removing user from task room was successful.")
+        self.tasks.close_room(room_id)
 
     def register_callbacks(self):
         @self.sio.event
@@ -121,14 +66,13 @@ class EchoBot(TaskBot):
             elif message.lower() == "ping":
                 message = "Pong!"
 
-            self.sio.emit(
+            self.sio.emit_acked(
                 "text",
                 {
                     "room": data["room"],
                     "message": message,
                     **options
                 },
-                callback=self.message_callback,
             )
 
         @self.sio.event
@@ -148,7 +92,7 @@ class EchoBot(TaskBot):
                 logging.debug("It was actually a private image o.O")
                 options["receiver_id"] = data["user"]["id"]
 
-            self.sio.emit(
+            self.sio.emit_acked(
                 "image",
                 {
                     "room": data["room"],
@@ -157,7 +101,6 @@ class EchoBot(TaskBot):
                     "height": data["height"],
                     **options,
                 },
-                callback=self.message_callback,
             )
 
 
@@ -170,6 +113,8 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     # create bot instance
-    echo_bot = EchoBot(args.token, args.user, args.task, args.host, args.port)
+    echo_bot = EchoBot(
+        args.token, args.user, args.task, args.host, args.port, args.task_config
+    )
     # connect to chat server
     echo_bot.run()
@@ -0,0 +1,676 @@
+"""In-memory stand-in for the slurk server to load test bots locally.
+
+Implements the parts of the REST API and the Socket.IO events the bots
+rely on, keeps everything in memory and can delay or fail requests on
+purpose. Statistics are served at `/stats`.
+
+    python fake_slurk.py --port 5000 --latency 0.02 --jitter 0.01 --error-rate 0.01
+
+Bots connect to it as to a real server (`SLURK_HOST=http://localhost`,
+`SLURK_PORT=5000`) with tokens created through the API; the admin token
+is `--api-token`.
+"""
+
+import argparse
+import asyncio
+from collections import defaultdict
+from datetime import datetime
+import itertools
+import logging
+import random
+import re
+import time
+import uuid
+
+try:
+    from aiohttp import web
+    import socketio
+except ImportError:  # the state can be used without a server
+    web = socketio = None
+
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_API_TOKEN = "00000000-0000-0000-0000-000000000000"
+
+# room layout elements changed by the bots, see `SlurkState.update_room`
+ROOM_UPDATES = {
+    ("attribute", "PATCH"): "attribute_update",
+    ("attribute", "POST"): "attribute_update",
+    ("attribute", "DELETE"): "attribute_remove",
+    ("text", "PATCH"): "text_update",
+    ("text", "POST"): "text_update",
+    ("class", "POST"): "class_add",
+    ("class", "PATCH"): "class_add",
+    ("class", "DELETE"): "class_remove",
+}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def timestamp():
+    return datetime.utcnow().isoformat()
+
+
+class SlurkState:
+    def __init__(self, api_token=DEFAULT_API_TOKEN):
+        """All objects of the fake server and the rules of slurk for
+        changing them. Nothing here waits or talks to the network:
+        events that slurk would send are appended to `outbox` as
+        `(event, data, room, user)` for the server to deliver to the
+        sockets in `room` or of `user` (both None to broadcast).
+        :param api_token: Token with access to the whole API
+        :type api_token: str
+        """
+        self.api_token = api_token
+        self.layouts = dict()
+        self.rooms = dict()
+        self.permissions = dict()
+        self.tokens = {api_token: {"id": api_token, "task_id": None}}
+        self.users = dict()
+        self.tasks = dict()
+        self.logs = list()
+        self.connected = set()
+        self.outbox = list()
+
+        self._ids = defaultdict(lambda: itertools.count(1))
+        self._versions = defaultdict(int)
+        self._routes = [
+            ("POST", r"/layouts", self.create_layout),
+            ("GET", r"/layouts/(\d+)", self.get_layout),
+            ("POST", r"/rooms", self.create_room),
+            ("GET", r"/rooms/(\d+)", self.get_room),
+            ("DELETE", r"/rooms/(\d+)", self.delete_room),
+            ("GET", r"/rooms/(\d+)/users", self.room_users),
+            ("GET", r"/rooms/(\d+)/logs", self.room_logs),
+            (None, r"/rooms/(\d+)/(attribute)/(\w+)/([\w-]+)", self.update_room),
+            (None, r"/rooms/(\d+)/(text|class)/()([\w-]+)", self.update_room),
+            ("POST", r"/permissions", self.create_permissions),
+            ("GET", r"/permissions/(\d+)", self.get_permissions),
+            ("PATCH", r"/permissions/(\d+)", self.patch_permissions),
+            ("POST", r"/tokens", self.create_token),
+            ("GET", r"/tokens/([\w-]+)", self.get_token),
+            ("POST", r"/users", self.create_user),
+            ("GET", r"/users/(\d+)", self.get_user),
+            ("PATCH", r"/users/(\d+)", self.patch_user),
+            ("GET", r"/users/(\d+)/task", self.user_task),
+            ("GET", r"/users/(\d+)/permissions", self.user_permissions),
+            ("POST", r"/users/(\d+)/rooms/(\d+)", self.join_room),
+            ("DELETE", r"/users/(\d+)/rooms/(\d+)", self.leave_room),
+            ("POST", r"/tasks", self.create_task),
+            ("GET", r"/tasks/(\d+)", self.get_task),
+            ("POST", r"/logs", self.create_log),
+        ]
+        self._routes = [
+            (method, re.compile(pattern + "$"), handler)
+            for method, pattern, handler in self._routes
+        ]
+
+    def handle(self, method, path, body=None, headers=None):
+        """Answer an API request.
+        :param path: Path below `/slurk/api`, e.g. `/rooms/1`
+        :type path: str
+        :return: Status code, JSON body and response headers
+        :rtype: tuple
+        """
+        headers = headers or dict()
+        token = headers.get("Authorization", "").replace("Bearer ", "")
+        if token not in self.tokens:
+            return 401, {"message": "unknown token"}, {}
+
+        allowed = False
+        for route_method, pattern, handler in self._routes:
+            match = pattern.match(path)
+            if match is None:
+                continue
+            if route_method not in {None, method}:
+                allowed = True
+                continue
+            try:
+                if route_method is None:
+                    result = handler(method, *match.groups(), body=body or {})
+                else:
+                    result = handler(
+                        *match.groups(),
+                        body=body or {},
+                        if_match=headers.get("If-Match"),
+                        token=token,
+                    )
+            except ApiError as error:
+                return error.status, {"message": str(error)}, {}
+            return result
+        if allowed:
+            return 405, {"message": "method not allowed"}, {}
+        return 404, {"message": f"no route {path}"}, {}
+
+    # REST API
+    def create_layout(self, body, **_):
+        return self._create(self.layouts, "layout", body)
+
+    def get_layout(self, layout_id, **_):
+        return self._get(self.layouts, "layout", int(layout_id))
+
+    def create_room(self, body, **_):
+        self._find(self.layouts, int(body.get("layout_id", 0)), "layout")
+        return self._create(self.rooms, "room", {**body, "users": []})
+
+    def get_room(self, room_id, **_):
+        return self._get(self.rooms, "room", int(room_id))
+
+    def delete_room(self, room_id, if_match=None, **_):
+        room = self._find(self.rooms, int(room_id), "room")
+        self._check_etag("room", int(room_id), if_match)
+        if room["users"]:
+            raise ApiError(409, "room is not empty")
+        del self.rooms[int(room_id)]
+        return 204, None, {}
+
+    def room_users(self, room_id, **_):
+        room = self._find(self.rooms, int(room_id), "room")
+        return 200, [self.user_info(user_id) for user_id in room["users"]], {}
+
+    def room_logs(self, room_id, **_):
+        self._find(self.rooms, int(room_id), "room")
+        return 200, [log for log in self.logs if log["room_id"] == int(room_id)], {}
+
+    def update_room(self, method, room_id, kind, element_type, element, body):
+        self._find(self.rooms, int(room_id), "room")
+        event = ROOM_UPDATES.get((kind, method))
+        if event is None:
+            raise ApiError(405, "method not allowed")
+        data = {"id": element, "timestamp": timestamp(), **body}
+        if kind == "attribute":
+            data["type"] = element_type
+        receiver = body.get("receiver_id")
+        self.emit(event, data, room=None if receiver else int(room_id), user=receiver)
+        return 204, None, {}
+
+    def create_permissions(self, body, **_):
+        return self._create(self.permissions, "permissions", body)
+
+    def get_permissions(self, permissions_id, **_):
+        return self._get(self.permissions, "permissions", int(permissions_id))
+
+    def patch_permissions(self, permissions_id, body, if_match=None, **_):
+        return self._patch(
+            self.permissions, "permissions", int(permissions_id), body, if_match
+        )
+
+    def create_token(self, body, **_):
+        token = {
+            "id": str(uuid.uuid4()),
+            "permissions_id": body.get("permissions_id"),
+            "room_id": body.get("room_id"),
+            "task_id": body.get("task_id"),
+            "registrations_left": body.get("registrations_left", 1),
+        }
+        self.tokens[token["id"]] = token
+        return 200, token, {}
+
+    def get_token(self, token_id, **_):
+        token = self.tokens.get(token_id)
+        if token is None:
+            raise ApiError(404, "token not found")
+        return 200, token, {}
+
+    def create_user(self, body, **_):
+        token = self.tokens.get(body.get("token_id"))
+        if token is None:
+            raise ApiError(422, "token not found")
+        if token["registrations_left"] == 0:
+            raise ApiError(422, "token is used up")
+        if token["registrations_left"] > 0:
+            token["registrations_left"] -= 1
+
+        status, user, headers = self._create(
+            self.users,
+            "user",
+            {"name": body.get("name"), "token_id": token["id"], "rooms": []},
+        )
+        # slurk lets users enter the room of their token on login
+        if token.get("room_id") in self.rooms:
+            self._enter(user["id"], token["room_id"])
+            headers = {"ETag": self._etag("user", user["id"])}
+        return status, user, headers
+
+    def get_user(self, user_id, **_):
+        return self._get(self.users, "user", int(user_id))
+
+    def patch_user(self, user_id, body, if_match=None, **_):
+        return self._patch(self.users, "user", int(user_id), body, if_match)
+
+    def user_task(self, user_id, **_):
+        user = self._find(self.users, int(user_id), "user")
+        task_id = self.tokens[user["token_id"]].get("task_id")
+        return 200, self.tasks.get(task_id), {}
+
+    def user_permissions(self, user_id, **_):
+        user = self._find(self.users, int(user_id), "user")
+        permissions_id = self.tokens[user["token_id"]].get("permissions_id")
+        return self._get(self.permissions, "permissions", permissions_id)
+
+    def join_room(self, user_id, room_id, if_match=None, **_):
+        user_id, room_id = int(user_id), int(room_id)
+        user = self._find(self.users, user_id, "user")
+        self._find(self.rooms, room_id, "room")
+        self._check_etag("user", user_id, if_match)
+        self._enter(user_id, room_id)
+        return 200, user, {"ETag": self._etag("user", user_id)}
+
+    def leave_room(self, user_id, room_id, if_match=None, **_):
+        user_id, room_id = int(user_id), int(room_id)
+        user = self._find(self.users, user_id, "user")
+        room = self._find(self.rooms, room_id, "room")
+        self._check_etag("user", user_id, if_match)
+        if room_id not in user["rooms"]:
+            raise ApiError(404, "user is not in the room")
+
+        user["rooms"].remove(room_id)
+        room["users"].remove(user_id)
+        self._versions[("user", user_id)] += 1
+        if user_id in self.connected:
+            self.emit("left_room", {"room": room_id, "user": user_id}, user=user_id)
+            self._announce("leave", user_id, room_id)
+        return 200, user, {"ETag": self._etag("user", user_id)}
+
+    def create_task(self, body, **_):
+        return self._create(self.tasks, "task", body)
+
+    def get_task(self, task_id, **_):
+        return self._get(self.tasks, "task", int(task_id))
+
+    def create_log(self, body, token=None, **_):
+        # slurk logs the event as coming from the user of the token
+        user_id = next(
+            (user["id"] for user in self.users.values() if user["token_id"] == token),
+            None,
+        )
+        self._log(
+            body.get("event"),
+            user_id,
+            body.get("room_id"),
+            body.get("data", {}),
+            body.get("receiver_id"),
+        )
+        return 201, self.logs[-1], {}
+
+    # Socket.IO
+    def connect(self, token, user_id):
+        """A socket logs in.
+        :return: The user, None if the token does not belong to them
+        """
+        user = self.users.get(int(user_id)) if str(user_id).isdigit() else None
+        if user is None or user["token_id"] != token:
+            return None
+        if user["id"] not in self.connected:
+            self.connected.add(user["id"])
+            for room_id in user["rooms"]:
+                self._announce("join", user["id"], room_id)
+        return user
+
+    def disconnect(self, user_id):
+        if user_id not in self.connected:
+            return
+        self.connected.discard(user_id)
+        for room_id in self.users[user_id]["rooms"]:
+            self._announce("leave", user_id, room_id)
+
+    def on_text(self, user_id, data):
+        message = {
+            "message": data.get("message"),
+            "user": self.user_info(user_id),
+            "room": data.get("room"),
+            "timestamp": timestamp(),
+            "private": data.get("receiver_id") is not None,
+            "html": data.get("html", False),
+        }
+        self._forward("text_message", message, data)
+        self._log(
+            "text_message",
+            user_id,
+            data.get("room"),
+            {"message": message["message"], "html": message["html"]},
+            data.get("receiver_id"),
+        )
+        return True
+
+    def on_message_command(self, user_id, data):
+        command = {
+            "command": data.get("command"),
+            "user": self.user_info(user_id),
+            "room": data.get("room"),
+            "timestamp": timestamp(),
+        }
+        self._forward("command", command, data)
+        self._log(
+            "command",
+            user_id,
+            data.get("room"),
+            {"command": command["command"]},
+            data.get("receiver_id"),
+        )
+        return True
+
+    def on_mouse(self, user_id, data):
+        self._forward(
+            "mouse",
+            {**data, "user": self.user_info(user_id), "timestamp": timestamp()},
+            data,
+        )
+        self._log(
+            "mouse",
+            user_id,
+            data.get("room"),
+            {key: value for key, value in data.items() if key != "room"},
+        )
+        return True
+
+    def on_keypress(self, user_id, data):
+        event = "start_typing" if data.get("typing") else "stop_typing"
+        for room_id in self.users[user_id]["rooms"]:
+            self.emit(
+                event,
+                {
+                    "user": self.user_info(user_id),
+                    "room": room_id,
+                    "timestamp": timestamp(),
+                },
+                room=room_id,
+            )
+        return True
+
+    def on_room_created(self, user_id, data):
+        room = self._find(self.rooms, int(data["room"]), "room")
+        users = [self.user_info(member) for member in room["users"]]
+        self.emit(
+            "new_task_room",
+            {"room": room["id"], "task": data.get("task"), "users": users},
+        )
+        return True
+
+    def emit(self, event, data, room=None, user=None):
+        self.outbox.append((event, data, room, user))
+
+    def user_info(self, user_id):
+        return {"id": user_id, "name": self.users[user_id]["name"]}
+
+    def stats(self):
+        return {
+            "rooms": len(self.rooms),
+            "users": len(self.users),
+            "connected": len(self.connected),
+            "logs": len(self.logs),
+        }
+
+    def _forward(self, event, data, request):
+        receiver = request.get("receiver_id")
+        if receiver is not None:
+            self.emit(event, data, user=int(receiver))
+        else:
+            self.emit(event, data, room=request.get("room"))
+
+    def _enter(self, user_id, room_id):
+        user = self.users[user_id]
+        if room_id in user["rooms"]:
+            return
+        user["rooms"].append(room_id)
+        self.rooms[room_id]["users"].append(user_id)
+        self._versions[("user", user_id)] += 1
+        if user_id in self.connected:
+            self.emit("joined_room", {"room": room_id, "user": user_id}, user=user_id)
+            self._announce("join", user_id, room_id)
+
+    def _announce(self, kind, user_id, room_id):
+        """Tell a room that a user came or went and log it like slurk."""
+        self.emit("status", self._status(kind, user_id, room_id), room=room_id)
+        self._log(kind, user_id, room_id, {})
+
+    def _log(self, event, user_id, room_id, data, receiver_id=None):
+        self.logs.append(
+            {
+                "id": len(self.logs) + 1,
+                "date_created": timestamp(),
+                "event": event,
+                "user_id": user_id,
+                "room_id": room_id,
+                "receiver_id": receiver_id,
+                "data": data,
+            }
+        )
+
+    def _status(self, kind, user_id, room_id):
+        return {
+            "type": kind,
+            "user": self.user_info(user_id),
+            "room": room_id,
+            "timestamp": timestamp(),
+        }
+
+    def _create(self, objects, kind, body):
+        object_id = next(self._ids[kind])
+        objects[object_id] = {
+            **body,
+            "id": object_id,
+            "date_created": timestamp(),
+        }
+        self._versions[(kind, object_id)] = 1
+        return 200, objects[object_id], {"ETag": self._etag(kind, object_id)}
+
+    def _get(self, objects, kind, object_id):
+        return 200, self._find(objects, object_id, kind), {
+            "ETag": self._etag(kind, object_id)
+        }
+
+    def _patch(self, objects, kind, object_id, body, if_match):
+        found = self._find(objects, object_id, kind)
+        self._check_etag(kind, object_id, if_match)
+        found.update({key: value for key, value in body.items() if key != "id"})
+        self._versions[(kind, object_id)] += 1
+        return 200, found, {"ETag": self._etag(kind, object_id)}
+
+    @staticmethod
+    def _find(objects, object_id, kind):
+        found = objects.get(object_id)
+        if found is None:
+            raise ApiError(404, f"{kind} not found")
+        return found
+
+    def _etag(self, kind, object_id):
+        return f'"{kind}-{object_id}-{self._versions[(kind, object_id)]}"'
+
+    def _check_etag(self, kind, object_id, if_match):
+        if if_match is not None and if_match != self._etag(kind, object_id):
+            raise ApiError(412, "precondition failed")
+
+
+class Faults:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, event_latency=0.0):
+        """Delays and failures injected by the server.
+        :param latency: Seconds every API request is delayed
+        :type latency: float
+        :param jitter: Random extra delay of up to this many seconds
+        :type jitter: float
+        :param error_rate: Fraction of API requests answered with 503
+        :type error_rate: float
+        :param event_latency: Seconds every Socket.IO event is delayed
+        :type event_latency: float
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.event_latency = event_latency
+
+    def delay(self):
+        return self.latency + random.uniform(0, self.jitter)
+
+    def fail(self):
+        return random.random() < self.error_rate
+
+
+class FakeSlurk:
+    def __init__(self, state=None, faults=None):
+        """aiohttp application serving a `SlurkState` over HTTP and
+        Socket.IO, at the same paths as slurk."""
+        if web is None:
+            raise ImportError(
+                "the fake server requires aiohttp and python-socketio: "
+                "pip install aiohttp python-socketio"
+            )
+        self.state = state if state is not None else SlurkState()
+        self.faults = faults if faults is not None else Faults()
+
+        self.sio = socketio.AsyncServer(async_mode="aiohttp", cors_allowed_origins="*")
+        self.app = web.Application()
+        self.sio.attach(self.app)
+        self.app.router.add_route("*", "/slurk/api/{path:.*}", self.api)
+        self.app.router.add_get("/stats", self.stats)
+
+        self._sids = defaultdict(set)
+        self._users = dict()
+        self._counts = defaultdict(int)
+        self._started = time.monotonic()
+
+        self.sio.on("connect", self.on_connect)
+        self.sio.on("disconnect", self.on_disconnect)
+        for event, handler in (
+            ("text", self.state.on_text),
+            ("message_command", self.state.on_message_command),
+            ("mouse", self.state.on_mouse),
+            ("keypress", self.state.on_keypress),
+            ("room_created", self.state.on_room_created),
+        ):
+            self.sio.on(event, self._socket_handler(event, handler))
+
+    async def api(self, request):
+        path = "/" + request.match_info["path"]
+        route = re.sub(r"/(\d+|[0-9a-f-]{36})(?=/|$)", "/{id}", path)
+        self._counts[f"api {request.method} {route}"] += 1
+
+        await asyncio.sleep(self.faults.delay())
+        if self.faults.fail():
+            self._counts["injected_errors"] += 1
+            return web.json_response({"message": "injected error"}, status=503)
+
+        body = await request.json() if request.can_read_body else None
+        status, data, headers = self.state.handle(
+            request.method, path, body, dict(request.headers)
+        )
+        await self._deliver()
+        if status == 204:
+            return web.Response(status=204, headers=headers)
+        return web.json_response(data, status=status, headers=headers)
+
+    async def stats(self, request):
+        elapsed = time.monotonic() - self._started
+        requests = sum(
+            count for name, count in self._counts.items() if name.startswith("api ")
+        )
+        return web.json_response(
+            {
+                **self.state.stats(),
+                "uptime": elapsed,
+                "requests_per_second": requests / elapsed,
+                "counts": dict(self._counts),
+            }
+        )
+
+    async def on_connect(self, sid, environ, auth=None):
+        token = environ.get("HTTP_AUTHORIZATION", "").replace("Bearer ", "")
+        user = self.state.connect(token, environ.get("HTTP_USER", ""))
+        if user is None:
+            return False
+        self._sids[user["id"]].add(sid)
+        self._users[sid] = user["id"]
+        await self._deliver()
+
+    async def on_disconnect(self, sid):
+        user_id = self._users.pop(sid, None)
+        if user_id is None:
+            return
+        self._sids[user_id].discard(sid)
+        if not self._sids[user_id]:
+            self.state.disconnect(user_id)
+            await self._deliver()
+
+    def _socket_handler(self, event, handler):
+        async def on_event(sid, data):
+            self._counts[f"event {event}"] += 1
+            user_id = self._users.get(sid)
+            if user_id is None or not isinstance(data, dict):
+                return False, "not logged in"
+            if self.faults.event_latency:
+                await asyncio.sleep(self.faults.event_latency)
+            try:
+                result = handler(user_id, data)
+            except (ApiError, KeyError, ValueError) as error:
+                return False, str(error)
+            await self._deliver()
+            return result
+
+        return on_event
+
+    async def _deliver(self):
+        outbox, self.state.outbox = self.state.outbox, []
+        for event, data, room, user in outbox:
+            self._counts[f"emit {event}"] += 1
+            if user is not None:
+                receivers = self._sids.get(user, ())
+            elif room is not None:
+                room = self.state.rooms.get(room, {"users": ()})
+                receivers = [
+                    sid for member in room["users"] for sid in self._sids.get(member, ())
+                ]
+            else:
+                await self.sio.emit(event, data)
+                continue
+            for sid in list(receivers):
+                await self.sio.emit(event, data, to=sid)
+
+    def run(self, host="0.0.0.0", port=5000):
+        web.run_app(self.app, host=host, port=port, print=None, access_log=None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0", help="address to listen on")
+    parser.add_argument("--port", type=int, default=5000, help="port to listen on")
+    parser.add_argument(
+        "--api-token", default=DEFAULT_API_TOKEN, help="admin token of the API"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds each request is delayed"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0, help="random extra delay in seconds"
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="fraction of requests answered with 503",
+    )
+    parser.add_argument(
+        "--event-latency",
+        type=float,
+        default=0.0,
+        help="seconds each Socket.IO event is delayed",
+    )
+    parser.add_argument("--seed", type=int, help="seed for the injected faults")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(message)s")
+    random.seed(args.seed)
+    server = FakeSlurk(
+        SlurkState(args.api_token),
+        Faults(args.latency, args.jitter, args.error_rate, args.event_latency),
+    )
+    LOG.info(f"Fake slurk listening on {args.host}:{args.port}")
+    server.run(args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
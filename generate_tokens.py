@@ -1,47 +1,142 @@
 import argparse
+from concurrent.futures import as_completed, ThreadPoolExecutor
 import configparser
+import csv
 import json
 from pathlib import Path
 import sys
+import time
 
-import randomname
+try:
+    import randomname
+except ImportError:  # only needed for --complete-links
+    randomname = None
 import requests
 
+from provision import SlurkAdmin
 
-def create_permissions(permissions):
-    response = requests.post(
-        f"{SLURK_API}/permissions",
-        headers={"Authorization": f"Bearer {API_TOKEN}"},
-        json=permissions,
-    )
 
-    if not response.ok:
-        print("could not create permissions")
-        response.raise_for_status()
+# columns of the files written in bulk mode
+TOKEN_FIELDS = ["token", "task_id", "room_id", "permissions_id", "link"]
 
-    return response.json()["id"]
 
+def create_token(admin, permissions, room_id, task_id):
+    """Create a token, with new permissions if `permissions` is a dict
+    rather than the id of existing ones.
+    :return: The token and the id of its permissions
+    :rtype: tuple
+    """
+    if isinstance(permissions, dict):
+        permissions = admin.create_permissions(permissions)
+    return admin.create_token(permissions, room_id, task_id), permissions
 
-def create_token(permissions, room_id, task_id=None):
-    response = requests.post(
-        f"{SLURK_API}/tokens",
-        headers={"Authorization": f"Bearer {API_TOKEN}"},
-        json={
-            "permissions_id": permissions,
-            "room_id": room_id,
-            "registrations_left": 1,
-            "task_id": task_id,
-        },
-    )
 
-    if not response.ok:
-        print("could not create token")
-        response.raise_for_status()
+def read_tokens(path, room_id, task_id):
+    """Number of tokens a former bulk run wrote to a file.
+    :raise ValueError: If the file holds tokens of another room or task
+    """
+    if not path.exists():
+        return 0
+
+    with path.open(newline="", encoding="utf-8") as file:
+        if path.suffix == ".jsonl":
+            records = [json.loads(line) for line in file if line.strip()]
+        else:
+            records = list(csv.DictReader(file))
+
+    for record in records:
+        if (int(record["room_id"]), int(record["task_id"])) != (room_id, task_id):
+            raise ValueError(
+                f"{path} holds tokens of room {record['room_id']} and task "
+                f"{record['task_id']}, pass another file with --output"
+            )
+    return len(records)
+
+
+class TokenWriter:
+    def __init__(self, file, jsonl=False):
+        """Writes tokens to a CSV or JSONL file as they are created,
+        flushing every line so that an interrupted run keeps all tokens
+        created so far."""
+        self.file = file
+        self.jsonl = jsonl
+        if not jsonl:
+            self.writer = csv.DictWriter(file, fieldnames=TOKEN_FIELDS)
+            if file.tell() == 0:
+                self.writer.writeheader()
+
+    def write(self, record):
+        if self.jsonl:
+            self.file.write(json.dumps(record) + "\n")
+        else:
+            self.writer.writerow(record)
+        self.file.flush()
+
+
+def bulk(args, admin, permissions, room_id, task_id):
+    """Create the tokens missing in the `--output` file, `--workers` at
+    a time, with their own permissions or sharing `--permissions-pool`
+    permissions objects."""
+    output = Path(args.output)
+    existing = read_tokens(output, room_id, task_id)
+    missing = args.n_tokens - existing
+    if missing <= 0:
+        print(f"{output} already holds {existing} tokens")
+        return
+
+    # no pool: every token gets its own permissions, which bots such as
+    # recolage need to mute single users; sharing is opt-in
+    pool = [admin.create_permissions(permissions) for _ in range(args.permissions_pool)]
+
+    created = failed = 0
+    start = time.monotonic()
+    with output.open("a", newline="", encoding="utf-8") as file, ThreadPoolExecutor(
+        max_workers=args.workers
+    ) as executor:
+        writer = TokenWriter(file, jsonl=output.suffix == ".jsonl")
+        futures = [
+            executor.submit(
+                create_token,
+                admin,
+                pool[number % len(pool)] if pool else permissions,
+                room_id,
+                task_id,
+            )
+            for number in range(missing)
+        ]
+        for future in as_completed(futures):
+            try:
+                token, permissions_id = future.result()
+            except requests.RequestException:
+                failed += 1
+                continue
 
-    return response.json()["id"]
+            link = ""
+            if args.complete_links is True:
+                link = admin.login_link(token, randomname.get_name())
+            writer.write(
+                {
+                    "token": token,
+                    "task_id": task_id,
+                    "room_id": room_id,
+                    "permissions_id": permissions_id,
+                    "link": link,
+                }
+            )
+            created += 1
+
+    elapsed = max(time.monotonic() - start, 1e-6)
+    print(
+        f"created {created} tokens in {elapsed:.1f}s "
+        f"({created / elapsed:.1f} tokens/s), {failed} failed; "
+        f"{output} holds {existing + created} of {args.n_tokens} tokens"
+    )
+    if failed:
+        print("run the same command again to create the missing tokens")
+        sys.exit(1)
 
 
-def main(args):
+def main(args, admin):
     if args.user_permissions is None:
         user_permissions_dict = {"send_message": True, "send_command": True}
 
@@ -50,14 +145,18 @@ def main(args):
             Path(args.user_permissions).read_text(encoding="utf-8")
         )
 
+    if args.output is not None:
+        bulk(args, admin, user_permissions_dict, WAITING_ROOM_ID, TASK_ID)
+        return
+
     for user in range(args.n_tokens):
-        user_permissions_id = create_permissions(user_permissions_dict)
-        user_token = create_token(
+        user_permissions_id = admin.create_permissions(user_permissions_dict)
+        user_token = admin.create_token(
             user_permissions_id, WAITING_ROOM_ID, TASK_ID
         )
 
         if args.complete_links is True:
-            print(f"{SLURK_HOST}/login?name={randomname.get_name()}&token={user_token}")
+            print(admin.login_link(user_token, randomname.get_name()))
         else:
             print(user_token)
 
@@ -108,13 +207,31 @@ if __name__ == "__main__":
         help="read slurk and bot parameters from a configuration file"
         
     )
+    parser.add_argument(
+        "--output",
+        help="bulk mode: write the tokens to this .csv or .jsonl file as they are created, a second run with the same file only creates the tokens still missing",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=16,
+        help="bulk mode: number of tokens created at once",
+    )
+    parser.add_argument(
+        "--permissions-pool",
+        type=int,
+        default=0,
+        help="bulk mode: number of permissions objects shared by the tokens, by default every token gets its own; only share them for bots that never change the permissions of a single user",
+    )
 
     args = parser.parse_args()
 
+    if args.complete_links is True and randomname is None:
+        parser.error("--complete-links needs the randomname package")
+
     # define some variables here
-    SLURK_HOST = args.slurk_host
-    SLURK_API = f"{args.slurk_host}/slurk/api"
-    API_TOKEN = args.slurk_api_token
+    slurk_host = args.slurk_host
+    api_token = args.slurk_api_token
 
     TASK_ID = args.task_id
     WAITING_ROOM_ID = args.waiting_room_id
@@ -134,13 +251,13 @@ if __name__ == "__main__":
         if any(config["BOT"].get(i) is None for i in ["task_id", "waiting_room_id"]):
             raise ValueError("Config file is missing slurk entries")
 
-        slurk_address = config.get("SLURK", "host")
-        SLURK_HOST = slurk_address
-        SLURK_API = f"{slurk_address}/slurk/api"
-        API_TOKEN = config.get("SLURK", "token")
+        slurk_host = config.get("SLURK", "host")
+        api_token = config.get("SLURK", "token")
 
         TASK_ID = int(config.get("BOT", "task_id"))
         WAITING_ROOM_ID = int(config.get("BOT", "waiting_room_id"))
 
+    admin = SlurkAdmin(slurk_host, api_token, pool_size=max(args.workers, 1))
+
     # start bot
-    main(args)
+    main(args, admin)
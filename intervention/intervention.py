@@ -1,10 +1,9 @@
 import argparse
 import logging
 import os
-from threading import Timer
 
-import requests
-import socketio
+from common.scheduler import schedule
+from templates import ApiClient, InstrumentedClient, close_room
 
 
 LOG = logging.getLogger(__name__)
@@ -20,16 +19,12 @@ class RoomTimer:
         self.left_room = dict()
 
     def start_timer(self):
-        self.timer = Timer(
-            TIMEOUT_TIMER*60,
-            self.function,
-            args=[self.room_id]
+        self.timer = schedule(
+            TIMEOUT_TIMER * 60, self.function, self.room_id, group=self.room_id
         )
-        self.timer.start()
 
     def reset(self):
-        self.timer.cancel()
-        self.start_timer()
+        self.timer.reset()
         LOG.info("reset timer")
 
     def cancel(self):
@@ -41,16 +36,13 @@ class RoomTimer:
             self.left_room[user].cancel()
 
     def user_left(self, user):
-        self.left_room[user] = Timer(
-            LEAVE_TIMER*60,
-            self.function,
-            args=[self.room_id, self.game]
+        self.left_room[user] = schedule(
+            LEAVE_TIMER * 60, self.function, self.room_id, self.game, group=self.room_id
         )
-        self.left_room[user].start()
 
 
 class InterventionBot:
-    sio = socketio.Client(logger=True)
+    sio = InstrumentedClient(logger=True)
     task_id = None
 
     def __init__(self, token, user, host, port):
@@ -61,6 +53,7 @@ class InterventionBot:
         if port is not None:
             self.uri += f":{port}"
         self.uri += "/slurk/api"
+        self.api = ApiClient(self.uri, self.token)
 
         LOG.info(f"Running intervention bot on {self.uri} with token {self.token}")
 
@@ -80,13 +73,6 @@ class InterventionBot:
         # wait until the connection with the server ends
         self.sio.wait()
 
-    @staticmethod
-    def message_callback(success, error_msg="Unknown Error"):
-        if not success:
-            LOG.error(f"Could not send message: {error_msg}")
-            exit(1)
-        LOG.debug("Sent message successfully.")
-
     def register_callbacks(self):
         @self.sio.event
         def status(data):
@@ -115,10 +101,7 @@ class InterventionBot:
             room_id = data["room"]
             task_id = data["task"]
             if self.task_id is None or task_id == self.task_id:
-                response = requests.post(
-                    f"{self.uri}/users/{self.user}/rooms/{room_id}",
-                    headers={"Authorization": f"Bearer {self.token}"},
-                )
+                response = self.api.post(f"/users/{self.user}/rooms/{room_id}")
                 if not response.ok:
                     LOG.error(
                         f"Could not let intervention bot join room: {response.status_code}"
@@ -166,7 +149,7 @@ class InterventionBot:
             # (the user who sent will see the original; has already seen it)
             for user in self.players_per_room[room_id]:
                 if user["id"] != user_id:
-                    self.sio.emit(
+                    self.sio.emit_acked(
                         "text",
                         {
                             "room": data["room"],
@@ -174,54 +157,18 @@ class InterventionBot:
                             "message": message,
                             "impersonate": user_id,
                         },
-                        callback=self.message_callback,
                     )
 
     def close_game(self, room_id):
         self.room_to_read_only(room_id)
         self.timers_per_room.pop(room_id)
         self.players_per_room.pop(room_id)
+        self.sio.forget_room(room_id)
 
     def room_to_read_only(self, room_id):
-        """Set room to read only."""
-        # set room to read-only
-        response = requests.patch(
-            f"{self.uri}/rooms/{room_id}/attribute/id/text",
-            json={"attribute": "readonly", "value": "True"},
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
-        if not response.ok:
-            logging.error(f"Could not set room to read_only: {response.status_code}")
-            response.raise_for_status()
-        response = requests.patch(
-            f"{self.uri}/rooms/{room_id}/attribute/id/text",
-            json={"attribute": "placeholder", "value": "This room is read-only"},
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
-        if not response.ok:
-            logging.error(f"Could not set room to read_only: {response.status_code}")
-            response.raise_for_status()
-
-        for user in self.players_per_room[room_id]:
-            response = requests.get(
-                f"{self.uri}/users/{user['id']}",
-                headers={"Authorization": f"Bearer {self.token}"},
-            )
-            if not response.ok:
-                logging.error(f"Could not get user: {response.status_code}")
-                response.raise_for_status()
-            etag = response.headers["ETag"]
-
-            response = requests.delete(
-                f"{self.uri}/users/{user['id']}/rooms/{room_id}",
-                headers={"If-Match": etag, "Authorization": f"Bearer {self.token}"},
-            )
-            if not response.ok:
-                logging.error(
-                    f"Could not remove user from task room: {response.status_code}"
-                )
-                response.raise_for_status()
-            logging.debug("Removing user from task room was successful.")
+        """Set room to read only and remove the players from it."""
+        users = [user["id"] for user in self.players_per_room[room_id]]
+        close_room(self.api, room_id, users)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,503 @@
+"""Scripted participants to load test a running bot.
+
+Creates tokens for pairs of participants, lets them enter the waiting
+room following a ramp-up profile and, once the concierge has moved a
+pair to a task room, plays a scripted game there. Reports the response
+latency of the bot per action, how long rooms took to finish and how
+many actions went unanswered.
+
+    python loadtest.py wordle --pairs 50 --ramp linear:60 \\
+        --waiting-room-id 1 --task-id 2 --slurk-host http://localhost:5000
+
+The concierge and the bot have to be running, e.g. against
+`fake_slurk.py`.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+from pathlib import Path
+import random
+import time
+
+try:
+    import aiohttp
+    import socketio
+except ImportError:  # the reporting helpers work without them
+    aiohttp = socketio = None
+
+
+LOG = logging.getLogger(__name__)
+
+# events the bot causes in a task room
+BOT_EVENTS = (
+    "text_message",
+    "command",
+    "attribute_update",
+    "attribute_remove",
+    "text_update",
+    "class_add",
+    "class_remove",
+)
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of `values`, None if empty.
+    :param q: Percentile between 0 and 100
+    :type q: float
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def ramp_schedule(pairs, profile):
+    """Seconds after the start at which each pair arrives.
+    :param profile: `all` at once, `linear:SECONDS` spread evenly or
+        `step:PAIRS:SECONDS` in batches
+    :type profile: str
+    :rtype: list
+    """
+    kind, *values = profile.split(":")
+    if kind == "all" and not values:
+        return [0.0] * pairs
+    if kind == "linear" and len(values) == 1:
+        duration = float(values[0])
+        return [duration * pair / pairs for pair in range(pairs)]
+    if kind == "step" and len(values) == 2:
+        size, interval = int(values[0]), float(values[1])
+        return [interval * (pair // size) for pair in range(pairs)]
+    raise ValueError(f"unknown ramp-up profile: {profile}")
+
+
+class Report:
+    def __init__(self):
+        """Response latencies per action and completion times of rooms."""
+        self.latencies = dict()
+        self.errors = dict()
+        self.completed = list()
+        self.rooms_started = 0
+        self.rooms_failed = 0
+        self.connection_errors = 0
+        self.started = time.monotonic()
+
+    def action(self, name, latency=None):
+        """Record an answered action, or a failed one if `latency` is
+        None."""
+        self.latencies.setdefault(name, [])
+        self.errors.setdefault(name, 0)
+        if latency is None:
+            self.errors[name] += 1
+        else:
+            self.latencies[name].append(latency)
+
+    def room(self, duration=None):
+        """Record a finished room, or one that did not finish in time
+        if `duration` is None."""
+        if duration is None:
+            self.rooms_failed += 1
+        else:
+            self.completed.append(duration)
+
+    def summary(self):
+        actions = dict()
+        for name, latencies in sorted(self.latencies.items()):
+            total = len(latencies) + self.errors[name]
+            actions[name] = {
+                "count": total,
+                "error_rate": self.errors[name] / total if total else 0.0,
+                **{
+                    f"p{q}": percentile(latencies, q)
+                    for q in (50, 90, 99)
+                },
+                "max": max(latencies, default=None),
+            }
+        return {
+            "duration": time.monotonic() - self.started,
+            "connection_errors": self.connection_errors,
+            "actions": actions,
+            "rooms": {
+                "started": self.rooms_started,
+                "completed": len(self.completed),
+                "failed": self.rooms_failed,
+                **{
+                    f"p{q}": percentile(self.completed, q)
+                    for q in (50, 90, 99)
+                },
+            },
+        }
+
+    def render(self):
+        summary = self.summary()
+
+        def ms(value):
+            return "-" if value is None else f"{value * 1e3:.0f}"
+
+        lines = [
+            f"{'action':<14}{'count':>8}{'errors':>9}"
+            f"{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+        ]
+        for name, values in summary["actions"].items():
+            lines.append(
+                f"{name:<14}{values['count']:>8}{values['error_rate']:>9.1%}"
+                f"{ms(values['p50']):>9}{ms(values['p90']):>9}"
+                f"{ms(values['p99']):>9}{ms(values['max']):>9}"
+            )
+
+        rooms = summary["rooms"]
+        lines.append("")
+        lines.append(
+            f"rooms: {rooms['started']} started, {rooms['completed']} completed, "
+            f"{rooms['failed']} not finished in time"
+        )
+        if rooms["completed"]:
+            lines.append(
+                "completion time (s): "
+                f"p50 {rooms['p50']:.1f}, p90 {rooms['p90']:.1f}, "
+                f"p99 {rooms['p99']:.1f}"
+            )
+        lines.append(f"connection errors: {summary['connection_errors']}")
+        return "\n".join(lines)
+
+
+class Participant:
+    def __init__(self, run, user_id, name, token):
+        """A scripted user with its own Socket.IO connection."""
+        self.run = run
+        self.user_id = user_id
+        self.name = name
+        self.token = token
+
+        self.room = None
+        self.closed = asyncio.Event()
+        self.inbox = asyncio.Queue()
+        self.sio = socketio.AsyncClient()
+        self.sio.on("joined_room", self.on_joined_room)
+        self.sio.on("left_room", self.on_left_room)
+        for event in BOT_EVENTS:
+            self.sio.on(event, self._collect(event))
+
+    async def connect(self):
+        await self.sio.connect(
+            self.run.host,
+            headers={"Authorization": f"Bearer {self.token}", "user": str(self.user_id)},
+            namespaces="/",
+        )
+
+    async def act(self, name, event, data, expect=True):
+        """Emit an event into the task room and measure the time until
+        the bot reacts.
+        :param expect: Whether the bot answers this action at all
+        :type expect: bool
+        """
+        while not self.inbox.empty():
+            self.inbox.get_nowait()
+
+        start = time.monotonic()
+        await self.sio.emit(event, {**data, "room": self.room})
+        if not expect:
+            return
+        try:
+            await asyncio.wait_for(self.inbox.get(), self.run.action_timeout)
+        except asyncio.TimeoutError:
+            self.run.report.action(name)
+        else:
+            self.run.report.action(name, time.monotonic() - start)
+
+    async def settle(self, quiet=1.0):
+        """Wait until the bot has been silent for `quiet` seconds, e.g.
+        after a greeting."""
+        while True:
+            try:
+                await asyncio.wait_for(self.inbox.get(), quiet)
+            except asyncio.TimeoutError:
+                return
+
+    async def on_joined_room(self, data):
+        # each participant plays a single game
+        if self.room is None and data["room"] != self.run.waiting_room:
+            self.room = data["room"]
+            self.run.arrived(self, data["room"])
+
+    async def on_left_room(self, data):
+        if data["room"] == self.room:
+            self.closed.set()
+
+    def _collect(self, event):
+        async def collect(data):
+            user = data.get("user") if isinstance(data, dict) else None
+            if isinstance(user, dict) and user.get("id") in self.run.participants:
+                return
+            if isinstance(data, dict) and data.get("room") not in {None, self.room}:
+                return
+            self.inbox.put_nowait((event, data))
+
+        return collect
+
+
+async def play_wordle(run, players):
+    """Both players enter the same guess; every sixth guess ends the
+    round, so a room lasts at most six guesses per image."""
+    first, second = players
+    for _ in range(run.max_actions // 12):
+        for remaining in range(6, 0, -1):
+            command = {"guess": random.choice(run.words), "remaining": remaining}
+            for player in (first, second):
+                await player.act("guess", "message_command", {"command": command})
+                if player.closed.is_set():
+                    return
+
+
+async def play_dito(run, players):
+    """Both players type /ready, exchange three messages each and type
+    /difference, for every image."""
+    for player in players:
+        await player.act("ready", "message_command", {"command": "ready"})
+    for _ in range(run.max_actions // 10):
+        for turn in range(3):
+            for player in players:
+                await player.act(
+                    "message",
+                    "text",
+                    {"message": f"on my image there is something number {turn}"},
+                    expect=False,
+                )
+        for player in players:
+            await player.act(
+                "difference",
+                "message_command",
+                {"command": "difference the colour of the car"},
+            )
+            if player.closed.is_set():
+                return
+
+
+async def play_recolage(run, players):
+    """The first player becomes the wizard. The other describes, the
+    wizard clicks somewhere on the board and the selection is confirmed.
+    """
+    wizard, player = players
+    await wizard.act("role", "message_command", {"command": "role:wizard"})
+    for _ in range(run.max_actions // 3):
+        await player.act(
+            "description", "text", {"message": "the red piece"}, expect=False
+        )
+        await wizard.act(
+            "click",
+            "mouse",
+            {
+                "type": "click",
+                "coordinates": {
+                    "x": random.uniform(0, run.board_size),
+                    "y": random.uniform(0, run.board_size),
+                    "block_size": run.board_size / 20,
+                },
+                "element_id": "#overlayer",
+            },
+        )
+        await player.act(
+            "confirm",
+            "message_command",
+            {"command": {"event": "confirm_selection", "answer": "yes"}},
+        )
+        if player.closed.is_set():
+            return
+
+
+GAMES = {"wordle": play_wordle, "dito": play_dito, "recolage": play_recolage}
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.host = args.slurk_host
+        self.api = f"{args.slurk_host}/slurk/api"
+        self.api_token = args.slurk_api_token
+        self.waiting_room = args.waiting_room_id
+        self.task = args.task_id
+        self.pairs = args.pairs
+        self.ramp = ramp_schedule(args.pairs, args.ramp)
+        self.game = GAMES[args.game]
+        self.action_timeout = args.action_timeout
+        self.room_timeout = args.room_timeout
+        self.max_actions = args.max_actions
+        self.board_size = args.board_size
+        self.permissions = args.permissions
+        self.words = [
+            line.split("\t")[0]
+            for line in Path(args.words).read_text(encoding="utf-8").splitlines()
+            if line.strip()
+        ]
+
+        self.report = Report()
+        self.participants = dict()
+        self.rooms = dict()
+        self.games = list()
+
+    async def run(self):
+        async with aiohttp.ClientSession(
+            headers={"Authorization": f"Bearer {self.api_token}"}
+        ) as session:
+            pairs = [
+                await asyncio.gather(
+                    self.create_participant(session, 2 * pair),
+                    self.create_participant(session, 2 * pair + 1),
+                )
+                for pair in range(self.pairs)
+            ]
+
+        self.report.started = time.monotonic()
+        await asyncio.gather(
+            *(self.arrive(pair, delay) for pair, delay in zip(pairs, self.ramp))
+        )
+        # games are started as the concierge fills the task rooms
+        deadline = self.ramp[-1] + self.room_timeout if self.ramp else 0
+        while len(self.games) < self.pairs and time.monotonic() - self.report.started < deadline:
+            await asyncio.sleep(0.5)
+        await asyncio.gather(*self.games)
+
+        for participant in self.participants.values():
+            await participant.sio.disconnect()
+
+    async def create_participant(self, session, index):
+        async def post(path, body):
+            async with session.post(f"{self.api}{path}", json=body) as response:
+                response.raise_for_status()
+                return await response.json()
+
+        permissions = await post("/permissions", self.permissions)
+        token = await post(
+            "/tokens",
+            {
+                "permissions_id": permissions["id"],
+                "room_id": self.waiting_room,
+                "task_id": self.task,
+                "registrations_left": 1,
+            },
+        )
+        name = f"load-{index}"
+        user = await post("/users", {"name": name, "token_id": token["id"]})
+        participant = Participant(self, user["id"], name, token["id"])
+        self.participants[user["id"]] = participant
+        return participant
+
+    async def arrive(self, pair, delay):
+        await asyncio.sleep(delay)
+        for participant in pair:
+            try:
+                await participant.connect()
+            except Exception:
+                LOG.exception(f"{participant.name} could not connect")
+                self.report.connection_errors += 1
+
+    def arrived(self, participant, room_id):
+        players = self.rooms.setdefault(room_id, [])
+        players.append(participant)
+        if len(players) == 2:
+            self.report.rooms_started += 1
+            self.games.append(asyncio.ensure_future(self.play(room_id, players)))
+
+    async def play(self, room_id, players):
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(self._play(players), self.room_timeout)
+        except asyncio.TimeoutError:
+            LOG.warning(f"Room {room_id} did not finish in time")
+            self.report.room()
+        except Exception:
+            LOG.exception(f"Game in room {room_id} failed")
+            self.report.room()
+        else:
+            self.report.room(time.monotonic() - start)
+
+    async def _play(self, players):
+        await asyncio.gather(*(player.settle() for player in players))
+        await self.game(self, players)
+        await asyncio.gather(*(player.closed.wait() for player in players))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0],
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("game", choices=sorted(GAMES), help="scripted game to play")
+    parser.add_argument("--pairs", type=int, default=10, help="number of pairs")
+    parser.add_argument(
+        "--ramp",
+        default="all",
+        help="arrival of the pairs: all, linear:SECONDS or step:PAIRS:SECONDS",
+    )
+    parser.add_argument(
+        "--slurk-host",
+        default="http://127.0.0.1:5000",
+        help="address of the slurk server",
+    )
+    parser.add_argument(
+        "--slurk-api-token",
+        default="00000000-0000-0000-0000-000000000000",
+        help="slurk token with api permissions",
+    )
+    parser.add_argument(
+        "--waiting-room-id", type=int, required=True, help="waiting room of the task"
+    )
+    parser.add_argument("--task-id", type=int, required=True, help="task to test")
+    parser.add_argument(
+        "--user-permissions",
+        help="path to the file containing the user permissions",
+    )
+    parser.add_argument(
+        "--words",
+        default="wordle/data/image_data.tsv",
+        help="file with one wordle guess at the start of each line",
+    )
+    parser.add_argument(
+        "--board-size",
+        type=float,
+        default=600,
+        help="size of the recolage board in pixels",
+    )
+    parser.add_argument(
+        "--action-timeout",
+        type=float,
+        default=10,
+        help="seconds to wait for the bot to answer an action",
+    )
+    parser.add_argument(
+        "--room-timeout",
+        type=float,
+        default=900,
+        help="seconds a room may take until it is closed",
+    )
+    parser.add_argument(
+        "--max-actions",
+        type=int,
+        default=600,
+        help="actions per room after which a game stops",
+    )
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    if args.user_permissions is None:
+        args.permissions = {"send_message": True, "send_command": True}
+    else:
+        args.permissions = json.loads(
+            Path(args.user_permissions).read_text(encoding="utf-8")
+        )
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(message)s")
+    load_test = LoadTest(args)
+    asyncio.run(load_test.run())
+
+    print(load_test.report.render())
+    if args.json:
+        Path(args.json).write_text(
+            json.dumps(load_test.report.summary(), indent=2), encoding="utf-8"
+        )
+
+
+if __name__ == "__main__":
+    main()
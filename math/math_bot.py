@@ -4,10 +4,9 @@ import logging
 import os
 from pathlib import Path
 import re
-from threading import Timer
 
-import requests
-import socketio
+from common.scheduler import schedule
+from templates import ApiClient, InstrumentedClient, close_room
 
 
 LOG = logging.getLogger(__name__)
@@ -28,16 +27,12 @@ class RoomTimer:
         self.left_room = dict()
 
     def start_timer(self):
-        self.timer = Timer(
-            TIMEOUT_TIMER*60,
-            self.function,
-            args=[self.room_id]
+        self.timer = schedule(
+            TIMEOUT_TIMER * 60, self.function, self.room_id, group=self.room_id
         )
-        self.timer.start()
 
     def reset(self):
-        self.timer.cancel()
-        self.start_timer()
+        self.timer.reset()
         LOG.info("reset timer")
 
     def cancel(self):
@@ -49,16 +44,13 @@ class RoomTimer:
             self.left_room[user].cancel()
 
     def user_left(self, user):
-        self.left_room[user] = Timer(
-            LEAVE_TIMER*60,
-            self.function,
-            args=[self.room_id]
+        self.left_room[user] = schedule(
+            LEAVE_TIMER * 60, self.function, self.room_id, group=self.room_id
         )
-        self.left_room[user].start()
 
 
 class MathBot:
-    sio = socketio.Client(logger=True)
+    sio = InstrumentedClient(logger=True)
     task_id = None
 
     def __init__(self, token, user, host, port):
@@ -73,6 +65,7 @@ class MathBot:
         if port is not None:
             self.uri += f":{port}"
         self.uri += "/slurk/api"
+        self.api = ApiClient(self.uri, self.token)
 
         self.room_to_q = dict()
         self.players_per_room = dict()
@@ -92,14 +85,6 @@ class MathBot:
         # wait until the connection with the server ends
         self.sio.wait()
 
-    @staticmethod
-    def message_callback(success, error_msg="Unknown Error"):
-        """Verify whether an emit was succesful."""
-        if not success:
-            LOG.error(f"Could not send message: {error_msg}")
-            exit(1)
-        LOG.debug("Sent message successfully.")
-
     def register_callbacks(self):
         @self.sio.event
         def status(data):
@@ -125,10 +110,7 @@ class MathBot:
             room_id = data["room"]
             task_id = data["task"]
             if self.task_id is None or task_id == self.task_id:
-                response = requests.post(
-                    f"{self.uri}/users/{self.user}/rooms/{room_id}",
-                    headers={"Authorization": f"Bearer {self.token}"},
-                )
+                response = self.api.post(f"/users/{self.user}/rooms/{room_id}")
                 if not response.ok:
                     LOG.error(
                         f"Could not let math bot join room: {response.status_code}"
@@ -136,20 +118,17 @@ class MathBot:
                     response.raise_for_status()
                 LOG.debug("Math bot joins new task room", data)
 
-                response = requests.patch(
-                    f"{self.uri}/rooms/{room_id}/text/instr",
+                response = self.api.patch(
+                    f"/rooms/{room_id}/text/instr",
                     json={"text": TASK_DESCR},
-                    headers={"Authorization": f"Bearer {self.token}"},
                 )
-                response = requests.patch(
-                    f"{self.uri}/rooms/{room_id}/text/instr_title",
+                response = self.api.patch(
+                    f"/rooms/{room_id}/text/instr_title",
                     json={"text": TASK_TITLE},
-                    headers={"Authorization": f"Bearer {self.token}"},
                 )
-                response = requests.patch(
-                    f"{self.uri}/rooms/{room_id}/attribute/id/current-image",
+                response = self.api.patch(
+                    f"/rooms/{room_id}/attribute/id/current-image",
                     json={"attribute": "src", "value": IMG_LINK},
-                    headers={"Authorization": f"Bearer {self.token}"},
                 )
 
                 # keep track of users per room
@@ -190,14 +169,13 @@ class MathBot:
                 self._give_answer(room_id, user_id, cmd)
             else:
                 # inform the user in case of an invalid command
-                self.sio.emit(
+                self.sio.emit_acked(
                     "text",
                     {
                         "message": f"`{cmd}` is not a valid command.",
                         "room": room_id,
                         "receiver_id": user_id,
                     },
-                    callback=self.message_callback,
                 )
 
     def _set_question(self, room_id, user_id, cmd):
@@ -205,14 +183,13 @@ class MathBot:
         solution = self._eval(question)
 
         if solution is None:
-            self.sio.emit(
+            self.sio.emit_acked(
                 "text",
                 {
                     "message": "Questions must be mathematical expressions.",
                     "room": room_id,
                     "receiver_id": user_id,
                 },
-                callback=self.message_callback,
             )
         else:
             self.room_to_q[room_id] = {
@@ -220,13 +197,12 @@ class MathBot:
                 "solution": solution,
                 "sender": user_id,
             }
-            self.sio.emit(
+            self.sio.emit_acked(
                 "text",
                 {
                     "message": f"A new question has been created:\n{question}",
                     "room": room_id,
                 },
-                callback=self.message_callback,
             )
 
     def _give_answer(self, room_id, user_id, cmd):
@@ -234,53 +210,47 @@ class MathBot:
         prop_solution = self._eval(answer, answer=True)
 
         if room_id not in self.room_to_q:
-            self.sio.emit(
+            self.sio.emit_acked(
                 "text",
                 {
                     "message": "Oops, no question found you could answer!",
                     "room": room_id,
                     "receiver_id": user_id,
                 },
-                callback=self.message_callback,
             )
         elif self.room_to_q[room_id]["sender"] == user_id:
-            self.sio.emit(
+            self.sio.emit_acked(
                 "text",
                 {
                     "message": "Come on! Don't answer your own question.",
                     "room": room_id,
                     "receiver_id": user_id,
                 },
-                callback=self.message_callback,
             )
         elif prop_solution is None:
-            self.sio.emit(
+            self.sio.emit_acked(
                 "text",
                 {
                     "message": "What? Sure that's a number?",
                     "room": room_id,
                     "receiver_id": user_id,
                 },
-                callback=self.message_callback,
             )
         else:
-            self.sio.emit(
+            self.sio.emit_acked(
                 "text",
                 {"message": f"The proposed answer is: {answer}", "room": room_id},
-                callback=self.message_callback,
             )
             if prop_solution == self.room_to_q[room_id]["solution"]:
-                self.sio.emit(
+                self.sio.emit_acked(
                     "text",
                     {"message": "Wow! That's indeed correct.", "room": room_id},
-                    callback=self.message_callback,
                 )
                 self.room_to_q.pop(room_id)
             else:
-                self.sio.emit(
+                self.sio.emit_acked(
                     "text",
                     {"message": "Naahh. Try again!", "room": room_id},
-                    callback=self.message_callback,
                 )
 
     @staticmethod
@@ -317,55 +287,11 @@ class MathBot:
         self.timers_per_room.pop(room_id)
         if room_id in self.room_to_q:
             self.room_to_q.pop(room_id)
+        self.sio.forget_room(room_id)
 
     def room_to_read_only(self, room_id):
-        """Set room to read only."""
-        # set room to read-only
-        response = requests.patch(
-            f"{self.uri}/rooms/{room_id}/attribute/id/text",
-            json={"attribute": "readonly", "value": "True"},
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
-        if not response.ok:
-            logging.error(f"Could not set room to read_only: {response.status_code}")
-            response.raise_for_status()
-        response = requests.patch(
-            f"{self.uri}/rooms/{room_id}/attribute/id/text",
-            json={"attribute": "placeholder", "value": "This room is read-only"},
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
-        if not response.ok:
-            logging.error(f"Could not set room to read_only: {response.status_code}")
-            response.raise_for_status()
-
-        response = requests.get(
-            f"{self.uri}/rooms/{room_id}/users",
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
-        if not response.ok:
-            logging.error(f"Could not get user: {response.status_code}")
-
-        users = response.json()
-        for user in users:
-            response = requests.get(
-                f"{self.uri}/users/{user['id']}",
-                headers={"Authorization": f"Bearer {self.token}"},
-            )
-            if not response.ok:
-                logging.error(f"Could not get user: {response.status_code}")
-                response.raise_for_status()
-            etag = response.headers["ETag"]
-
-            response = requests.delete(
-                f"{self.uri}/users/{user['id']}/rooms/{room_id}",
-                headers={"If-Match": etag, "Authorization": f"Bearer {self.token}"},
-            )
-            if not response.ok:
-                logging.error(
-                    f"Could not remove user from task room: {response.status_code}"
-                )
-                response.raise_for_status()
-            logging.debug("Removing user from task room was successful.")
+        """Set room to read only and remove everyone from it."""
+        close_room(self.api, room_id)
 
     def close_game(self, room_id):
         self.room_to_read_only(room_id)
@@ -373,55 +299,11 @@ class MathBot:
         for game_dict in [self.room_to_q, self.players_per_room]:
             if room_id in game_dict:
                 game_dict.pop(room_id)
+        self.sio.forget_room(room_id)
 
     def room_to_read_only(self, room_id):
-        """Set room to read only."""
-        # set room to read-only
-        response = requests.patch(
-            f"{self.uri}/rooms/{room_id}/attribute/id/text",
-            json={"attribute": "readonly", "value": "True"},
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
-        if not response.ok:
-            logging.error(f"Could not set room to read_only: {response.status_code}")
-            response.raise_for_status()
-        response = requests.patch(
-            f"{self.uri}/rooms/{room_id}/attribute/id/text",
-            json={"attribute": "placeholder", "value": "This room is read-only"},
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
-        if not response.ok:
-            logging.error(f"Could not set room to read_only: {response.status_code}")
-            response.raise_for_status()
-
-        response = requests.get(
-            f"{self.uri}/rooms/{room_id}/users",
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
-        if not response.ok:
-            logging.error(f"Could not get user: {response.status_code}")
-
-        users = response.json()
-        for user in users:
-            response = requests.get(
-                f"{self.uri}/users/{user['id']}",
-                headers={"Authorization": f"Bearer {self.token}"},
-            )
-            if not response.ok:
-                logging.error(f"Could not get user: {response.status_code}")
-                response.raise_for_status()
-            etag = response.headers["ETag"]
-
-            response = requests.delete(
-                f"{self.uri}/users/{user['id']}/rooms/{room_id}",
-                headers={"If-Match": etag, "Authorization": f"Bearer {self.token}"},
-            )
-            if not response.ok:
-                logging.error(
-                    f"Could not remove user from task room: {response.status_code}"
-                )
-                response.raise_for_status()
-            logging.debug("Removing user from task room was successful.")
+        """Set room to read only and remove everyone from it."""
+        close_room(self.api, room_id)
 
 
 if __name__ == "__main__":
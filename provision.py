@@ -0,0 +1,288 @@
+"""Creating the objects a bot needs on a slurk server: layouts, rooms,
+tasks, permissions, tokens and users."""
+
+from contextlib import contextmanager
+import hashlib
+import json
+import os
+from pathlib import Path
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class SlurkAdmin:
+    def __init__(
+        self,
+        host,
+        token,
+        pool_size=16,
+        retries=3,
+        timeout=30.0,
+        session=None,
+        cache=None,
+    ):
+        """Pooled access to the slurk API with an admin token, shared by
+        all threads provisioning objects.
+
+        Connections are kept alive and reused. Connecting is retried
+        with backoff, but a request the server has received is never
+        sent again: creating objects is not idempotent.
+        :param host: Address of the slurk server, e.g. `http://localhost:5000`
+        :type host: str
+        :param token: Token with api permissions
+        :type token: str
+        :param pool_size: Maximum number of kept-alive connections
+        :type pool_size: int
+        :param retries: Maximum number of attempts to connect again
+        :type retries: int
+        :param timeout: Seconds to wait for the server before giving up
+        :type timeout: float
+        :param session: Session to send requests with instead of a new one
+        :type session: requests.Session, optional
+        :param cache: Objects created before, reused for layouts and
+            shared permissions
+        :type cache: ProvisionCache, optional
+        """
+        self.host = host.rstrip("/")
+        self.uri = f"{self.host}/slurk/api"
+        self.token = token
+        self.timeout = timeout
+        self.cache = cache
+
+        if session is None:
+            retry = Retry(connect=retries, read=False, redirect=0, backoff_factor=0.2)
+            adapter = HTTPAdapter(
+                pool_connections=1, pool_maxsize=pool_size, max_retries=retry
+            )
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+
+    def request(self, method, path, json=None):
+        return self.session.request(
+            method,
+            f"{self.uri}{path}",
+            headers={"Authorization": f"Bearer {self.token}"},
+            json=json,
+            timeout=self.timeout,
+        )
+
+    def create(self, path, data, description):
+        """Create an object and return its id."""
+        return self._create(path, data, description)["id"]
+
+    def create_cached(self, path, data, description):
+        """Return the id of an object with the same content created
+        before, if the server still has it, else create it."""
+        if self.cache is None:
+            return self.create(path, data, description)
+
+        key = self.cache.key(self.host, path, data)
+        with self.cache.lock(key):
+            entry = self.cache.get(key)
+            if entry is not None and (
+                self.cache.checked(key) or self._exists(path, entry)
+            ):
+                self.cache.reuse(key)
+                return entry["id"]
+            created = self._create(path, data, description)
+            self.cache.put(key, created["id"], created.get("date_created"))
+            return created["id"]
+
+    def create_room_layout(self, room_layout):
+        return self.create_cached(
+            "/layouts", room_layout, f"room layout: {room_layout.get('title')}"
+        )
+
+    def create_room(self, layout_id):
+        return self.create(
+            "/rooms", {"layout_id": layout_id}, f"room with layout {layout_id}"
+        )
+
+    def create_task(self, name, num_users, layout_id):
+        return self.create(
+            "/tasks",
+            {"name": name, "num_users": num_users, "layout_id": layout_id},
+            f"task: {name}",
+        )
+
+    def create_permissions(self, permissions, shared=False):
+        """Create permissions, or reuse cached ones if `shared`. Only
+        permissions nobody changes later may be shared: bots change the
+        permissions of single users, e.g. to mute them."""
+        if shared:
+            return self.create_cached("/permissions", permissions, "permissions")
+        return self.create("/permissions", permissions, "permissions")
+
+    def create_token(self, permissions, room_id, task_id=None, registrations_left=1):
+        return self.create(
+            "/tokens",
+            {
+                "permissions_id": permissions,
+                "room_id": room_id,
+                "registrations_left": registrations_left,
+                "task_id": task_id,
+            },
+            "token",
+        )
+
+    def create_user(self, name, token):
+        return self.create(
+            "/users", {"name": name, "token_id": token}, f"user: {name}"
+        )
+
+    def wait_until_ready(self, timeout=60.0, interval=0.25):
+        """Wait until the server answers requests with the admin token,
+        e.g. after starting it.
+        :return: Seconds waited
+        :rtype: float
+        """
+        start = time.monotonic()
+        while True:
+            try:
+                if self.request("GET", f"/tokens/{self.token}").ok:
+                    return time.monotonic() - start
+            except requests.ConnectionError:
+                pass
+            if time.monotonic() - start > timeout:
+                raise TimeoutError(f"slurk at {self.host} is not ready after {timeout}s")
+            time.sleep(interval)
+
+    def login_link(self, token, name):
+        return f"{self.host}/login?name={name}&token={token}"
+
+    def _create(self, path, data, description):
+        response = self.request("POST", path, json=data)
+        if not response.ok:
+            print(f"could not create {description}")
+            response.raise_for_status()
+        return response.json()
+
+    def _exists(self, path, entry):
+        """Whether the server still has a cached object. Its creation
+        time tells it apart from a new object with the same id on a
+        server that was reset."""
+        response = self.request("GET", f"{path}/{entry['id']}")
+        if not response.ok:
+            return False
+        date_created = entry.get("date_created")
+        return (
+            date_created is None
+            or response.json().get("date_created") == date_created
+        )
+
+
+class ProvisionCache:
+    def __init__(self, path):
+        """Ids of objects created before, kept in a JSON file so that
+        deploying the same layouts and permissions again reuses them
+        instead of creating duplicates on the server. The file also
+        remembers how long the images of the bots took to build.
+
+        Objects are keyed by a hash of the slurk host, the kind of the
+        object and its content, so changing a file creates a new object.
+        A cached object is checked once per run before it is reused.
+        :param path: JSON file, created if missing
+        :type path: str
+        """
+        self.path = Path(path)
+        state = dict()
+        if self.path.exists():
+            state = json.loads(self.path.read_text(encoding="utf-8"))
+        self._entries = state.get("objects", {})
+        # image name to the fingerprint and duration of its last build
+        self._images = state.get("images", {})
+        self._checked = set()
+        self._locks = dict()
+        self._lock = threading.Lock()
+        self._counts = {"reused": 0, "created": 0}
+
+    @staticmethod
+    def key(host, kind, payload):
+        content = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(f"{host}\n{kind}\n{content}".encode()).hexdigest()
+
+    @contextmanager
+    def lock(self, key):
+        """Hold while looking up and creating an object, so that threads
+        creating the same content create it only once."""
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            yield
+
+    def get(self, key):
+        with self._lock:
+            return self._entries.get(key)
+
+    def checked(self, key):
+        """Whether the cached object was created or found in this run."""
+        with self._lock:
+            return key in self._checked
+
+    def reuse(self, key):
+        with self._lock:
+            self._checked.add(key)
+            self._counts["reused"] += 1
+
+    def put(self, key, object_id, date_created=None):
+        with self._lock:
+            self._entries[key] = {"id": object_id, "date_created": date_created}
+            self._checked.add(key)
+            self._counts["created"] += 1
+            self._save()
+
+    def image(self, name):
+        """Fingerprint and duration in seconds of the last build of an
+        image, None if it was not built before."""
+        with self._lock:
+            return self._images.get(name)
+
+    def put_image(self, name, fingerprint, seconds):
+        with self._lock:
+            self._images[name] = {"fingerprint": fingerprint, "seconds": seconds}
+            self._save()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts)
+
+    def _save(self):
+        """Write the state file. Called with the lock held."""
+        state = {"objects": self._entries, "images": self._images}
+        # replace the file at once, a crash must not leave half of it
+        temporary = self.path.with_name(f"{self.path.name}.tmp")
+        temporary.write_text(json.dumps(state, indent=2), encoding="utf-8")
+        os.replace(temporary, self.path)
+
+
+class Phases:
+    def __init__(self):
+        """Wall clock time spent per phase of a deployment, in the order
+        the phases started. Phases may overlap, e.g. image builds
+        running while API objects are created."""
+        self.durations = dict()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.monotonic()
+        with self._lock:
+            self.durations[name] = 0.0
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.durations[name] = time.monotonic() - start
+
+    def render(self):
+        width = max((len(name) for name in self.durations), default=0)
+        return "\n".join(
+            f"{name.ljust(width)}  {duration:7.2f}s"
+            for name, duration in self.durations.items()
+        )
@@ -1,12 +1,12 @@
 from copy import deepcopy
 import logging
 import os
+from pathlib import Path
 import random
 from time import sleep
-from threading import Timer
-import requests
 import string
 
+from common.scheduler import cancel_all, schedule
 from templates import TaskBot
 from .config import *
 from .golmi_client import *
@@ -14,30 +14,34 @@ from .dataloader import Dataloader
 
 
 class RoomTimer:
-    def __init__(self, function, room_id):
+    def __init__(
+        self, function, room_id, timeout=TIMEOUT_TIMER, leave_timeout=LEAVE_TIMER
+    ):
         self.function = function
         self.room_id = room_id
+        self.timeout = timeout
+        self.leave_timeout = leave_timeout
         self.start_timer()
         self.left_room = dict()
 
     def start_timer(self):
-        self.timer = Timer(
-            TIMEOUT_TIMER * 60, self.function, args=[self.room_id, "timeout"]
+        self.timer = schedule(
+            self.timeout * 60,
+            self.function,
+            self.room_id,
+            "timeout",
+            group=self.room_id,
         )
-        self.timer.start()
 
     def reset(self):
-        self.timer.cancel()
-        self.start_timer()
+        self.timer.reset()
         logging.info("reset timer")
 
     def cancel(self):
         self.timer.cancel()
 
     def cancel_all_timers(self):
-        self.timer.cancel()
-        for timer in self.left_room.values():
-            timer.cancel()
+        cancel_all(self.room_id)
 
     def user_joined(self, user):
         timer = self.left_room.get(user)
@@ -45,18 +49,22 @@ class RoomTimer:
             self.left_room[user].cancel()
 
     def user_left(self, user):
-        self.left_room[user] = Timer(
-            LEAVE_TIMER * 60, self.function, args=[self.room_id, "user_left"]
+        self.left_room[user] = schedule(
+            self.leave_timeout * 60,
+            self.function,
+            self.room_id,
+            "user_left",
+            group=self.room_id,
         )
-        self.left_room[user].start()
 
 
 class Session:
-    def __init__(self):
+    def __init__(self, boards=BOARDS, boards_per_room=BOARDS_PER_ROOM):
         self.players = list()
         self.golmi_client = None
         self.timer = None
-        self.boards = Dataloader(BOARDS, BOARDS_PER_ROOM)
+        # a data file from `--task-config` is given as a string
+        self.boards = Dataloader(Path(boards), boards_per_room)
         self.description = False
         self.selected_object = False
         self.game_over = False
@@ -73,8 +81,8 @@ class Session:
 
 
 class SessionManager(dict):
-    def create_session(self, room_id):
-        self[room_id] = Session()
+    def create_session(self, room_id, **settings):
+        self[room_id] = Session(**settings)
 
     def clear_session(self, room_id):
         if room_id in self:
@@ -90,18 +98,28 @@ class RecolageBot(TaskBot):
 
     def post_init(self, waiting_room, golmi_server, golmi_password, version):
         """
-        save extra variables after the __init__() method has been called
-        and create the init_base_dict: a dictionary containing
-        needed arguments for the init event to send to the JS frontend
+        save extra variables after the __init__() method has been called,
+        `version` is used for tasks that do not set their own one
         """
         self.waiting_room = waiting_room
         self.golmi_server = golmi_server
         self.golmi_password = golmi_password
         self.version = version
-        self.base_init_dict = {
+
+    def version_of(self, room_id):
+        """version played in a room, see `--task-config`"""
+        return self.tasks.setting(room_id, "version", self.version)
+
+    def init_dict(self, room_id):
+        """
+        a dictionary containing needed arguments for the init event
+        to send to the JS frontend
+        """
+        version = self.version_of(room_id)
+        return {
             "event": "init",
-            "url": golmi_server,
-            "password": golmi_password,
+            "url": self.golmi_server,
+            "password": self.golmi_password,
             "tracking": version != "show_gripper",
             "show_gripper": version == "show_gripper",
             "show_gripped_objects": version in {"confirm_selection", "show_gripper"},
@@ -115,23 +133,34 @@ class RecolageBot(TaskBot):
         logging.debug(f"A new task room was created with id: {data['task']}")
         logging.debug(f"This bot is looking for task id: {self.task_id}")
 
-        if task_id is not None and task_id == self.task_id:
+        if task_id in self.tasks:
             # reduce height of sidebar
-            response = requests.patch(
-                f"{self.uri}/rooms/{room_id}/attribute/id/sidebar",
-                headers={"Authorization": f"Bearer {self.token}"},
+            response = self.api.patch(
+                f"/rooms/{room_id}/attribute/id/sidebar",
                 json={"attribute": "style", "value": f"height: 90%"}
             )
 
             # log the version
-            self.log_event("bot_version_log", {"version": self.version}, room_id)
+            version = self.version_of(room_id)
+            self.log_event("bot_version_log", {"version": version}, room_id)
 
             for usr in data["users"]:
                 self.received_waiting_token.discard(usr["id"])
 
-            # create session for these users
-            self.sessions.create_session(room_id)
-            timer = RoomTimer(self.timeout_close_game, room_id)
+            # create session for these users, the data file and the
+            # timers can be set per task, see `--task-config`
+            setting = self.tasks.setting
+            self.sessions.create_session(
+                room_id,
+                boards=setting(room_id, "boards", BOARDS),
+                boards_per_room=setting(room_id, "boards_per_room", BOARDS_PER_ROOM),
+            )
+            timer = RoomTimer(
+                self.timeout_close_game,
+                room_id,
+                setting(room_id, "timeout_timer", TIMEOUT_TIMER),
+                setting(room_id, "leave_timer", LEAVE_TIMER),
+            )
             self.sessions[room_id].timer = timer
 
             for usr in data["users"]:
@@ -139,10 +168,7 @@ class RecolageBot(TaskBot):
                     {**usr, "role": None, "status": "joined"}
                 )
 
-            response = requests.post(
-                f"{self.uri}/users/{self.user}/rooms/{room_id}",
-                headers={"Authorization": f"Bearer {self.token}"},
-            )
+            response = self.api.post(f"/users/{self.user}/rooms/{room_id}")
             self.request_feedback(response, "letting task bot join room")
             logging.debug("Sending golmi bot to new room was successful.")
 
@@ -177,35 +203,28 @@ class RecolageBot(TaskBot):
             room_id = data["room"]
 
             if room_id in self.sessions:
+                boards_per_room = self.tasks.setting(
+                    room_id, "boards_per_room", BOARDS_PER_ROOM
+                )
                 # read out task greeting
-                for line in task_greeting():
-                    self.sio.emit(
-                        "text",
-                        {
-                            "message": line.format(board_number=BOARDS_PER_ROOM),
-                            "room": room_id,
-                            "html": True,
-                        },
-                    )
-                    sleep(0.5)
+                self.send_paced(
+                    room_id,
+                    [
+                        line.format(board_number=boards_per_room)
+                        for line in task_greeting()
+                    ],
+                )
 
-                # if self.version != "no_feedback":
+                # if self.version_of(room_id) != "no_feedback":
                 #     self.update_title_points(room_id)
 
         @self.sio.event
         def status(data):
             """Triggered if a user enters or leaves a room."""
+            self.metadata.on_status(data)
             # check whether the user is eligible to join this task
-            task = requests.get(
-                f"{self.uri}/users/{data['user']['id']}/task",
-                headers={"Authorization": f"Bearer {self.token}"},
-            )
-            if not task.ok:
-                logging.error(
-                    f"Could not set task instruction title: {task.status_code}"
-                )
-                task.raise_for_status()
-            if not task.json() or task.json()["id"] != int(self.task_id):
+            task = self.metadata.task_of(data["user"]["id"])
+            if not task or task["id"] not in self.tasks:
                 return
 
             room_id = data["room"]
@@ -241,7 +260,7 @@ class RecolageBot(TaskBot):
                             "message_command",
                             {
                                 "command": {
-                                    **self.base_init_dict,
+                                    **self.init_dict(room_id),
                                     "role": role,
                                     "room_id": str(room_id),
                                 },
@@ -311,10 +330,10 @@ class RecolageBot(TaskBot):
             # revoke user's text privilege
             if curr_usr["role"] == "player":
                 self.sessions[room_id].description = True
-                if self.version != "show_gripper":
+                if self.version_of(room_id) != "show_gripper":
                     self.set_message_privilege(user_id, False)
 
-                elif self.version == "show_gripper":
+                elif self.version_of(room_id) == "show_gripper":
                     # attach wizard's controller
                     self.sio.emit(
                         "message_command",
@@ -353,7 +372,7 @@ class RecolageBot(TaskBot):
                 y = data["coordinates"]["y"]
                 block_size = data["coordinates"]["block_size"]
 
-                req = requests.get(
+                req = self.api.get(
                     f"{self.golmi_server}/slurk/{room_id}/{x}/{y}/{block_size}"
                 )
                 self.request_feedback(req, "retrieving gripped piece")
@@ -414,12 +433,12 @@ class RecolageBot(TaskBot):
                 y = data["coordinates"]["y"]
                 block_size = data["coordinates"]["block_size"]
 
-                if self.version == "confirm_selection":
-                    req = requests.get(
+                if self.version_of(room_id) == "confirm_selection":
+                    req = self.api.get(
                         f"{self.golmi_server}/slurk/grip/{room_id}/{x}/{y}/{block_size}"
                     )
                 else:    
-                    req = requests.get(
+                    req = self.api.get(
                         f"{self.golmi_server}/slurk/{room_id}/{x}/{y}/{block_size}"
                     )
 
@@ -464,7 +483,7 @@ class RecolageBot(TaskBot):
                     if event == "confirm_selection":
                         self.sessions[room_id].selected_object = False
 
-                        if self.version == "show_gripper":
+                        if self.version_of(room_id) == "show_gripper":
                             # attach wizard's controller
                             self.sio.emit(
                                 "message_command",
@@ -477,22 +496,26 @@ class RecolageBot(TaskBot):
 
                         if data["command"]["answer"] == "no":
                             # remove gripper
-                            if self.version != "show_gripper":
-                                response = requests.delete(
+                            if self.version_of(room_id) != "show_gripper":
+                                response = self.api.delete(
                                     f"{self.golmi_server}/slurk/gripper/{room_id}/mouse"
                                 )
                                 self.request_feedback(response, "removing mouse gripper")
 
                             else:
                                 # reset the gripper to its original position
-                                req = requests.get(f"{self.golmi_server}/slurk/{room_id}/state")
+                                req = self.api.get(
+                                    f"{self.golmi_server}/slurk/{room_id}/state"
+                                )
                                 self.request_feedback(req, "retrieving state")
 
                                 state = req.json()
                                 grippers = state["grippers"]
                                 gr_id = list(grippers.keys())[0]
 
-                                req = requests.patch(f"{self.golmi_server}/slurk/gripper/reset/{room_id}/{gr_id}")
+                                req = self.api.patch(
+                                    f"{self.golmi_server}/slurk/gripper/reset/{room_id}/{gr_id}"
+                                )
 
                             # allow the player to send a second description
                             self.sessions[room_id].description = False
@@ -503,7 +526,7 @@ class RecolageBot(TaskBot):
                             self.sessions[room_id].points["history"][-1]["wrong"] += 1
 
                             # update points in title
-                            if self.version != "no_feedback":
+                            if self.version_of(room_id) != "no_feedback":
                                 self.update_title_points(room_id)
 
                             # inform users
@@ -529,7 +552,7 @@ class RecolageBot(TaskBot):
                             )
                         else:
                             # player thinks the wizard selected the right object
-                            req = requests.get(
+                            req = self.api.get(
                                 f"{self.golmi_server}/slurk/{room_id}/gripped"
                             )
                             self.request_feedback(req, "retrieving gripped piece")
@@ -549,7 +572,7 @@ class RecolageBot(TaskBot):
                     if event == "warning":
                         logging.debug("emitting WARNING")
 
-                        if self.version == "no_feedback":
+                        if self.version_of(room_id) == "no_feedback":
                             # not available
                             return
 
@@ -683,12 +706,12 @@ class RecolageBot(TaskBot):
         )
 
         # load next state
-        if self.version not in {"confirm_selection", "show_gripper"}:
+        if self.version_of(room_id) not in {"confirm_selection", "show_gripper"}:
             self.load_next_state(room_id, result)
         else:
             self.sessions[room_id].selected_object = True
 
-            if self.version == "show_gripper":
+            if self.version_of(room_id) == "show_gripper":
                 # detach wizard's controller
                 self.sio.emit(
                     "message_command",
@@ -731,7 +754,7 @@ class RecolageBot(TaskBot):
 
         self.sessions[room_id].boards.pop(0)
         self.sessions[room_id].description = False
-        if self.version == "show_gripper":
+        if self.version_of(room_id) == "show_gripper":
             # detach wizard's controller
             self.sio.emit(
                 "message_command",
@@ -745,7 +768,7 @@ class RecolageBot(TaskBot):
 
         score = self.sessions[room_id].points["score"]
 
-        if self.version != "no_feedback":
+        if self.version_of(room_id) != "no_feedback":
             # update points on title
             self.update_title_points(room_id)
 
@@ -759,11 +782,14 @@ class RecolageBot(TaskBot):
                 {"correct": 0, "wrong": 0, "warnings": 0}
             )
             message = "Let's get you to the next board"
-            if self.version != "no_feedback":
+            if self.version_of(room_id) != "no_feedback":
                 message = f"That was the {result} piece {result_emoji} {message}"
 
             # limited number of boards, inform the user that how many left
-            if BOARDS_PER_ROOM > 0:
+            boards_per_room = self.tasks.setting(
+                room_id, "boards_per_room", BOARDS_PER_ROOM
+            )
+            if boards_per_room > 0:
                 boards_left = len(self.sessions[room_id].boards)
                 if boards_left % 5 == 0:
                     message = f"{message}. Still {boards_left} to go"
@@ -785,22 +811,7 @@ class RecolageBot(TaskBot):
         """
         change user's permission to send messages
         """
-        # get permission_id based on user_id
-        response = requests.get(
-            f"{self.uri}/users/{user_id}/permissions",
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
-        self.request_feedback(response, "retrieving user's permissions")
-
-        permission_id = response.json()["id"]
-        requests.patch(
-            f"{self.uri}/permissions/{permission_id}",
-            json={"send_message": value},
-            headers={
-                "If-Match": response.headers["ETag"],
-                "Authorization": f"Bearer {self.token}",
-            },
-        )
+        response = self.metadata.update_permissions(user_id, {"send_message": value})
         self.request_feedback(response, "changing user's message permission")
 
     def set_wizard_role(self, room_id, user_id):
@@ -820,7 +831,7 @@ class RecolageBot(TaskBot):
                     "message_command",
                     {
                         "command": {
-                            **self.base_init_dict,
+                            **self.init_dict(room_id),
                             "role": role,
                             "room_id": str(room_id),
                         },
@@ -833,7 +844,7 @@ class RecolageBot(TaskBot):
                     self.set_message_privilege(curr_usr["id"], False)
 
             # update title with points
-            if self.version != "no_feedback":
+            if self.version_of(room_id) != "no_feedback":
                 self.update_title_points(room_id)
 
             sleep(0.5)
@@ -867,12 +878,12 @@ class RecolageBot(TaskBot):
         board = deepcopy(self.sessions[room_id].boards[0])
 
         # add gripper if not present
-        if self.version == "show_gripper":
+        if self.version_of(room_id) == "show_gripper":
             if from_disconnect is False:
                 # copy over to new board the gripper of the previous one
                 # so that the controller can still operate it
                 if not board["state"]["grippers"]:
-                    req = requests.get(f"{self.golmi_server}/slurk/{room_id}/state")
+                    req = self.api.get(f"{self.golmi_server}/slurk/{room_id}/state")
                     self.request_feedback(req, "retrieving state")
 
                     state = req.json()
@@ -931,57 +942,31 @@ class RecolageBot(TaskBot):
             if board["wrong"] == 0:
                 correct += board["correct"]
 
-        response = requests.patch(
-            f"{self.uri}/rooms/{room_id}/text/title",
+        response = self.api.patch(
+            f"/rooms/{room_id}/text/title",
             json={"text": f"Score: {score} 🏆 | Correct: {correct} ✅"},
-            headers={"Authorization": f"Bearer {self.token}"},
         )
         self.request_feedback(response, "setting point stand in title")
 
     def close_game(self, room_id):
         """Erase any data structures no longer necessary."""
+        self.pacer.cancel(room_id)
         self.sio.emit(
             "text",
             {"message": "The room is closing, see you next time 👋", "room": room_id},
         )
 
         self.sessions[room_id].game_over = True
+        # the session logs must be complete before the room is closed
+        self.flush_logs()
         self.room_to_read_only(room_id)
         self.sessions.clear_session(room_id)
+        self.tasks.close_room(room_id)
 
     def room_to_read_only(self, room_id):
-        """Set room to read only."""
-        # set room to read-only
-        response = requests.patch(
-            f"{self.uri}/rooms/{room_id}/attribute/id/text",
-            json={"attribute": "readonly", "value": "True"},
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
-        self.request_feedback(response, "setting room to read_only")
-
-        response = requests.patch(
-            f"{self.uri}/rooms/{room_id}/attribute/id/text",
-            json={"attribute": "placeholder", "value": "This room is read-only"},
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
-        self.request_feedback(response, "setting room title to read_only")
-
-        # remove user from room
-        if room_id in self.sessions:
-            for usr in self.sessions[room_id].players:
-                response = requests.get(
-                    f"{self.uri}/users/{usr['id']}",
-                    headers={"Authorization": f"Bearer {self.token}"},
-                )
-                self.request_feedback(response, "getting user")
-                etag = response.headers["ETag"]
-
-                response = requests.delete(
-                    f"{self.uri}/users/{usr['id']}/rooms/{room_id}",
-                    headers={"If-Match": etag, "Authorization": f"Bearer {self.token}"},
-                )
-                self.request_feedback(response, "removing user from task toom")
-                logging.debug("Removing user from task room was successful.")
+        """Set room to read only and remove the players from it."""
+        players = self.sessions[room_id].players if room_id in self.sessions else []
+        super().room_to_read_only(room_id, users=[usr["id"] for usr in players])
 
     def timeout_close_game(self, room_id, status):
         self.sio.emit(
@@ -1069,7 +1054,8 @@ if __name__ == "__main__":
         args.user,
         args.task,
         args.host,
-        args.port
+        args.port,
+        args.task_config
     )
     bot.post_init(
         args.waiting_room,
@@ -1,10 +1,10 @@
 import logging
 import os
 import json
+from pathlib import Path
 from time import sleep
-from threading import Timer
 
-import requests
+from common.scheduler import schedule
 from templates import TaskBot
 from .config import *
 from .golmi_client import *
@@ -19,12 +19,12 @@ class RoomTimer:
         self.start_timer()
 
     def start_timer(self):
-        self.timer = Timer(self.time * 60, self.function, args=[self.room_id])
-        self.timer.start()
+        self.timer = schedule(
+            self.time * 60, self.function, self.room_id, group=self.room_id
+        )
 
     def snooze(self):
-        self.timer.cancel()
-        self.start_timer()
+        self.timer.reset()
         logging.debug("snooze")
 
     def cancel(self):
@@ -32,10 +32,11 @@ class RoomTimer:
 
 
 class Session:
-    def __init__(self):
+    def __init__(self, boards=BOARDS, boards_per_room=BOARDS_PER_ROOM):
         self.players = list()
         self.golmi_client = None
-        self.boards = Dataloader(BOARDS, BOARDS_PER_ROOM)
+        # a data file from `--task-config` is given as a string
+        self.boards = Dataloader(Path(boards), boards_per_room)
         self.can_load_next_state = False
         self.timer = None
 
@@ -45,8 +46,8 @@ class Session:
 
 
 class SessionManager(dict):
-    def create_session(self, room_id):
-        self[room_id] = Session()
+    def create_session(self, room_id, **settings):
+        self[room_id] = Session(**settings)
 
     def clear_session(self, room_id):
         if room_id in self:
@@ -76,25 +77,31 @@ class RecolagEval(TaskBot):
             logging.debug(f"A new task room was created with id: {data['task']}")
             logging.debug(f"This bot is looking for task id: {self.task_id}")
 
-            if task_id is not None and task_id == self.task_id:
+            if task_id in self.tasks:
+                self.tasks.open_room(room_id, task_id)
                 for usr in data["users"]:
                     self.received_waiting_token.discard(usr["id"])
 
-                # create image items for this room
+                # create image items for this room, the data file and
+                # timeout can be set per task, see `--task-config`
                 logging.debug("Create data for the new task room...")
-                self.sessions.create_session(room_id)
+                setting = self.tasks.setting
+                self.sessions.create_session(
+                    room_id,
+                    boards=setting(room_id, "boards", BOARDS),
+                    boards_per_room=setting(room_id, "boards_per_room", BOARDS_PER_ROOM),
+                )
                 self.sessions[room_id].timer = RoomTimer(
-                    TIMEOUT_TIMER, self.close_game, room_id
+                    setting(room_id, "timeout_timer", TIMEOUT_TIMER),
+                    self.close_game,
+                    room_id,
                 )
                 for usr in data["users"]:
                     self.sessions[room_id].players.append(
                         {**usr, "role": None, "status": "joined"}
                     )
 
-                response = requests.post(
-                    f"{self.uri}/users/{self.user}/rooms/{room_id}",
-                    headers={"Authorization": f"Bearer {self.token}"},
-                )
+                response = self.api.post(f"/users/{self.user}/rooms/{room_id}")
                 if not response.ok:
                     logging.error(
                         f"Could not let recolageval bot join room: {response.status_code}"
@@ -117,10 +124,9 @@ class RecolagEval(TaskBot):
 
             if room_id in self.sessions:
                 # add description title
-                response = requests.patch(
-                    f"{self.uri}/rooms/{room_id}/text/instr_title",
+                response = self.api.patch(
+                    f"/rooms/{room_id}/text/instr_title",
                     json={"text": "Please wait for the roles to be assigned"},
-                    headers={"Authorization": f"Bearer {self.token}"},
                 )
                 if not response.ok:
                     logging.error(
@@ -128,42 +134,29 @@ class RecolagEval(TaskBot):
                     )
                     response.raise_for_status()
 
-                sleep(0.5)
+                boards_per_room = self.tasks.setting(
+                    room_id, "boards_per_room", BOARDS_PER_ROOM
+                )
                 # read out task greeting
-                for line in task_greeting():
-                    self.sio.emit(
-                        "text",
-                        {
-                            "message": line.format(board_number=BOARDS_PER_ROOM),
-                            "room": room_id,
-                            "html": True,
-                        },
-                    )
-                    sleep(0.5)
-
-                self.sio.emit(
-                    "text",
-                    {
-                        "message": task_instr(),
-                        "room": room_id,
-                        "html": True,
-                    },
+                self.send_paced(
+                    room_id,
+                    [
+                        *(
+                            line.format(board_number=boards_per_room)
+                            for line in task_greeting()
+                        ),
+                        task_instr(),
+                    ],
+                    delay=0.5,
                 )
 
         @self.sio.event
         def status(data):
             """Triggered if a user enters or leaves a room."""
+            self.metadata.on_status(data)
             # check whether the user is eligible to join this task
-            task = requests.get(
-                f"{self.uri}/users/{data['user']['id']}/task",
-                headers={"Authorization": f"Bearer {self.token}"},
-            )
-            if not task.ok:
-                logging.error(
-                    f"Could not set task instruction title: {task.status_code}"
-                )
-                task.raise_for_status()
-            if not task.json() or task.json()["id"] != int(self.task_id):
+            task = self.metadata.task_of(data["user"]["id"])
+            if not task or task["id"] not in self.tasks:
                 return
 
             room_id = data["room"]
@@ -226,7 +219,7 @@ class RecolagEval(TaskBot):
                         y = data["command"]["offset_y"]
                         block_size = data["command"]["block_size"]
 
-                        req = requests.get(
+                        req = self.api.get(
                             f"{self.golmi_server}/slurk/{room_id}/{x}/{y}/{block_size}"
                         )
                         if req.ok is not True:
@@ -330,57 +323,23 @@ class RecolagEval(TaskBot):
 
     def close_game(self, room_id):
         """Erase any data structures no longer necessary."""
+        self.pacer.cancel(room_id)
         self.sio.emit(
             "text",
             {"message": "The room is closing, see you next time 👋", "room": room_id},
         )
+        # the session logs must be complete before the room is closed
+        self.flush_logs()
         self.room_to_read_only(room_id)
 
         # clear session
         self.sessions.clear_session(room_id)
+        self.tasks.close_room(room_id)
 
     def room_to_read_only(self, room_id):
-        """Set room to read only."""
-        # set room to read-only
-        response = requests.patch(
-            f"{self.uri}/rooms/{room_id}/attribute/id/text",
-            json={"attribute": "readonly", "value": "True"},
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
-        if not response.ok:
-            logging.error(f"Could not set room to read_only: {response.status_code}")
-            response.raise_for_status()
-        response = requests.patch(
-            f"{self.uri}/rooms/{room_id}/attribute/id/text",
-            json={"attribute": "placeholder", "value": "This room is read-only"},
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
-        if not response.ok:
-            logging.error(f"Could not set room to read_only: {response.status_code}")
-            response.raise_for_status()
-
-        # remove user from room
-        if room_id in self.sessions:
-            for usr in self.sessions[room_id].players:
-                response = requests.get(
-                    f"{self.uri}/users/{usr['id']}",
-                    headers={"Authorization": f"Bearer {self.token}"},
-                )
-                if not response.ok:
-                    logging.error(f"Could not get user: {response.status_code}")
-                    response.raise_for_status()
-                etag = response.headers["ETag"]
-
-                response = requests.delete(
-                    f"{self.uri}/users/{usr['id']}/rooms/{room_id}",
-                    headers={"If-Match": etag, "Authorization": f"Bearer {self.token}"},
-                )
-                if not response.ok:
-                    logging.error(
-                        f"Could not remove user from task room: {response.status_code}"
-                    )
-                    response.raise_for_status()
-                logging.debug("Removing user from task room was successful.")
+        """Set room to read only and remove the players from it."""
+        players = self.sessions[room_id].players if room_id in self.sessions else []
+        super().room_to_read_only(room_id, users=[usr["id"] for usr in players])
 
 
 if __name__ == "__main__":
@@ -415,7 +374,9 @@ if __name__ == "__main__":
     logging.debug(args)
 
     # create bot instance
-    bot = RecolagEval(args.token, args.user, args.task, args.host, args.port)
+    bot = RecolagEval(
+        args.token, args.user, args.task, args.host, args.port, args.task_config
+    )
     bot.golmi_server = args.golmi_server
     bot.golmi_password = args.golmi_password
     # connect to chat server
@@ -0,0 +1,535 @@
+"""Replay the recorded log of a room against a running bot.
+
+Reads the slurk log of a room (as returned by `/rooms/{id}/logs`, either
+a JSON list or one record per line), creates a new room for the task
+with one user per recorded participant and sends their messages,
+commands, clicks and typing again, keeping the original timing scaled
+by `--speed` (0 for as fast as the bot answers). Afterwards the log
+events and messages of the bot in the new room are compared to the
+recorded ones.
+
+    python replay.py room-42.json --task-id 2 --speed 10 \\
+        --slurk-host http://localhost:5000
+
+The bot has to be running for the task. The exit status is 1 if the bot
+did not act as recorded.
+"""
+
+import argparse
+import asyncio
+from collections import Counter
+from datetime import datetime
+import difflib
+import json
+import logging
+from pathlib import Path
+import sys
+import time
+
+try:
+    import aiohttp
+    import socketio
+except ImportError:  # a recording can be read and compared without them
+    aiohttp = socketio = None
+
+from loadtest import percentile
+
+
+LOG = logging.getLogger(__name__)
+
+# events slurk logs by itself, everything else was logged by a bot
+SLURK_EVENTS = {"join", "leave", "text_message", "command", "mouse"}
+
+# participant events logged by the bots when they receive them
+TYPING_EVENTS = {"start_typing": True, "stop_typing": False}
+
+# keys compared by value only after mapping recorded IDs to replayed ones
+ID_KEYS = {"user_id", "receiver_id", "room", "room_id"}
+VOLATILE_KEYS = {"id", "date_created", "date_modified", "timestamp"}
+
+
+def parse_time(value):
+    """Seconds since the epoch of an ISO timestamp in a slurk log."""
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def read_log(path):
+    """Records of an exported room log, in the order they happened."""
+    text = Path(path).read_text(encoding="utf-8").strip()
+    if text.startswith("["):
+        records = json.loads(text)
+    else:
+        records = [json.loads(line) for line in text.splitlines() if line.strip()]
+    return sorted(records, key=lambda record: (record["date_created"], record["id"]))
+
+
+def inbound_event(record, participants):
+    """The Socket.IO event a participant emitted to cause `record`.
+    :return: Participant, event and payload without the room, None if
+        the record was not caused by a participant
+    :rtype: tuple
+    """
+    event, data = record["event"], record.get("data") or dict()
+    user_id = record.get("user_id")
+    if event in TYPING_EVENTS:
+        user_id = (data.get("user") or dict()).get("id")
+        if user_id in participants:
+            return user_id, "keypress", {"typing": TYPING_EVENTS[event]}
+        return None
+    if user_id not in participants:
+        return None
+
+    receiver = {}
+    if record.get("receiver_id") is not None:
+        receiver = {"receiver_id": record["receiver_id"]}
+    if event == "text_message":
+        return user_id, "text", {"message": data.get("message"), **receiver}
+    if event == "command":
+        return user_id, "message_command", {"command": data.get("command"), **receiver}
+    if event == "mouse":
+        return user_id, "mouse", data
+    return None
+
+
+class Recording:
+    def __init__(self, records, bot_id=None):
+        """The participants' inbound events and the bot's outputs of
+        one recorded room.
+        :param bot_id: User ID of the bot in the recording, by default
+            the user who logged events slurk does not log by itself
+        :type bot_id: int, optional
+        """
+        if bot_id is None:
+            bot_id = next(
+                (
+                    record["user_id"]
+                    for record in records
+                    if record["event"] not in SLURK_EVENTS
+                    and record.get("user_id") is not None
+                ),
+                None,
+            )
+        if bot_id is None:
+            raise ValueError("cannot tell the bot from the log, pass its user ID")
+        self.bot_id = bot_id
+        self.room_id = records[0]["room_id"] if records else None
+        self.participants = sorted(
+            {
+                record["user_id"]
+                for record in records
+                if record["event"] == "join" and record.get("user_id") != bot_id
+            }
+        )
+
+        # the bot joining the room starts the replay
+        start = next(
+            (
+                record
+                for record in records
+                if record["event"] == "join" and record.get("user_id") == bot_id
+            ),
+            records[0] if records else None,
+        )
+        self.start = parse_time(start["date_created"]) if start else 0.0
+
+        self.outputs = list()
+        self.steps = list()
+        visible = 0
+        for record in records:
+            offset = max(0.0, parse_time(record["date_created"]) - self.start)
+            if record.get("user_id") == bot_id and record["event"] not in {
+                "join",
+                "leave",
+            }:
+                self.outputs.append((offset, record))
+                if record["event"] == "text_message":
+                    visible += 1
+            step = inbound_event(record, set(self.participants))
+            if step is not None:
+                user_id, event, data = step
+                # messages of the bot the participant had seen by then
+                self.steps.append((offset, user_id, event, data, visible))
+
+    @property
+    def visible_outputs(self):
+        """Offsets of the bot's messages, the outputs a participant sees."""
+        return [
+            offset
+            for offset, record in self.outputs
+            if record["event"] == "text_message"
+        ]
+
+    def response_times(self):
+        """Seconds from each inbound event to the next message of the bot."""
+        outputs = self.visible_outputs
+        times = list()
+        for offset, *_ in self.steps:
+            following = [output for output in outputs if output >= offset]
+            if following:
+                times.append(following[0] - offset)
+        return times
+
+
+def normalize(data, ids):
+    """`data` without volatile keys and with recorded IDs mapped."""
+    if isinstance(data, list):
+        return [normalize(value, ids) for value in data]
+    if not isinstance(data, dict):
+        return data
+    result = dict()
+    for key, value in data.items():
+        if key == "user" and isinstance(value, dict):
+            result[key] = ids.get(value.get("id"), value.get("id"))
+        elif key in ID_KEYS:
+            result[key] = ids.get(value, value)
+        elif key not in VOLATILE_KEYS:
+            result[key] = normalize(value, ids)
+    return result
+
+
+def signature(record, ids, strict=False):
+    """What is compared of a log record: its event and receiver, and
+    with `strict` also its data."""
+    key = {
+        "event": record["event"],
+        "receiver_id": ids.get(record.get("receiver_id"), record.get("receiver_id")),
+    }
+    if strict:
+        key["data"] = normalize(record.get("data"), ids)
+    return json.dumps(key, sort_keys=True)
+
+
+def compare(expected, actual, ids=None, strict=False, ignore=()):
+    """Differences between the recorded and the replayed bot outputs.
+    :param ids: Recorded user and room IDs mapped to the replayed ones
+    :type ids: dict
+    :param ignore: Events left out, e.g. those of other servers
+    :type ignore: collection
+    :rtype: dict
+    """
+    ids = ids or dict()
+    expected = [record for record in expected if record["event"] not in ignore]
+    actual = [record for record in actual if record["event"] not in ignore]
+    old = [signature(record, ids, strict) for record in expected]
+    new = [signature(record, dict(), strict) for record in actual]
+
+    missing, unexpected = Counter(), Counter()
+    first = None
+    matcher = difflib.SequenceMatcher(None, old, new, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        if first is None:
+            first = {
+                "index": i1,
+                "expected": expected[i1] if i1 < len(expected) else None,
+                "actual": actual[j1] if j1 < len(actual) else None,
+            }
+        missing.update(record["event"] for record in expected[i1:i2])
+        unexpected.update(record["event"] for record in actual[j1:j2])
+
+    return {
+        "expected": len(expected),
+        "actual": len(actual),
+        "matched": sum(block.size for block in matcher.get_matching_blocks()),
+        "missing": dict(missing),
+        "unexpected": dict(unexpected),
+        "first_difference": first,
+    }
+
+
+class Replayer:
+    def __init__(self, recording, args):
+        self.recording = recording
+        self.host = args.slurk_host
+        self.api = f"{args.slurk_host}/slurk/api"
+        self.api_token = args.slurk_api_token
+        self.task = args.task_id
+        self.speed = args.speed
+        self.wait = args.wait
+        self.drain = args.drain
+
+        self.room = None
+        self.users = dict()
+        self.sockets = dict()
+        self.bot_id = None
+        self.bot_joined = asyncio.Event()
+        self.seen = 0
+        self.seen_changed = asyncio.Event()
+        self.stalls = 0
+        self.response_times = list()
+        self._pending = list()
+
+    async def run(self):
+        async with aiohttp.ClientSession(
+            headers={"Authorization": f"Bearer {self.api_token}"}
+        ) as session:
+            self.session = session
+            await self.setup()
+            try:
+                duration = await self.replay()
+                await self.settle()
+                logs = await self.request("GET", f"/rooms/{self.room}/logs")
+            finally:
+                for sio in self.sockets.values():
+                    await sio.disconnect()
+
+        ours = set(self.users.values())
+        actual = [
+            record
+            for record in logs
+            if record.get("user_id") not in ours
+            and record.get("user_id") is not None
+            and record["event"] not in {"join", "leave"}
+        ]
+        return duration, actual
+
+    async def request(self, method, path, body=None):
+        async with self.session.request(
+            method, f"{self.api}{path}", json=body
+        ) as response:
+            response.raise_for_status()
+            return await response.json()
+
+    async def setup(self):
+        """A new room with one user per recorded participant and one
+        more user announcing the room to the bot."""
+        task = await self.request("GET", f"/tasks/{self.task}")
+        room = await self.request("POST", "/rooms", {"layout_id": task["layout_id"]})
+        self.room = room["id"]
+
+        permissions = await self.request(
+            "POST",
+            "/permissions",
+            {"send_message": True, "send_command": True, "send_privately": True},
+        )
+        for recorded in self.recording.participants + ["concierge"]:
+            token = await self.request(
+                "POST",
+                "/tokens",
+                {
+                    "permissions_id": permissions["id"],
+                    "room_id": None if recorded == "concierge" else self.room,
+                    "task_id": self.task,
+                    "registrations_left": 1,
+                },
+            )
+            user = await self.request(
+                "POST",
+                "/users",
+                {"name": f"replay-{recorded}", "token_id": token["id"]},
+            )
+            self.users[recorded] = user["id"]
+            self.sockets[recorded] = self.socket(recorded, user["id"], token["id"])
+
+        for recorded, sio in self.sockets.items():
+            await sio.connect(
+                self.host,
+                headers={
+                    "Authorization": f"Bearer {sio.token}",
+                    "user": str(self.users[recorded]),
+                },
+                namespaces="/",
+            )
+
+    def socket(self, recorded, user_id, token):
+        sio = socketio.AsyncClient()
+        sio.token = token
+        # messages to the whole room are counted by one participant only
+        counts_room = recorded == (self.recording.participants or [None])[0]
+
+        @sio.event
+        async def status(data):
+            user = data["user"]["id"]
+            if data["room"] == self.room and data["type"] == "join":
+                if user not in self.users.values():
+                    self.bot_id = user
+                    self.bot_joined.set()
+
+        @sio.event
+        async def text_message(data):
+            if data.get("room") != self.room or data["user"]["id"] != self.bot_id:
+                return
+            if data.get("private") or counts_room:
+                self.seen += 1
+                now = time.monotonic()
+                for sent in self._pending:
+                    self.response_times.append(now - sent)
+                self._pending.clear()
+                self.seen_changed.set()
+
+        return sio
+
+    async def replay(self):
+        """Send the inbound events, returning how long it took."""
+        await self.sockets["concierge"].emit(
+            "room_created", {"room": self.room, "task": self.task}
+        )
+        try:
+            await asyncio.wait_for(self.bot_joined.wait(), self.wait)
+        except asyncio.TimeoutError:
+            raise RuntimeError(
+                f"no bot joined room {self.room}, "
+                f"is the bot of task {self.task} running?"
+            )
+
+        start = time.monotonic()
+        for offset, recorded, event, data, visible in self.recording.steps:
+            if self.speed > 0:
+                due = start + offset / self.speed
+                await asyncio.sleep(max(0.0, due - time.monotonic()))
+            if not await self.seen_at_least(visible):
+                self.stalls += 1
+            self._pending.append(time.monotonic())
+            await self.sockets[recorded].emit(
+                event, {**self.mapped(data), "room": self.room}
+            )
+        return time.monotonic() - start
+
+    async def settle(self):
+        """Wait for the remaining messages, then for log records
+        submitted in the background."""
+        await self.seen_at_least(len(self.recording.visible_outputs))
+        await asyncio.sleep(self.drain)
+
+    async def seen_at_least(self, count):
+        deadline = time.monotonic() + self.wait
+        while self.seen < count:
+            self.seen_changed.clear()
+            try:
+                await asyncio.wait_for(
+                    self.seen_changed.wait(), deadline - time.monotonic()
+                )
+            except (asyncio.TimeoutError, ValueError):
+                return False
+        return True
+
+    def mapped(self, data):
+        if "receiver_id" in data:
+            data = {**data, "receiver_id": self.ids().get(data["receiver_id"])}
+        return data
+
+    def ids(self):
+        """Recorded user and room IDs mapped to the replayed ones."""
+        return {
+            **self.users,
+            self.recording.bot_id: self.bot_id,
+            self.recording.room_id: self.room,
+        }
+
+
+def report(recording, replayer, duration, result):
+    def ms(value):
+        return "-" if value is None else f"{value * 1e3:.0f}"
+
+    recorded = recording.response_times()
+    lines = [
+        f"replayed {len(recording.steps)} events in {duration:.1f}s "
+        f"(recorded {recording.steps[-1][0] if recording.steps else 0:.1f}s), "
+        f"{replayer.stalls} waited longer than {replayer.wait}s for the bot",
+        f"{'response ms':<14}{'p50':>8}{'p90':>8}{'p99':>8}",
+    ]
+    for name, values in (("recorded", recorded), ("replayed", replayer.response_times)):
+        lines.append(
+            f"{name:<14}{ms(percentile(values, 50)):>8}"
+            f"{ms(percentile(values, 90)):>8}{ms(percentile(values, 99)):>8}"
+        )
+    lines.append(
+        f"bot outputs: {result['matched']} of {result['expected']} recorded "
+        f"matched, {result['actual']} replayed"
+    )
+    if result["missing"]:
+        lines.append(f"missing: {result['missing']}")
+    if result["unexpected"]:
+        lines.append(f"unexpected: {result['unexpected']}")
+    first = result["first_difference"]
+    if first is not None:
+        lines.append(f"first difference at output {first['index']}:")
+        lines.append(f"  recorded: {json.dumps(first['expected'])}")
+        lines.append(f"  replayed: {json.dumps(first['actual'])}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0],
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("log", help="exported log of the room to replay")
+    parser.add_argument("--task-id", type=int, required=True, help="task of the bot")
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1,
+        help="speed-up of the original timing, 0 to wait only for the bot",
+    )
+    parser.add_argument(
+        "--recorded-bot", type=int, help="user ID of the bot in the recording"
+    )
+    parser.add_argument(
+        "--slurk-host",
+        default="http://127.0.0.1:5000",
+        help="address of the slurk server",
+    )
+    parser.add_argument(
+        "--slurk-api-token",
+        default="00000000-0000-0000-0000-000000000000",
+        help="slurk token with api permissions",
+    )
+    parser.add_argument(
+        "--wait",
+        type=float,
+        default=10,
+        help="seconds to wait for a message the participants had seen",
+    )
+    parser.add_argument(
+        "--drain",
+        type=float,
+        default=2,
+        help="seconds to wait for log events after the last message",
+    )
+    parser.add_argument(
+        "--strict",
+        action="store_true",
+        help="also compare the data of each output, not only its event",
+    )
+    parser.add_argument(
+        "--ignore",
+        action="append",
+        default=[],
+        help="event to leave out of the comparison, e.g. gripper_movement",
+    )
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(message)s")
+    recording = Recording(read_log(args.log), args.recorded_bot)
+    replayer = Replayer(recording, args)
+    duration, actual = asyncio.run(replayer.run())
+
+    result = compare(
+        [record for _, record in recording.outputs],
+        actual,
+        replayer.ids(),
+        args.strict,
+        set(args.ignore),
+    )
+    print(report(recording, replayer, duration, result))
+    if args.json:
+        Path(args.json).write_text(
+            json.dumps(
+                {
+                    "duration": duration,
+                    "stalls": replayer.stalls,
+                    "response_times": replayer.response_times,
+                    **result,
+                },
+                indent=2,
+            ),
+            encoding="utf-8",
+        )
+    sys.exit(1 if result["missing"] or result["unexpected"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -26,114 +26,226 @@ Examples:
     or save your credentials in a configuration file and pass this as an argument to the script:
     $ python start_bot.py echo/ --users 1 --tokens \
         --config-file path/to/config.ini
+
+    Several bots, e.g. all conditions of a study, can be started at once from a manifest:
+    $ python start_bot.py --manifest study.json --workers 8
 """
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 import configparser
+import hashlib
 import json
-from pathlib import Path
+import os
+from pathlib import Path, PurePosixPath
 import random
 import shutil
 import subprocess
 import sys
-from time import sleep
+from time import monotonic
 
-import requests
+from provision import Phases, ProvisionCache, SlurkAdmin
+from supervisor import Supervisor
 
 
-def build_docker_image(path, name=None):
-    # if a name is not provided use the name
-    # of the directory with a  "-bot" ending
-    bot_path = Path(path)
-    if name is None:
-        name = f"{Path(path)}-bot"
+DEFAULT_WAITING_ROOM_LAYOUT = "concierge/waiting_room_layout.json"
+DEFAULT_STATE_FILE = ".slurk-state.json"
+# label of the images holding the fingerprint of the files they were built from
+FINGERPRINT_LABEL = "slurk.fingerprint"
 
-    subprocess.run(
-        [
-            "docker",
-            "build",
-            "--tag",
-            f"slurk/{name}",
-            "-f",
-            f"{bot_path}/Dockerfile",
-            ".",
-        ]
-    )
 
+def dockerfile_sources(dockerfile):
+    """Files a Dockerfile copies from the build context (the current
+    directory) into the image."""
+    for line in Path(dockerfile).read_text(encoding="utf-8").splitlines():
+        instruction = line.split()
+        if not instruction or instruction[0].upper() not in {"COPY", "ADD"}:
+            continue
 
-def create_room_layout(room_layout):
-    response = requests.post(
-        f"{SLURK_API}/layouts",
-        headers={"Authorization": f"Bearer {API_TOKEN}"},
-        json=room_layout,
-    )
+        for source in instruction[1:-1]:
+            if source.startswith("--"):
+                continue
+            source = Path(source)
+            filenames = sorted(source.rglob("*")) if source.is_dir() else [source]
+            for filename in filenames:
+                # skipped by .dockerignore as well
+                if "__pycache__" in filename.parts or not filename.is_file():
+                    continue
+                yield filename
 
-    if not response.ok:
-        print(f"could not create room layout: {room_layout['title']}")
-        response.raise_for_status()
 
-    return response.json()["id"]
+def image_fingerprint(dockerfile):
+    """Hash of a Dockerfile and of every file it copies into the image."""
+    digest = hashlib.sha256(Path(dockerfile).read_bytes())
+    for filename in dockerfile_sources(dockerfile):
+        digest.update(f"{filename.as_posix()}\0".encode())
+        digest.update(filename.read_bytes())
+    return digest.hexdigest()
 
 
-def create_room(room_layout):
-    response = requests.post(
-        f"{SLURK_API}/rooms",
-        headers={"Authorization": f"Bearer {API_TOKEN}"},
-        json={"layout_id": room_layout},
+def image_label(name, label):
+    result = subprocess.run(
+        [
+            "docker",
+            "image",
+            "inspect",
+            "--format",
+            f'{{{{ index .Config.Labels "{label}" }}}}',
+            f"slurk/{name}",
+        ],
+        capture_output=True,
+        text=True,
     )
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip()
+
+
+def build_docker_image(path, name=None, quiet=False, cache=None, force=False):
+    """Build the image of a bot, unless an image built from the same
+    files exists already.
+    :param quiet: Only keep the output of the build to report failures
+    :type quiet: bool
+    :param cache: Remembers how long builds took, to tell how much
+        time skipping them saved
+    :type cache: provision.ProvisionCache, optional
+    :param force: Build even if the image is up to date
+    :type force: bool
+    :return: The image name, whether it was built, the seconds it took,
+        the seconds saved by skipping it if known, and the output of a
+        failed build
+    :rtype: dict
+    """
+    # if a name is not provided use the name
+    # of the directory with a  "-bot" ending
+    bot_path = Path(path)
+    if name is None:
+        name = f"{Path(path)}-bot"
 
-    if not response.ok:
-        print(f"could not create room: {room_layout['title']}")
-        response.raise_for_status()
-
-    return response.json()["id"]
+    build = {"image": name, "built": False, "seconds": 0.0, "saved": None, "error": None}
+    fingerprint = image_fingerprint(bot_path / "Dockerfile")
+    if not force and image_label(name, FINGERPRINT_LABEL) == fingerprint:
+        last_build = cache.image(name) if cache is not None else None
+        if last_build is not None and last_build["fingerprint"] == fingerprint:
+            build["saved"] = last_build["seconds"]
+        return build
 
+    command = [
+        "docker",
+        "build",
+        "--tag",
+        f"slurk/{name}",
+        "--label",
+        f"{FINGERPRINT_LABEL}={fingerprint}",
+        "-f",
+        f"{bot_path}/Dockerfile",
+        ".",
+    ]
+    if quiet:
+        # builds running side by side would interleave their output
+        command.insert(2, "--quiet")
 
-def create_permissions(permissions):
-    response = requests.post(
-        f"{SLURK_API}/permissions",
-        headers={"Authorization": f"Bearer {API_TOKEN}"},
-        json=permissions,
-    )
+    start = monotonic()
+    result = subprocess.run(command, capture_output=quiet, text=quiet)
+    build["seconds"] = monotonic() - start
+    if result.returncode != 0:
+        build["error"] = result.stderr if quiet else f"exit code {result.returncode}"
+        return build
 
-    if not response.ok:
-        print("could not create permissions")
-        response.raise_for_status()
+    build["built"] = True
+    if cache is not None:
+        cache.put_image(name, fingerprint, build["seconds"])
+    return build
 
-    return response.json()["id"]
 
+def run_docker_container(name, env):
+    docker_args = [
+        "docker",
+        "run",
+        "--restart",
+        "unless-stopped",
+        "--network",
+        "host",
+        "-d",
+    ]
+    for key, value in env.items():
+        docker_args.extend(["-e", f"{key}={value}"])
+    docker_args.append(f"slurk/{name}")
+    return subprocess.run(docker_args)
+
+
+def local_command(bot_path):
+    """Command and working directory to run a bot without docker,
+    following the ENTRYPOINT and WORKDIR of its Dockerfile."""
+    entrypoint, workdir = None, "/"
+    for line in (bot_path / "Dockerfile").read_text(encoding="utf-8").splitlines():
+        instruction = line.split(maxsplit=1)
+        if len(instruction) < 2:
+            continue
+        if instruction[0].upper() == "WORKDIR":
+            workdir = instruction[1].strip()
+        elif instruction[0].upper() == "ENTRYPOINT":
+            entrypoint = json.loads(instruction[1])
+
+    if entrypoint is None:
+        raise ValueError(f"The Dockerfile of {bot_path} has no ENTRYPOINT")
+    if entrypoint[0] == "python":
+        entrypoint[0] = sys.executable
+    # images either run the bot inside its own directory or run it as
+    # a package from the directory above
+    cwd = bot_path if PurePosixPath(workdir).name == bot_path.name else Path(".")
+    return entrypoint, cwd.resolve()
+
+
+def run_local_processes(bots):
+    """Run bots as local processes with the environment their containers
+    would get, until interrupted.
+    :param bots: Name, directory and environment of every bot
+    :type bots: list
+    """
+    root = str(Path(".").resolve())
+    pythonpath = os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")]))
+
+    supervisor = Supervisor()
+    for name, bot_path, env in bots:
+        command, cwd = local_command(Path(bot_path))
+        supervisor.add(
+            name,
+            command,
+            cwd=cwd,
+            env={
+                **os.environ,
+                # shared modules such as templates.py live in the root
+                "PYTHONPATH": pythonpath,
+                "PYTHONUNBUFFERED": "1",
+                **{key: str(value) for key, value in env.items()},
+            },
+            watch=list(dockerfile_sources(Path(bot_path) / "Dockerfile")),
+        )
+    print("running the bots locally, stop them with Ctrl+C")
+    supervisor.run()
 
-def create_token(permissions, room_id, task_id=None):
-    response = requests.post(
-        f"{SLURK_API}/tokens",
-        headers={"Authorization": f"Bearer {API_TOKEN}"},
-        json={
-            "permissions_id": permissions,
-            "room_id": room_id,
-            "registrations_left": 1,
-            "task_id": task_id,
-        },
-    )
 
-    if not response.ok:
-        print("could not create token")
-        response.raise_for_status()
+def read_json(path):
+    return json.loads(Path(path).read_text(encoding="utf-8"))
 
-    return response.json()["id"]
 
+def read_extra_args(path):
+    extra_args_path = Path(path)
+    # make sure extra-args config file exists:
+    if not extra_args_path.exists():
+        raise FileNotFoundError(f"Extra argument file missing: {path}")
 
-def create_user(name, token):
-    response = requests.post(
-        f"{SLURK_API}/users",
-        headers={"Authorization": f"Bearer {API_TOKEN}"},
-        json={"name": name, "token_id": token},
-    )
+    # read config file
+    extra_args = configparser.ConfigParser()
+    extra_args.optionxform = str  # arg names should be case sensitive
+    extra_args.read(extra_args_path)
 
-    if not response.ok:
-        print(f"could not create user: {name}")
-        response.raise_for_status()
+    # make sure it has the right structure
+    if dict(extra_args).get("ARGS") is None:
+        raise ValueError(f"Invalid formatting for extra argument file: {path}")
 
-    return response.json()["id"]
+    return dict(extra_args["ARGS"])
 
 
 def find_task_layout_file(path):
@@ -166,211 +278,503 @@ def find_user_permissions_file(path):
     )
 
 
-def create_task(name, num_users, layout_id):
-    response = requests.post(
-        f"{SLURK_API}/tasks",
-        headers={"Authorization": f"Bearer {API_TOKEN}"},
-        json={"name": name, "num_users": num_users, "layout_id": layout_id},
-    )
+def create_bot_user(admin, name, permissions, room_id):
+    permissions_id = admin.create_permissions(permissions, shared=True)
+    token = admin.create_token(permissions_id, room_id)
+    user_id = admin.create_user(name, token)
+    return token, user_id
+
+
+def create_user_token(admin, permissions, room_id, task_id):
+    permissions_id = admin.create_permissions(permissions)
+    return admin.create_token(permissions_id, room_id, task_id)
+
+
+def start_slurk_server(admin, plugin_dirs=()):
+    if not Path("../slurk").exists():
+        raise FileNotFoundError(
+            "../slurk is missing, download it first: https://github.com/clp-research/slurk/"
+            " and make sure that slurk and slurk-bots are in the same directory"
+        )
 
-    if not response.ok:
-        print(f"could not create task: {name}")
-        response.raise_for_status()
+    # plugins must be all placed in the plugin directory
+    target_dir = Path("../slurk/slurk/views/static/plugins/")
+    for plugins_path in plugin_dirs:
+        if not plugins_path.exists():
+            raise FileNotFoundError("Your bot is missing a 'plugins' directory")
 
-    return response.json()["id"]
+        for filename in plugins_path.iterdir():
+            shutil.copy(filename, target_dir)
 
+    # build image
+    subprocess.run(
+        ["docker", "build", "--tag", "slurk/server", "-f", "Dockerfile", "."],
+        cwd=Path("../slurk"),
+    )
+
+    # run slurk server
+    subprocess.run(
+        [
+            "docker",
+            "run",
+            "-d",
+            "-p",
+            "5000:80",
+            "-e",
+            f"SLURK_SECRET_KEY={random.randint(0, 100000)}",
+            "-e",
+            "SLURK_DISABLE_ETAG=False",
+            "-e",
+            "FLASK_ENV=development",
+            "slurk/server:latest",
+        ]
+    )
+    waited = admin.wait_until_ready()
+    print(f"slurk server ready after {waited:.1f}s")
 
-def create_waiting_room(args):
+
+def create_waiting_room(args, admin):
+    """Create a waiting room and the user of its concierge bot.
+    :return: The waiting room and the environment of the concierge bot
+        to start, if one is needed
+    :rtype: tuple
+    """
     # create a waiting room if not provided
     if args.waiting_room_id is None:
         # create a waiting_room_layout (or read from args)
         if args.waiting_room_layout_dict is None:
             print("Skip waiting room creation")
-            return None
+            return None, None
 
         waiting_room_layout_dict_path = Path(args.waiting_room_layout_dict)
         if not Path(waiting_room_layout_dict_path).exists():
             raise FileNotFoundError("Missing layout file for the waiting room")
 
-        waiting_room_layout_dict = json.loads(
-            Path(waiting_room_layout_dict_path).read_text(encoding="utf-8")
-        )
-        waiting_room_layout = args.waiting_room_layout_id or create_room_layout(
+        waiting_room_layout_dict = read_json(waiting_room_layout_dict_path)
+        waiting_room_layout = args.waiting_room_layout_id or admin.create_room_layout(
             waiting_room_layout_dict
         )
 
         # create a new waiting room
-        waiting_room_id = create_room(waiting_room_layout)
+        waiting_room_id = admin.create_room(waiting_room_layout)
 
         # create a concierge bot for this room
         if "concierge" in args.bot:
-            bot_name = args.bot_name or str(bot_base_path)
+            bot_name = args.bot_name or str(Path(args.bot))
             concierge_name = f"{bot_name}-{waiting_room_id}"
         else:
             concierge_name = f"concierge-{waiting_room_id}"
 
         concierge_bot_permissions_file = find_bot_permissions_file(Path("concierge"))
-        concierge_permissions_dict = json.loads(
-            concierge_bot_permissions_file.read_text(encoding="utf-8")
-        )
-        concierge_permissions = create_permissions(concierge_permissions_dict)
-        concierge_bot_token = create_token(concierge_permissions, waiting_room_id)
-        concierge_bot_user_id = create_user(concierge_name, concierge_bot_token)
-
-        build_docker_image("concierge", concierge_name)
-        subprocess.run(
-            [
-                "docker",
-                "run",
-                "--restart",
-                "unless-stopped",
-                "--network",
-                "host",
-                "-d",
-                "-e",
-                f"WAITING_ROOM={waiting_room_id}",
-                "-e",
-                f"BOT_TOKEN={concierge_bot_token}",
-                "-e",
-                f"BOT_ID={concierge_bot_user_id}",
-                "-e",
-                f"SLURK_HOST={SLURK_HOST}",
-                f"slurk/{concierge_name}",
-            ]
+        concierge_bot_token, concierge_bot_user_id = create_bot_user(
+            admin,
+            concierge_name,
+            read_json(concierge_bot_permissions_file),
+            waiting_room_id,
         )
 
+        concierge_env = {
+            "WAITING_ROOM": waiting_room_id,
+            "BOT_TOKEN": concierge_bot_token,
+            "BOT_ID": concierge_bot_user_id,
+            "SLURK_HOST": admin.host,
+        }
+
         if "concierge" in args.bot:
             print("---------------------------")
             print(f"waiting room id:\t{waiting_room_id}")
             print("---------------------------")
     else:
         waiting_room_id = args.waiting_room_id
+        concierge_env = None
 
-    return waiting_room_id
+    return waiting_room_id, concierge_env
 
 
-def main(args):
-    bot_base_path = Path(args.bot)
+def load_manifest(path):
+    """Read an experiment manifest and check every file it refers to,
+    so that nothing is created or built for a broken manifest.
 
-    if args.dev is True:
-        if any([args.waiting_room_id, args.waiting_room_layout_id]):
-            raise ValueError(
-                "You provided a waiting room id or layout, you cannot also start a new slurk server"
-            )
+    Every entry of `bots` is started once, or once per condition if it
+    has `conditions`, which map a condition name to the extra argument
+    file of that condition.
+    :return: The manifest and one dict per bot to start
+    :rtype: tuple
+    """
+    manifest = read_json(path)
+    if not manifest.get("bots"):
+        raise ValueError("The manifest does not list any bots")
+
+    if manifest.get("waiting_room_id") is None:
+        waiting_room_layout = manifest.setdefault(
+            "waiting_room_layout", DEFAULT_WAITING_ROOM_LAYOUT
+        )
+        if not Path(waiting_room_layout).exists():
+            raise FileNotFoundError("Missing layout file for the waiting room")
 
-        if not Path("../slurk").exists():
-            raise FileNotFoundError(
-                "../slurk is missing, download it first: https://github.com/clp-research/slurk/"
-                " and make sure that slurk and slurk-bots are in the same directory"
+    bots = []
+    for entry in manifest["bots"]:
+        if entry.get("bot") is None or entry.get("users") is None:
+            raise ValueError(f"Every bot in the manifest needs `bot` and `users`: {entry}")
+
+        bot_path = Path(entry["bot"])
+        if not (bot_path / "Dockerfile").exists():
+            raise FileNotFoundError(f"Missing Dockerfile for bot {bot_path}")
+
+        image = entry.get("name") or bot_path.name
+        files = {
+            "task_layout": find_task_layout_file(bot_path),
+            "bot_permissions": find_bot_permissions_file(bot_path),
+        }
+        if entry.get("tokens", 0) > 0:
+            files["user_permissions"] = find_user_permissions_file(bot_path)
+
+        conditions = entry.get("conditions") or {None: entry.get("extra_args")}
+        for condition, extra_args in conditions.items():
+            bots.append(
+                {
+                    "bot": bot_path,
+                    "image": image,
+                    "name": image if condition is None else f"{image}-{condition}",
+                    "users": entry["users"],
+                    "tokens": entry.get("tokens", 0),
+                    "env": read_extra_args(extra_args) if extra_args else {},
+                    **files,
+                }
             )
 
-        if args.copy_plugins is True:
-            # plugins must be all placed in the plugin directory
-            target_dir = Path("../slurk/slurk/views/static/plugins/")
-            plugins_path = Path(f"{bot_base_path}/plugins")
+    names = [bot["name"] for bot in bots]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Bot names in the manifest are not unique: {names}")
+
+    return manifest, bots
+
+
+def provision_manifest(manifest, bots, admin, workers=8, phases=None):
+    """Create the API objects of all bots of a manifest, `workers`
+    requests at a time. Objects only depend on objects of earlier
+    phases, so each phase runs all its requests in parallel: layouts,
+    then the waiting room and tasks, then the bot users and the user
+    tokens.
+    :return: The waiting room, the concierge user if one is needed and
+        the created objects of every bot
+    :rtype: dict
+    """
+    phases = phases or Phases()
+    waiting_room_id = manifest.get("waiting_room_id")
+
+    with ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix="provision"
+    ) as executor:
+        with phases.phase("layouts"):
+            # bots started under several conditions share one layout
+            layout_files = list(dict.fromkeys(bot["task_layout"] for bot in bots))
+            if waiting_room_id is None:
+                layout_files.append(Path(manifest["waiting_room_layout"]))
+            layouts = [read_json(path) for path in layout_files]
+            layout_ids = dict(
+                zip(layout_files, executor.map(admin.create_room_layout, layouts))
+            )
 
-            if not plugins_path.exists():
-                raise FileNotFoundError("Your bot is missing a 'plugins' directory")
+        with phases.phase("rooms and tasks"):
+            if waiting_room_id is None:
+                waiting_room = executor.submit(
+                    admin.create_room,
+                    layout_ids[Path(manifest["waiting_room_layout"])],
+                )
+            tasks = [
+                executor.submit(
+                    admin.create_task,
+                    f"{bot['name'].capitalize()} Task",
+                    bot["users"],
+                    layout_ids[bot["task_layout"]],
+                )
+                for bot in bots
+            ]
+            if waiting_room_id is None:
+                waiting_room_id = waiting_room.result()
+            task_ids = [task.result() for task in tasks]
+
+        with phases.phase("bot users"):
+            concierge = None
+            if manifest.get("waiting_room_id") is None:
+                concierge = executor.submit(
+                    create_bot_user,
+                    admin,
+                    f"concierge-{waiting_room_id}",
+                    read_json(find_bot_permissions_file(Path("concierge"))),
+                    waiting_room_id,
+                )
+            users = [
+                executor.submit(
+                    create_bot_user,
+                    admin,
+                    bot["name"],
+                    read_json(bot["bot_permissions"]),
+                    waiting_room_id,
+                )
+                for bot in bots
+            ]
+            if concierge is not None:
+                concierge = dict(zip(("token", "user_id"), concierge.result()))
+            users = [user.result() for user in users]
+
+        with phases.phase("user tokens"):
+            # every token gets its own permissions: bots like recolage
+            # mute single users by changing their permissions
+            tokens = []
+            for bot, task_id in zip(bots, task_ids):
+                permissions = bot["tokens"] and read_json(bot["user_permissions"])
+                tokens.append(
+                    [
+                        executor.submit(
+                            create_user_token, admin, permissions, waiting_room_id, task_id
+                        )
+                        for _ in range(bot["tokens"])
+                    ]
+                )
+            tokens = [[token.result() for token in bot_tokens] for bot_tokens in tokens]
+
+    return {
+        "waiting_room_id": waiting_room_id,
+        "concierge": concierge,
+        "bots": [
+            {
+                **bot,
+                "task_id": task_id,
+                "token": token,
+                "user_id": user_id,
+                "user_tokens": bot_tokens,
+            }
+            for bot, task_id, (token, user_id), bot_tokens in zip(
+                bots, task_ids, users, tokens
+            )
+        ],
+    }
+
+
+def build_images(images, phases=None, cache=None, force=False):
+    """Build the images of a deployment side by side, skipping the ones
+    that are up to date, see `build_docker_image`.
+    :param images: Bot directory per image name
+    :type images: dict
+    :return: One result per image
+    :rtype: list
+    """
+    phases = phases or Phases()
+    with phases.phase("docker builds"):
+        with ThreadPoolExecutor(
+            max_workers=max(1, len(images)), thread_name_prefix="build"
+        ) as executor:
+            return list(
+                executor.map(
+                    lambda item: build_docker_image(
+                        item[1],
+                        item[0],
+                        quiet=len(images) > 1,
+                        cache=cache,
+                        force=force,
+                    ),
+                    images.items(),
+                )
+            )
 
-            for filename in plugins_path.iterdir():
-                shutil.copy(filename, target_dir)
 
-        # build image
-        subprocess.run(
-            ["docker", "build", "--tag", "slurk/server", "-f", "Dockerfile", "."],
-            cwd=Path("../slurk"),
+def check_builds(builds):
+    """Report the builds and raise if any failed."""
+    if not builds:
+        return
+    built = [build for build in builds if build["built"]]
+    skipped = [build for build in builds if not build["built"] and not build["error"]]
+    failed = [build for build in builds if build["error"]]
+
+    report = f"docker images: {len(built)} built"
+    if built:
+        report += f" in {sum(build['seconds'] for build in built):.1f}s"
+    report += f", {len(skipped)} up to date"
+    saved = [build["saved"] for build in skipped if build["saved"] is not None]
+    if saved:
+        report += f", about {sum(saved):.1f}s of build time saved"
+    print(report)
+
+    for build in failed:
+        print(f"could not build image slurk/{build['image']}:\n{build['error']}")
+    if failed:
+        raise RuntimeError(
+            f"Docker builds failed: {', '.join(build['image'] for build in failed)}"
         )
 
-        # run slurk server
-        subprocess.run(
-            [
-                "docker",
-                "run",
-                "-d",
-                "-p",
-                "5000:80",
-                "-e",
-                f"SLURK_SECRET_KEY={random.randint(0, 100000)}",
-                "-e",
-                "SLURK_DISABLE_ETAG=False",
-                "-e",
-                "FLASK_ENV=development",
-                "slurk/server:latest",
-            ]
-        )
-        sleep(1)
 
-    waiting_room_id = create_waiting_room(args)
+def print_manifest_summary(deployment, admin, phases):
+    for bot in deployment["bots"]:
+        for number, token in enumerate(bot["user_tokens"]):
+            link = admin.login_link(token, f"user_{number}")
+            print(f"{bot['name']} | Token: {token} | Link: {link}")
+
+    rows = [("bot", "task id", "user id", "tokens")]
+    rows.extend(
+        (bot["name"], bot["task_id"], bot["user_id"], len(bot["user_tokens"]))
+        for bot in deployment["bots"]
+    )
+    widths = [max(len(str(row[column])) for row in rows) for column in range(4)]
+
+    print("---------------------------")
+    print(f"waiting room id:\t{deployment['waiting_room_id']}")
+    if deployment["concierge"] is not None:
+        print(f"concierge user id:\t{deployment['concierge']['user_id']}")
+    print("---------------------------")
+    for row in rows:
+        print("  ".join(str(value).ljust(width) for value, width in zip(row, widths)))
+    print("---------------------------")
+    print(phases.render())
+    print("---------------------------")
+    print_cache_summary(admin)
+
+
+def print_cache_summary(admin):
+    if admin.cache is None:
+        return
+    stats = admin.cache.stats()
+    print(
+        f"layouts and permissions: {stats['reused']} reused, {stats['created']} created"
+        f" (state file: {admin.cache.path})"
+    )
+
+
+def deploy_manifest(args, admin):
+    """Start every bot of a manifest: the images are built while the API
+    objects are created, then all containers are started, or with
+    `--local` all bots are run as local processes."""
+    manifest, bots = load_manifest(args.manifest)
+    phases = Phases()
+
+    with phases.phase("total"):
+        if args.dev is True:
+            if manifest.get("waiting_room_id") is not None:
+                raise ValueError(
+                    "You provided a waiting room id, you cannot also start a new slurk server"
+                )
+            plugin_dirs = dict.fromkeys(bot["bot"] / "plugins" for bot in bots)
+            with phases.phase("slurk server"):
+                start_slurk_server(admin, plugin_dirs if args.copy_plugins else ())
+
+        images = {bot["image"]: bot["bot"] for bot in bots}
+        if manifest.get("waiting_room_id") is None:
+            images["concierge"] = Path("concierge")
+        if args.local:
+            images = {}
+
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="builds") as builds:
+            builds = builds.submit(
+                build_images, images, phases, admin.cache, args.rebuild
+            )
+            deployment = provision_manifest(manifest, bots, admin, args.workers, phases)
+            builds = builds.result()
+        check_builds(builds)
+
+        # name, image, directory and environment of every bot
+        launches = []
+        if deployment["concierge"] is not None:
+            concierge_env = {
+                "WAITING_ROOM": deployment["waiting_room_id"],
+                "BOT_TOKEN": deployment["concierge"]["token"],
+                "BOT_ID": deployment["concierge"]["user_id"],
+                "SLURK_HOST": admin.host,
+            }
+            launches.append(
+                ("concierge", "concierge", Path("concierge"), concierge_env)
+            )
+        for bot in deployment["bots"]:
+            env = {
+                "BOT_TOKEN": bot["token"],
+                "BOT_ID": bot["user_id"],
+                "TASK_ID": bot["task_id"],
+                "WAITING_ROOM": deployment["waiting_room_id"],
+                "SLURK_HOST": admin.host,
+                **bot["env"],
+            }
+            launches.append((bot["name"], bot["image"], bot["bot"], env))
+
+        if not args.local:
+            with phases.phase("containers"):
+                with ThreadPoolExecutor(
+                    max_workers=args.workers, thread_name_prefix="container"
+                ) as executor:
+                    list(
+                        executor.map(
+                            lambda launch: run_docker_container(launch[1], launch[3]),
+                            launches,
+                        )
+                    )
+
+    print_manifest_summary(deployment, admin, phases)
+    if args.local:
+        run_local_processes([(name, path, env) for name, _, path, env in launches])
+
+
+def main(args, admin):
+    bot_base_path = Path(args.bot)
+
+    if args.dev is True:
+        if any([args.waiting_room_id, args.waiting_room_layout_id]):
+            raise ValueError(
+                "You provided a waiting room id or layout, you cannot also start a new slurk server"
+            )
+
+        plugin_dirs = [Path(f"{bot_base_path}/plugins")] if args.copy_plugins else []
+        start_slurk_server(admin, plugin_dirs)
+
+    # the images are built while the objects are created on the server
+    bot_name = args.bot_name or str(bot_base_path)
+    images = {bot_name: bot_base_path}
+    if args.waiting_room_id is None and args.waiting_room_layout_dict is not None:
+        images["concierge"] = Path("concierge")
+    if args.local:
+        images = {}
+    builds = ThreadPoolExecutor(max_workers=1, thread_name_prefix="builds")
+    built = builds.submit(build_images, images, None, admin.cache, args.rebuild)
+    builds.shutdown(wait=False)
+
+    waiting_room_id, concierge_env = create_waiting_room(args, admin)
 
     # create task room
     # look for the task room layout (allow some options)
     task_room_layout_path = find_task_layout_file(bot_base_path)
-    task_room_layout_dict = json.loads(
-        task_room_layout_path.read_text(encoding="utf-8")
-    )
-    task_room_layout_id = create_room_layout(task_room_layout_dict)
+    task_room_layout_id = admin.create_room_layout(read_json(task_room_layout_path))
 
     # if there is no waiting room, create a task room instead
     if not waiting_room_id:
-        room_id = create_room(task_room_layout_id)
+        room_id = admin.create_room(task_room_layout_id)
     else:
         room_id = waiting_room_id
 
-    bot_name = args.bot_name or str(bot_base_path)
-    task_id = create_task(
+    task_id = admin.create_task(
         f"{bot_name.capitalize()} Task", args.users, task_room_layout_id
     )
     task_bot_permissions_path = find_bot_permissions_file(bot_base_path)
-    task_bot_permissions_dict = json.loads(
-        task_bot_permissions_path.read_text(encoding="utf-8")
+    task_bot_token, task_bot_user_id = create_bot_user(
+        admin, bot_name, read_json(task_bot_permissions_path), room_id
     )
-    task_bot_permissions_id = create_permissions(task_bot_permissions_dict)
-    task_bot_token = create_token(task_bot_permissions_id, room_id)
-    task_bot_user_id = create_user(bot_name, task_bot_token)
 
-    build_docker_image(args.bot, bot_name)
-    docker_args = [
-        "docker",
-        "run",
-        "--restart",
-        "unless-stopped",
-        "--network",
-        "host",
-        "-d",
-        "-e",
-        f"BOT_TOKEN={task_bot_token}",
-        "-e",
-        f"BOT_ID={task_bot_user_id}",
-        "-e",
-        f"TASK_ID={task_id}",
-        "-e",
-        f"WAITING_ROOM={waiting_room_id}",
-        "-e",
-        f"SLURK_HOST={SLURK_HOST}",
-    ]
+    env = {
+        "BOT_TOKEN": task_bot_token,
+        "BOT_ID": task_bot_user_id,
+        "TASK_ID": task_id,
+        "WAITING_ROOM": waiting_room_id,
+        "SLURK_HOST": admin.host,
+    }
 
     if args.extra_args is not None:
-        extra_args_path = Path(args.extra_args)
-        # make sure extra-args config file exists:
-        if not extra_args_path.exists():
-            raise FileNotFoundError("Extra argument file missing")
-
-        # read config file
-        extra_args = configparser.ConfigParser()
-        extra_args.optionxform = str  # arg names should be case sensitive
-        extra_args.read(extra_args_path)
-        extra_args.sections()
-
-        # make sure it has the right structure
-        if dict(extra_args).get("ARGS") is None:
-            raise ValueError("Invalid formatting for extra argument file")
-
         # collect arguments
-        for key, value in extra_args["ARGS"].items():
-            docker_args.extend(["-e", f"{key}={value}"])
+        env.update(read_extra_args(args.extra_args))
 
-    docker_args.append(f"slurk/{bot_name}")
-    subprocess.run(docker_args)
+    check_builds(built.result())
+    launches = [(bot_name, bot_base_path, env)]
+    if concierge_env is not None:
+        launches.insert(0, ("concierge", Path("concierge"), concierge_env))
+    if not args.local:
+        for name, _, bot_env in launches:
+            run_docker_container(name, bot_env)
 
     print("---------------------------")
     print(f"room id:\t{room_id}")
@@ -379,17 +783,19 @@ def main(args):
 
     if any([args.tokens, args.dev]) is True:
         user_permissions_path = find_user_permissions_file(bot_base_path)
-        user_permissions_dict = json.loads(
-            user_permissions_path.read_text(encoding="utf-8")
-        )
+        user_permissions_dict = read_json(user_permissions_path)
 
         for user in range(args.users):
-            user_permissions_id = create_permissions(user_permissions_dict)
-            user_token = create_token(user_permissions_id, room_id, task_id)
+            user_permissions_id = admin.create_permissions(user_permissions_dict)
+            user_token = admin.create_token(user_permissions_id, room_id, task_id)
             print(
-                f"Token: {user_token} | Link: {SLURK_HOST}/login?name=user_{user}&token={user_token}"
+                f"Token: {user_token} | Link: {admin.login_link(user_token, f'user_{user}')}"
             )
 
+    print_cache_summary(admin)
+    if args.local:
+        run_local_processes(launches)
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
@@ -397,6 +803,7 @@ if __name__ == "__main__":
     )
     parser.add_argument(
         "bot",
+        nargs="?",
         help="path to the directory containing your bot",
     )
     parser.add_argument(
@@ -410,7 +817,8 @@ if __name__ == "__main__":
     parser.add_argument(
         "--users",
         help="number of users for this task",
-        required=all("concierge" not in arg for arg in sys.argv),
+        required=all("concierge" not in arg for arg in sys.argv)
+        and "--manifest" not in sys.argv,
         type=int,
     )
     parser.add_argument(
@@ -458,12 +866,44 @@ if __name__ == "__main__":
         help="copy all the files in the plugins directory to slurk's plugins before starting the slurk server",
         action="store_true",
     )
+    parser.add_argument(
+        "--manifest",
+        help="path to a json file listing several bots to start at once, replaces the bot argument",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="number of requests sent to the slurk server at once in manifest mode",
+    )
+    parser.add_argument(
+        "--state-file",
+        default=DEFAULT_STATE_FILE,
+        help="file remembering the layouts and bot permissions created before, which are reused if their content did not change",
+    )
+    parser.add_argument(
+        "--no-state",
+        action="store_true",
+        help="create all layouts and permissions anew instead of reusing the ones in the state file",
+    )
+    parser.add_argument(
+        "--local",
+        action="store_true",
+        help="run the bots as local processes instead of docker containers, restarting them when they crash or their files change",
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="build the docker images even if they are up to date",
+    )
     args = parser.parse_args()
 
+    if (args.bot is None) == (args.manifest is None):
+        parser.error("pass either the directory of a bot or --manifest")
+
     # define some variables here
-    SLURK_HOST = args.slurk_host
-    SLURK_API = f"{args.slurk_host}/slurk/api"
-    API_TOKEN = args.slurk_api_token
+    slurk_host = args.slurk_host
+    api_token = args.slurk_api_token
 
     if args.config_file:
         config_file = Path(args.config_file)
@@ -477,10 +917,16 @@ if __name__ == "__main__":
         if any(config["SLURK"].get(i) is None for i in ["host", "token"]):
             raise ValueError("Invalid formatting for configuration file")
 
-        slurk_address = config.get("SLURK", "host")
-        SLURK_HOST = slurk_address
-        SLURK_API = f"{slurk_address}/slurk/api"
-        API_TOKEN = config.get("SLURK", "token")
+        slurk_host = config.get("SLURK", "host")
+        api_token = config.get("SLURK", "token")
+
+    cache = None if args.no_state else ProvisionCache(args.state_file)
+    admin = SlurkAdmin(
+        slurk_host, api_token, pool_size=max(args.workers, 1), cache=cache
+    )
 
     # start bot
-    main(args)
+    if args.manifest is not None:
+        deploy_manifest(args, admin)
+    else:
+        main(args, admin)
@@ -1,9 +1,7 @@
 import logging
 import random
-from threading import Timer
-
-import requests
 
+from common.scheduler import schedule
 from templates import TaskBot
 
 
@@ -11,18 +9,19 @@ TIMEOUT_TIMER = 60  # minutes
 
 
 class RoomTimer:
-    def __init__(self, function, room_id):
+    def __init__(self, function, room_id, timeout=TIMEOUT_TIMER):
         self.function = function
         self.room_id = room_id
+        self.timeout = timeout
         self.start_timer()
 
     def start_timer(self):
-        self.timer = Timer(TIMEOUT_TIMER * 60, self.function, args=[self.room_id])
-        self.timer.start()
+        self.timer = schedule(
+            self.timeout * 60, self.function, self.room_id, group=self.room_id
+        )
 
     def reset(self):
-        self.timer.cancel()
-        self.start_timer()
+        self.timer.reset()
         logging.debug("reset timer")
 
     def cancel(self):
@@ -37,7 +36,9 @@ class StrictTurnTakingBot(TaskBot):
         room_id = data["room"]
         self.users_per_room[room_id] = list()
 
-        self.timers_per_room[room_id] = RoomTimer(self.close_room, room_id)
+        # the timeout can be set per task, see `--task-config`
+        timeout = self.tasks.setting(room_id, "timeout_timer", TIMEOUT_TIMER)
+        self.timers_per_room[room_id] = RoomTimer(self.close_room, room_id, timeout)
 
         # assign random writing rights and inform the users
         rights = [True, False]
@@ -67,100 +68,36 @@ class StrictTurnTakingBot(TaskBot):
                 )
 
                 # make input field unresponsive
-                response = requests.patch(
-                    f"{self.uri}/rooms/{room_id}/attribute/id/text",
+                response = self.api.patch(
+                    f"/rooms/{room_id}/attribute/id/text",
                     json={
                         "attribute": "readonly",
                         "value": "true",
                         "receiver_id": usr["id"],
                     },
-                    headers={"Authorization": f"Bearer {self.token}"},
                 )
-                response = requests.patch(
-                    f"{self.uri}/rooms/{room_id}/attribute/id/text",
+                response = self.api.patch(
+                    f"/rooms/{room_id}/attribute/id/text",
                     json={
                         "attribute": "placeholder",
                         "value": "Wait for a message from your partner",
                         "receiver_id": usr["id"],
                     },
-                    headers={"Authorization": f"Bearer {self.token}"},
                 )
 
     def close_room(self, room_id):
         self.room_to_read_only(room_id)
         self.timers_per_room.pop(room_id)
         self.users_per_room.pop(room_id)
+        self.tasks.close_room(room_id)
 
     def set_message_privilege(self, user_id, value):
         """
         change user's permission to send messages
         """
-        # get permission_id based on user_id
-        response = requests.get(
-            f"{self.uri}/users/{user_id}/permissions",
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
-        self.request_feedback(response, "retrieving user's permissions")
-
-        permission_id = response.json()["id"]
-        requests.patch(
-            f"{self.uri}/permissions/{permission_id}",
-            json={"send_message": value},
-            headers={
-                "If-Match": response.headers["ETag"],
-                "Authorization": f"Bearer {self.token}",
-            },
-        )
+        response = self.metadata.update_permissions(user_id, {"send_message": value})
         self.request_feedback(response, "changing user's message permission")
 
-    def room_to_read_only(self, room_id):
-        """Set room to read only."""
-        # set room to read-only by disabling the text input field
-        response = requests.patch(
-            f"{self.uri}/rooms/{room_id}/attribute/id/text",
-            json={"attribute": "readonly", "value": "True"},
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
-        self.request_feedback(response, "Could not set room to read_only")
-        response = requests.patch(
-            f"{self.uri}/rooms/{room_id}/attribute/id/text",
-            json={"attribute": "placeholder", "value": "This room is read-only"},
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
-        self.request_feedback(response, "Could not set room to read_only")
-
-        # get users in this room
-        response = requests.get(
-            f"{self.uri}/rooms/{room_id}/users",
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
-        if not response.ok:
-            logging.error(f"Could not get user: {response.status_code}")
-
-        users = response.json()
-        for user in users:
-            if user["id"] != self.user:
-                # get current user
-                response = requests.get(
-                    f"{self.uri}/users/{user['id']}",
-                    headers={"Authorization": f"Bearer {self.token}"},
-                )
-                self.request_feedback(
-                    response, f"Could not get user: {response.status_code}"
-                )
-                etag = response.headers["ETag"]
-
-                # remove this user from this room
-                response = requests.delete(
-                    f"{self.uri}/users/{user['id']}/rooms/{room_id}",
-                    headers={"If-Match": etag, "Authorization": f"Bearer {self.token}"},
-                )
-                self.request_feedback(
-                    response,
-                    f"Could not remove user from task room: {response.status_code}",
-                )
-                logging.debug("Removing user from task room was successful.")
-
     def register_callbacks(self):
         @self.sio.event
         def text_message(data):
@@ -179,44 +116,40 @@ class StrictTurnTakingBot(TaskBot):
 
             # revoke writing rights to current user
             self.set_message_privilege(curr_usr["id"], False)
-            response = requests.patch(
-                f"{self.uri}/rooms/{room_id}/attribute/id/text",
+            response = self.api.patch(
+                f"/rooms/{room_id}/attribute/id/text",
                 json={
                     "attribute": "readonly",
                     "value": "true",
                     "receiver_id": curr_usr["id"],
                 },
-                headers={"Authorization": f"Bearer {self.token}"},
             )
-            response = requests.patch(
-                f"{self.uri}/rooms/{room_id}/attribute/id/text",
+            response = self.api.patch(
+                f"/rooms/{room_id}/attribute/id/text",
                 json={
                     "attribute": "placeholder",
                     "value": "Wait for a message from your partner",
                     "receiver_id": curr_usr["id"],
                 },
-                headers={"Authorization": f"Bearer {self.token}"},
             )
 
             # assign writing rights to other user
             self.set_message_privilege(other_usr["id"], True)
-            response = requests.delete(
-                f"{self.uri}/rooms/{room_id}/attribute/id/text",
+            response = self.api.delete(
+                f"/rooms/{room_id}/attribute/id/text",
                 json={
                     "attribute": "readonly",
                     "value": "placeholder",
                     "receiver_id": other_usr["id"],
                 },
-                headers={"Authorization": f"Bearer {self.token}"},
             )
-            response = requests.patch(
-                f"{self.uri}/rooms/{room_id}/attribute/id/text",
+            response = self.api.patch(
+                f"/rooms/{room_id}/attribute/id/text",
                 json={
                     "attribute": "placeholder",
                     "value": "Enter your message here!",
                     "receiver_id": other_usr["id"],
                 },
-                headers={"Authorization": f"Bearer {self.token}"},
             )
 
 
@@ -230,7 +163,7 @@ if __name__ == "__main__":
 
     # create bot instance
     echo_bot = StrictTurnTakingBot(
-        args.token, args.user, args.task, args.host, args.port
+        args.token, args.user, args.task, args.host, args.port, args.task_config
     )
     # connect to chat server
     echo_bot.run()
@@ -0,0 +1,186 @@
+"""Running bots as local processes, restarted when they crash or when
+their files change."""
+
+import logging
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+
+LOG = logging.getLogger(__name__)
+
+
+class Supervised:
+    def __init__(
+        self, name, command, cwd=None, env=None, watch=(), min_delay=0.5, max_delay=30.0
+    ):
+        """One process of a `Supervisor`.
+        :param name: Prefix of the lines the process writes
+        :type name: str
+        :param command: Program and its arguments
+        :type command: list
+        :param cwd: Working directory of the process
+        :type cwd: str, optional
+        :param env: Environment of the process, that of this process if
+            omitted
+        :type env: dict, optional
+        :param watch: Files whose change restarts the process
+        :type watch: list
+        :param min_delay: Seconds to wait before restarting a crashed
+            process, doubled for every crash in a row
+        :type min_delay: float
+        :param max_delay: Seconds to wait before a restart at most
+        :type max_delay: float
+        """
+        self.name = name
+        self.command = command
+        self.cwd = cwd
+        self.env = env
+        self.watch = list(watch)
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+
+        self.process = None
+        self.crashes = 0
+        self.restarts = 0
+        self._delay = min_delay
+        self._started = None
+        self._restart_at = None
+        self._mtimes = self._snapshot()
+
+    def start(self, write):
+        self.process = subprocess.Popen(
+            self.command,
+            cwd=self.cwd,
+            env=self.env,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+        )
+        self._started = time.monotonic()
+        self._restart_at = None
+        threading.Thread(
+            target=self._pump,
+            args=(self.process, write),
+            name=f"output-{self.name}",
+            daemon=True,
+        ).start()
+
+    def stop(self, timeout=5.0):
+        """Ask the process to terminate, kill it if it does not within
+        `timeout` seconds."""
+        if self.process is None or self.process.poll() is not None:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+    def check(self, write):
+        """Restart the process if it crashed and its delay passed, or at
+        once if one of its files changed."""
+        now = time.monotonic()
+        mtimes = self._snapshot()
+        if mtimes != self._mtimes:
+            self._mtimes = mtimes
+            write(self.name, "files changed, restarting")
+            self.stop()
+            self._delay = self.min_delay
+            self.restarts += 1
+            self.start(write)
+            return
+
+        code = self.process.poll()
+        if code is None:
+            return
+        if self._restart_at is None:
+            # a process that ran for a while is not crashing in a loop
+            if now - self._started > self.max_delay:
+                self._delay = self.min_delay
+            self.crashes += 1
+            self._restart_at = now + self._delay
+            write(
+                self.name, f"exited with code {code}, restarting in {self._delay:.1f}s"
+            )
+            self._delay = min(self.max_delay, self._delay * 2)
+        elif now >= self._restart_at:
+            self.restarts += 1
+            self.start(write)
+
+    def _snapshot(self):
+        mtimes = dict()
+        for path in self.watch:
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                mtimes[path] = None
+        return mtimes
+
+    def _pump(self, process, write):
+        for line in process.stdout:
+            write(self.name, line.rstrip("\n"))
+
+
+class Supervisor:
+    def __init__(self, interval=0.5, output=None):
+        """Runs bots as local processes instead of containers: prints
+        their output prefixed with their name, restarts them with
+        exponential backoff when they crash and at once when one of
+        their files changes.
+        :param interval: Seconds between two checks of the processes
+        :type interval: float
+        :param output: Stream to write the output of the processes to,
+            standard output if omitted
+        :type output: file, optional
+        """
+        self.interval = interval
+        self.output = output
+        self.processes = []
+        self._lock = threading.Lock()
+        self._width = 0
+
+    def add(self, name, command, cwd=None, env=None, watch=(), **kwargs):
+        """Add a process, see `Supervised`.
+        :rtype: Supervised
+        """
+        supervised = Supervised(name, command, cwd, env, watch, **kwargs)
+        self.processes.append(supervised)
+        self._width = max(self._width, len(name))
+        return supervised
+
+    def write(self, name, line):
+        with self._lock:
+            print(
+                f"{name.ljust(self._width)} | {line}",
+                file=self.output or sys.stdout,
+                flush=True,
+            )
+
+    def run(self, until=None):
+        """Start all processes and keep them running until interrupted
+        or until `until()` returns True, then stop them."""
+        handler = None
+        if threading.current_thread() is threading.main_thread():
+            # stop the processes as well when being terminated
+            handler = signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        try:
+            for supervised in self.processes:
+                supervised.start(self.write)
+            while until is None or not until():
+                time.sleep(self.interval)
+                for supervised in self.processes:
+                    supervised.check(self.write)
+        except KeyboardInterrupt:
+            LOG.info("Stopping the supervised processes")
+        finally:
+            for supervised in self.processes:
+                supervised.stop()
+            if handler is not None:
+                signal.signal(signal.SIGTERM, handler)
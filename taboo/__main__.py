@@ -2,8 +2,6 @@ from collections import defaultdict
 import logging
 import os
 
-import requests
-
 from templates import TaskBot
 
 import random
@@ -58,12 +56,10 @@ class TabooBot(TaskBot):
             "Beef patty": ["pork", "ground", "steak"],
         }
 
-    @staticmethod
-    def message_callback(success, error_msg="Unknown Error"):
-        if not success:
-            LOG.error(f"Could not send message: {error_msg}")
-            exit(1)
-        LOG.debug("Sent message successfully.")
+    def close_room(self, room_id):
+        self.sessions.clear_session(room_id)
+        self.tasks.close_room(room_id)
+        self.sio.forget_room(room_id)
 
     def register_callbacks(self):
         @self.sio.event
@@ -154,7 +150,10 @@ class TabooBot(TaskBot):
                     )
                 )
 
-                if len(this_session.players) < 2:
+                if not this_session.players:
+                    # everybody left, the room is over
+                    self.close_room(room_id)
+                elif len(this_session.players) < 2:
                     self.sio.emit(
                         "text",
                         {
@@ -220,7 +219,9 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     # create bot instance
-    taboo_bot = TabooBot(args.token, args.user, args.task, args.host, args.port)
+    taboo_bot = TabooBot(
+        args.token, args.user, args.task, args.host, args.port, args.task_config
+    )
     # taboo_bot.taboo_data = args.taboo_data
     # connect to chat server
     taboo_bot.run()
@@ -2,20 +2,302 @@
 
 from abc import ABC, abstractmethod
 import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import json
 import logging
 import os
+import random
+import re
+import time
+from urllib.parse import urlsplit
 
-import requests  # NOQA
+try:
+    import aiohttp
+except ImportError:  # only needed by the asyncio bots
+    aiohttp = None
+import requests
+from requests.adapters import HTTPAdapter
 import socketio
+from urllib3.util.retry import Retry
+
+from common.acks import AckWindow
+from common.dispatcher import RoomDispatcher, RoomLocks
+from common.log_pipeline import LogPipeline
+from common.metadata import MetadataCache
+from common.metrics import get_metrics, serve_from_env
+from common.outbound import Outbound, shares_ack
+from common.pacing import PacedSender
+from common.routing import TaskRoutes
+from common.scheduler import cancel_all
 
 
 # limit logging of every http call, comment to allow more logging
 logging.getLogger("urllib3").setLevel(logging.WARNING)
 
+# responses worth another try; POST is not idempotent and is never resent
+# once the server has answered
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_METHODS = frozenset(["HEAD", "GET", "PUT", "PATCH", "DELETE", "OPTIONS"])
+
+# numeric IDs and tokens in request paths
+ID_SEGMENT = re.compile(r"/(\d+|[0-9a-f]{8}(-[0-9a-f]{4}){3}-[0-9a-f]{12})(?=/|$)")
+
+
+def api_settings(pool_size=None, retries=None, backoff=None, timeout=None):
+    """Fill in unset connection settings from the environment."""
+    if pool_size is None:
+        pool_size = int(os.environ.get("SLURK_API_POOL_SIZE", 32))
+    if retries is None:
+        retries = int(os.environ.get("SLURK_API_RETRIES", 3))
+    if backoff is None:
+        backoff = float(os.environ.get("SLURK_API_BACKOFF", 0.2))
+    if timeout is None and "SLURK_API_TIMEOUT" in os.environ:
+        timeout = float(os.environ["SLURK_API_TIMEOUT"])
+    return pool_size, retries, backoff, timeout
+
+
+def api_route(path):
+    """Path of a request with its IDs replaced, to group metrics."""
+    return ID_SEGMENT.sub("/{id}", urlsplit(path).path)
+
+
+class JitteredRetry(Retry):
+    """urllib3 retry policy that spreads its backoff with full jitter,
+    so that many rooms retrying at once do not hit the server in lockstep.
+    """
+
+    def get_backoff_time(self):
+        return random.uniform(0, super().get_backoff_time())
+
+
+class ApiClient:
+    def __init__(
+        self, uri, token, pool_size=None, retries=None, backoff=None, timeout=None
+    ):
+        """Pooled, keep-alive access to the slurk REST API.
+
+        One instance is meant to be shared by all handlers and timer
+        threads of a bot: connections are kept alive and reused per host,
+        and failed calls (429, 5xx, connection resets) are retried with
+        jittered exponential backoff. Defaults can be changed with the
+        environment variables `SLURK_API_POOL_SIZE`, `SLURK_API_RETRIES`,
+        `SLURK_API_BACKOFF` and `SLURK_API_TIMEOUT`.
+        :param uri: Base URL of the slurk API, e.g. `http://localhost/slurk/api`
+        :type uri: str
+        :param token: Token used to authorize requests against the API
+        :type token: str
+        :param pool_size: Maximum number of kept-alive connections per host
+        :type pool_size: int, optional
+        :param retries: Maximum number of retries per request
+        :type retries: int, optional
+        :param backoff: Backoff factor (in seconds) between retries
+        :type backoff: float, optional
+        :param timeout: Seconds to wait for the server before giving up
+        :type timeout: float, optional
+        """
+        self.uri = uri
+        self.token = token
+        pool_size, retries, backoff, self.timeout = api_settings(
+            pool_size, retries, backoff, timeout
+        )
+
+        retry = JitteredRetry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=RETRY_METHODS,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        self._adapter = HTTPAdapter(
+            pool_connections=4, pool_maxsize=pool_size, max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.mount("http://", self._adapter)
+        self.session.mount("https://", self._adapter)
+
+    def request(self, method, path, headers=None, **kwargs):
+        """Send a request and return the `requests.models.Response`.
+        :param method: HTTP method, e.g. `GET` or `PATCH`
+        :type method: str
+        :param path: Either a path relative to the slurk API (`/rooms/1`)
+            or a full URL to another server, which will not receive
+            the slurk authorization header
+        :type path: str
+        """
+        headers = dict(headers or {})
+        if path.startswith(("http://", "https://")):
+            url = path
+        else:
+            url = f"{self.uri}{path}"
+            headers.setdefault("Authorization", f"Bearer {self.token}")
+        kwargs.setdefault("timeout", self.timeout)
+
+        with get_metrics().track("api", method=method, path=api_route(path)) as call:
+            response = self.session.request(method, url, headers=headers, **kwargs)
+            call.error = not response.ok
+        return response
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def patch(self, path, **kwargs):
+        return self.request("PATCH", path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request("PUT", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+    def stats(self):
+        """Count requests and how many of them needed a new connection.
+        :return: `requests`, `connections_opened` and `connections_reused`
+        :rtype: dict
+        """
+        sent = opened = 0
+        pools = self._adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                sent += pool.num_requests
+                opened += pool.num_connections
+        return {
+            "requests": sent,
+            "connections_opened": opened,
+            "connections_reused": sent - opened,
+        }
+
+    def close(self):
+        self.session.close()
+
+
+def instrument_handler(event, handler):
+    """Wrap an event handler to record its duration, errors and
+    concurrency under the event name, see `metrics`."""
+    metrics = get_metrics()
+    if not asyncio.iscoroutinefunction(handler):
+        return metrics.timed("event", event=event)(handler)
+
+    @functools.wraps(handler)
+    async def wrapper(*args):
+        with metrics.track("event", event=event):
+            return await handler(*args)
+
+    return wrapper
+
+
+class InstrumentedClient(socketio.Client):
+    """`socketio.Client` measuring every registered event handler. The
+    metrics are served once connected if `SLURK_METRICS_PORT` is set.
+
+    If `SLURK_DISPATCH_WORKERS` is set, events concerning a room are
+    handed to a `RoomDispatcher` with that many workers: the events of
+    a room are handled in order, rooms in parallel. Such handlers cannot
+    answer with an acknowledgement.
+
+    If `SLURK_EMIT_MERGE_WINDOW` or `SLURK_ROOM_RATE` is set, emits to a
+    room pass through an `Outbound` layer merging text messages and
+    limiting the rate per room.
+
+    `emit_acked` sends an event and tracks its acknowledgement in an
+    `AckWindow` configured by `SLURK_ACK_WINDOW`, `SLURK_ACK_TIMEOUT`
+    and `SLURK_ACK_RETRIES`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.room_locks = RoomLocks()
+        self.dispatcher = None
+        self.outbound = None
+        self.acks = None
+
+    def on(self, event, handler=None, namespace=None):
+        def set_handler(handler):
+            super(InstrumentedClient, self).on(
+                event, self._dispatch(instrument_handler(event, handler)), namespace
+            )
+            return handler
+
+        if handler is None:
+            return set_handler
+        set_handler(handler)
+
+    def connect(self, *args, **kwargs):
+        serve_from_env()
+        if self.dispatcher is None:
+            self.dispatcher = RoomDispatcher.from_env(self.room_locks)
+        if self.outbound is None:
+            self.outbound = Outbound.from_env(super().emit)
+        if self.acks is None:
+            self.acks = AckWindow.from_env(self.emit)
+        super().connect(*args, **kwargs)
+
+    def emit(self, event, data=None, namespace=None, callback=None):
+        if self.outbound is None:
+            return super().emit(event, data, namespace, callback)
+        self.outbound.emit(event, data, namespace, callback)
+
+    def emit_acked(
+        self, event, data=None, namespace=None, on_ack=None, on_failure=None
+    ):
+        """Emit without blocking and watch for the acknowledgement; a
+        failed emit is logged, counted and kept as dead letter instead
+        of raising. See `AckWindow.emit`."""
+        if self.acks is None:
+            self.acks = AckWindow.from_env(self.emit)
+        return self.acks.emit(event, data, namespace, on_ack, on_failure)
+
+    def forget_room(self, room_id):
+        """Drop the lock of a closed room, once its dispatched events
+        are handled, see `RoomDispatcher.discard`. The timers of the room
+        are cancelled first, so that none takes a new lock later on."""
+        cancel_all(room_id)
+        if self.dispatcher is not None:
+            self.dispatcher.discard(room_id)
+        else:
+            self.room_locks.discard(room_id)
+
+    def _dispatch(self, handler):
+        @functools.wraps(handler)
+        def wrapper(*args):
+            data = args[0] if args else None
+            if self.dispatcher is None or not isinstance(data, dict):
+                return handler(*args)
+            if data.get("room") is None:
+                return handler(*args)
+            self.dispatcher.submit(data["room"], handler, *args)
+
+        return wrapper
+
+
+class InstrumentedAsyncClient(socketio.AsyncClient):
+    """`socketio.AsyncClient` counterpart of `InstrumentedClient`."""
+
+    def on(self, event, handler=None, namespace=None):
+        def set_handler(handler):
+            super(InstrumentedAsyncClient, self).on(
+                event, instrument_handler(event, handler), namespace
+            )
+            return handler
+
+        if handler is None:
+            return set_handler
+        set_handler(handler)
+
+    async def connect(self, *args, **kwargs):
+        serve_from_env()
+        await super().connect(*args, **kwargs)
+
 
 class Bot(ABC):
     # set logger=True for extensive logging of events
-    sio = socketio.Client(logger=False)
+    sio = InstrumentedClient(logger=False)
 
     def __init__(self, token, user, host, port):
         """Serves as a template for bots.
@@ -40,6 +322,9 @@ class Bot(ABC):
         self.uri += "/slurk/api"
         logging.info(f"Running {self.__class__.__name__} on {self.uri} with token: {self.token} ...")
 
+        # shared by all handlers, see `ApiClient`
+        self.api = ApiClient(self.uri, self.token)
+
         self.register_callbacks()
 
     @abstractmethod
@@ -56,7 +341,13 @@ class Bot(ABC):
         )
         self.sio.wait()
 
+    def room_lock(self, room_id):
+        """Lock guarding the state of a room; held while a dispatched
+        handler of that room runs, see `InstrumentedClient`."""
+        return self.sio.room_locks(room_id)
+
     @staticmethod
+    @shares_ack
     def message_callback(success, error_msg="Unknown Error"):
         """Verify whether a call was successful.
         Will be invoked after the server has processed the event,
@@ -69,8 +360,10 @@ class Bot(ABC):
         :type status: str, optional
         """
         if not success:
+            # raising here would only kill the callback thread
             logging.error(f"Could not send message: {error_msg}")
-            raise ValueError(error_msg)
+            get_metrics().observe("ack", 0.0, error=True)
+            return
         logging.debug("Message was sent successfully.")
 
     @staticmethod
@@ -126,14 +419,107 @@ class Bot(ABC):
         return parser
 
 
+def close_room(api, room_id, users=None, metadata=None, exclude=()):
+    """Set a room to read-only and remove its users from it.
+    :param users: IDs of the users to remove, by default everyone in
+        the room; pass an empty list to only set the room to read-only
+    :type users: list, optional
+    :param metadata: Cache with the users' ETags, see `MetadataCache`
+    :type metadata: metadata.MetadataCache, optional
+    :param exclude: IDs of users to keep in the room, e.g. the bot
+    :type exclude: collection
+    :return: Seconds it took
+    :rtype: float
+    """
+    start = time.monotonic()
+    if metadata is None:
+        metadata = MetadataCache(api)
+
+    with get_metrics().track("room_teardown"):
+        for attribute, value in (
+            ("readonly", "True"),
+            ("placeholder", "This room is read-only"),
+        ):
+            response = api.patch(
+                f"/rooms/{room_id}/attribute/id/text",
+                json={"attribute": attribute, "value": value},
+            )
+            Bot.request_feedback(response, "set room to read_only")
+
+        if users is None:
+            response = api.get(f"/rooms/{room_id}/users")
+            Bot.request_feedback(response, "get users of the room")
+            users = [user["id"] for user in response.json()]
+        for user_id in users:
+            if user_id in exclude:
+                continue
+            # reuses a known ETag and retries on 412
+            response = metadata.remove_user_from_room(user_id, room_id)
+            Bot.request_feedback(response, "remove user from task room")
+    return time.monotonic() - start
+
+
+def close_rooms(api, room_ids, users=None, metadata=None, exclude=(), workers=8):
+    """`close_room` for many rooms at once, e.g. when their timers
+    expire together. At most `workers` rooms are closed in parallel.
+    :param users: IDs of the users to remove per room ID; rooms not
+        in it lose everyone in them
+    :type users: dict, optional
+    :return: Seconds each room took, None for rooms that failed
+    :rtype: dict
+    """
+    room_ids = list(room_ids)
+    users = users or dict()
+    if metadata is None:
+        metadata = MetadataCache(api)
+
+    start = time.monotonic()
+    durations = dict()
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(workers, len(room_ids))),
+        thread_name_prefix="teardown",
+    ) as pool:
+        futures = {
+            room_id: pool.submit(
+                close_room, api, room_id, users.get(room_id), metadata, exclude
+            )
+            for room_id in room_ids
+        }
+        for room_id, future in futures.items():
+            try:
+                durations[room_id] = future.result()
+            except Exception:
+                logging.exception(f"Could not close room {room_id}")
+                durations[room_id] = None
+
+    closed = [duration for duration in durations.values() if duration is not None]
+    logging.info(
+        f"Closed {len(closed)} of {len(room_ids)} rooms in "
+        f"{time.monotonic() - start:.2f}s, slowest {max(closed, default=0):.2f}s"
+    )
+    return durations
+
+
 class TaskBot(Bot):
-    def __init__(self, token, user, task, host, port):
+    def __init__(self, token, user, task, host, port, tasks=None):
         """Serves as a template for task bots.
         :param task: Task ID
         :type task: str
+        :param tasks: Configuration per task ID for bots serving several
+            tasks, see `TaskRoutes`
+        :type tasks: dict, optional
         """
         super().__init__(token, user, host, port)
-        self.task_id = task
+        # tasks this bot serves and the task of each joined room
+        self.tasks = TaskRoutes(tasks)
+        if task is not None and task not in self.tasks:
+            self.tasks.add(task)
+        self.task_id = task if task is not None else next(iter(self.tasks), None)
+        self.log_pipeline = LogPipeline.from_env(self.api)
+        # user tasks, ETags and permissions, see `MetadataCache`
+        self.metadata = MetadataCache(self.api)
+        # multi-line messages sent off the event thread, see `PacedSender`
+        self.pacer = PacedSender(self.sio)
         self.sio.on("new_task_room", self.join_task_room())
 
     def on_task_room_creation(self, data):
@@ -145,13 +531,11 @@ class TaskBot(Bot):
         """Let the bot join an assigned task room."""
 
         def join(data):
-            if self.task_id is None or data["task"] != self.task_id:
+            if data["task"] not in self.tasks:
                 return
+            self.tasks.open_room(data["room"], data["task"])
 
-            response = requests.post(
-                f"{self.uri}/users/{self.user}/rooms/{data['room']}",
-                headers={"Authorization": f"Bearer {self.token}"},
-            )
+            response = self.api.post(f"/users/{self.user}/rooms/{data['room']}")
             self.request_feedback(response, f"let {self.__class__.__name__}  join room")
             self.on_task_room_creation(data)
 
@@ -165,27 +549,344 @@ class TaskBot(Bot):
             logging.error("could not resize chat and task area: invalid parameters")
             raise ValueError("chat_area and task_area must sum up to 100")
 
-        response = requests.patch(
-            f"{self.uri}/rooms/{room_id}/attribute/id/sidebar",
-            headers={"Authorization": f"Bearer {self.token}"},
+        response = self.api.patch(
+            f"/rooms/{room_id}/attribute/id/sidebar",
             json={"attribute": "style", "value": f"width: {task_area}%"}
         )
 
-        response = requests.patch(
-            f"{self.uri}/rooms/{room_id}/attribute/id/content",
-            headers={"Authorization": f"Bearer {self.token}"},
+        response = self.api.patch(
+            f"/rooms/{room_id}/attribute/id/content",
             json={"attribute": "style", "value": f"width: {chat_area}%"}
         )
 
+    def room_to_read_only(self, room_id, users=None):
+        """Set a room to read-only and remove its users except the bot,
+        see `close_room`."""
+        close_room(self.api, room_id, users, self.metadata, exclude={self.user})
+        self.sio.forget_room(room_id)
+
+    def close_rooms(self, room_ids, users=None, workers=8):
+        """Set many rooms to read-only and remove their users except
+        the bot concurrently, see `close_rooms`.
+        :return: Seconds each room took, None for rooms that failed
+        :rtype: dict
+        """
+        durations = close_rooms(
+            self.api, room_ids, users, self.metadata, {self.user}, workers
+        )
+        for room_id in durations:
+            self.sio.forget_room(room_id)
+        return durations
+
+    def send_paced(self, room_id, messages, interval=0.5, delay=0):
+        """Send several messages to a room with `interval` seconds in
+        between without blocking the calling handler. Messages of a room
+        keep their order; `self.pacer.cancel(room_id)` drops the ones not
+        sent yet.
+        :param messages: Message texts (sent as HTML) or payloads
+        :type messages: list
+        """
+        self.pacer.send(room_id, messages, interval, delay)
+
     def log_event(self, event, data, room_id):
-        response = requests.post(
-            f"{self.uri}/logs",
+        record = {"event": event, "room_id": room_id, "data": data}
+        # submitted in the background if enabled, see `LogPipeline`
+        if self.log_pipeline is not None:
+            self.log_pipeline.put(record)
+            return
+
+        response = self.api.post("/logs", json=record)
+        self.request_feedback(response, event)
+
+    def flush_logs(self, timeout=None):
+        """Wait until all buffered log events reached the server."""
+        if self.log_pipeline is not None:
+            if not self.log_pipeline.flush(timeout):
+                logging.error("could not flush log events in time")
+
+    @classmethod
+    def create_argparser(cls):
+        # inherit from parent's argparser
+        parser = argparse.ArgumentParser(
+            description=f"Run {cls.__name__}.",
+            parents=[super().create_argparser()],
+            add_help=False,
+        )
+
+        parser.add_argument(
+            "--task",
+            type=int,
+            default=os.environ.get(f"TASK_ID"),
+            help="slurk task ID the bot should moderate",
+        )
+        parser.add_argument(
+            "--task-config",
+            type=TaskRoutes.load,
+            default=os.environ.get("TASK_CONFIG"),
+            help="JSON object or file mapping further task IDs to their settings",
+        )
+        return parser
+
+
+class AsyncApiResponse:
+    def __init__(self, method, url, status_code, headers, content):
+        """Fully read response of the `AsyncApiClient`. Offers the parts
+        of `requests.models.Response` the bots rely on, so that
+        `request_feedback` works unchanged.
+        """
+        self.method = method
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.HTTPError(
+                f"{self.status_code} Error for {self.method} {self.url}",
+                response=self,
+            )
+
+
+class AsyncApiClient:
+    def __init__(
+        self, uri, token, pool_size=None, retries=None, backoff=None, timeout=None
+    ):
+        """asyncio counterpart of `ApiClient` built on aiohttp.
+
+        Accepts the same settings and environment variables and follows
+        the same retry policy. The underlying session is opened lazily
+        inside the running event loop.
+        """
+        if aiohttp is None:
+            raise ImportError("asyncio bots require aiohttp: pip install aiohttp")
+
+        self.uri = uri
+        self.token = token
+        self.pool_size, self.retries, self.backoff, self.timeout = api_settings(
+            pool_size, retries, backoff, timeout
+        )
+        self._session = None
+        self._counts = {"requests": 0, "connections_opened": 0, "connections_reused": 0}
+
+    def _open_session(self):
+        async def count(name):
+            self._counts[name] += 1
+
+        trace = aiohttp.TraceConfig()
+        trace.on_request_start.append(lambda *_: count("requests"))
+        trace.on_connection_create_end.append(lambda *_: count("connections_opened"))
+        trace.on_connection_reuseconn.append(lambda *_: count("connections_reused"))
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit_per_host=self.pool_size),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            trace_configs=[trace],
+        )
+
+    async def request(self, method, path, headers=None, **kwargs):
+        """Send a request and return an `AsyncApiResponse`.
+        :param method: HTTP method, e.g. `GET` or `PATCH`
+        :type method: str
+        :param path: Either a path relative to the slurk API (`/rooms/1`)
+            or a full URL to another server, which will not receive
+            the slurk authorization header
+        :type path: str
+        """
+        with get_metrics().track("api", method=method, path=api_route(path)) as call:
+            response = await self._send(method, path, headers, **kwargs)
+            call.error = not response.ok
+        return response
+
+    async def _send(self, method, path, headers, **kwargs):
+        if self._session is None:
+            self._session = self._open_session()
+
+        headers = dict(headers or {})
+        if path.startswith(("http://", "https://")):
+            url = path
+        else:
+            url = f"{self.uri}{path}"
+            headers.setdefault("Authorization", f"Bearer {self.token}")
+
+        for attempt in range(self.retries + 1):
+            delay = random.uniform(0, self.backoff * 2 ** attempt)
+            try:
+                async with self._session.request(
+                    method, url, headers=headers, **kwargs
+                ) as response:
+                    content = await response.read()
+            except aiohttp.ClientConnectorError:
+                # the request never reached the server
+                if attempt == self.retries:
+                    raise
+            except (aiohttp.ServerDisconnectedError, aiohttp.ClientOSError):
+                if attempt == self.retries or method not in RETRY_METHODS:
+                    raise
+            else:
+                if (
+                    response.status not in RETRY_STATUSES
+                    or method not in RETRY_METHODS
+                    or attempt == self.retries
+                ):
+                    return AsyncApiResponse(
+                        method, url, response.status, response.headers, content
+                    )
+                retry_after = response.headers.get("Retry-After", "")
+                if retry_after.isdigit():
+                    delay = int(retry_after)
+            await asyncio.sleep(delay)
+
+    async def get(self, path, **kwargs):
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request("POST", path, **kwargs)
+
+    async def patch(self, path, **kwargs):
+        return await self.request("PATCH", path, **kwargs)
+
+    async def put(self, path, **kwargs):
+        return await self.request("PUT", path, **kwargs)
+
+    async def delete(self, path, **kwargs):
+        return await self.request("DELETE", path, **kwargs)
+
+    def stats(self):
+        """Count requests and how many of them needed a new connection.
+        :return: `requests`, `connections_opened` and `connections_reused`
+        :rtype: dict
+        """
+        return dict(self._counts)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class AsyncBot(ABC):
+    # set logger=True for extensive logging of events
+    sio = InstrumentedAsyncClient(logger=False)
+
+    def __init__(self, token, user, host, port):
+        """Serves as a template for bots running on asyncio.
+
+        Handlers registered with `self.sio` may be coroutines and should
+        use `await self.api...` for REST calls, so that a slow call only
+        delays the room it was made for. Start the bot with
+        `asyncio.run(bot.run())`.
+        For the parameters see `Bot`.
+        """
+        self.token = token
+        self.user = user
+
+        self.uri = host
+        if port is not None:
+            self.uri += f":{port}"
+        self.uri += "/slurk/api"
+        logging.info(f"Running {self.__class__.__name__} on {self.uri} with token: {self.token} ...")
+
+        # shared by all handlers, see `AsyncApiClient`
+        self.api = AsyncApiClient(self.uri, self.token)
+
+        self.register_callbacks()
+
+    @abstractmethod
+    def register_callbacks(self):
+        """Register all necessary event handlers."""
+        pass
+
+    async def run(self):
+        """Establish a connection to the slurk chat server."""
+        await self.sio.connect(
+            self.uri,
+            headers={"Authorization": f"Bearer {self.token}", "user": str(self.user)},
+            namespaces="/",
+        )
+        try:
+            await self.sio.wait()
+        finally:
+            await self.api.close()
+
+    message_callback = staticmethod(Bot.message_callback)
+    request_feedback = staticmethod(Bot.request_feedback)
+    create_argparser = classmethod(Bot.create_argparser.__func__)
+
+
+class AsyncTaskBot(AsyncBot):
+    def __init__(self, token, user, task, host, port, tasks=None):
+        """Serves as a template for task bots running on asyncio.
+        :param task: Task ID
+        :type task: str
+        :param tasks: Configuration per task ID for bots serving several
+            tasks, see `TaskRoutes`
+        :type tasks: dict, optional
+        """
+        super().__init__(token, user, host, port)
+        # tasks this bot serves and the task of each joined room
+        self.tasks = TaskRoutes(tasks)
+        if task is not None and task not in self.tasks:
+            self.tasks.add(task)
+        self.task_id = task if task is not None else next(iter(self.tasks), None)
+        self.sio.on("new_task_room", self.join_task_room())
+
+    async def on_task_room_creation(self, data):
+        """Each bot can define some actions to be performed upon
+        task room creation."""
+        pass
+
+    def join_task_room(self):
+        """Let the bot join an assigned task room."""
+
+        async def join(data):
+            if data["task"] not in self.tasks:
+                return
+            self.tasks.open_room(data["room"], data["task"])
+
+            response = await self.api.post(f"/users/{self.user}/rooms/{data['room']}")
+            self.request_feedback(response, f"let {self.__class__.__name__}  join room")
+            await self.on_task_room_creation(data)
+
+        return join
+
+    async def move_divider(self, room_id, chat_area=50, task_area=50):
+        """move the central divider and resize chat and task area
+        the sum of char_area and task_area must sum up to 100
+        """
+        if chat_area + task_area != 100:
+            logging.error("could not resize chat and task area: invalid parameters")
+            raise ValueError("chat_area and task_area must sum up to 100")
+
+        await asyncio.gather(
+            self.api.patch(
+                f"/rooms/{room_id}/attribute/id/sidebar",
+                json={"attribute": "style", "value": f"width: {task_area}%"}
+            ),
+            self.api.patch(
+                f"/rooms/{room_id}/attribute/id/content",
+                json={"attribute": "style", "value": f"width: {chat_area}%"}
+            ),
+        )
+
+    async def log_event(self, event, data, room_id):
+        response = await self.api.post(
+            "/logs",
             json={
                 "event": event,
                 "room_id": room_id,
                 "data": data,
             },
-            headers={"Authorization": f"Bearer {self.token}"},
         )
         self.request_feedback(response, event)
 
@@ -204,4 +905,10 @@ class TaskBot(Bot):
             default=os.environ.get(f"TASK_ID"),
             help="slurk task ID the bot should moderate",
         )
+        parser.add_argument(
+            "--task-config",
+            type=TaskRoutes.load,
+            default=os.environ.get("TASK_CONFIG"),
+            help="JSON object or file mapping further task IDs to their settings",
+        )
         return parser
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""AckWindow class test cases."""
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from common.acks import AckWindow, ack_result
+from common.scheduler import Scheduler
+
+
+class FakeEmit:
+    """Records emits; the test decides when and how they are acked."""
+
+    def __init__(self, fail=False):
+        self.emitted = []
+        self.fail = fail
+        self.lock = threading.Lock()
+
+    def __call__(self, event, data, namespace, callback):
+        if self.fail:
+            raise ConnectionError("not connected")
+        with self.lock:
+            self.emitted.append((event, data, callback))
+
+    def ack(self, index, *args):
+        self.emitted[index][2](*args)
+
+    def messages(self):
+        return [data["message"] for _, data, _ in self.emitted]
+
+
+class TestAckWindow(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = Scheduler()
+        self.emit = FakeEmit()
+
+    def tearDown(self):
+        self.scheduler.shutdown()
+
+    def window(self, **kwargs):
+        return AckWindow(self.emit, scheduler=self.scheduler, **kwargs)
+
+    def test_ack_result(self):
+        self.assertEqual(ack_result(()), (True, None))
+        self.assertEqual(ack_result((True,)), (True, None))
+        self.assertEqual(ack_result((False, "no room")), (False, "no room"))
+        self.assertEqual(ack_result(([False, "no room"],)), (False, "no room"))
+
+    def test_window_per_room(self):
+        acks = self.window(window=2)
+        acked = []
+        for number in range(4):
+            acks.emit(
+                "text",
+                {"message": str(number), "room": 1},
+                on_ack=lambda *args, number=number: acked.append(number),
+            )
+        acks.emit("text", {"message": "other", "room": 2})
+
+        self.assertEqual(self.emit.messages(), ["0", "1", "other"])
+        self.assertEqual(acks.in_flight(1), 2)
+        self.assertEqual(acks.waiting(1), 2)
+
+        self.emit.ack(1, True)
+        self.assertEqual(self.emit.messages(), ["0", "1", "other", "2"])
+        self.assertEqual(acked, [1])
+
+        for index in (0, 2, 3, 4):
+            self.emit.ack(index, True)
+        self.assertEqual(acks.in_flight(), 0)
+        self.assertEqual(acked, [1, 0, 2, 3])
+        self.assertEqual(acks.stats()["rooms"], 0)
+
+    def test_refused(self):
+        acks = self.window()
+        failures = []
+        acks.emit(
+            "text",
+            {"message": "hi", "room": 1},
+            on_failure=lambda reason, data: failures.append((reason, data)),
+        )
+        self.emit.ack(0, False, "You are not in the room")
+        # a late duplicate ack changes nothing
+        self.emit.ack(0, True)
+
+        self.assertEqual(
+            failures, [("You are not in the room", {"message": "hi", "room": 1})]
+        )
+        dead = acks.dead_letters()
+        self.assertEqual(len(dead), 1)
+        self.assertEqual(dead[0]["reason"], "You are not in the room")
+        self.assertEqual(acks.stats()["dead"], 1)
+        self.assertEqual(acks.in_flight(), 0)
+
+    def test_retry_then_dead_letter(self):
+        acks = self.window(window=1, timeout=0.05, retries=2)
+        failed = threading.Event()
+        acks.emit(
+            "text",
+            {"message": "hi", "room": 1},
+            on_failure=lambda reason, data: failed.set(),
+        )
+        acks.emit("text", {"message": "next", "room": 1})
+
+        self.assertTrue(failed.wait(2))
+        self.assertEqual(self.emit.messages(), ["hi", "hi", "hi", "next"])
+        self.assertEqual(acks.dead_letters()[0]["attempts"], 3)
+        self.assertEqual(acks.dead_letters()[0]["reason"], "timeout")
+        self.assertEqual(acks.stats()["retries"], 2)
+
+    def test_late_ack_of_earlier_attempt(self):
+        acks = self.window(timeout=0.05, retries=2)
+        acks.emit("text", {"message": "hi", "room": 1})
+        deadline = time.monotonic() + 2
+        while len(self.emit.emitted) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        self.emit.ack(0, True)
+        time.sleep(0.15)
+        self.assertEqual(len(self.emit.emitted), 2)
+        self.assertEqual(acks.stats()["acked"], 1)
+        self.assertEqual(acks.dead_letters(), [])
+
+    def test_emit_error_does_not_raise(self):
+        self.emit.fail = True
+        acks = self.window(timeout=0.02, retries=1)
+        failed = threading.Event()
+        acks.emit(
+            "text", {"message": "hi", "room": 1}, on_failure=lambda *args: failed.set()
+        )
+        self.assertTrue(failed.wait(2))
+        self.assertEqual(acks.stats()["sent"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
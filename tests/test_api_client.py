@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""ApiClient class test cases."""
+
+import asyncio
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from fake_slurk import DEFAULT_API_TOKEN, FakeSlurk, Faults, web
+from templates import ApiClient, JitteredRetry
+
+
+class FailFirst(Faults):
+    """Answers the first `failures` requests with 503."""
+
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def fail(self):
+        self.failures -= 1
+        return self.failures >= 0
+
+
+class FakeServer:
+    """`FakeSlurk` served on a free local port by a background thread."""
+
+    def __init__(self, faults=None):
+        self.server = FakeSlurk(faults=faults)
+        self.state = self.server.state
+        self.loop = asyncio.new_event_loop()
+        self._runner = web.AppRunner(self.server.app, access_log=None)
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self.loop).result()
+        host, port = self._runner.addresses[0][:2]
+        self.host = f"http://{host}"
+        self.port = port
+        self.uri = f"{self.host}:{port}/slurk/api"
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+    def count(self, method, route):
+        return self.server._counts[f"api {method} {route}"]
+
+    async def _start(self):
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "127.0.0.1", 0).start()
+
+    async def _stop(self):
+        await self._runner.cleanup()
+        # e.g. the pings of Socket.IO connections
+        current = asyncio.current_task()
+        tasks = [task for task in asyncio.all_tasks() if task is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class TestApiClient(unittest.TestCase):
+    def serve(self, faults=None):
+        server = FakeServer(faults).start()
+        self.addCleanup(server.stop)
+        return server
+
+    def client(self, server, **kwargs):
+        api = ApiClient(server.uri, DEFAULT_API_TOKEN, backoff=0, **kwargs)
+        self.addCleanup(api.close)
+        return api
+
+    def test_request(self):
+        server = self.serve()
+        api = self.client(server)
+        response = api.post("/layouts", json={"title": "Task"})
+        self.assertTrue(response.ok)
+        layout = response.json()["id"]
+        self.assertEqual(api.get(f"/layouts/{layout}").json()["title"], "Task")
+
+        # full URLs do not get the slurk token
+        response = api.get(f"{server.host}:{server.port}/slurk/api/layouts/{layout}")
+        self.assertEqual(response.status_code, 401)
+
+    def test_get_retried(self):
+        server = self.serve(FailFirst(2))
+        api = self.client(server, retries=3)
+        self.assertEqual(api.get("/layouts/1").status_code, 404)
+        self.assertEqual(server.count("GET", "/layouts/{id}"), 3)
+
+    def test_retries_exhausted(self):
+        server = self.serve(Faults(error_rate=1.0))
+        api = self.client(server, retries=2)
+        self.assertEqual(api.get("/layouts/1").status_code, 503)
+        self.assertEqual(server.count("GET", "/layouts/{id}"), 3)
+
+    def test_post_not_retried(self):
+        server = self.serve(Faults(error_rate=1.0))
+        api = self.client(server, retries=3)
+        self.assertEqual(api.post("/layouts", json={}).status_code, 503)
+        self.assertEqual(server.count("POST", "/layouts"), 1)
+        self.assertEqual(server.state.layouts, {})
+
+    def test_pool_stats(self):
+        server = self.serve()
+        api = self.client(server)
+        for _ in range(5):
+            api.get("/layouts/1")
+        self.assertEqual(
+            api.stats(),
+            {"requests": 5, "connections_opened": 1, "connections_reused": 4},
+        )
+
+    def test_environment(self):
+        with mock.patch.dict(
+            os.environ, {"SLURK_API_RETRIES": "0", "SLURK_API_TIMEOUT": "2.5"}
+        ):
+            api = ApiClient("http://localhost/slurk/api", DEFAULT_API_TOKEN)
+        self.addCleanup(api.close)
+        self.assertEqual(api.timeout, 2.5)
+        self.assertEqual(api.session.get_adapter("http://").max_retries.total, 0)
+
+
+class TestJitteredRetry(unittest.TestCase):
+    def test_backoff(self):
+        retry = JitteredRetry(total=5, backoff_factor=1.0)
+        for _ in range(3):
+            retry = retry.increment(method="GET", url="/rooms/1")
+        ceiling = super(JitteredRetry, retry).get_backoff_time()
+        self.assertGreater(ceiling, 0)
+
+        delays = [retry.get_backoff_time() for _ in range(50)]
+        self.assertTrue(all(0 <= delay <= ceiling for delay in delays))
+        # spread instead of the same delay for every retry
+        self.assertGreater(len(set(delays)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
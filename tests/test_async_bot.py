@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""AsyncApiClient and AsyncTaskBot class test cases."""
+
+import asyncio
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+import socketio
+
+from fake_slurk import DEFAULT_API_TOKEN, Faults
+from templates import AsyncApiClient, AsyncTaskBot, InstrumentedAsyncClient
+from test_api_client import FailFirst, FakeServer
+
+ADMIN = {"Authorization": f"Bearer {DEFAULT_API_TOKEN}"}
+
+
+def create(state, path, body):
+    status, data, _ = state.handle("POST", path, body, ADMIN)
+    assert status < 300, data
+    return data["id"]
+
+
+def create_user(state, name, room_id, task_id=None):
+    permissions = create(state, "/permissions", {"send_message": True})
+    token = create(
+        state,
+        "/tokens",
+        {"permissions_id": permissions, "room_id": room_id, "task_id": task_id},
+    )
+    return create(state, "/users", {"name": name, "token_id": token}), token
+
+
+class TestAsyncApiClient(unittest.IsolatedAsyncioTestCase):
+    def serve(self, faults=None):
+        server = FakeServer(faults).start()
+        self.addCleanup(server.stop)
+        return server
+
+    async def client(self, server, **kwargs):
+        api = AsyncApiClient(server.uri, DEFAULT_API_TOKEN, backoff=0, **kwargs)
+        self.addAsyncCleanup(api.close)
+        return api
+
+    async def test_request(self):
+        server = self.serve()
+        api = await self.client(server)
+        response = await api.post("/layouts", json={"title": "Task"})
+        self.assertTrue(response.ok)
+        layout = response.json()["id"]
+        response = await api.get(f"/layouts/{layout}")
+        self.assertEqual(response.json()["title"], "Task")
+
+        response = await api.get("/layouts/42")
+        with self.assertRaises(Exception):
+            response.raise_for_status()
+
+    async def test_get_retried(self):
+        server = self.serve(FailFirst(2))
+        api = await self.client(server, retries=3)
+        self.assertEqual((await api.get("/layouts/1")).status_code, 404)
+        self.assertEqual(server.count("GET", "/layouts/{id}"), 3)
+
+    async def test_retries_exhausted(self):
+        server = self.serve(Faults(error_rate=1.0))
+        api = await self.client(server, retries=2)
+        self.assertEqual((await api.get("/layouts/1")).status_code, 503)
+        self.assertEqual(server.count("GET", "/layouts/{id}"), 3)
+
+    async def test_post_not_retried(self):
+        server = self.serve(Faults(error_rate=1.0))
+        api = await self.client(server, retries=3)
+        self.assertEqual((await api.post("/layouts", json={})).status_code, 503)
+        self.assertEqual(server.count("POST", "/layouts"), 1)
+        self.assertEqual(server.state.layouts, {})
+
+    async def test_connection_refused(self):
+        server = FakeServer().start()
+        server.stop()
+        api = AsyncApiClient(server.uri, DEFAULT_API_TOKEN, retries=1, backoff=0)
+        self.addAsyncCleanup(api.close)
+        with self.assertRaises(OSError):
+            await api.get("/layouts/1")
+
+    async def test_stats(self):
+        server = self.serve()
+        api = await self.client(server)
+        for _ in range(5):
+            await api.get("/layouts/1")
+        self.assertEqual(
+            api.stats(),
+            {"requests": 5, "connections_opened": 1, "connections_reused": 4},
+        )
+
+
+class TestAsyncTaskBot(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.server = FakeServer().start()
+        self.addCleanup(self.server.stop)
+        state = self.server.state
+
+        layout = create(state, "/layouts", {"title": "Task"})
+        self.waiting_room = create(state, "/rooms", {"layout_id": layout})
+        self.task = create(
+            state, "/tasks", {"name": "Task", "num_users": 1, "layout_id": layout}
+        )
+        self.room = create(state, "/rooms", {"layout_id": layout})
+        self.user, self.token = create_user(state, "bot", self.waiting_room)
+        self.other, self.other_token = create_user(
+            state, "concierge", self.waiting_room
+        )
+
+    def bot(self, tasks=None):
+        class Bot(AsyncTaskBot):
+            # a client per bot, the class attribute is shared otherwise
+            sio = InstrumentedAsyncClient(logger=False)
+
+            def register_callbacks(self):
+                self.created = asyncio.Event()
+
+            async def on_task_room_creation(self, data):
+                self.created.set()
+
+        bot = Bot(
+            self.token,
+            self.user,
+            self.task,
+            self.server.host,
+            self.server.port,
+            tasks,
+        )
+        bot.api.backoff = 0
+        self.addAsyncCleanup(bot.api.close)
+        return bot
+
+    async def test_join_task_room(self):
+        bot = self.bot()
+        join = bot.join_task_room()
+        await join({"room": self.room, "task": self.task + 1})
+        self.assertNotIn(self.room, self.server.state.users[self.user]["rooms"])
+
+        await join({"room": self.room, "task": self.task})
+        self.assertIn(self.room, self.server.state.users[self.user]["rooms"])
+        self.assertTrue(bot.created.is_set())
+        self.assertEqual(bot.tasks.task_of_room(self.room), self.task)
+
+    async def test_further_tasks(self):
+        bot = self.bot(tasks={str(self.task + 1): {}})
+        await bot.join_task_room()({"room": self.room, "task": self.task + 1})
+        self.assertIn(self.room, self.server.state.users[self.user]["rooms"])
+
+    async def test_room_updates(self):
+        bot = self.bot()
+        await bot.move_divider(self.room, 30, 70)
+        with self.assertRaises(ValueError):
+            await bot.move_divider(self.room, 30, 30)
+        await bot.log_event("confirmation_log", {"ok": True}, self.room)
+
+        logs = self.server.state.logs
+        self.assertEqual(
+            [log["event"] for log in logs if log["room_id"] == self.room][-1],
+            "confirmation_log",
+        )
+
+    async def test_run(self):
+        """The bot joins task rooms announced over Socket.IO."""
+        bot = self.bot()
+        running = asyncio.create_task(bot.run())
+        self.addAsyncCleanup(self.stop, bot, running)
+
+        concierge = socketio.AsyncClient()
+        await concierge.connect(
+            f"{self.server.host}:{self.server.port}",
+            headers={
+                "Authorization": f"Bearer {self.other_token}",
+                "user": str(self.other),
+            },
+            namespaces="/",
+        )
+        self.addAsyncCleanup(concierge.disconnect)
+        while not bot.sio.connected:
+            await asyncio.sleep(0.01)
+
+        await concierge.call("room_created", {"room": self.room, "task": self.task})
+        await asyncio.wait_for(bot.created.wait(), 5)
+        self.assertIn(self.room, self.server.state.users[self.user]["rooms"])
+
+    async def stop(self, bot, running):
+        await bot.sio.disconnect()
+        await asyncio.wait_for(running, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""ConciergeBot grouping test cases."""
+
+import os
+import sys
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "concierge"))
+
+from concierge import ConciergeBot
+from fake_slurk import DEFAULT_API_TOKEN, SlurkState
+from common.room_pool import RoomPool
+import test_teardown
+
+
+class StateApi(test_teardown.StateApi):
+    """Also fails every request concerning one of the `broken` users."""
+
+    def __init__(self, state, delay=0.0):
+        super().__init__(state, delay)
+        self.broken = set()
+
+    def request(self, method, path, headers=None, json=None):
+        if any(path.startswith(f"/users/{user}/rooms/") for user in self.broken):
+            return test_teardown.StateResponse(500, None, {})
+        return super().request(method, path, headers, json)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+
+class FakeSio:
+    def __init__(self):
+        self.emitted = []
+
+    def emit(self, event, data=None, namespace=None, callback=None):
+        self.emitted.append((event, data))
+
+    def emit_acked(self, event, data=None, namespace=None, **_):
+        self.emitted.append((event, data))
+
+
+class TestConcierge(unittest.TestCase):
+    def setUp(self):
+        self.state = SlurkState()
+        self.api = StateApi(self.state)
+        self.layout = self.post("/layouts", {"title": "Task"})["id"]
+        self.task = self.post(
+            "/tasks", {"name": "Task", "num_users": 3, "layout_id": self.layout}
+        )
+        self.waiting_room = self.post("/rooms", {"layout_id": self.layout})["id"]
+
+        self.bot = ConciergeBot(DEFAULT_API_TOKEN, 1, "http://localhost", None)
+        self.bot.api = self.api
+        self.bot.sio = FakeSio()
+
+    def post(self, path, body=None):
+        _, data, _ = self.state.handle(
+            "POST", path, body, {"Authorization": f"Bearer {DEFAULT_API_TOKEN}"}
+        )
+        return data
+
+    def create_user(self):
+        """A user in the waiting room, not yet seen by the bot."""
+        permissions = self.post("/permissions", {})["id"]
+        token = self.post(
+            "/tokens", {"permissions_id": permissions, "room_id": self.waiting_room}
+        )
+        user = self.post("/users", {"name": "player", "token_id": token["id"]})
+        self.post(f"/users/{user['id']}/rooms/{self.waiting_room}")
+        return user
+
+    def join(self, count):
+        users = [self.create_user() for _ in range(count)]
+        for user in users:
+            self.bot.user_task_join(user, self.task, self.waiting_room)
+        return [user["id"] for user in users]
+
+    def created_rooms(self):
+        emitted = self.bot.sio.emitted
+        return [data["room"] for event, data in emitted if event == "room_created"]
+
+    def test_group_moves_in_parallel(self):
+        self.api.delay = 0.05
+        users = self.join(3)
+        rooms = self.created_rooms()
+
+        self.assertEqual(len(rooms), 1)
+        self.assertEqual(sorted(self.state.rooms[rooms[0]]["users"]), users)
+        self.assertEqual(self.state.rooms[self.waiting_room]["users"], [])
+        # the two users who had to wait were greeted
+        self.assertEqual(len(self.bot.sio.emitted), 3)
+
+    def test_parallel_is_faster(self):
+        self.join(2)
+        self.api.delay = 0.05
+        start = time.monotonic()
+        self.join(1)
+        # room, three joins and three removals one after another: 0.35s
+        self.assertLess(time.monotonic() - start, 0.3)
+
+    def test_failed_transfer_requeues_others(self):
+        users = self.join(2)
+        self.api.broken.add(users[1])
+        last = self.join(1)[0]
+
+        self.assertEqual(self.created_rooms(), [])
+        waiting = self.bot.matchmaker.waiting(self.task["id"])
+        self.assertEqual([ticket.user_id for ticket in waiting], [users[0], last])
+        # the user who could not join is asked to queue again
+        messages = [
+            data["message"]
+            for _, data in self.bot.sio.emitted
+            if data.get("receiver_id") == users[1]
+        ]
+        self.assertIn("reload the page", messages[-1])
+        # the unused room was deleted
+        self.assertEqual(set(self.state.rooms), {self.waiting_room})
+
+        self.api.broken.clear()
+        self.join(1)
+        self.assertEqual(len(self.created_rooms()), 1)
+
+    def test_failed_transfer_matches_again(self):
+        users = self.join(2)
+        self.api.broken.add(users[1])
+        # a user queued while the group is moved, e.g. by another replica
+        other = self.create_user()["id"]
+        join_room = self.bot.join_room
+
+        def queue_other(user_id, room_id):
+            self.bot.matchmaker.enqueue(self.task["id"], other, self.waiting_room)
+            return join_room(user_id, room_id)
+
+        self.bot.join_room = queue_other
+        last = self.join(1)[0]
+
+        rooms = self.created_rooms()
+        self.assertEqual(len(rooms), 1)
+        self.assertEqual(
+            sorted(self.state.rooms[rooms[0]]["users"]), sorted([users[0], last, other])
+        )
+        self.assertEqual(set(self.state.rooms), {self.waiting_room, rooms[0]})
+
+    def test_failed_transfer_returns_pooled_room(self):
+        self.bot.room_pool = RoomPool(
+            self.bot.prepare_room, self.bot.discard_room, min_size=1
+        )
+        self.addCleanup(self.bot.room_pool.close)
+        users = self.join(2)
+        deadline = time.monotonic() + 2
+        while self.bot.room_pool.sizes().get(self.layout) != 1:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+        pooled = self.bot.room_pool._rooms[self.layout][0]
+
+        self.api.broken.add(users[1])
+        self.join(1)
+        self.assertEqual(self.created_rooms(), [])
+        # the room is ready for the next group
+        self.assertIn(pooled, self.bot.room_pool._rooms[self.layout])
+        self.assertEqual(self.state.rooms[pooled[0]]["users"], [])
+
+    def test_pooled_rooms(self):
+        self.bot.room_pool = RoomPool(
+            self.bot.prepare_room, self.bot.discard_room, min_size=2
+        )
+        self.join(1)
+        deadline = time.monotonic() + 2
+        while self.bot.room_pool.sizes().get(self.layout) != 2:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+        pooled = set(self.state.rooms) - {self.waiting_room}
+
+        users = self.join(2)
+        room = self.created_rooms()[0]
+        self.assertIn(room, pooled)
+        self.assertEqual(len(self.state.rooms[room]["users"]), 3)
+
+        self.bot.room_pool.close()
+        # only the waiting room and the used room are left
+        self.assertEqual(set(self.state.rooms), {self.waiting_room, room})
+        self.assertNotIn(users[0], self.state.rooms[self.waiting_room]["users"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""RoomDispatcher class test cases."""
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from common.dispatcher import RoomDispatcher
+from common.scheduler import schedule
+from templates import InstrumentedClient
+
+
+class TestRoomDispatcher(unittest.TestCase):
+    def setUp(self):
+        self.dispatcher = RoomDispatcher(workers=4, batch=3)
+        self.handled = []
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        self.dispatcher.shutdown()
+
+    def handle(self, room_id, i, pause=0):
+        time.sleep(pause)
+        with self.lock:
+            self.handled.append((room_id, i))
+
+    def wait_idle(self):
+        for _ in range(200):
+            if not self.dispatcher.stats()["rooms"]:
+                return
+            time.sleep(0.01)
+        self.fail("dispatcher did not finish")
+
+    def test_order_within_room(self):
+        for i in range(20):
+            for room_id in range(3):
+                self.dispatcher.submit(room_id, self.handle, room_id, i)
+        self.wait_idle()
+
+        for room_id in range(3):
+            order = [i for room, i in self.handled if room == room_id]
+            self.assertEqual(order, list(range(20)))
+        self.assertEqual(self.dispatcher.stats()["dispatched"], 60)
+
+    def test_slow_room_does_not_block_others(self):
+        self.dispatcher.submit(1, self.handle, 1, 0, 0.3)
+        self.dispatcher.submit(1, self.handle, 1, 1)
+        self.dispatcher.submit(2, self.handle, 2, 0)
+        time.sleep(0.1)
+
+        self.assertEqual(self.handled, [(2, 0)])
+        self.assertEqual(self.dispatcher.backlog(1), 1)
+        self.wait_idle()
+        self.assertEqual(self.handled[1:], [(1, 0), (1, 1)])
+
+    def test_handler_holds_room_lock(self):
+        started = threading.Event()
+
+        def hold(room_id):
+            started.set()
+            time.sleep(0.1)
+
+        self.dispatcher.submit(1, hold, 1)
+        started.wait(1)
+        lock = self.dispatcher.locks(1)
+        self.assertFalse(lock.acquire(blocking=False))
+        self.assertTrue(lock.acquire(timeout=1))
+        lock.release()
+
+    def test_failing_handler(self):
+        def fail(room_id):
+            raise RuntimeError(room_id)
+
+        self.dispatcher.submit(1, fail, 1)
+        self.dispatcher.submit(1, self.handle, 1, 0)
+        self.wait_idle()
+        self.assertEqual(self.handled, [(1, 0)])
+
+    def test_discard_idle_room(self):
+        self.dispatcher.submit(1, self.handle, 1, 0)
+        self.wait_idle()
+        self.assertEqual(len(self.dispatcher.locks), 1)
+
+        self.dispatcher.discard(1)
+        self.assertEqual(len(self.dispatcher.locks), 0)
+
+    def test_discard_busy_room(self):
+        started = threading.Event()
+
+        def hold(room_id):
+            started.set()
+            time.sleep(0.1)
+
+        self.dispatcher.submit(1, hold, 1)
+        self.dispatcher.submit(1, self.handle, 1, 0)
+        started.wait(1)
+        self.dispatcher.discard(1)
+        # the lock is kept until the pending events were handled
+        self.assertEqual(len(self.dispatcher.locks), 1)
+
+        self.wait_idle()
+        self.assertEqual(self.handled, [(1, 0)])
+        self.assertEqual(len(self.dispatcher.locks), 0)
+
+
+class TestForgetRoom(unittest.TestCase):
+    def test_timers_do_not_recreate_lock(self):
+        sio = InstrumentedClient(logger=False)
+        fired = threading.Event()
+
+        def tick(room_id):
+            with sio.room_locks(room_id):
+                fired.set()
+
+        schedule(0.05, tick, 1, group=1)
+        sio.room_locks(1)
+        sio.forget_room(1)
+        self.assertFalse(fired.wait(0.2))
+        self.assertEqual(len(sio.room_locks), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""SlurkState class test cases."""
+
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from fake_slurk import DEFAULT_API_TOKEN, SlurkState
+
+
+ADMIN = {"Authorization": f"Bearer {DEFAULT_API_TOKEN}"}
+
+
+class TestSlurkState(unittest.TestCase):
+    def setUp(self):
+        self.state = SlurkState()
+        self.layout = self.post("/layouts", {"title": "Task"})["id"]
+        self.room = self.post("/rooms", {"layout_id": self.layout})["id"]
+        self.task = self.post(
+            "/tasks", {"name": "Task", "num_users": 2, "layout_id": self.layout}
+        )["id"]
+
+    def post(self, path, body=None, headers=ADMIN):
+        status, data, _ = self.state.handle("POST", path, body, headers)
+        self.assertLess(status, 300, data)
+        return data
+
+    def create_user(self, name, task_id=None):
+        permissions = self.post("/permissions", {"send_message": True})["id"]
+        token = self.post(
+            "/tokens",
+            {"permissions_id": permissions, "room_id": self.room, "task_id": task_id},
+        )["id"]
+        user = self.post("/users", {"name": name, "token_id": token})
+        return user["id"], token
+
+    def events(self):
+        events, self.state.outbox = self.state.outbox, []
+        return events
+
+    def test_authorization(self):
+        status, _, _ = self.state.handle("GET", f"/rooms/{self.room}", None, {})
+        self.assertEqual(status, 401)
+        status, _, _ = self.state.handle("GET", "/unknown", None, ADMIN)
+        self.assertEqual(status, 404)
+
+    def test_user_task_and_room(self):
+        user, _ = self.create_user("Ann", self.task)
+        _, task, _ = self.state.handle("GET", f"/users/{user}/task", None, ADMIN)
+        self.assertEqual(task["id"], self.task)
+
+        _, users, _ = self.state.handle("GET", f"/rooms/{self.room}/users", None, ADMIN)
+        self.assertEqual(users, [{"id": user, "name": "Ann"}])
+
+    def test_etag(self):
+        user, _ = self.create_user("Ann")
+        _, _, headers = self.state.handle("GET", f"/users/{user}", None, ADMIN)
+        etag = headers["ETag"]
+
+        other = self.post("/rooms", {"layout_id": self.layout})["id"]
+        _, _, headers = self.state.handle(
+            "POST", f"/users/{user}/rooms/{other}", None, ADMIN
+        )
+        self.assertNotEqual(headers["ETag"], etag)
+
+        status, _, _ = self.state.handle(
+            "DELETE",
+            f"/users/{user}/rooms/{other}",
+            None,
+            {**ADMIN, "If-Match": etag},
+        )
+        self.assertEqual(status, 412)
+        status, _, _ = self.state.handle(
+            "DELETE",
+            f"/users/{user}/rooms/{other}",
+            None,
+            {**ADMIN, "If-Match": headers["ETag"]},
+        )
+        self.assertEqual(status, 200)
+
+    def test_join_emits_when_connected(self):
+        user, token = self.create_user("Ann")
+        self.assertIsNone(self.state.connect("wrong", str(user)))
+        self.assertIsNotNone(self.state.connect(token, str(user)))
+        [(event, data, room, _)] = self.events()
+        self.assertEqual((event, data["type"], room), ("status", "join", self.room))
+
+        other = self.post("/rooms", {"layout_id": self.layout})["id"]
+        self.post(f"/users/{user}/rooms/{other}")
+        self.assertEqual(
+            [(event, room, receiver) for event, _, room, receiver in self.events()],
+            [("joined_room", None, user), ("status", other, None)],
+        )
+
+    def test_room_updates(self):
+        status, _, _ = self.state.handle(
+            "PATCH",
+            f"/rooms/{self.room}/attribute/id/sidebar",
+            {"attribute": "style", "value": "width: 80%"},
+            ADMIN,
+        )
+        self.assertEqual(status, 204)
+        status, _, _ = self.state.handle(
+            "DELETE",
+            f"/rooms/{self.room}/class/image-area",
+            {"class": "dis-area", "receiver_id": 3},
+            ADMIN,
+        )
+        self.assertEqual(status, 204)
+        self.assertEqual(
+            [(event, room, receiver) for event, _, room, receiver in self.events()],
+            [("attribute_update", self.room, None), ("class_remove", None, 3)],
+        )
+
+    def test_messages(self):
+        ann, _ = self.create_user("Ann")
+        self.assertTrue(self.state.on_text(ann, {"message": "hi", "room": self.room}))
+        self.state.on_message_command(
+            ann, {"command": "ready", "room": self.room, "receiver_id": 5}
+        )
+        [text, command] = self.events()
+        self.assertEqual(text[0], "text_message")
+        self.assertEqual(text[1]["user"], {"id": ann, "name": "Ann"})
+        self.assertEqual((command[0], command[3]), ("command", 5))
+
+    def test_room_created(self):
+        ann, _ = self.create_user("Ann")
+        self.state.on_room_created(ann, {"room": self.room, "task": self.task})
+        [(event, data, room, receiver)] = self.events()
+        self.assertEqual(event, "new_task_room")
+        self.assertEqual(data["users"], [{"id": ann, "name": "Ann"}])
+        self.assertIsNone(room or receiver)
+
+    def test_logs(self):
+        status, _, _ = self.state.handle(
+            "POST", "/logs", {"event": "x", "room_id": self.room, "data": {}}, ADMIN
+        )
+        self.assertEqual(status, 201)
+        self.assertEqual(self.state.stats()["logs"], 1)
+
+    def test_room_logs(self):
+        ann, token = self.create_user("Ann")
+        self.state.connect(token, str(ann))
+        self.state.on_text(ann, {"message": "hi", "room": self.room})
+        self.state.handle(
+            "POST",
+            "/logs",
+            {"event": "board_log", "room_id": self.room, "data": {"board": 1}},
+            {"Authorization": f"Bearer {token}"},
+        )
+        _, logs, _ = self.state.handle("GET", f"/rooms/{self.room}/logs", None, ADMIN)
+        self.assertEqual(
+            [(log["event"], log["user_id"]) for log in logs],
+            [("join", ann), ("text_message", ann), ("board_log", ann)],
+        )
+
+    def test_keypress(self):
+        ann, _ = self.create_user("Ann")
+        self.state.on_keypress(ann, {"typing": True})
+        [(event, data, room, _)] = self.events()
+        self.assertEqual(event, "start_typing")
+        self.assertEqual((data["room"], room), (self.room, self.room))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""Bulk token generation test cases."""
+
+import argparse
+import csv
+import json
+import os
+from pathlib import Path
+import sys
+import tempfile
+import unittest
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from fake_slurk import DEFAULT_API_TOKEN, SlurkState
+import generate_tokens
+from provision import SlurkAdmin
+from test_provision import StateSession
+
+
+class FlakySession(StateSession):
+    """Fails the first `failures` token requests."""
+
+    def __init__(self, state, failures=0):
+        super().__init__(state)
+        self.failures = failures
+
+    def request(self, method, url, **kwargs):
+        if url.endswith("/tokens"):
+            with self.lock:
+                fail = self.failures > 0
+                self.failures -= 1
+            if fail:
+                raise requests.ConnectionError("connection reset")
+        return super().request(method, url, **kwargs)
+
+
+class TestBulkTokens(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.state = SlurkState()
+        self.session = FlakySession(self.state)
+        self.admin = SlurkAdmin(
+            "http://localhost:5000", DEFAULT_API_TOKEN, session=self.session
+        )
+
+    def bulk(self, output, n_tokens=50, task_id=2, **kwargs):
+        args = argparse.Namespace(
+            output=os.path.join(self.directory, output),
+            n_tokens=n_tokens,
+            workers=8,
+            permissions_pool=0,
+            complete_links=False,
+        )
+        for key, value in kwargs.items():
+            setattr(args, key, value)
+        generate_tokens.bulk(args, self.admin, {"send_message": True}, 1, task_id)
+        return args.output
+
+    def test_csv(self):
+        output = self.bulk("tokens.csv", permissions_pool=1)
+        with open(output, newline="") as file:
+            records = list(csv.DictReader(file))
+
+        self.assertEqual(len(records), 50)
+        self.assertEqual(len({record["token"] for record in records}), 50)
+        self.assertEqual({record["task_id"] for record in records}, {"2"})
+        # all tokens share one permissions object
+        self.assertEqual(len(self.state.permissions), 1)
+        self.assertEqual(len(self.state.tokens), 51)
+
+    def test_permissions_per_token(self):
+        self.bulk("tokens.jsonl", n_tokens=10)
+        self.assertEqual(len(self.state.permissions), 10)
+
+    def test_resume(self):
+        self.session.failures = 5
+        with self.assertRaises(SystemExit):
+            self.bulk("tokens.jsonl")
+        output = os.path.join(self.directory, "tokens.jsonl")
+        self.assertEqual(generate_tokens.read_tokens(Path(output), 1, 2), 45)
+
+        self.bulk("tokens.jsonl")
+        with open(output) as file:
+            records = [json.loads(line) for line in file]
+        self.assertEqual(len(records), 50)
+        self.assertEqual(len({record["token"] for record in records}), 50)
+        # nothing left to do
+        self.bulk("tokens.jsonl")
+        self.assertEqual(len(self.state.tokens), 51)
+
+    def test_other_task(self):
+        self.bulk("tokens.csv", n_tokens=5)
+        with self.assertRaises(ValueError):
+            self.bulk("tokens.csv", n_tokens=10, task_id=3)
+
+
+if __name__ == "__main__":
+    unittest.main()
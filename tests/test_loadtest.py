@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""Load test helper test cases."""
+
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from loadtest import Report, percentile, ramp_schedule
+
+
+class TestLoadTest(unittest.TestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([3], 90), 3)
+        self.assertIsNone(percentile([], 50))
+
+    def test_ramp_schedule(self):
+        self.assertEqual(ramp_schedule(3, "all"), [0.0, 0.0, 0.0])
+        self.assertEqual(ramp_schedule(4, "linear:8"), [0.0, 2.0, 4.0, 6.0])
+        self.assertEqual(ramp_schedule(5, "step:2:10"), [0, 0, 10, 10, 20])
+        with self.assertRaises(ValueError):
+            ramp_schedule(2, "sine:4")
+
+    def test_report(self):
+        report = Report()
+        for latency in (0.1, 0.2, 0.3):
+            report.action("guess", latency)
+        report.action("guess")
+        report.room(12.0)
+        report.room()
+
+        summary = report.summary()
+        self.assertEqual(summary["actions"]["guess"]["count"], 4)
+        self.assertEqual(summary["actions"]["guess"]["error_rate"], 0.25)
+        self.assertEqual(summary["actions"]["guess"]["p50"], 0.2)
+        self.assertEqual(summary["rooms"]["completed"], 1)
+        self.assertEqual(summary["rooms"]["failed"], 1)
+        self.assertIn("guess", report.render())
+
+
+if __name__ == "__main__":
+    unittest.main()
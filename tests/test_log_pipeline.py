@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""LogPipeline class test cases."""
+
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from common.log_pipeline import LogPipeline
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+
+class FakeApi:
+    """Records posted log events, optionally holding them back."""
+
+    def __init__(self, status_code=201):
+        self.status_code = status_code
+        self.posted = []
+        self.release = threading.Event()
+        self.release.set()
+        self._lock = threading.Lock()
+
+    def post(self, path, json):
+        self.release.wait()
+        with self._lock:
+            self.posted.append(json)
+        return FakeResponse(self.status_code)
+
+
+def record(i, room_id=1):
+    return {"event": f"event_{i}", "room_id": room_id, "data": {"i": i}}
+
+
+class TestLogPipeline(unittest.TestCase):
+    def tearDown(self):
+        self.pipeline.close(timeout=5)
+
+    def test_flush_submits_everything(self):
+        api = FakeApi()
+        self.pipeline = LogPipeline(api, batch_size=7)
+        for i in range(50):
+            self.pipeline.put(record(i, room_id=i % 3))
+
+        self.assertTrue(self.pipeline.flush(timeout=5))
+        self.assertEqual(len(api.posted), 50)
+        self.assertEqual(self.pipeline.stats()["submitted"], 50)
+        self.assertEqual(self.pipeline.stats()["queue_depth"], 0)
+
+    def test_order_within_room(self):
+        api = FakeApi()
+        self.pipeline = LogPipeline(api, batch_size=10, workers=4)
+        for i in range(40):
+            self.pipeline.put(record(i, room_id=i % 4))
+        self.pipeline.flush(timeout=5)
+
+        for room_id in range(4):
+            sent = [r["data"]["i"] for r in api.posted if r["room_id"] == room_id]
+            self.assertEqual(sent, sorted(sent))
+
+    def test_failures_are_counted(self):
+        self.pipeline = LogPipeline(FakeApi(status_code=500))
+        self.pipeline.put(record(0))
+        self.pipeline.flush(timeout=5)
+
+        stats = self.pipeline.stats()
+        self.assertEqual(stats["failed"], 1)
+        self.assertEqual(stats["submitted"], 0)
+
+    def test_drop_oldest(self):
+        api = FakeApi()
+        api.release.clear()
+        self.pipeline = LogPipeline(
+            api, max_size=5, batch_size=1, overflow="drop-oldest"
+        )
+        for i in range(20):
+            self.pipeline.put(record(i))
+        api.release.set()
+        self.pipeline.flush(timeout=5)
+
+        stats = self.pipeline.stats()
+        self.assertEqual(stats["dropped"] + stats["submitted"], 20)
+        self.assertGreater(stats["dropped"], 0)
+        # the most recent events always survive
+        self.assertEqual(api.posted[-1]["event"], "event_19")
+
+    def test_spill_keeps_order(self):
+        api = FakeApi()
+        api.release.clear()
+        with tempfile.TemporaryDirectory() as tmp:
+            self.pipeline = LogPipeline(
+                api,
+                max_size=5,
+                batch_size=2,
+                overflow="spill",
+                spill_file=os.path.join(tmp, "spill.jsonl"),
+            )
+            for i in range(30):
+                self.pipeline.put(record(i))
+            self.assertGreater(self.pipeline.stats()["spill_depth"], 0)
+
+            api.release.set()
+            self.assertTrue(self.pipeline.flush(timeout=5))
+            self.pipeline.close(timeout=5)
+
+        self.assertEqual([r["data"]["i"] for r in api.posted], list(range(30)))
+        self.assertEqual(self.pipeline.stats()["dropped"], 0)
+
+    def test_invalid_policy(self):
+        self.pipeline = LogPipeline(FakeApi())
+        with self.assertRaises(ValueError):
+            LogPipeline(FakeApi(), overflow="ignore")
+        with self.assertRaises(ValueError):
+            LogPipeline(FakeApi(), overflow="spill")
+
+
+if __name__ == "__main__":
+    unittest.main()
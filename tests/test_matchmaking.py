@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""Matchmaker class test cases."""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from common.matchmaking import Matchmaker, SqliteMatchmaker, open_matchmaker
+from common.metrics import get_metrics
+
+
+def user_ids(groups):
+    return [[ticket.user_id for ticket in group] for group in groups]
+
+
+def replica(path, offset, users, group_size, start, results):
+    """A concierge process: queues every user it sees (all replicas
+    see all of them), lets some leave again and claims groups."""
+    matchmaker = SqliteMatchmaker(path)
+    grouped = []
+    start.wait()
+    for user_id in range(users):
+        # replicas see the events in different orders
+        user_id = (user_id + offset * 7) % users
+        matchmaker.enqueue(1, user_id, 5)
+        if user_id % 11 == 0:
+            matchmaker.leave(1, user_id)
+        for group in matchmaker.match(1, group_size):
+            assert len(group) == group_size
+            grouped.extend(ticket.user_id for ticket in group)
+    matchmaker.close()
+    results.put((offset, grouped))
+
+
+class MatchmakerTests:
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "queue.db")
+        self.matchmaker = self.open()
+
+    def tearDown(self):
+        self.matchmaker.close()
+        self.directory.cleanup()
+
+    def test_groups_in_joining_order(self):
+        self.assertEqual(self.matchmaker.join(1, 10, 5, 2), [])
+        self.assertEqual(self.matchmaker.join(2, 20, 5, 2), [])
+        groups = self.matchmaker.join(1, 11, 6, 2)
+
+        self.assertEqual(user_ids(groups), [[10, 11]])
+        self.assertEqual([ticket.room_id for ticket in groups[0]], [5, 6])
+        self.assertEqual(self.matchmaker.depths(), {2: 1})
+
+    def test_rejoin_keeps_place(self):
+        self.matchmaker.join(1, 10, 5, 3)
+        self.matchmaker.join(1, 11, 5, 3)
+        self.matchmaker.join(1, 10, 7, 3)
+        self.assertEqual([t.user_id for t in self.matchmaker.waiting(1)], [10, 11])
+        self.assertEqual(self.matchmaker.waiting(1)[0].room_id, 7)
+
+    def test_leave(self):
+        self.matchmaker.join(1, 10, 5, 2)
+        self.assertIsNotNone(self.matchmaker.leave(1, 10))
+        self.assertIsNone(self.matchmaker.leave(1, 10))
+        self.assertIsNone(self.matchmaker.leave(3, 10))
+        self.assertEqual(self.matchmaker.join(1, 11, 5, 2), [])
+        self.assertEqual(self.matchmaker.stats()["cancelled"], 1)
+
+    def test_batch_match_and_requeue(self):
+        for user_id in range(7):
+            self.matchmaker.join(1, user_id, 5, 10)
+        groups = self.matchmaker.match(1, 3)
+        self.assertEqual(user_ids(groups), [[0, 1, 2], [3, 4, 5]])
+
+        self.matchmaker.requeue(groups[1])
+        self.assertEqual(
+            [t.user_id for t in self.matchmaker.waiting(1)], [3, 4, 5, 6]
+        )
+        self.assertEqual(self.matchmaker.stats()["matched"], 3)
+
+    def test_concurrent_joins(self):
+        barrier = threading.Barrier(8)
+        groups = []
+        lock = threading.Lock()
+
+        def join(offset):
+            barrier.wait()
+            for user_id in range(offset, 200, 8):
+                formed = self.matchmaker.join(1, user_id, 5, 2)
+                if user_id % 5 == 0:
+                    self.matchmaker.leave(1, user_id)
+                with lock:
+                    groups.extend(formed)
+
+        threads = [threading.Thread(target=join, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        grouped = [user_id for group in user_ids(groups) for user_id in group]
+        waiting = [ticket.user_id for ticket in self.matchmaker.waiting(1)]
+        self.assertEqual(len(grouped), len(set(grouped)))
+        self.assertTrue(all(len(group) == 2 for group in groups))
+        self.assertFalse(set(grouped) & set(waiting))
+        cancelled = self.matchmaker.stats()["cancelled"]
+        self.assertEqual(len(grouped) + len(waiting) + cancelled, 200)
+
+    def test_greeting_once(self):
+        self.assertTrue(self.matchmaker.enqueue(1, 10, 5))
+        self.assertFalse(self.matchmaker.enqueue(1, 10, 5))
+        self.assertEqual(self.matchmaker.stats()["queued"], 1)
+
+    def test_metrics(self):
+        task = f"metrics-{type(self).__name__}"
+        self.matchmaker.join(task, 1, 5, 2)
+        self.matchmaker.join(task, 2, 5, 2)
+        self.matchmaker.join(task, 3, 5, 2)
+        self.matchmaker.join(task, 4, 5, 3)
+        self.matchmaker.leave(task, 4)
+
+        series = get_metrics().snapshot()["match_wait"][(("task", task),)]
+        self.assertEqual(series["count"], 3)
+        self.assertEqual(series["errors"], 1)
+        self.matchmaker.join(task, 5, 5, 3)
+        self.assertIn(
+            f'slurk_bot_match_queue_depth{{task="{task}"}} 2', get_metrics().render()
+        )
+
+
+class TestMatchmaker(MatchmakerTests, unittest.TestCase):
+    def open(self):
+        return Matchmaker()
+
+
+class TestSqliteMatchmaker(MatchmakerTests, unittest.TestCase):
+    def open(self):
+        return SqliteMatchmaker(self.path)
+
+    def test_shared_between_instances(self):
+        other = SqliteMatchmaker(self.path)
+        self.addCleanup(other.close)
+        self.assertTrue(self.matchmaker.enqueue(1, 10, 5))
+        self.assertFalse(other.enqueue(1, 10, 5))
+        groups = other.join(1, 11, 6, 2)
+        self.assertEqual(user_ids(groups), [[10, 11]])
+        self.assertEqual(self.matchmaker.match(1, 2), [])
+        # a late join event of a grouped user is ignored
+        self.assertFalse(self.matchmaker.enqueue(1, 10, 5))
+        self.assertEqual(self.matchmaker.waiting(1), [])
+
+    def test_claim_expires(self):
+        self.matchmaker.claim_ttl = 0
+        self.matchmaker.join(1, 10, 5, 1)
+        self.assertTrue(self.matchmaker.enqueue(1, 10, 5))
+
+    def test_replicas(self):
+        replicas, users, group_size = 4, 300, 3
+        context = multiprocessing.get_context("spawn")
+        start, results = context.Event(), context.Queue()
+        processes = [
+            context.Process(
+                target=replica,
+                args=(self.path, offset, users, group_size, start, results),
+            )
+            for offset in range(replicas)
+        ]
+        for process in processes:
+            process.start()
+        start.set()
+        grouped = dict(results.get(timeout=60) for _ in processes)
+        for process in processes:
+            process.join(timeout=10)
+            self.assertEqual(process.exitcode, 0)
+
+        everyone = [user_id for ids in grouped.values() for user_id in ids]
+        # nobody is assigned twice, and everyone is grouped or waiting
+        self.assertEqual(len(everyone), len(set(everyone)))
+        waiting = {ticket.user_id for ticket in self.matchmaker.waiting(1)}
+        self.assertFalse(waiting & set(everyone))
+        self.assertLess(len(waiting), group_size)
+        left = set(range(0, users, 11))
+        self.assertEqual(set(everyone) | waiting | left, set(range(users)))
+        # the work was shared
+        self.assertGreater(sum(1 for ids in grouped.values() if ids), 1)
+
+    def test_open_matchmaker(self):
+        self.assertIsInstance(open_matchmaker("memory"), Matchmaker)
+        with self.assertRaises(ValueError):
+            open_matchmaker("redis://localhost")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""MetadataCache class test cases."""
+
+import json
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from common.metadata import MetadataCache
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, etag=None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.content = json.dumps(body).encode()
+        self.headers = {"ETag": etag} if etag else {}
+        self._body = body
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise RuntimeError(self.status_code)
+
+
+class FakeApi:
+    """Serves one user whose ETag changes with every write."""
+
+    def __init__(self):
+        self.etag = "v1"
+        self.calls = []
+
+    def get(self, path):
+        self.calls.append(("GET", path))
+        if path.endswith("/task"):
+            return FakeResponse(200, {"id": 7})
+        if path.endswith("/permissions"):
+            return FakeResponse(200, {"id": 11}, self.etag)
+        return FakeResponse(200, {"id": 3}, self.etag)
+
+    def _write(self, method, path, headers, **kwargs):
+        self.calls.append((method, path))
+        if headers["If-Match"] != self.etag:
+            return FakeResponse(412)
+        self.etag = f"v{int(self.etag[1:]) + 1}"
+        return FakeResponse(200, {"id": 3}, self.etag)
+
+    def patch(self, path, headers, **kwargs):
+        return self._write("PATCH", path, headers, **kwargs)
+
+    def delete(self, path, headers, **kwargs):
+        return self._write("DELETE", path, headers, **kwargs)
+
+
+class TestMetadataCache(unittest.TestCase):
+    def setUp(self):
+        self.api = FakeApi()
+        self.cache = MetadataCache(self.api, ttl=60)
+
+    def test_task_is_cached(self):
+        for _ in range(3):
+            self.assertEqual(self.cache.task_of(3), {"id": 7})
+        self.assertEqual(self.api.calls, [("GET", "/users/3/task")])
+        self.assertEqual(self.cache.stats()["hits"], 2)
+
+    def test_expiry(self):
+        self.cache.ttl = -1
+        self.cache.task_of(3)
+        self.cache.task_of(3)
+        self.assertEqual(self.cache.stats()["misses"], 2)
+
+    def test_writes_keep_etag(self):
+        for value in (True, False, True):
+            response = self.cache.update_permissions(3, {"send_message": value})
+            self.assertTrue(response.ok)
+        # one lookup, then the ETags of the responses are used
+        self.assertEqual(
+            [call for call in self.api.calls if call[0] == "GET"],
+            [("GET", "/users/3/permissions")],
+        )
+
+    def test_retry_on_outdated_etag(self):
+        self.cache.user_etag(3)
+        self.api.etag = "v5"  # changed by someone else
+
+        response = self.cache.remove_user_from_room(3, 1)
+        self.assertTrue(response.ok)
+        self.assertEqual(
+            self.api.calls,
+            [
+                ("GET", "/users/3"),
+                ("DELETE", "/users/3/rooms/1"),
+                ("GET", "/users/3"),
+                ("DELETE", "/users/3/rooms/1"),
+            ],
+        )
+
+    def test_write_attempts(self):
+        get = self.api.get
+
+        def moved_on(path):
+            response = get(path)
+            # changed by someone else right after every lookup
+            self.api.etag = f"v{int(self.api.etag[1:]) + 1}"
+            return response
+
+        self.api.get = moved_on
+        response = self.cache.remove_user_from_room(3, 1)
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(self.api.calls.count(("DELETE", "/users/3/rooms/1")), 3)
+
+    def test_status_invalidates_user(self):
+        self.cache.task_of(3)
+        self.cache.user_etag(3)
+        self.cache.on_status({"type": "join", "user": {"id": 3}, "room": 1})
+        self.cache.task_of(3)
+        self.cache.user_etag(3)
+
+        self.assertEqual(self.api.calls.count(("GET", "/users/3")), 2)
+        self.assertEqual(self.api.calls.count(("GET", "/users/3/task")), 1)
+        self.assertEqual(self.cache.stats()["invalidations"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
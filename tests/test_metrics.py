@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""Metrics class test cases."""
+
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from common.metrics import Metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics(buckets=(0.1, 1.0))
+
+    def test_track(self):
+        with self.metrics.track("event", event="status"):
+            series = self.metrics.snapshot()["event"][(("event", "status"),)]
+            self.assertEqual(series["in_flight"], 1)
+
+        with self.assertRaises(KeyError):
+            with self.metrics.track("event", event="status"):
+                raise KeyError("room")
+
+        with self.metrics.track("event", event="status") as call:
+            call.error = True
+
+        series = self.metrics.snapshot()["event"][(("event", "status"),)]
+        self.assertEqual(series["count"], 3)
+        self.assertEqual(series["errors"], 2)
+        self.assertEqual(series["in_flight"], 0)
+
+    def test_timed(self):
+        @self.metrics.timed("event", event="command")
+        def command(data):
+            return data
+
+        self.assertEqual(command.__name__, "command")
+        self.assertEqual(command(1), 1)
+        series = self.metrics.snapshot()["event"][(("event", "command"),)]
+        self.assertEqual(series["count"], 1)
+
+    def test_render(self):
+        with self.metrics.track("api", method="GET", path='/rooms/"{id}"'):
+            pass
+        text = self.metrics.render()
+
+        self.assertIn("# TYPE slurk_bot_api_seconds histogram", text)
+        self.assertIn(
+            'slurk_bot_api_seconds_bucket{method="GET",path="/rooms/\\"{id}\\"",le="0.1"} 1',
+            text,
+        )
+        self.assertIn('le="+Inf"} 1', text)
+        self.assertIn(
+            'slurk_bot_api_errors_total{method="GET",path="/rooms/\\"{id}\\""} 0', text
+        )
+
+    def test_gauge(self):
+        self.metrics.gauge("backlog", lambda: 3, "Waiting.")
+        self.metrics.gauge(
+            "depth", lambda: {(("task", 2),): 1, (("task", 1),): 4}, "Per task."
+        )
+        text = self.metrics.render()
+
+        self.assertIn("# TYPE slurk_bot_backlog gauge\nslurk_bot_backlog 3", text)
+        self.assertIn(
+            'slurk_bot_depth{task="1"} 4\nslurk_bot_depth{task="2"} 1', text
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""Outbound class test cases."""
+
+import importlib.util
+import os
+import sys
+import threading
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from common.acks import AckWindow
+from common.outbound import Outbound, shares_ack
+from common.scheduler import Scheduler
+from templates import Bot, InstrumentedClient
+
+
+def load_echo_bot():
+    path = os.path.join(ROOT, "echo", "__main__.py")
+    spec = importlib.util.spec_from_file_location("echo_bot", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.EchoBot
+
+
+class FakeEmit:
+    def __init__(self):
+        self.emitted = []
+        self.callbacks = []
+        self.lock = threading.Lock()
+
+    def __call__(self, event, data, namespace, callback):
+        with self.lock:
+            self.emitted.append((time.monotonic(), event, data))
+            self.callbacks.append(callback)
+
+
+class TestOutbound(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = Scheduler()
+        self.emit = FakeEmit()
+
+    def tearDown(self):
+        self.scheduler.shutdown()
+
+    def outbound(self, **kwargs):
+        return Outbound(self.emit, scheduler=self.scheduler, **kwargs)
+
+    def wait_idle(self, outbound, timeout=2):
+        deadline = time.monotonic() + timeout
+        while outbound.pending() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.02)
+
+    def payloads(self):
+        return [(event, data) for _, event, data in self.emit.emitted]
+
+    def test_merge_within_window(self):
+        outbound = self.outbound(window=0.05)
+        outbound.emit("text", {"message": "<b>You won!</b>", "room": 1, "html": True})
+        outbound.emit("text", {"message": "<i>again</i>", "room": 1, "html": True})
+        outbound.emit("text", {"message": "a < b", "room": 1})
+        outbound.emit("text", {"message": "c", "room": 1})
+        outbound.emit("text", {"message": "psst", "room": 1, "receiver_id": 4})
+        outbound.emit("text", {"message": "other room", "room": 2})
+        self.assertEqual(self.emit.emitted, [])
+
+        self.wait_idle(outbound)
+        self.assertEqual(
+            self.payloads(),
+            [
+                (
+                    "text",
+                    {
+                        "message": "<b>You won!</b><br><i>again</i>",
+                        "room": 1,
+                        "html": True,
+                    },
+                ),
+                ("text", {"message": "a < b\nc", "room": 1}),
+                ("text", {"message": "psst", "room": 1, "receiver_id": 4}),
+                ("text", {"message": "other room", "room": 2}),
+            ],
+        )
+        self.assertEqual(outbound.stats()["merged"], 2)
+
+    def test_order_with_other_events(self):
+        outbound = self.outbound(window=0.05)
+        outbound.emit("text", {"message": "a", "room": 1})
+        outbound.emit("message_command", {"command": "show", "room": 1})
+        outbound.emit("text", {"message": "b", "room": 1})
+        outbound.emit("text", {"message": "c", "room": 1}, callback=print)
+        outbound.emit("status", None)
+        self.wait_idle(outbound)
+
+        self.assertEqual(
+            [data and data.get("message", data.get("command")) for _, data in self.payloads()],
+            [None, "a", "show", "b", "c"],
+        )
+
+    def test_shared_acks(self):
+        acks = []
+
+        @shares_ack
+        def ack(*args):
+            acks.append(args)
+
+        outbound = self.outbound(window=0.05)
+        outbound.emit("text", {"message": "a", "room": 1}, callback=ack)
+        outbound.emit("text", {"message": "b", "room": 1})
+        outbound.emit("text", {"message": "c", "room": 1}, callback=ack)
+        outbound.emit("text", {"message": "d", "room": 1}, callback=print)
+        self.wait_idle(outbound)
+
+        self.assertEqual(
+            [data["message"] for _, data in self.payloads()], ["a\nb\nc", "d"]
+        )
+        self.emit.callbacks[0](True)
+        self.assertEqual(acks, [(True,), (True,)])
+
+    def test_rate_limit(self):
+        outbound = self.outbound(rate=20, burst=2)
+        start = time.monotonic()
+        for number in range(4):
+            outbound.emit("message_command", {"command": number, "room": 1})
+        outbound.emit("message_command", {"command": "x", "room": 2})
+        # the burst and the other room go out at once
+        self.assertEqual(len(self.emit.emitted), 3)
+
+        self.wait_idle(outbound)
+        times = {data["command"]: sent - start for sent, _, data in self.emit.emitted}
+        self.assertGreaterEqual(times[3], 0.09)
+        self.assertEqual(outbound.stats()["throttled"], 2)
+
+    def test_throttled_messages_merge(self):
+        outbound = self.outbound(rate=10, burst=1)
+        for number in range(5):
+            outbound.emit("text", {"message": str(number), "room": 1})
+        self.wait_idle(outbound)
+        self.assertEqual(
+            [data["message"] for _, data in self.payloads()], ["0", "1\n2\n3\n4"]
+        )
+
+    def test_emits_without_lock(self):
+        outbound = self.outbound()
+        locked = []
+        emit = self.emit
+
+        def check(*args):
+            locked.append(outbound._lock.locked())
+            emit(*args)
+
+        outbound._emit = check
+        outbound.emit("message_command", {"command": "show", "room": 1})
+        self.assertEqual(locked, [False])
+
+    def test_order_while_emitting(self):
+        outbound = self.outbound()
+        emit = self.emit
+        started = threading.Event()
+
+        def slow(event, data, namespace, callback):
+            if data["command"] == "a":
+                started.set()
+                time.sleep(0.1)
+            emit(event, data, namespace, callback)
+
+        outbound._emit = slow
+        thread = threading.Thread(
+            target=outbound.emit, args=("message_command", {"command": "a", "room": 1})
+        )
+        thread.start()
+        started.wait(1)
+        # queued behind "a" and sent by the thread emitting it
+        outbound.emit("message_command", {"command": "b", "room": 1})
+        thread.join()
+        self.assertEqual([data["command"] for _, data in self.payloads()], ["a", "b"])
+        self.assertEqual(outbound.pending(), 0)
+
+    def test_from_env(self):
+        self.assertIsNone(Outbound.from_env(self.emit))
+
+
+class TestBotMessages(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = Scheduler()
+        self.emit = FakeEmit()
+
+        class EchoBot(load_echo_bot()):
+            sio = InstrumentedClient(logger=False)
+
+        self.bot = EchoBot("token", 1, 1, "http://localhost", None)
+        self.bot.sio.outbound = Outbound(
+            self.emit, window=0.05, scheduler=self.scheduler
+        )
+        self.bot.sio.acks = AckWindow(self.bot.sio.emit, scheduler=self.scheduler)
+        self.addCleanup(self.bot.api.close)
+
+    def tearDown(self):
+        self.scheduler.shutdown()
+
+    def test_message_callback_merges(self):
+        for message in ["Well", "done"]:
+            self.bot.sio.emit(
+                "text",
+                {"message": message, "room": 1},
+                callback=self.bot.message_callback,
+            )
+        time.sleep(0.1)
+        self.assertEqual(len(self.emit.emitted), 1)
+        self.assertEqual(self.emit.emitted[0][2]["message"], "Well\ndone")
+        self.assertIs(Bot.message_callback, self.bot.message_callback)
+
+    def test_echoes_merge(self):
+        handler = self.bot.sio.handlers["/"]["text_message"]
+        for message in ["hello", "ping"]:
+            handler(
+                {
+                    "room": 1,
+                    "user": {"id": 2},
+                    "private": False,
+                    "message": message,
+                }
+            )
+        time.sleep(0.1)
+        self.assertEqual(
+            [data for _, _, data in self.emit.emitted],
+            [{"message": "World!\nPong!", "room": 1}],
+        )
+
+        # both echoes are acknowledged by the one ack
+        self.assertEqual(self.bot.sio.acks.in_flight(), 2)
+        self.emit.callbacks[0](True)
+        self.assertEqual(self.bot.sio.acks.stats()["acked"], 2)
+        self.assertEqual(self.bot.sio.acks.in_flight(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
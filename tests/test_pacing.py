@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""PacedSender class test cases."""
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from common.pacing import PacedSender
+from common.scheduler import Scheduler
+
+
+class FakeClient:
+    def __init__(self):
+        self.emitted = []
+        self.lock = threading.Lock()
+
+    def emit(self, event, data):
+        with self.lock:
+            self.emitted.append((time.monotonic(), event, data))
+
+
+class TestPacedSender(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = Scheduler()
+        self.sio = FakeClient()
+        self.pacer = PacedSender(self.sio, self.scheduler)
+
+    def tearDown(self):
+        self.scheduler.shutdown()
+
+    def wait_idle(self, timeout=2):
+        deadline = time.monotonic() + timeout
+        while self.pacer.pending() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.02)
+
+    def messages(self, room_id=None):
+        return [
+            data["message"]
+            for _, _, data in self.sio.emitted
+            if room_id is None or data["room"] == room_id
+        ]
+
+    def test_does_not_block(self):
+        start = time.monotonic()
+        self.pacer.send(1, ["a", "b", "c"], interval=0.05)
+        self.assertLess(time.monotonic() - start, 0.02)
+        self.wait_idle()
+        self.assertEqual(self.messages(), ["a", "b", "c"])
+
+        times = [emitted for emitted, _, _ in self.sio.emitted]
+        self.assertGreaterEqual(times[2] - times[0], 0.09)
+        self.assertEqual(
+            self.sio.emitted[0][2], {"message": "a", "html": True, "room": 1}
+        )
+
+    def test_order_across_calls(self):
+        self.pacer.send(1, ["a", "b"], interval=0.03)
+        self.pacer.send(1, [{"message": "c", "receiver_id": 7}], interval=0.03)
+        self.wait_idle()
+        self.assertEqual(self.messages(), ["a", "b", "c"])
+        self.assertEqual(self.sio.emitted[2][2]["receiver_id"], 7)
+
+    def test_rooms_in_parallel(self):
+        self.pacer.send(1, ["a1", "b1", "c1"], interval=0.05)
+        self.pacer.send(2, ["a2", "b2", "c2"], interval=0.05)
+        self.wait_idle()
+        self.assertEqual(self.messages(1), ["a1", "b1", "c1"])
+        self.assertEqual(self.messages(2), ["a2", "b2", "c2"])
+
+        times = [emitted for emitted, _, _ in self.sio.emitted]
+        self.assertLess(times[-1] - times[0], 0.14)
+
+    def test_cancel(self):
+        self.pacer.send(1, ["a", "b", "c"], interval=0.05)
+        time.sleep(0.02)
+        self.assertEqual(self.pacer.cancel(1), 2)
+        time.sleep(0.12)
+        self.assertEqual(self.messages(), ["a"])
+        self.assertEqual(self.pacer.pending(), 0)
+
+        # the room can be used again
+        self.pacer.send(1, ["d"])
+        self.wait_idle()
+        self.assertEqual(self.messages(), ["a", "d"])
+
+    def test_stats(self):
+        self.pacer.send(1, ["a", "b"], interval=0.01)
+        self.wait_idle()
+        stats = self.pacer.stats()
+        self.assertEqual(stats["sent"], 2)
+        self.assertEqual(stats["rooms"], 0)
+        self.assertGreaterEqual(stats["max_lag"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""Provisioning test cases."""
+
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+from pathlib import Path
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from fake_slurk import DEFAULT_API_TOKEN, SlurkState
+from provision import Phases, ProvisionCache, SlurkAdmin
+import start_bot
+from test_teardown import StateResponse
+
+
+class StateSession:
+    """`requests.Session` answering from a `SlurkState`, `delay` seconds
+    per request, counting the requests answered at once."""
+
+    def __init__(self, state, delay=0.0):
+        self.state = state
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.requests = []
+        self.running = 0
+        self.most_running = 0
+
+    def request(self, method, url, headers=None, json=None, timeout=None):
+        path = url.split("/slurk/api", 1)[1]
+        with self.lock:
+            self.requests.append((method, path))
+            self.running += 1
+            self.most_running = max(self.most_running, self.running)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= 1
+            return StateResponse(*self.state.handle(method, path, json, headers))
+
+
+class TestSlurkAdmin(unittest.TestCase):
+    def setUp(self):
+        self.state = SlurkState()
+        self.session = StateSession(self.state)
+        self.admin = SlurkAdmin(
+            "http://localhost:5000/", DEFAULT_API_TOKEN, session=self.session
+        )
+
+    def test_create(self):
+        layout = self.admin.create_room_layout({"title": "Task"})
+        room = self.admin.create_room(layout)
+        task = self.admin.create_task("Echo Task", 2, layout)
+        token = self.admin.create_token(self.admin.create_permissions({}), room, task)
+        user = self.admin.create_user("echo", token)
+
+        self.assertEqual(self.state.rooms[room]["layout_id"], layout)
+        self.assertEqual(self.state.tokens[token]["task_id"], task)
+        self.assertEqual(self.state.users[user]["token_id"], token)
+        self.assertEqual(
+            self.admin.login_link(token, "user_0"),
+            f"http://localhost:5000/login?name=user_0&token={token}",
+        )
+
+    def test_failure(self):
+        with self.assertRaises(RuntimeError):
+            self.admin.create_room(42)
+
+
+class TestProvisionCache(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "state.json")
+        self.state = SlurkState()
+
+    def admin(self, state=None):
+        session = StateSession(state or self.state)
+        return SlurkAdmin(
+            "http://localhost:5000",
+            DEFAULT_API_TOKEN,
+            session=session,
+            cache=ProvisionCache(self.path),
+        )
+
+    def test_reuse(self):
+        layout = self.admin().create_room_layout({"title": "Task"})
+        admin = self.admin()
+        self.assertEqual(admin.create_room_layout({"title": "Task"}), layout)
+        self.assertEqual(admin.create_room_layout({"title": "Task"}), layout)
+        # checked once, nothing created
+        self.assertEqual(admin.session.requests, [("GET", f"/layouts/{layout}")])
+        self.assertEqual(admin.cache.stats(), {"reused": 2, "created": 0})
+        self.assertEqual(len(self.state.layouts), 1)
+
+    def test_changed_content(self):
+        admin = self.admin()
+        first = admin.create_permissions({"send_message": True}, shared=True)
+        second = admin.create_permissions({"send_message": False}, shared=True)
+        self.assertNotEqual(first, second)
+        self.assertEqual(
+            admin.create_permissions({"send_message": True}, shared=True), first
+        )
+
+    def test_unshared_permissions(self):
+        admin = self.admin()
+        first = admin.create_permissions({"send_message": True})
+        self.assertNotEqual(admin.create_permissions({"send_message": True}), first)
+        self.assertEqual(admin.cache.stats(), {"reused": 0, "created": 0})
+
+    def test_server_reset(self):
+        layout = self.admin().create_room_layout({"title": "Task"})
+        # a new server hands out the same id for another layout
+        state = SlurkState()
+        time.sleep(0.01)
+        other = self.admin(state).create_room_layout({"title": "Other"})
+        self.assertEqual(other, layout)
+
+        admin = self.admin(state)
+        self.assertNotEqual(admin.create_room_layout({"title": "Task"}), layout)
+        self.assertEqual(admin.cache.stats(), {"reused": 0, "created": 1})
+
+    def test_concurrent(self):
+        admin = self.admin()
+        admin.session.delay = 0.02
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            ids = set(
+                executor.map(
+                    lambda _: admin.create_permissions({"x": 1}, shared=True), range(8)
+                )
+            )
+        self.assertEqual(len(ids), 1)
+        self.assertEqual(len(self.state.permissions), 1)
+
+
+class TestManifest(unittest.TestCase):
+    def setUp(self):
+        self.state = SlurkState()
+        self.session = StateSession(self.state, delay=0.02)
+        self.admin = SlurkAdmin(
+            "http://localhost:5000", DEFAULT_API_TOKEN, session=self.session
+        )
+        self.cwd = os.getcwd()
+        os.chdir(ROOT)
+        self.addCleanup(os.chdir, self.cwd)
+
+    def load(self, manifest):
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as file:
+            json.dump(manifest, file)
+        self.addCleanup(os.remove, file.name)
+        return start_bot.load_manifest(file.name)
+
+    def study(self, **kwargs):
+        return self.load(
+            {
+                "bots": [
+                    {
+                        "bot": "recolage",
+                        "users": 2,
+                        "tokens": 5,
+                        "conditions": {
+                            "feedback": "recolage/args_feedback.ini",
+                            "gripper": "recolage/args_gripper.ini",
+                            "selection": "recolage/args_selection.ini",
+                        },
+                    },
+                    {"bot": "echo", "users": 1, "tokens": 2},
+                ],
+                **kwargs,
+            }
+        )
+
+    def test_conditions(self):
+        manifest, bots = self.study()
+        self.assertEqual(
+            [bot["name"] for bot in bots],
+            ["recolage-feedback", "recolage-gripper", "recolage-selection", "echo"],
+        )
+        self.assertEqual({bot["image"] for bot in bots}, {"recolage", "echo"})
+        self.assertEqual(bots[1]["env"]["BOT_VERSION"], "show_gripper")
+        self.assertEqual(bots[3]["env"], {})
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            self.load({"bots": [{"bot": "echo"}]})
+        with self.assertRaises(FileNotFoundError):
+            self.load({"bots": [{"bot": "echo", "users": 1, "extra_args": "x.ini"}]})
+        with self.assertRaises(ValueError):
+            self.load(
+                {"bots": [{"bot": "echo", "users": 1}, {"bot": "echo", "users": 1}]}
+            )
+
+    def test_provision(self):
+        manifest, bots = self.study()
+        phases = Phases()
+        deployment = start_bot.provision_manifest(
+            manifest, bots, self.admin, workers=8, phases=phases
+        )
+
+        waiting_room = deployment["waiting_room_id"]
+        self.assertIn(waiting_room, self.state.rooms)
+        concierge = self.state.users[deployment["concierge"]["user_id"]]
+        self.assertEqual(concierge["name"], f"concierge-{waiting_room}")
+        # one layout per bot directory and one for the waiting room
+        self.assertEqual(len(self.state.layouts), 3)
+        self.assertEqual(len(self.state.tasks), 4)
+
+        for bot in deployment["bots"]:
+            self.assertEqual(self.state.users[bot["user_id"]]["name"], bot["name"])
+            task = self.state.tasks[bot["task_id"]]
+            self.assertEqual(task["num_users"], bot["users"])
+            self.assertEqual(len(bot["user_tokens"]), bot["tokens"])
+            for token in bot["user_tokens"]:
+                self.assertEqual(self.state.tokens[token]["task_id"], bot["task_id"])
+                self.assertEqual(self.state.tokens[token]["room_id"], waiting_room)
+            permissions = {
+                self.state.tokens[token]["permissions_id"]
+                for token in bot["user_tokens"]
+            }
+            self.assertEqual(len(permissions), bot["tokens"])
+
+        self.assertGreater(self.session.most_running, 1)
+        self.assertLessEqual(self.session.most_running, 8)
+        self.assertEqual(
+            list(phases.durations),
+            ["layouts", "rooms and tasks", "bot users", "user tokens"],
+        )
+
+    def test_provision_again(self):
+        manifest, bots = self.study()
+        with tempfile.TemporaryDirectory() as directory:
+            self.admin.cache = ProvisionCache(os.path.join(directory, "state.json"))
+            start_bot.provision_manifest(manifest, bots, self.admin)
+            layouts = len(self.state.layouts)
+            permissions = len(self.state.permissions)
+
+            self.admin.cache = ProvisionCache(os.path.join(directory, "state.json"))
+            start_bot.provision_manifest(manifest, bots, self.admin)
+
+        self.assertEqual(len(self.state.layouts), layouts)
+        # only the permissions of the new user tokens
+        self.assertEqual(len(self.state.permissions), permissions + 17)
+        self.assertEqual(self.admin.cache.stats()["created"], 0)
+
+    def test_existing_waiting_room(self):
+        manifest, bots = self.study(waiting_room_id=1)
+        deployment = start_bot.provision_manifest(
+            manifest, bots, self.admin, workers=2
+        )
+        self.assertIsNone(deployment["concierge"])
+        self.assertEqual(deployment["waiting_room_id"], 1)
+        self.assertEqual(len(self.state.layouts), 2)
+        self.assertEqual(self.state.rooms, {})
+        self.assertLessEqual(self.session.most_running, 2)
+
+
+class TestImageFingerprint(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cwd = os.getcwd()
+        os.chdir(directory.name)
+        self.addCleanup(os.chdir, self.cwd)
+
+        os.makedirs("bot/__pycache__")
+        self.write("bot/Dockerfile", "FROM python:3.9\nCOPY shared.py /src\nCOPY bot /src\n")
+        self.write("bot/main.py", "print('hello')")
+        self.write("shared.py", "VERSION = 1")
+        self.write("unused.py", "")
+        self.fingerprint = start_bot.image_fingerprint("bot/Dockerfile")
+
+    def write(self, path, content):
+        with open(path, "w") as file:
+            file.write(content)
+
+    def test_copied_files(self):
+        self.write("unused.py", "changed")
+        self.write("bot/__pycache__/main.cpython-39.pyc", "compiled")
+        self.assertEqual(start_bot.image_fingerprint("bot/Dockerfile"), self.fingerprint)
+
+        self.write("shared.py", "VERSION = 2")
+        changed = start_bot.image_fingerprint("bot/Dockerfile")
+        self.assertNotEqual(changed, self.fingerprint)
+
+        self.write("bot/data.json", "{}")
+        self.assertNotEqual(start_bot.image_fingerprint("bot/Dockerfile"), changed)
+
+    def test_check_builds(self):
+        builds = [
+            {"image": "a", "built": True, "seconds": 30.0, "saved": None, "error": None},
+            {"image": "b", "built": False, "seconds": 0.0, "saved": 40.0, "error": None},
+        ]
+        start_bot.check_builds(builds)
+        builds.append(
+            {"image": "c", "built": False, "seconds": 1.0, "saved": None, "error": "no"}
+        )
+        with self.assertRaises(RuntimeError):
+            start_bot.check_builds(builds)
+
+
+class TestLocalCommand(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        os.chdir(ROOT)
+        self.addCleanup(os.chdir, self.cwd)
+
+    def test_package(self):
+        command, cwd = start_bot.local_command(Path("echo"))
+        self.assertEqual(command, [sys.executable, "-m", "echo"])
+        self.assertEqual(cwd, Path(ROOT))
+
+    def test_script(self):
+        command, cwd = start_bot.local_command(Path("concierge"))
+        self.assertEqual(command, [sys.executable, "concierge.py"])
+        self.assertEqual(cwd, Path(ROOT, "concierge"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""Room log replay test cases."""
+
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from replay import Recording, compare
+
+
+def record(id, second, event, user_id, data=None, receiver_id=None):
+    return {
+        "id": id,
+        "date_created": f"2024-05-01T10:00:{second:06.3f}",
+        "event": event,
+        "user_id": user_id,
+        "room_id": 3,
+        "receiver_id": receiver_id,
+        "data": data or {},
+    }
+
+
+RECORDS = [
+    record(1, 0, "join", 5),
+    record(2, 1, "join", 9),
+    record(3, 1.5, "join", 6),
+    record(4, 2, "text_message", 9, {"message": "Hello!"}),
+    record(5, 4, "command", 5, {"command": {"guess": "water", "remaining": 6}}),
+    record(6, 4.2, "board_log", 9, {"board": {"user": {"id": 5}, "tiles": 3}}),
+    record(7, 5, "start_typing", 9, {"user": {"id": 6}, "room": 3}),
+    record(8, 6, "text_message", 6, {"message": "hi"}, receiver_id=9),
+    record(9, 6.5, "text_message", 9, {"message": "Welcome"}, receiver_id=6),
+]
+
+
+class TestRecording(unittest.TestCase):
+    def test_split(self):
+        recording = Recording(RECORDS)
+        steps = recording.steps
+        self.assertEqual(recording.bot_id, 9)
+        self.assertEqual(recording.participants, [5, 6])
+        self.assertEqual(
+            [(offset, user, event, seen) for offset, user, event, _, seen in steps],
+            [
+                (3.0, 5, "message_command", 1),
+                (4.0, 6, "keypress", 1),
+                (5.0, 6, "text", 1),
+            ],
+        )
+        self.assertEqual(recording.steps[2][3], {"message": "hi", "receiver_id": 9})
+        self.assertEqual(len(recording.outputs), 4)
+        self.assertEqual(recording.response_times(), [2.5, 1.5, 0.5])
+
+    def test_unknown_bot(self):
+        with self.assertRaises(ValueError):
+            Recording([record(1, 0, "join", 5)])
+
+
+class TestCompare(unittest.TestCase):
+    def setUp(self):
+        self.expected = [record for _, record in Recording(RECORDS).outputs]
+        self.ids = {5: 15, 6: 16, 9: 19, 3: 13}
+
+    def replayed(self, records):
+        return [
+            {
+                **record,
+                "id": record["id"] + 100,
+                "user_id": 19,
+                "room_id": 13,
+                "receiver_id": self.ids.get(record["receiver_id"]),
+            }
+            for record in records
+        ]
+
+    def test_identical(self):
+        actual = self.replayed(self.expected)
+        actual[2]["data"] = {"user": {"id": 16}, "room": 13}
+        actual[1]["data"] = {"board": {"user": {"id": 15}, "tiles": 3}}
+        result = compare(self.expected, actual, self.ids, strict=True)
+        self.assertEqual(result["matched"], 4)
+        self.assertIsNone(result["first_difference"])
+
+    def test_differences(self):
+        actual = self.replayed(self.expected[:1] + self.expected[2:])
+        actual[-1]["data"] = {"message": "Bye"}
+        result = compare(self.expected, actual, self.ids)
+        self.assertEqual(result["missing"], {"board_log": 1})
+        self.assertEqual(result["first_difference"]["index"], 1)
+
+        result = compare(self.expected, actual, self.ids, strict=True)
+        self.assertEqual(result["unexpected"], {"start_typing": 1, "text_message": 1})
+
+        result = compare(self.expected, actual, self.ids, ignore={"board_log"})
+        self.assertEqual(result["matched"], 3)
+        self.assertEqual(result["missing"], {})
+
+
+if __name__ == "__main__":
+    unittest.main()
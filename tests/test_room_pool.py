@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""RoomPool class test cases."""
+
+import itertools
+import os
+import sys
+import threading
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from common.room_pool import RoomPool
+
+
+class FakeRooms:
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.ids = itertools.count(1)
+        self.created = []
+        self.discarded = []
+        self.lock = threading.Lock()
+
+    def create(self, layout_id):
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("server down")
+        with self.lock:
+            room = (layout_id, next(self.ids))
+            self.created.append(room)
+            return room
+
+    def discard(self, layout_id, room):
+        self.discarded.append(room)
+
+
+class TestRoomPool(unittest.TestCase):
+    def setUp(self):
+        self.rooms = FakeRooms()
+
+    def pool(self, **kwargs):
+        pool = RoomPool(self.rooms.create, self.rooms.discard, **kwargs)
+        self.addCleanup(pool.close)
+        return pool
+
+    def wait_ready(self, pool, key, count, timeout=2):
+        deadline = time.monotonic() + timeout
+        while pool.sizes().get(key, 0) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_register_fills(self):
+        pool = self.pool(min_size=2)
+        pool.register(7)
+        self.wait_ready(pool, 7, 2)
+        self.assertEqual(pool.sizes(), {7: 2})
+
+        room = pool.acquire(7)
+        self.assertEqual(room[0], 7)
+        self.wait_ready(pool, 7, 2)
+        self.assertEqual(len(self.rooms.created), 3)
+        self.assertEqual(pool.stats()["hits"], 1)
+
+    def test_miss_does_not_wait(self):
+        self.rooms.delay = 0.2
+        pool = self.pool(min_size=1)
+        start = time.monotonic()
+        self.assertIsNone(pool.acquire(7))
+        self.assertLess(time.monotonic() - start, 0.1)
+        self.assertEqual(pool.stats()["misses"], 1)
+
+    def test_target_follows_demand(self):
+        pool = self.pool(min_size=1, max_size=5, horizon=10, window=10)
+        pool.register(7)
+        self.assertEqual(pool.target(7), 1)
+        for _ in range(3):
+            pool.acquire(7)
+        self.assertEqual(pool.target(7), 3)
+        for _ in range(10):
+            pool.acquire(7)
+        self.assertEqual(pool.target(7), 5)
+
+    def test_close_discards_unused(self):
+        pool = self.pool(min_size=3)
+        pool.register(7)
+        pool.register(8)
+        self.wait_ready(pool, 7, 3)
+        self.wait_ready(pool, 8, 3)
+        taken = pool.acquire(8)
+
+        discarded = pool.close()
+        unused = set(self.rooms.created) - {taken}
+        self.assertEqual(discarded, len(unused))
+        self.assertEqual(set(self.rooms.discarded), unused)
+        self.assertIsNone(pool.acquire(7))
+
+    def test_release(self):
+        pool = self.pool(min_size=1, max_size=1)
+        pool.register(7)
+        self.wait_ready(pool, 7, 1)
+        taken = pool.acquire(7)
+        self.wait_ready(pool, 7, 1)
+
+        # the pool is full again
+        pool.release(7, taken)
+        self.assertEqual(self.rooms.discarded, [taken])
+
+        pool = self.pool(min_size=1, max_size=5)
+        pool.register(8)
+        self.wait_ready(pool, 8, 1)
+        room = pool.acquire(8)
+        pool.release(8, room)
+        self.assertIn(room, [pool.acquire(8), pool.acquire(8)])
+        self.assertEqual(self.rooms.discarded, [taken])
+
+    def test_failed_creation(self):
+        self.rooms.fail = True
+        pool = self.pool(min_size=2)
+        pool.register(7)
+        pool.close()
+        self.assertEqual(pool.stats()["failed"], 2)
+        self.assertEqual(pool.sizes(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
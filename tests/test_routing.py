@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""TaskRoutes class test cases."""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from common.routing import TaskRoutes
+from common.scheduler import cancel_all
+from templates import InstrumentedClient
+from test_outbound import load_echo_bot
+
+
+class TestTaskRoutes(unittest.TestCase):
+    def test_load_inline_and_file(self):
+        source = '{"12": {"version": "feedback"}, "13": null}'
+        expected = {12: {"version": "feedback"}, 13: {}}
+        self.assertEqual(TaskRoutes.load(source), expected)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "tasks.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"12": {"version": "feedback"}, "13": None}, f)
+            self.assertEqual(TaskRoutes.load(path), expected)
+
+    def test_membership(self):
+        tasks = TaskRoutes({12: {}, "13": {}})
+        self.assertIn(12, tasks)
+        self.assertIn("13", tasks)
+        self.assertNotIn(14, tasks)
+        self.assertNotIn(None, tasks)
+        self.assertEqual(sorted(tasks), [12, 13])
+
+    def test_room_settings(self):
+        tasks = TaskRoutes({12: {"version": "feedback"}, 13: {}})
+        tasks.open_room(1, 12)
+        tasks.open_room(2, 13)
+
+        self.assertEqual(tasks.task_of_room(1), 12)
+        self.assertEqual(tasks.setting(1, "version", "no_feedback"), "feedback")
+        self.assertEqual(tasks.setting(2, "version", "no_feedback"), "no_feedback")
+        self.assertEqual(tasks.setting(3, "version"), None)
+        self.assertEqual(tasks.stats(), {"tasks": 2, "rooms": {12: 1, 13: 1}})
+
+        tasks.close_room(1)
+        self.assertIsNone(tasks.task_of_room(1))
+        self.assertEqual(tasks.setting(1, "version", "no_feedback"), "no_feedback")
+
+
+class TestBotRoutes(unittest.TestCase):
+    def setUp(self):
+        class EchoBot(load_echo_bot()):
+            sio = InstrumentedClient(logger=False)
+            timers_per_room = dict()
+
+        tasks = {12: {"timeout_timer": 0.5}, 13: {}}
+        self.bot = EchoBot("token", 1, None, "http://localhost", None, tasks)
+        self.addCleanup(self.bot.api.close)
+
+    def test_timeout_per_task(self):
+        for room_id, task_id in [(1, 12), (2, 13)]:
+            self.addCleanup(cancel_all, room_id)
+            self.bot.tasks.open_room(room_id, task_id)
+            self.bot.on_task_room_creation({"room": room_id, "task": task_id})
+
+        self.assertEqual(self.bot.timers_per_room[1].timer.delay, 30)
+        self.assertEqual(self.bot.timers_per_room[2].timer.delay, 3600)
+
+    def test_close_releases_route(self):
+        self.addCleanup(cancel_all, 1)
+        self.bot.tasks.open_room(1, 12)
+        self.bot.on_task_room_creation({"room": 1, "task": 12})
+
+        with mock.patch.object(self.bot, "room_to_read_only"):
+            self.bot.close_room(1)
+        self.assertIsNone(self.bot.tasks.task_of_room(1))
+        self.assertEqual(self.bot.tasks.stats()["rooms"], {12: 0, 13: 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""Scheduler class test cases."""
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from common.scheduler import Scheduler
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = Scheduler()
+        self.fired = []
+        self.event = threading.Event()
+
+    def tearDown(self):
+        self.scheduler.shutdown()
+
+    def callback(self, name):
+        self.fired.append(name)
+        self.event.set()
+
+    def test_fires_in_order(self):
+        self.scheduler.schedule(0.06, self.callback, "late")
+        self.scheduler.schedule(0.02, self.callback, "early")
+        time.sleep(0.15)
+        self.assertEqual(self.fired, ["early", "late"])
+
+    def test_reset_postpones(self):
+        timer = self.scheduler.schedule(0.1, self.callback, "timeout")
+        for _ in range(4):
+            time.sleep(0.05)
+            timer.reset()
+        self.assertEqual(self.fired, [])
+        self.assertTrue(self.event.wait(1))
+        self.assertFalse(timer.is_alive())
+
+    def test_reset_to_shorter_delay(self):
+        timer = self.scheduler.schedule(60, self.callback, "timeout")
+        timer.reset(0.01)
+        self.assertTrue(self.event.wait(1))
+
+    def test_reset_after_firing_restarts(self):
+        timer = self.scheduler.schedule(0.01, self.callback, "timeout")
+        self.assertTrue(self.event.wait(1))
+        self.event.clear()
+        timer.reset()
+        self.assertTrue(timer.is_alive())
+        self.assertTrue(self.event.wait(1))
+        self.assertEqual(self.fired, ["timeout", "timeout"])
+
+    def test_cancel(self):
+        timer = self.scheduler.schedule(0.02, self.callback, "timeout")
+        timer.cancel()
+        time.sleep(0.08)
+        self.assertEqual(self.fired, [])
+        self.assertIsNone(timer.remaining())
+
+    def test_cancel_all(self):
+        for name in ("a", "b"):
+            self.scheduler.schedule(0.02, self.callback, name, group=1)
+        self.scheduler.schedule(0.02, self.callback, "other", group=2)
+        self.assertEqual(self.scheduler.pending(group=1), 2)
+
+        self.scheduler.cancel_all(1)
+        self.assertEqual(self.scheduler.pending(group=1), 0)
+        time.sleep(0.08)
+        self.assertEqual(self.fired, ["other"])
+        self.assertEqual(self.scheduler.pending(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
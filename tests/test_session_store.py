@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""SessionStore class test cases."""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from common.scheduler import schedule
+from common.session_store import (
+    FileSessionStore,
+    SessionStore,
+    SqliteSessionStore,
+    deadline_of,
+    open_store,
+    resume_timer,
+)
+
+
+class StoreTests:
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, self.filename)
+        self.store = self.open()
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def reopen(self):
+        self.store.close()
+        self.store = self.open()
+
+    def test_latest_state_survives(self):
+        self.store.save(1, {"points": 0, "players": [{"id": 3}]})
+        self.store.save(1, {"points": 25, "players": [{"id": 3}]})
+        self.store.save(2, {"points": 5, "players": []})
+        self.reopen()
+        self.assertEqual(
+            self.store.load(),
+            {
+                1: {"points": 25, "players": [{"id": 3}]},
+                2: {"points": 5, "players": []},
+            },
+        )
+
+    def test_delete(self):
+        self.store.save(1, {"points": 0})
+        self.store.save(2, {"points": 0})
+        self.store.delete(1)
+        self.reopen()
+        self.assertEqual(list(self.store.load()), [2])
+        self.assertEqual(self.store.stats()["restored"], 1)
+
+
+class TestSqliteSessionStore(StoreTests, unittest.TestCase):
+    filename = "sessions.db"
+
+    def open(self):
+        return SqliteSessionStore(self.path)
+
+
+class TestFileSessionStore(StoreTests, unittest.TestCase):
+    filename = "sessions.jsonl"
+
+    def open(self):
+        return FileSessionStore(self.path, compact_after=10)
+
+    def test_compact(self):
+        for points in range(50):
+            self.store.save(1, {"points": points})
+        with open(self.path) as infile:
+            self.assertLessEqual(len(infile.readlines()), 11)
+        self.reopen()
+        self.assertEqual(self.store.load(), {1: {"points": 49}})
+
+    def test_broken_last_line(self):
+        self.store.save(1, {"points": 1})
+        self.store.close()
+        with open(self.path, "a") as outfile:
+            outfile.write('{"room": 2, "sta')
+
+        self.store = self.open()
+        self.store.save(3, {"points": 3})
+        self.reopen()
+        self.assertEqual(self.store.load(), {1: {"points": 1}, 3: {"points": 3}})
+
+
+class TestTimers(unittest.TestCase):
+    def test_abstract_store(self):
+        with self.assertRaises(TypeError):
+            SessionStore()
+
+    def test_open_store(self):
+        with self.assertRaises(ValueError):
+            open_store("redis://localhost")
+
+    def test_resume_timer(self):
+        fired = threading.Event()
+        timer = schedule(0.2, fired.set)
+        deadline = deadline_of(timer)
+        timer.cancel()
+        self.assertIsNone(deadline_of(timer))
+
+        resumed = resume_timer(deadline, fired.set)
+        self.assertLessEqual(resumed.remaining(), 0.2)
+        self.assertTrue(fired.wait(1))
+
+    def test_resume_expired_timer(self):
+        fired = threading.Event()
+        resume_timer(time.time() - 60, fired.set)
+        self.assertTrue(fired.wait(1))
+
+
+if __name__ == "__main__":
+    unittest.main()
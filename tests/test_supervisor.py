@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""Supervisor class test cases."""
+
+import io
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from supervisor import Supervisor
+
+
+def deadline(seconds, done):
+    """`until` function of `Supervisor.run`: stop once `done()` or after
+    `seconds`."""
+    end = time.monotonic() + seconds
+    return lambda: done() or time.monotonic() > end
+
+
+class TestSupervisor(unittest.TestCase):
+    def setUp(self):
+        self.output = io.StringIO()
+        self.supervisor = Supervisor(interval=0.05, output=self.output)
+
+    def lines(self):
+        return self.output.getvalue().splitlines()
+
+    def test_output_prefix(self):
+        self.supervisor.add("short", [sys.executable, "-c", "print('hello')"])
+        self.supervisor.add(
+            "longer",
+            [sys.executable, "-c", "import os; print(os.environ['BOT_ID'])"],
+            env={**os.environ, "BOT_ID": "42"},
+        )
+        self.supervisor.run(deadline(5, lambda: len(self.lines()) >= 2))
+        self.assertIn("short  | hello", self.lines())
+        self.assertIn("longer | 42", self.lines())
+
+    def test_restart_on_crash(self):
+        crashing = self.supervisor.add(
+            "bot",
+            [sys.executable, "-c", "import sys; print('up'); sys.exit(3)"],
+            min_delay=0.05,
+            max_delay=0.2,
+        )
+        self.supervisor.run(deadline(5, lambda: crashing.restarts >= 3))
+        self.assertGreaterEqual(crashing.restarts, 3)
+        self.assertIn("bot | exited with code 3, restarting in 0.1s", self.lines())
+
+    def test_restart_on_change(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as file:
+            file.write("print('first')\nimport time\ntime.sleep(30)\n")
+        self.addCleanup(os.remove, file.name)
+
+        running = self.supervisor.add(
+            "bot", [sys.executable, file.name], watch=[file.name]
+        )
+
+        def edit():
+            if running.restarts == 0 and "bot | first" in self.lines():
+                with open(file.name, "w") as script:
+                    script.write("print('second')\nimport time\ntime.sleep(30)\n")
+                os.utime(file.name, ns=(0, time.time_ns() + 10**9))
+            return "bot | second" in self.lines()
+
+        start = time.monotonic()
+        self.supervisor.run(deadline(10, edit))
+        self.assertIn("bot | files changed, restarting", self.lines())
+        self.assertIn("bot | second", self.lines())
+        self.assertEqual(running.crashes, 0)
+        # the sleeping process was stopped instead of waited for
+        self.assertLess(time.monotonic() - start, 10)
+        self.assertIsNotNone(running.process.poll())
+
+
+if __name__ == "__main__":
+    unittest.main()
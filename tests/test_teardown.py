@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""Room teardown test cases."""
+
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from fake_slurk import DEFAULT_API_TOKEN, SlurkState
+from common.metadata import MetadataCache
+from templates import close_room, close_rooms
+
+
+class StateResponse:
+    def __init__(self, status_code, body, headers):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.content = json.dumps(body).encode() if body is not None else b""
+        self.headers = headers
+        self._body = body
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise RuntimeError(self.status_code)
+
+
+class StateApi:
+    """`ApiClient` answering from a `SlurkState`, `delay` seconds per
+    request."""
+
+    def __init__(self, state, delay=0.0):
+        self.state = state
+        self.delay = delay
+        self.lock = threading.Lock()
+
+    def request(self, method, path, headers=None, json=None):
+        time.sleep(self.delay)
+        headers = {"Authorization": f"Bearer {DEFAULT_API_TOKEN}", **(headers or {})}
+        with self.lock:
+            return StateResponse(*self.state.handle(method, path, json, headers))
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def patch(self, path, **kwargs):
+        return self.request("PATCH", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+
+class TestTeardown(unittest.TestCase):
+    def setUp(self):
+        self.state = SlurkState()
+        self.api = StateApi(self.state)
+        self.layout = self.post("/layouts", {"title": "Task"})["id"]
+        self.bot = self.create_user("bot", self.create_room())
+        self.rooms = dict()
+        for _ in range(6):
+            room = self.create_room()
+            self.rooms[room] = [self.create_user("player", room) for _ in range(2)]
+            self.post(f"/users/{self.bot}/rooms/{room}")
+
+    def post(self, path, body=None):
+        _, data, _ = self.state.handle(
+            "POST", path, body, {"Authorization": f"Bearer {DEFAULT_API_TOKEN}"}
+        )
+        return data
+
+    def create_room(self):
+        return self.post("/rooms", {"layout_id": self.layout})["id"]
+
+    def create_user(self, name, room):
+        permissions = self.post("/permissions", {})["id"]
+        token = self.post("/tokens", {"permissions_id": permissions, "room_id": room})
+        return self.post("/users", {"name": name, "token_id": token["id"]})["id"]
+
+    def members(self, room):
+        return self.state.rooms[room]["users"]
+
+    def test_close_room(self):
+        room = next(iter(self.rooms))
+        self.assertGreaterEqual(close_room(self.api, room, exclude={self.bot}), 0)
+        self.assertEqual(self.members(room), [self.bot])
+        self.assertEqual(
+            [
+                data["attribute"]
+                for event, data, _, _ in self.state.outbox
+                if event == "attribute_update"
+            ],
+            ["readonly", "placeholder"],
+        )
+
+    def test_only_read_only(self):
+        room = next(iter(self.rooms))
+        close_room(self.api, room, users=[])
+        self.assertEqual(len(self.members(room)), 3)
+
+    def test_close_rooms_in_parallel(self):
+        self.api.delay = 0.02
+        start = time.monotonic()
+        durations = close_rooms(self.api, self.rooms, exclude={self.bot}, workers=6)
+        elapsed = time.monotonic() - start
+
+        # each room takes 7 requests, one after another
+        self.assertLess(elapsed, sum(durations.values()) / 2)
+        for room in self.rooms:
+            self.assertEqual(self.members(room), [self.bot])
+
+    def test_known_etags_and_retry(self):
+        metadata = MetadataCache(self.api, ttl=60)
+        room, players = next(iter(self.rooms.items()))
+        for player in players:
+            metadata.user_etag(player)
+        # one of them changed in the meantime
+        self.post(f"/users/{players[0]}/rooms/{self.create_room()}")
+
+        durations = close_rooms(
+            self.api, [room], {room: players}, metadata, exclude={self.bot}
+        )
+        self.assertIsNotNone(durations[room])
+        self.assertEqual(self.members(room), [self.bot])
+
+    def test_failed_room(self):
+        room = next(iter(self.rooms))
+        durations = close_rooms(self.api, [room, 999], exclude={self.bot})
+        self.assertIsNotNone(durations[room])
+        self.assertIsNone(durations[999])
+
+
+if __name__ == "__main__":
+    unittest.main()
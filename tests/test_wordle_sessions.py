@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+# University of Potsdam
+"""Wordle session checkpoint test cases."""
+
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.insert(0, os.path.join(ROOT, "wordle"))
+
+from common.scheduler import get_scheduler
+from common.session_store import SqliteSessionStore
+from lib.image_data import ImageData
+from lib.wordle_bot import Session, WordleBot
+
+ROOM = 7
+ITEMS = [["crane", "https://example.org/1.jpg", None]]
+PLAYERS = [
+    {"id": 1, "name": "Ann", "msg_n": 3, "status": "ready"},
+    {"id": 2, "name": "Bob", "msg_n": 1, "status": "ready"},
+]
+
+
+def noop(*args):
+    pass
+
+
+class TestSessionRestore(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "sessions.db")
+        self.addCleanup(get_scheduler().cancel_all, ROOM)
+
+    def session(self):
+        session = Session(ImageData.from_items(ITEMS, 1, "one_blind"))
+        session.players = PLAYERS
+        session.guesses = {1: "slate"}
+        session.guesses_history = ["slate"]
+        session.points = 25
+        session.timer.start_round_timer(noop, ROOM)
+        session.timer.user_left(noop, ROOM, 2)
+        return session
+
+    def bot(self):
+        store = f"sqlite:{self.path}"
+        with mock.patch.dict(os.environ, {"SLURK_SESSION_STORE": store}):
+            bot = WordleBot("token", 1, "http://localhost", None)
+        self.addCleanup(bot.api.close)
+        self.addCleanup(bot.sessions.store.close)
+        return bot
+
+    def test_state_round_trip(self):
+        session = self.session()
+        state = json.loads(json.dumps(session.to_state()))
+        restored = Session.from_state(state)
+        session.close()
+
+        self.assertEqual(list(restored.images), [tuple(item) for item in ITEMS])
+        self.assertEqual(restored.players, PLAYERS)
+        self.assertEqual(restored.guesses, {1: "slate"})
+        self.assertEqual(restored.guesses_history, ["slate"])
+        self.assertEqual(restored.points, 25)
+        self.assertEqual([user for user, _ in state["left_deadlines"]], [2])
+
+    def test_bot_restores_every_timer(self):
+        session = self.session()
+        store = SqliteSessionStore(self.path)
+        store.save(ROOM, session.to_state())
+        store.close()
+        round_deadline, left_deadlines = session.timer.deadlines()
+        session.close()
+
+        bot = self.bot()
+        bot.restore_sessions()
+        timer = bot.sessions[ROOM].timer
+        self.assertEqual(list(timer.left_room), [2])
+        self.assertEqual(timer.left_room[2].function, bot.user_gone)
+        self.assertEqual(timer.left_room[2].args, (ROOM, 2))
+
+        # the timers keep their remaining time
+        restored = timer.deadlines()
+        self.assertAlmostEqual(restored[0], round_deadline, delta=1)
+        self.assertAlmostEqual(restored[1][2], left_deadlines[2], delta=1)
+        self.assertEqual(get_scheduler().pending(ROOM), 2)
+
+    def test_leave_is_restored(self):
+        bot = self.bot()
+        bot.sessions[ROOM] = Session(ImageData.from_items(ITEMS, 1, "one_blind"))
+        bot.sessions[ROOM].players = PLAYERS
+        bot.user_left(ROOM, 2)
+        bot.sessions[ROOM].close()
+
+        # a restart after the leave, but before the player came back
+        bot = self.bot()
+        bot.restore_sessions()
+        timer = bot.sessions[ROOM].timer
+        self.assertEqual(list(timer.left_room), [2])
+        self.assertEqual(timer.left_room[2].args, (ROOM, 2))
+        self.assertEqual(get_scheduler().pending(ROOM), 1)
+
+    def test_expired_timer_fires(self):
+        session = self.session()
+        state = session.to_state()
+        session.close()
+        state["left_deadlines"] = [[2, time.time() - 60]]
+        store = SqliteSessionStore(self.path)
+        store.save(ROOM, state)
+        store.close()
+
+        bot = self.bot()
+        with mock.patch.object(WordleBot, "user_gone") as user_gone:
+            bot.restore_sessions()
+            deadline = time.monotonic() + 2
+            while not user_gone.called and time.monotonic() < deadline:
+                time.sleep(0.01)
+        user_gone.assert_called_once_with(ROOM, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
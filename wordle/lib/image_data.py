@@ -46,6 +46,25 @@ class ImageData(list):
         self._switch_order = self._switch_image_order()
         self.get_word_image_pairs()
 
+    @classmethod
+    def from_items(cls, items, n=1, game_mode='same'):
+        """Image data of a restored session, without reading the file.
+
+        Args:
+            items (list): The items left for the room.
+            n (int): Number of images presented per room.
+            game_mode (str): The game mode of the room.
+        """
+        data = cls.__new__(cls)
+        data.extend(tuple(item) for item in items)
+        data._path = None
+        data._n = n
+        data._mode = game_mode
+        data._shuffle = False
+        data._images = None
+        data._switch_order = data._switch_image_order()
+        return data
+
     @property
     def n(self):
         return self._n
@@ -7,12 +7,13 @@ import logging
 import os
 import random
 import string
-from threading import Timer
-from time import sleep
-
-import requests
-import socketio
+from time import perf_counter
 
+from common.metadata import MetadataCache
+from common.pacing import PacedSender
+from common.scheduler import schedule
+from common.session_store import SessionStore, deadline_of, resume_timer
+from templates import ApiClient, InstrumentedClient, close_room
 from lib.image_data import ImageData
 from lib.config import (
     COLOR_MESSAGE,
@@ -51,35 +52,54 @@ class RoomTimers:
         self.round_timer = None
 
     def cancel_all_timers(self):
-        self.round_timer.cancel()
+        if self.round_timer is not None:
+            self.round_timer.cancel()
         for timer in self.left_room.values():
             timer.cancel()
 
     def user_joined(self, user):
-        timer = self.left_room.get(user)
+        timer = self.left_room.pop(user, None)
         if timer is not None:
-            self.left_room[user].cancel()
-
-    def user_left(self, user):
-        self.left_room[user] = Timer(
-            LEAVE_TIMER * 60, self.function, args=[self.room_id, "user_left"]
-        )
-        self.left_room[user].start()
+            timer.cancel()
 
-    def start_round_timer(self, function, room_id):
+    def user_left(self, function, room_id, user, deadline=None):
+        # a restored timer keeps its remaining time
+        if deadline is not None:
+            timer = resume_timer(deadline, function, room_id, user, group=room_id)
+        else:
+            timer = schedule(
+                TIME_LEFT * 60, function, room_id, user, group=room_id
+            )
+        self.left_room[user] = timer
+
+    def deadlines(self):
+        """Deadlines of the running timers, see `session_store.deadline_of`."""
+        left_room = dict()
+        for user, timer in self.left_room.items():
+            deadline = deadline_of(timer)
+            if deadline is not None:
+                left_room[user] = deadline
+        return deadline_of(self.round_timer), left_room
+
+    def start_round_timer(self, function, room_id, deadline=None):
         # cancel old timer if still running
-        if isinstance(self.round_timer, Timer):
+        if self.round_timer is not None:
             self.round_timer.cancel()
 
-        timer = Timer(TIME_ROUND * 60, function, args=[room_id])
-        timer.start()
+        # a restored round keeps its remaining time
+        if deadline is not None:
+            timer = resume_timer(deadline, function, room_id, group=room_id)
+        else:
+            timer = schedule(TIME_ROUND * 60, function, room_id, group=room_id)
         self.round_timer = timer
 
 
 class Session:
-    def __init__(self):
+    def __init__(self, images=None):
         self.timer = RoomTimers()
-        self.images = ImageData(DATA_PATH, N, GAME_MODE, SHUFFLE, SEED)
+        if images is None:
+            images = ImageData(DATA_PATH, N, GAME_MODE, SHUFFLE, SEED)
+        self.images = images
         self.players = list()
         self.guesses = dict()
         self.guesses_history = list()
@@ -89,8 +109,42 @@ class Session:
     def close(self):
         self.timer.cancel_all_timers()
 
+    def to_state(self):
+        """JSON serializable checkpoint of the session."""
+        round_deadline, left_deadlines = self.timer.deadlines()
+        return {
+            "images": list(self.images),
+            "n": self.images.n,
+            "players": self.players,
+            "guesses": list(self.guesses.items()),
+            "guesses_history": self.guesses_history,
+            "points": self.points,
+            "game_over": self.game_over,
+            "round_deadline": round_deadline,
+            # JSON object keys are strings
+            "left_deadlines": [[user, t] for user, t in left_deadlines.items()],
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        """Rebuild a session from `to_state`; timers are not started."""
+        session = cls(ImageData.from_items(state["images"], state["n"], GAME_MODE))
+        session.players = state["players"]
+        session.guesses = dict(state["guesses"])
+        session.guesses_history = state["guesses_history"]
+        session.points = state["points"]
+        session.game_over = state["game_over"]
+        return session
+
 
 class SessionManager(dict):
+    def __init__(self, store=None):
+        """Sessions per room, checkpointed to `store` if given.
+        :type store: session_store.SessionStore, optional
+        """
+        super().__init__()
+        self.store = store
+
     def create_session(self, room_id):
         self[room_id] = Session()
 
@@ -98,10 +152,18 @@ class SessionManager(dict):
         if room_id in self:
             self[room_id].close()
             self.pop(room_id)
+            if self.store is not None:
+                self.store.delete(room_id)
+
+    def checkpoint(self, room_id):
+        """Save the current state of a room, to be called after every
+        change of its session."""
+        if self.store is not None and room_id in self:
+            self.store.save(room_id, self[room_id].to_state())
 
 
 class WordleBot:
-    sio = socketio.Client(logger=True)
+    sio = InstrumentedClient(logger=True)
     """The ID of the task the bot is involved in."""
     task_id = None
     """The ID of the room where users for this task are waiting."""
@@ -148,8 +210,12 @@ class WordleBot:
 
         self.url = self.uri
         self.uri += "/slurk/api"
+        self.api = ApiClient(self.uri, self.token)
+        self.metadata = MetadataCache(self.api)
+        self.pacer = PacedSender(self.sio)
 
-        self.sessions = SessionManager()
+        # checkpointed if `SLURK_SESSION_STORE` is set
+        self.sessions = SessionManager(SessionStore.from_env())
 
         self.public = PUBLIC
         self.data_collection = PLATFORM
@@ -172,6 +238,7 @@ class WordleBot:
         self.register_callbacks()
 
     def run(self):
+        self.restore_sessions()
         # establish a connection to the server
         self.sio.connect(
             self.uri,
@@ -181,6 +248,26 @@ class WordleBot:
         # wait until the connection with the server ends
         self.sio.wait()
 
+    def restore_sessions(self):
+        """Resume the rooms checkpointed before the bot was restarted."""
+        if self.sessions.store is None:
+            return
+
+        start = perf_counter()
+        for room_id, state in self.sessions.store.load().items():
+            session = self.sessions[room_id] = Session.from_state(state)
+            self.wordlist.update(pair[0] for pair in session.images)
+            if state["round_deadline"] is not None:
+                session.timer.start_round_timer(
+                    self.time_out_round, room_id, state["round_deadline"]
+                )
+            for user_id, deadline in state.get("left_deadlines", []):
+                session.timer.user_left(self.user_gone, room_id, user_id, deadline)
+        LOG.info(
+            f"Restored {len(self.sessions)} rooms "
+            f"in {perf_counter() - start:.3f}s"
+        )
+
     @staticmethod
     def request_feedback(response, action):
         if not response.ok:
@@ -225,10 +312,7 @@ class WordleBot:
                         {**usr, "msg_n": 0, "status": "joined"}
                     )
 
-                response = requests.post(
-                    f"{self.uri}/users/{self.user}/rooms/{room_id}",
-                    headers={"Authorization": f"Bearer {self.token}"},
-                )
+                response = self.api.post(f"/users/{self.user}/rooms/{room_id}")
                 self.request_feedback(response, "let wordle bot join room")
 
                 logging.info(room_id)
@@ -243,6 +327,7 @@ class WordleBot:
                 self.sessions[room_id].timer.start_round_timer(
                     self.time_out_round, room_id
                 )
+                self.sessions.checkpoint(room_id)
 
                 # show info to users
                 self._update_score_info(room_id)
@@ -266,58 +351,40 @@ class WordleBot:
                     "needs to describe it to the other person."
                 )
 
-            response = requests.patch(
-                f"{self.uri}/rooms/{room_id}/text/mode",
+            response = self.api.patch(
+                f"/rooms/{room_id}/text/mode",
                 json={"text": mode_message},
-                headers={"Authorization": f"Bearer {self.token}"}
             )
             self.request_feedback(response, "add mode explanation")
 
             if room_id in self.sessions:
                 # read out task greeting
-                for line in TASK_GREETING:
-                    self.sio.emit(
-                        "text",
-                        {
-                            "message": COLOR_MESSAGE.format(
-                                color=STANDARD_COLOR, message=line
-                            ),
-                            "room": room_id,
-                            "html": True,
-                        },
-                    )
-                    sleep(0.5)
-
-                self.sio.emit(
-                    "text",
-                    {
-                        "message": COLOR_MESSAGE.format(
-                            color=STANDARD_COLOR,
-                            message=f"Let's start with the first "
-                            f"of {self.sessions[room_id].images.n} images",
-                        ),
-                        "room": room_id,
-                        "html": True,
-                    },
+                greeting = [
+                    *TASK_GREETING,
+                    f"Let's start with the first "
+                    f"of {self.sessions[room_id].images.n} images",
+                ]
+                self.pacer.send(
+                    room_id,
+                    [
+                        COLOR_MESSAGE.format(color=STANDARD_COLOR, message=line)
+                        for line in greeting
+                    ],
                 )
 
-                response = requests.patch(
-                    f"{self.uri}/rooms/{room_id}/text/instr_title",
-                    json={"text": line},
-                    headers={"Authorization": f"Bearer {self.token}"},
+                response = self.api.patch(
+                    f"/rooms/{room_id}/text/instr_title",
+                    json={"text": TASK_GREETING[-1]},
                 )
                 self.request_feedback(response, "set task instruction title")
 
         @self.sio.event
         def status(data):
             """Triggered if a user enters or leaves a room."""
+            self.metadata.on_status(data)
             # check whether the user is eligible to join this task
-            task = requests.get(
-                f"{self.uri}/users/{data['user']['id']}/task",
-                headers={"Authorization": f"Bearer {self.token}"},
-            )
-            self.request_feedback(task, "get task")
-            if not task.json() or task.json()["id"] != int(self.task_id):
+            task = self.metadata.task_of(data["user"]["id"])
+            if not task or task["id"] != int(self.task_id):
                 return
 
             room_id = data["room"]
@@ -328,14 +395,17 @@ class WordleBot:
                     self.waiting_timer.cancel()
                 if data["type"] == "join":
                     LOG.debug("Waiting Timer restarted.")
-                    self.waiting_timer = Timer(
+                    self.waiting_timer = schedule(
                         TIME_WAITING * 60,
                         self._no_partner,
-                        args=[room_id, data["user"]["id"]],
-                        )
-                    self.waiting_timer.start()
-                    sleep(10)
-                    self.sio.emit(
+                        room_id,
+                        data["user"]["id"],
+                        group=room_id,
+                    )
+                    # sleeping here would hold up the waiting room
+                    schedule(
+                        10,
+                        self.sio.emit,
                         "text",
                         {
                             "message": COLOR_MESSAGE.format(
@@ -409,6 +479,7 @@ class WordleBot:
                                 f"Cancelling Timer: left room for user {curr_usr['name']}"
                             )
                             self.sessions[room_id].timer.user_joined(curr_usr["id"])
+                            self.sessions.checkpoint(room_id)
 
                 elif data["type"] == "leave":
                     # send a message to the user that was left alone
@@ -419,7 +490,9 @@ class WordleBot:
                                 {
                                     "message": COLOR_MESSAGE.format(
                                         color=STANDARD_COLOR,
-                                        message=f"{curr_usr['name']} has left the game.",
+                                        message=f"{curr_usr['name']} has left the game. "
+                                                f"If they do not come back within "
+                                                f"{TIME_LEFT} minutes, the room closes.",
                                     ),
                                     "room": room_id,
                                     "receiver_id": other_usr["id"],
@@ -427,17 +500,7 @@ class WordleBot:
                                 },
                             )
 
-                            # close game, this user gets failure, other user success
-                            self.sessions[room_id].game_over = True
-                            self.end_game(
-                                room_id,
-                                {
-                                    curr_usr["id"]: "disconnection",
-                                    other_usr["id"]: "success",
-                                },
-                            )
-                            sleep(1)
-                            self.close_room(room_id)
+                            self.user_left(room_id, curr_usr["id"])
 
         @self.sio.event
         def text_message(data):
@@ -459,6 +522,7 @@ class WordleBot:
             for usr in self.sessions[room_id].players:
                 if usr["id"] == user_id and usr["status"] == "ready":
                     usr["msg_n"] += 1
+                    self.sessions.checkpoint(room_id)
 
         @self.sio.event
         def command(data):
@@ -494,6 +558,7 @@ class WordleBot:
                             )
                         else:
                             self._command_guess(room_id, user_id, data["command"])
+                            self.sessions.checkpoint(room_id)
 
                 # bot has no user defined commands
                 else:
@@ -518,16 +583,14 @@ class WordleBot:
             LOG.error("Could not resize chat and task area: invalid parameters.")
             raise ValueError("chat_area and task_area must sum up to 100")
 
-        response = requests.patch(
-            f"{self.uri}/rooms/{room_id}/attribute/id/sidebar",
-            headers={"Authorization": f"Bearer {self.token}"},
+        response = self.api.patch(
+            f"/rooms/{room_id}/attribute/id/sidebar",
             json={"attribute": "style", "value": f"width: {task_area}%"},
         )
         self.request_feedback(response, "resize sidebar")
 
-        response = requests.patch(
-            f"{self.uri}/rooms/{room_id}/attribute/id/content",
-            headers={"Authorization": f"Bearer {self.token}"},
+        response = self.api.patch(
+            f"/rooms/{room_id}/attribute/id/content",
             json={"attribute": "style", "value": f"width: {chat_area}%"},
         )
         self.request_feedback(response, "resize content area")
@@ -699,43 +762,50 @@ class WordleBot:
             )
 
             if (word == guess) or (remaining_guesses == 1):
-                sleep(2)
-
-                result = "LOST"
                 points = 0
-
                 if word == guess:
-                    result = "WON"
                     points = self.point_system[int(remaining_guesses)]
 
-                # update points for this room
-                self.sessions[room_id].points += points
+                # timer callbacks of this room wait for its lock, so the
+                # result is scheduled instead of sleeping here
+                schedule(2, self._end_round, room_id, word, points)
 
-                # self.timers_per_room[room_id].done_timer.cancel()
-                self.sio.emit(
-                    "text",
-                    {
-                        "message": COLOR_MESSAGE.format(
-                            color=STANDARD_COLOR,
-                            message=(
-                                f"**YOU {result}! For this round you get {points} points. "
-                                f"Your total score is: {self.sessions[room_id].points}**"
-                            ),
+    def _end_round(self, room_id, word, points):
+        with self.sio.room_locks(room_id):
+            session = self.sessions.get(room_id)
+            # the round may have timed out or the room closed meanwhile
+            if session is None or not session.images or session.images[0][0] != word:
+                return
+
+            result = "WON" if points else "LOST"
+
+            # update points for this room
+            session.points += points
+
+            self.sio.emit(
+                "text",
+                {
+                    "message": COLOR_MESSAGE.format(
+                        color=STANDARD_COLOR,
+                        message=(
+                            f"**YOU {result}! For this round you get {points} points. "
+                            f"Your total score is: {session.points}**"
                         ),
-                        "room": room_id,
-                        "html": True,
-                    },
-                )
+                    ),
+                    "room": room_id,
+                    "html": True,
+                },
+            )
 
-                self.next_round(room_id)
+            self.next_round(room_id)
+            self.sessions.checkpoint(room_id)
 
     def _update_score_info(self, room):
-        response = requests.patch(
-            f"{self.uri}/rooms/{room}/text/subtitle",
+        response = self.api.patch(
+            f"/rooms/{room}/text/subtitle",
             json={
                 "text": f"Your score is {self.sessions[room].points} – You have {len(self.sessions[room].images)} rounds to go."
             },
-            headers={"Authorization": f"Bearer {self.token}"},
         )
         self.request_feedback(response, "update score")
 
@@ -767,16 +837,10 @@ class WordleBot:
                 },
             )
             self._update_score_info(room_id)
-            sleep(1)
-
-            # close the game, bot users get a success token
-            curr_usr, other_usr = self.sessions[room_id].players
             self.sessions[room_id].game_over = True
-            self.end_game(
-                room_id, {curr_usr["id"]: "success", other_usr["id"]: "success"}
-            )
-            sleep(1)
-            self.close_room(room_id)
+            # the round timer calls this on a shared pool, so the next
+            # steps are scheduled instead of sleeping in between
+            schedule(1, self._finish_game, room_id)
         else:
             # load the next image
             self.sio.emit(
@@ -793,7 +857,13 @@ class WordleBot:
             )
 
             self._update_score_info(room_id)
-            sleep(2)
+            schedule(2, self._start_round, room_id)
+
+    def _start_round(self, room_id):
+        with self.sio.room_locks(room_id):
+            # the room may have closed meanwhile
+            if room_id not in self.sessions:
+                return
             self.sio.emit(
                 "message_command",
                 {"command": {"command": "wordle_init"}, "room": room_id},
@@ -808,6 +878,46 @@ class WordleBot:
 
             # restart next_round_timer
             self.sessions[room_id].timer.start_round_timer(self.time_out_round, room_id)
+            self.sessions.checkpoint(room_id)
+
+    def _finish_game(self, room_id):
+        with self.sio.room_locks(room_id):
+            if room_id not in self.sessions:
+                return
+            # close the game, bot users get a success token
+            curr_usr, other_usr = self.sessions[room_id].players
+            self.end_game(
+                room_id, {curr_usr["id"]: "success", other_usr["id"]: "success"}
+            )
+        schedule(1, self.close_room, room_id)
+
+    def user_left(self, room_id, user_id):
+        """Give a player who left `TIME_LEFT` minutes to come back."""
+        with self.sio.room_locks(room_id):
+            session = self.sessions.get(room_id)
+            if session is None or session.game_over:
+                return
+            session.timer.user_left(self.user_gone, room_id, user_id)
+            self.sessions.checkpoint(room_id)
+
+    def user_gone(self, room_id, user_id):
+        """Close the game of a player who left, also called by their
+        `left_room` timer. This user gets failure, the other success."""
+        with self.sio.room_locks(room_id):
+            session = self.sessions.get(room_id)
+            if session is None or session.game_over:
+                return
+            session.timer.left_room.pop(user_id, None)
+            curr_usr, other_usr = session.players
+            if curr_usr["id"] != user_id:
+                curr_usr, other_usr = other_usr, curr_usr
+
+            session.game_over = True
+            self.end_game(
+                room_id,
+                {curr_usr["id"]: "disconnection", other_usr["id"]: "success"},
+            )
+        schedule(1, self.close_room, room_id)
 
     def time_out_round(self, room_id):
         """
@@ -825,7 +935,10 @@ class WordleBot:
                 "html": True,
             },
         )
-        self.next_round(room_id)
+        # a guess of the same room may be handled at the same time
+        with self.sio.room_locks(room_id):
+            self.next_round(room_id)
+            self.sessions.checkpoint(room_id)
 
     def _no_partner(self, room_id, user_id):
         """Handle the situation that a participant waits in vain."""
@@ -839,8 +952,10 @@ class WordleBot:
             )
             # create token and send it to user
             self.confirmation_code(room_id, "no_partner", receiver_id=user_id)
-            sleep(5)
-            self.sio.emit(
+            # timer callbacks share a pool, they must not sleep
+            schedule(
+                5,
+                self.sio.emit,
                 "text",
                 {
                     "message": "You may also wait some more :)",
@@ -850,10 +965,9 @@ class WordleBot:
             )
             # no need to cancel
             # the running out of this timer triggered this event
-            self.waiting_timer = Timer(
-                TIME_WAITING * 60, self._no_partner, args=[room_id, user_id]
+            self.waiting_timer = schedule(
+                TIME_WAITING * 60, self._no_partner, room_id, user_id, group=room_id
             )
-            self.waiting_timer.start()
             self.received_waiting_token.add(user_id)
         else:
             self.sio.emit(
@@ -884,82 +998,73 @@ class WordleBot:
 
             # Player 1
             if image_1:
-                response = requests.patch(
-                    f"{self.uri}/rooms/{room_id}/attribute/id/current-image",
+                response = self.api.patch(
+                    f"/rooms/{room_id}/attribute/id/current-image",
                     json={
                         "attribute": "src",
                         "value": image_1,
                         "receiver_id": user_1["id"],
                     },
-                    headers={"Authorization": f"Bearer {self.token}"},
                 )
                 self.request_feedback(response, "set image 1")
                 # enable the image
-                response = requests.delete(
-                    f"{self.uri}/rooms/{room_id}/class/image-area",
+                response = self.api.delete(
+                    f"/rooms/{room_id}/class/image-area",
                     json={"class": "dis-area", "receiver_id": user_1["id"]},
-                    headers={"Authorization": f"Bearer {self.token}"},
                 )
                 self.request_feedback(response, "enable image 1")
 
             else:
                 # enable the explanatory text
-                response = requests.delete(
-                    f"{self.uri}/rooms/{room_id}/class/image-desc",
+                response = self.api.delete(
+                    f"/rooms/{room_id}/class/image-desc",
                     json={"class": "dis-area", "receiver_id": user_1["id"]},
-                    headers={"Authorization": f"Bearer {self.token}"},
                 )
                 self.request_feedback(response, "enable explanation")
 
             # Player 2
             if image_2:
-                response = requests.patch(
-                    f"{self.uri}/rooms/{room_id}/attribute/id/current-image",
+                response = self.api.patch(
+                    f"/rooms/{room_id}/attribute/id/current-image",
                     json={
                         "attribute": "src",
                         "value": image_2,
                         "receiver_id": user_2["id"],
                     },
-                    headers={"Authorization": f"Bearer {self.token}"},
                 )
                 self.request_feedback(response, "set image 2")
                 # enable the image
-                response = requests.delete(
-                    f"{self.uri}/rooms/{room_id}/class/image-area",
+                response = self.api.delete(
+                    f"/rooms/{room_id}/class/image-area",
                     json={"class": "dis-area", "receiver_id": user_2["id"]},
-                    headers={"Authorization": f"Bearer {self.token}"},
                 )
                 self.request_feedback(response, "enable image 2")
             else:
                 # enable the explanatory text
-                response = requests.delete(
-                    f"{self.uri}/rooms/{room_id}/class/image-desc",
+                response = self.api.delete(
+                    f"/rooms/{room_id}/class/image-desc",
                     json={"class": "dis-area", "receiver_id": user_2["id"]},
-                    headers={"Authorization": f"Bearer {self.token}"},
                 )
                 self.request_feedback(response, "enable explanation")
 
             # the task for both users is the same - no special receiver
-            response = requests.patch(
-                f"{self.uri}/rooms/{room_id}/text/instr_title",
+            response = self.api.patch(
+                f"/rooms/{room_id}/text/instr_title",
                 json={"text": TASK_TITLE},
-                headers={"Authorization": f"Bearer {self.token}"},
             )
             self.request_feedback(response, "set task instruction title")
 
     def _hide_image(self, room_id):
-        response = requests.post(
-            f"{self.uri}/rooms/{room_id}/class/image-area",
+        response = self.api.post(
+            f"/rooms/{room_id}/class/image-area",
             json={"class": "dis-area"},
-            headers={"Authorization": f"Bearer {self.token}"},
         )
         self.request_feedback(response, "hide image")
 
     def _hide_image_desc(self, room_id):
-        response = requests.post(
-            f"{self.uri}/rooms/{room_id}/class/image-desc",
+        response = self.api.post(
+            f"/rooms/{room_id}/class/image-desc",
             json={"class": "dis-area"},
-            headers={"Authorization": f"Bearer {self.token}"},
         )
         self.request_feedback(response, "hide description")
 
@@ -972,15 +1077,14 @@ class WordleBot:
 
         confirmation_token = "".join(random.choices(string.ascii_uppercase + string.digits, k=8))
         # post confirmation token to logs
-        response = requests.post(
-            f"{self.uri}/logs",
+        response = self.api.post(
+            "/logs",
             json={
                 "event": "confirmation_log",
                 "room_id": room_id,
                 "data": {"status_txt": status, "confirmation_token": confirmation_token},
                 **kwargs,
             },
-            headers={"Authorization": f"Bearer {self.token}"},
         )
         self.request_feedback(response, "post confirmation token to logs")
 
@@ -998,10 +1102,7 @@ class WordleBot:
 
         if token is None:
             # use the username
-            response = requests.get(
-                f"{self.uri}/users/{receiver}",
-                headers={"Authorization": f"Bearer {self.token}"},
-            )
+            response = self.api.get(f"/users/{receiver}")
             self.request_feedback(response, "get user")
             token = response.json().get("name", f"{room}–{receiver}")
 
@@ -1071,11 +1172,12 @@ class WordleBot:
             self.social_media_post(room_id, curr_usr["id"], other_usr["name"])
             self.social_media_post(room_id, other_usr["id"], curr_usr["name"])
         else:
+            # every player gets their own code, no need to pause in between
             for user_id, status in user_dict.items():
                 self.confirmation_code(room_id, status, user_id)
-                sleep(0.5)
 
     def close_room(self, room_id):
+        self.pacer.cancel(room_id)
         self.sio.emit(
             "text",
             {
@@ -1092,36 +1194,9 @@ class WordleBot:
 
         # remove any task room specific objects
         self.sessions.clear_session(room_id)
+        self.sio.forget_room(room_id)
 
     def room_to_read_only(self, room_id):
-        """Set room to read only."""
-        # set room to read-only
-        response = requests.patch(
-            f"{self.uri}/rooms/{room_id}/attribute/id/text",
-            json={"attribute": "readonly", "value": "True"},
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
-        self.request_feedback(response, "set room to read_only")
-
-        response = requests.patch(
-            f"{self.uri}/rooms/{room_id}/attribute/id/text",
-            json={"attribute": "placeholder", "value": "This room is read-only"},
-            headers={"Authorization": f"Bearer {self.token}"},
-        )
-        self.request_feedback(response, "set room to read_only")
-
-        # remove user from room
-        if room_id in self.sessions:
-            for usr in self.sessions[room_id].players:
-                response = requests.get(
-                    f"{self.uri}/users/{usr['id']}",
-                    headers={"Authorization": f"Bearer {self.token}"},
-                )
-                self.request_feedback(response, "get user")
-                etag = response.headers["ETag"]
-
-                response = requests.delete(
-                    f"{self.uri}/users/{usr['id']}/rooms/{room_id}",
-                    headers={"If-Match": etag, "Authorization": f"Bearer {self.token}"},
-                )
-                self.request_feedback(response, "remove user from task room")
+        """Set room to read only and remove the players from it."""
+        players = self.sessions[room_id].players if room_id in self.sessions else []
+        close_room(self.api, room_id, [usr["id"] for usr in players], self.metadata)